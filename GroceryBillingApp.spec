@@ -19,6 +19,13 @@ hidden_imports = [
     'sklearn.linear_model',
     'numpy',
     'openpyxl',
+    'xlsxwriter',
+    'pyarrow',
+    'pyarrow.feather',
+    'reportlab',
+    'PyPDF2',
+    'fitz',
+    'PIL',
     'email.mime.multipart',
     'email.mime.text',
     'email.mime.application',
@@ -27,8 +34,8 @@ hidden_imports = [
 hidden_imports.extend(collect_submodules('streamlit'))
 hidden_imports.extend(collect_submodules('plotly'))
 
-# Update this to match your main file name
-main_file = 'app.py'  # Change this to your actual main file name
+# Main entry point of the application (see MAIN_FILE in standalone_launcher.py)
+main_file = 'streamlit_app.py'
 
 a = Analysis(
     ['standalone_launcher.py'],
@@ -5,7 +5,7 @@ a = Analysis(
     ['launch.py'],
     pathex=[],
     binaries=[],
-    datas=[('.streamlit', '.streamlit'), ('pages', 'pages'), ('utils', 'utils')],
+    datas=[('streamlit_app.py', '.'), ('.streamlit', '.streamlit'), ('pages', 'pages'), ('utils', 'utils')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
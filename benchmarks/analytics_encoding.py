@@ -0,0 +1,128 @@
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from collections import Counter
+from utils import analytics_frames
+
+CATEGORIES = analytics_frames.CATEGORIES
+ITEM_COLUMNS = ['Cosmetic Items', 'Grocery Items', 'Drink Items']
+
+
+def make_snapshot_frames(line_item_count, customer_count=50000, sku_count=500, items_per_bill=3, seed=0):
+    """Generate bill and line item frames shaped like the analytics snapshot."""
+    rng = np.random.default_rng(seed)
+    bill_count = max(1, line_item_count // items_per_bill)
+    bill_numbers = np.array([f"BILL-{i:09d}" for i in range(bill_count)], dtype=object)
+    customers = rng.integers(0, customer_count, bill_count)
+    bills_df = pd.DataFrame({
+        'Bill Number': bill_numbers,
+        'Date': pd.Timestamp('2025-01-01') + pd.to_timedelta(np.arange(bill_count) * 30, unit='s'),
+        'Customer Name': pd.Categorical([f"Customer {c}" for c in customers]),
+        'Phone Number': pd.Categorical([f"9{c:09d}" for c in customers]),
+        'Subtotal': rng.uniform(20, 5000, bill_count),
+        'Tax': rng.uniform(3, 900, bill_count),
+        'Total': rng.uniform(23, 5900, bill_count)
+    })
+    skus = np.array([f"Product {i}" for i in range(sku_count)], dtype=object)
+    sku_ids = rng.integers(0, sku_count, bill_count * items_per_bill)
+    line_items_df = pd.DataFrame({
+        'Bill Number': np.repeat(bill_numbers, items_per_bill),
+        'Category': pd.Categorical.from_codes(sku_ids % len(CATEGORIES), CATEGORIES),
+        'Item': pd.Categorical.from_codes(sku_ids, skus),
+        'Quantity': rng.integers(1, 5, bill_count * items_per_bill).astype(np.int32),
+        'Price': rng.uniform(10, 500, bill_count * items_per_bill)
+    })
+    return bills_df, line_items_df
+
+
+def build_object_frame(bills_df, line_items_df):
+    """Build the previous layout: object string columns and per-bill Python lists of item names."""
+    billing_df = bills_df.copy()
+    # One string object per row, as read from Excel
+    billing_df['Customer Name'] = [str(name) + "" for name in bills_df['Customer Name'].astype(str)]
+    billing_df['Phone Number'] = [str(phone) + "" for phone in bills_df['Phone Number'].astype(str)]
+    for column, category in zip(ITEM_COLUMNS, CATEGORIES):
+        category_items = line_items_df[line_items_df['Category'] == category]
+        item_names = category_items['Item'].astype(object)
+        items_by_bill = item_names.groupby(category_items['Bill Number']).agg(lambda items: [str(item) for item in items])
+        billing_df[column] = [
+            items if isinstance(items, list) else []
+            for items in billing_df['Bill Number'].map(items_by_bill)
+        ]
+    return billing_df
+
+
+def object_frame_memory(billing_df):
+    """Memory of the object layout, including the strings held by the item lists."""
+    total = billing_df.drop(columns=ITEM_COLUMNS).memory_usage(deep=True).sum()
+    for column in ITEM_COLUMNS:
+        for items in billing_df[column]:
+            total += sys.getsizeof(items) + sum(sys.getsizeof(item) for item in items)
+    return total
+
+
+def encoded_memory(billing_df, line_items):
+    """Memory of the encoded layout."""
+    total = billing_df.memory_usage(deep=True).sum()
+    for key in ("bill_index", "sku_id", "category_id", "quantity"):
+        total += line_items[key].nbytes
+    total += line_items["skus"].memory_usage(deep=True)
+    return total
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def run(line_item_count):
+    bills_df, line_items_df = make_snapshot_frames(line_item_count)
+
+    object_df, build_before = timed(lambda: build_object_frame(bills_df, line_items_df))
+    memory_before = object_frame_memory(object_df)
+    _, groupby_before = timed(lambda: object_df.groupby('Customer Name')['Total'].sum())
+    _, customers_before = timed(lambda: sorted([str(name) for name in object_df['Customer Name'].unique() if name is not None and not pd.isna(name)]))
+
+    def count_items_before():
+        counts = []
+        for column in ITEM_COLUMNS:
+            all_items = []
+            for items in object_df[column]:
+                all_items.extend(items)
+            counts.append(Counter(all_items).most_common())
+        return counts
+    _, counts_before = timed(count_items_before)
+    del object_df
+
+    (encoded_df, line_items), build_after = timed(lambda: analytics_frames.encode_analytics_frames(bills_df, line_items_df))
+    memory_after = encoded_memory(encoded_df, line_items)
+    _, groupby_after = timed(lambda: encoded_df.groupby('Customer Name', observed=True)['Total'].sum())
+    _, customers_after = timed(lambda: analytics_frames.customer_names(encoded_df))
+    _, counts_after = timed(lambda: [analytics_frames.item_counts(line_items, category) for category in CATEGORIES])
+
+    rows = [
+        ("Build frame (s)", build_before, build_after),
+        ("Memory (MB)", memory_before / 2 ** 20, memory_after / 2 ** 20),
+        ("groupby('Customer Name') sum (s)", groupby_before, groupby_after),
+        ("Sorted customer list (s)", customers_before, customers_after),
+        ("Item counts, all categories (s)", counts_before, counts_after),
+    ]
+    print(f"{len(bills_df):,d} bills, {len(line_items_df):,d} line items")
+    print(f"{'Metric':<36}{'Before':>12}{'After':>12}{'Ratio':>10}")
+    for name, before, after in rows:
+        ratio = before / after if after else float('inf')
+        print(f"{name:<36}{before:>12.3f}{after:>12.3f}{ratio:>9.1f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare object and dictionary-encoded analytics frames")
+    parser.add_argument("--line-items", type=int, default=10_000_000, help="Number of line items to generate")
+    args = parser.parse_args(argv)
+    run(args.line_items)
+
+
+if __name__ == "__main__":
+    main()
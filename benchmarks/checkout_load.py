@@ -0,0 +1,332 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pandas as pd
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from utils import bill_store, catalog
+from utils.bill_operations import calculate_total, generate_bill, save_bill, export_bill_to_excel
+from utils.bill_storage import save_bill_to_master
+from utils.excel_export import stream_rows_to_excel, iter_synthetic_ledger_rows, materialize_ledger, LEDGER_HEADERS
+
+# Checkout stages in the order a cashier runs them
+STAGES = ["price", "format", "save_txt", "save_pdf", "export_excel", "save_master"]
+MASTER_HEADERS = ['Item', 'Quantity', 'Price', 'Total']
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def iter_synthetic_master_rows(count, seed=0):
+    """Generate master file rows (a header line, three items and the totals per bill)."""
+    rng = random.Random(seed)
+    for i in range(count):
+        yield [f"Bill Number: BILL-HIST-{i:07d}", "", "", ""]
+        subtotal = 0
+        for j in range(3):
+            quantity, price = rng.randint(1, 4), rng.choice([20, 35, 45, 60, 120])
+            subtotal += quantity * price
+            yield [f"Product {rng.randint(1, 500)}", quantity, price, quantity * price]
+        yield ["Subtotal:", "", "", subtotal]
+        yield ["Tax (18%):", "", "", round(subtotal * 0.18, 2)]
+        yield ["Grand Total:", "", "", round(subtotal * 1.18, 2)]
+
+
+def seed_history(workdir, history, bills_per_day=500, seed=0):
+    """
+    Create a bill history of the given size: the Excel ledger, the master file
+    and the partition manifests of the bill store, ending today.
+
+    Returns:
+        dict: Paths of the bills directory, the ledger and the master file
+    """
+    paths = {
+        "bills_directory": os.path.join(workdir, "saved_bills"),
+        "ledger_file": os.path.join(workdir, "vdx_excel_bills.xlsx"),
+        "master_file": os.path.join(workdir, "saved_bills", "master_bills.xlsx")
+    }
+    os.makedirs(paths["bills_directory"], exist_ok=True)
+    stream_rows_to_excel(iter_synthetic_ledger_rows(history, seed), paths["ledger_file"], headers=LEDGER_HEADERS)
+    stream_rows_to_excel(iter_synthetic_master_rows(history, seed), paths["master_file"], headers=MASTER_HEADERS)
+
+    # Manifests only; the history's artifacts are not needed to load the write path
+    rng = random.Random(seed)
+    today = datetime.now().date()
+    days = max(1, math.ceil(history / bills_per_day))
+    remaining = history
+    for day in range(days):
+        bill_date = today - timedelta(days=days - 1 - day)
+        count = min(bills_per_day, remaining)
+        remaining -= count
+        bills = {}
+        for i in range(count):
+            bill_number = f"BILL-{bill_date.strftime('%Y%m%d')}-H{i:06d}"
+            subtotal = round(rng.uniform(20, 5000), 2)
+            bills[bill_number] = {
+                "bill_number": bill_number,
+                "files": {},
+                "date": f"{bill_date.isoformat()} 12:00:00",
+                "customer_name": f"Customer {rng.randint(1, 50000)}",
+                "phone_number": f"9{rng.randint(100000000, 999999999)}",
+                "subtotal": subtotal,
+                "tax": round(subtotal * 0.18, 2),
+                "total": round(subtotal * 1.18, 2)
+            }
+        partition_dir = bill_store.get_partition_dir(paths["bills_directory"], bill_date, create=True)
+        bill_store.save_manifest(partition_dir, {"bills": bills})
+    return paths
+
+
+def make_cart(rng, products, prices):
+    """Pick 1-3 products from each category with random quantities."""
+    cosmetic_products, grocery_products, drink_products = catalog.get_category_products(products)
+    carts = []
+    for category_products in (cosmetic_products, grocery_products, drink_products):
+        names = [variant["name"] for variants in category_products.values() for variant in variants]
+        picked = rng.sample(names, min(len(names), rng.randint(1, 3)))
+        carts.append({name: rng.randint(1, 4) for name in picked})
+    return carts
+
+
+def master_frame(bill_number, cosmetic_items, grocery_items, drink_items, totals, prices):
+    """Build the DataFrame save_bill_to_master expects for a bill."""
+    rows = [{'Item': f"Bill Number: {bill_number}", 'Quantity': '', 'Price': '', 'Total': ''}]
+    for items in (cosmetic_items, grocery_items, drink_items):
+        for name, quantity in items.items():
+            rows.append({'Item': name, 'Quantity': quantity, 'Price': prices.get(name, 0),
+                         'Total': quantity * prices.get(name, 0)})
+    rows.append({'Item': 'Subtotal:', 'Quantity': '', 'Price': '', 'Total': totals['subtotal']})
+    rows.append({'Item': 'Tax (18%):', 'Quantity': '', 'Price': '', 'Total': totals['total_tax']})
+    rows.append({'Item': 'Grand Total:', 'Quantity': '', 'Price': '', 'Total': totals['grand_total']})
+    return pd.DataFrame(rows)
+
+
+def checkout(bill_number, cart, prices, paths, stages):
+    """
+    Run one checkout. Pricing and formatting always run; the storage stages
+    only when selected.
+
+    Returns:
+        tuple: (stage -> seconds, number of stages that reported an error)
+    """
+    cosmetic_items, grocery_items, drink_items = cart
+    timings = {}
+    errors = 0
+
+    def timed(stage, func):
+        nonlocal errors
+        start = time.perf_counter()
+        result = func()
+        timings[stage] = time.perf_counter() - start
+        if isinstance(result, str) and result.startswith("Error"):
+            errors += 1
+        return result
+
+    totals = timed("price", lambda: calculate_total(cosmetic_items, grocery_items, drink_items, prices))
+    content = timed("format", lambda: generate_bill(
+        "Load Test", "9000000000", bill_number, cosmetic_items, grocery_items, drink_items, totals, prices
+    ))
+    if "save_txt" in stages:
+        timed("save_txt", lambda: save_bill(
+            content, bill_number, "Load Test", "9000000000", cosmetic_items, grocery_items, drink_items, totals, prices,
+            bills_directory=paths["bills_directory"]
+        ))
+    if "save_pdf" in stages:
+        from utils.pdf_operations import save_bill_to_pdf
+        timed("save_pdf", lambda: save_bill_to_pdf(content, bill_number, bills_directory=paths["bills_directory"]))
+    if "export_excel" in stages:
+        timed("export_excel", lambda: export_bill_to_excel(
+            "Load Test", "9000000000", bill_number, cosmetic_items, grocery_items, drink_items, totals, prices,
+            bills_directory=paths["bills_directory"], ledger_file=paths["ledger_file"]
+        ))
+    if "save_master" in stages:
+        timed("save_master", lambda: save_bill_to_master(
+            master_frame(bill_number, cosmetic_items, grocery_items, drink_items, totals, prices),
+            master_file_path=paths["master_file"]
+        ))
+    return timings, errors
+
+
+def count_workbook_rows(path, min_row, is_bill_row):
+    """Count the rows of a workbook whose first cell passes is_bill_row."""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return sum(1 for row in workbook.active.iter_rows(min_row=min_row, max_col=1, values_only=True) if is_bill_row(row[0]))
+    finally:
+        workbook.close()
+
+
+def count_stored_bills(paths):
+    """
+    Count the bills in the ledger, the master file and the bill store manifests.
+
+    Concurrent read-modify-write of the workbooks can silently drop bills, so
+    these counts are compared with the number of bills that should be there.
+    A workbook can also be left unreadable (e.g. a truncated zip); it is then
+    reported as corrupt and counts no bills.
+
+    Returns:
+        tuple: (counts per store, error message per corrupt store)
+    """
+    counts = {}
+    corrupt = {}
+    stores = (
+        ("ledger", paths["ledger_file"], 2, bool),
+        ("master", paths["master_file"], 1, lambda value: isinstance(value, str) and value.startswith("Bill Number:"))
+    )
+    for store, path, min_row, is_bill_row in stores:
+        try:
+            if store == "ledger":
+                materialize_ledger(path)
+            if os.path.exists(path):
+                counts[store] = count_workbook_rows(path, min_row, is_bill_row)
+        except Exception as e:
+            corrupt[store] = f"{type(e).__name__}: {e}"
+    counts["manifests"] = sum(1 for _ in bill_store.iter_bills(paths["bills_directory"]))
+    return counts, corrupt
+
+
+def run_load(paths, cashiers, bills_per_cashier, stages, seed=0):
+    """
+    Simulate concurrent cashiers, each checking out bills back to back.
+
+    Cashiers are threads, like concurrent Streamlit sessions in one server.
+
+    Returns:
+        dict: Per-stage and end-to-end latencies (seconds), errors and throughput
+    """
+    products = catalog.load_product_data()
+    prices = catalog.load_prices()
+    date_part = datetime.now().strftime('%Y%m%d')
+    results = []
+    results_lock = threading.Lock()
+
+    def cashier(lane):
+        rng = random.Random(seed * 1000 + lane)
+        for i in range(bills_per_cashier):
+            bill_number = f"BILL-{date_part}-L{lane:02d}{i:06d}"
+            cart = make_cart(rng, products, prices)
+            start = time.perf_counter()
+            timings, errors = checkout(bill_number, cart, prices, paths, stages)
+            total = time.perf_counter() - start
+            with results_lock:
+                results.append((timings, total, errors))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=cashiers) as pool:
+        for future in [pool.submit(cashier, lane) for lane in range(cashiers)]:
+            future.result()
+    wall = time.perf_counter() - start
+
+    return {
+        "stages": {
+            stage: [timings[stage] for timings, _, _ in results if stage in timings]
+            for stage in STAGES if stage in ("price", "format") or stage in stages
+        },
+        "total": [total for _, total, _ in results],
+        "errors": sum(errors for _, _, errors in results),
+        "bills": len(results),
+        "seconds": wall,
+        "bills_per_second": len(results) / wall if wall > 0 else 0.0
+    }
+
+
+def summarize(history, result):
+    """Reduce a load run to p50/p99/mean milliseconds per stage."""
+    def stats(values):
+        return {
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+            "mean_ms": sum(values) / len(values) * 1000
+        } if values else None
+
+    return {
+        "history": history,
+        "bills": result["bills"],
+        "errors": result["errors"],
+        "lost_bills": result.get("lost_bills", {}),
+        "corrupt": result.get("corrupt", {}),
+        "bills_per_second": result["bills_per_second"],
+        "total": stats(result["total"]),
+        "stages": {stage: stats(values) for stage, values in result["stages"].items()}
+    }
+
+
+def print_summary(summary):
+    print(f"History {summary['history']:,d} bills: {summary['bills']} checkouts, "
+          f"{summary['bills_per_second']:.1f} bills/s, {summary['errors']} errors")
+    for store, error in summary['corrupt'].items():
+        print(f"    CORRUPT: the {store} cannot be read ({error})")
+    for store, lost in summary['lost_bills'].items():
+        if lost:
+            print(f"    LOST: {lost:,d} bills missing from the {store}")
+    print(f"    {'Stage':<14}{'p50 (ms)':>10}{'p99 (ms)':>10}{'mean (ms)':>11}")
+    rows = list(summary['stages'].items()) + [("checkout", summary['total'])]
+    for stage, stats in rows:
+        if stats:
+            print(f"    {stage:<14}{stats['p50_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['mean_ms']:>11.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the checkout path with concurrent cashiers")
+    parser.add_argument("--cashiers", type=int, default=4, help="Concurrent cashiers")
+    parser.add_argument("--bills-per-cashier", type=int, default=10, help="Checkouts per cashier and history size")
+    parser.add_argument("--history", type=int, nargs="+", default=[10_000, 100_000],
+                        help="Existing bill history sizes to measure at (e.g. 10000 100000 1000000)")
+    parser.add_argument("--bills-per-day", type=int, default=500, help="Bills per day in the seeded history")
+    parser.add_argument("--stages", nargs="+", choices=STAGES[2:], default=STAGES[2:],
+                        help="Storage stages to run (pricing and formatting always run)")
+    parser.add_argument("--workdir", default=None, help="Directory for the seeded stores (default: a temporary one)")
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded stores")
+    parser.add_argument("--json", default=None, help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    summaries = []
+    for history in args.history:
+        workdir = args.workdir and os.path.join(args.workdir, f"history_{history}")
+        workdir = workdir or tempfile.mkdtemp(prefix=f"checkout_{history}_")
+        try:
+            start = time.perf_counter()
+            paths = seed_history(workdir, history, args.bills_per_day)
+            print(f"Seeded {history:,d} bills in {time.perf_counter() - start:.1f}s")
+            result = run_load(paths, args.cashiers, args.bills_per_cashier, args.stages)
+            expected = {
+                "ledger": history + (result["bills"] if "export_excel" in args.stages else 0),
+                "master": history + (result["bills"] if "save_master" in args.stages else 0),
+                "manifests": history + (result["bills"] if "save_txt" in args.stages else 0)
+            }
+            stored, result["corrupt"] = count_stored_bills(paths)
+            result["lost_bills"] = {store: expected[store] - stored.get(store, 0) for store in expected}
+            summary = summarize(history, result)
+        finally:
+            if not args.keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+        print_summary(summary)
+        summaries.append(summary)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"cashiers": args.cashiers, "bills_per_cashier": args.bills_per_cashier,
+                       "results": summaries}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+from utils import customer_store
+from utils.customer_autocomplete import CustomerAutocomplete
+
+FIRST_NAMES = ["Aarav", "Aditi", "Akash", "Ananya", "Arjun", "Asha", "Deepak", "Divya", "Gaurav", "Isha",
+               "Kavya", "Karan", "Meera", "Mohit", "Neha", "Nikhil", "Pooja", "Priya", "Rahul", "Ravi",
+               "Riya", "Rohan", "Sanjay", "Sneha", "Sunil", "Tanvi", "Varun", "Vishal", "Yash", "Zoya"]
+SURNAMES = ["Agarwal", "Bose", "Chopra", "Das", "Dubey", "Gupta", "Iyer", "Jain", "Joshi", "Kapoor",
+            "Kumar", "Mehta", "Mishra", "Nair", "Pandey", "Patel", "Pathak", "Rao", "Reddy", "Shah",
+            "Sharma", "Singh", "Sinha", "Tiwari", "Verma", "Yadav"]
+
+
+def make_profiles(customer_count, seed=0):
+    """Generate customer profiles with Indian names and distinct phone numbers."""
+    rng = np.random.default_rng(seed)
+    first = rng.integers(0, len(FIRST_NAMES), customer_count)
+    last = rng.integers(0, len(SURNAMES), customer_count)
+    visits = rng.geometric(0.2, customer_count)
+    phones = 6_000_000_000 + rng.choice(4_000_000_000, customer_count, replace=False)
+    profiles = {}
+    for i in range(customer_count):
+        phone = str(phones[i])
+        name = f"{FIRST_NAMES[first[i]]} {SURNAMES[last[i]]}"
+        profile = customer_store.new_profile(phone)
+        profile.update({"name": name, "names": {name: int(visits[i])}, "visits": int(visits[i])})
+        profiles[phone] = profile
+    return profiles
+
+
+def make_queries(profiles, query_count, seed=1):
+    """Name and phone prefixes of random customers, 2 to 8 characters long."""
+    rng = np.random.default_rng(seed)
+    phones = list(profiles)
+    queries = []
+    for i in range(query_count):
+        profile = profiles[phones[rng.integers(len(phones))]]
+        length = int(rng.integers(2, 9))
+        if i % 2:
+            queries.append(profile["phone"][:length])
+        else:
+            word = profile["name"].split()[int(rng.integers(2))]
+            queries.append(word[:length].lower())
+    return queries
+
+
+def run(customer_count, query_count, new_customers):
+    with tempfile.TemporaryDirectory() as directory:
+        store = customer_store.CustomerStore(os.path.join(directory, "bills"), os.path.join(directory, "customers.json"))
+        store.customers = make_profiles(customer_count)
+
+        start = time.perf_counter()
+        autocomplete = CustomerAutocomplete(store)
+        build_seconds = time.perf_counter() - start
+
+        latencies = []
+        for query in make_queries(store.customers, query_count):
+            start = time.perf_counter()
+            autocomplete.suggest(query)
+            latencies.append(time.perf_counter() - start)
+        latencies = np.array(latencies) * 1000
+
+        # New customers reach the index through the store's listener
+        start = time.perf_counter()
+        for i in range(new_customers):
+            store.record_bill(f"BENCH-{i}", f"5{i:09d}", f"New Customer {i}", 100.0, "2025-01-01 10:00:00")
+        add_seconds = time.perf_counter() - start
+        found = autocomplete.suggest(f"5{new_customers - 1:09d}")
+
+    print(f"{customer_count:,d} customers indexed in {build_seconds:.2f} s")
+    print(f"{query_count:,d} suggestions: p50 {np.percentile(latencies, 50):.3f} ms, "
+          f"p99 {np.percentile(latencies, 99):.3f} ms, max {latencies.max():.3f} ms")
+    print(f"{new_customers:,d} new customers added in {add_seconds:.2f} s "
+          f"({add_seconds / max(new_customers, 1) * 1e6:.0f} µs each), last one found: {bool(found)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure customer suggestion latency")
+    parser.add_argument("--customers", type=int, default=1_000_000, help="Number of customers to index")
+    parser.add_argument("--queries", type=int, default=10_000, help="Number of suggestion queries")
+    parser.add_argument("--new-customers", type=int, default=20_000, help="Customers added after the index is built")
+    args = parser.parse_args(argv)
+    run(args.customers, args.queries, args.new_customers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import os
+import time
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from utils.bill_journal import BillJournal
+
+
+def run(thread_counts, transactions, directory=None):
+    """Journal transactions from several threads and report fsyncs per transaction."""
+    with tempfile.TemporaryDirectory(dir=directory) as workdir:
+        journal = BillJournal(os.path.join(workdir, "bench.wal"))
+        bill = {"bill_number": "BILL-00000000-0000", "content": "x" * 1500}
+
+        def transaction(i):
+            txn, seq = journal.begin("commit", bill=bill, stock={"Product": i}, save=True)
+            journal.sync(seq)
+            journal.end(txn)
+
+        print(f"{'Threads':>8}{'Txn/s':>10}{'fsyncs':>10}{'Txn per fsync':>15}")
+        for threads in thread_counts:
+            fsyncs_before = journal.fsyncs
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                list(pool.map(transaction, range(transactions)))
+            elapsed = time.perf_counter() - start
+            fsyncs = journal.fsyncs - fsyncs_before
+            print(f"{threads:>8}{transactions / elapsed:>10,.0f}{fsyncs:>10,d}{transactions / max(fsyncs, 1):>15.1f}")
+        journal.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure group commit of the bill journal")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16, 64], help="Concurrent writers")
+    parser.add_argument("--transactions", type=int, default=2000, help="Transactions per run")
+    parser.add_argument("--dir", default=None, help="Directory on the disk to measure (default: system temp)")
+    args = parser.parse_args(argv)
+    run(args.threads, args.transactions, args.dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+from utils.price_history import PriceHistory
+
+
+def make_history(path, product_count, changes_per_product, seed=0):
+    """A history of products whose prices changed at random days of 2020-2025."""
+    rng = np.random.default_rng(seed)
+    history = PriceHistory(path)
+    days = np.sort(np.datetime64("2020-01-01") + rng.integers(0, 6 * 365, (product_count, changes_per_product)), axis=1)
+    times = np.char.add(days.astype(str), " 00:00:00").tolist()
+    prices = rng.uniform(10, 500, (product_count, changes_per_product)).round(2).tolist()
+    for i in range(product_count):
+        name = f"Product {i:07d}"
+        history.times[name] = times[i]
+        history.prices[name] = prices[i]
+    return history
+
+
+def run(product_count, changes_per_product, query_count):
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        history = make_history(os.path.join(directory, "price_history.json"), product_count, changes_per_product)
+        build_seconds = time.perf_counter() - start
+
+        rng = np.random.default_rng(1)
+        names = [f"Product {i:07d}" for i in rng.integers(0, product_count, query_count)]
+        as_of = "2023-06-30"
+
+        start = time.perf_counter()
+        looped = [history.price_at(name, as_of) for name in names]
+        loop_seconds = time.perf_counter() - start
+
+        # The first batch lookup builds the flat arrays
+        start = time.perf_counter()
+        history.lookup(names, as_of)
+        first_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        batched = history.lookup(names, as_of)
+        batch_seconds = time.perf_counter() - start
+
+        dates = np.datetime64("2020-01-01") + rng.integers(0, 6 * 365, query_count)
+        start = time.perf_counter()
+        history.lookup(names, dates)
+        per_line_seconds = time.perf_counter() - start
+
+    looped = np.array([np.nan if price is None else price for price in looped])
+    assert np.array_equal(looped, batched, equal_nan=True)
+    print(f"{product_count:,d} products with {changes_per_product} price changes each, generated in {build_seconds:.2f} s")
+    print(f"{query_count:,d} prices as of {as_of}:")
+    print(f"  price_at loop        {loop_seconds * 1000:9.2f} ms")
+    print(f"  lookup (first)       {first_seconds * 1000:9.2f} ms  (builds the arrays)")
+    print(f"  lookup               {batch_seconds * 1000:9.2f} ms")
+    print(f"  lookup, date per row {per_line_seconds * 1000:9.2f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure point-in-time price lookups")
+    parser.add_argument("--products", type=int, default=100_000, help="Number of products")
+    parser.add_argument("--changes", type=int, default=8, help="Price changes per product")
+    parser.add_argument("--queries", type=int, default=10_000, help="Products priced per lookup")
+    args = parser.parse_args(argv)
+    run(args.products, args.changes, args.queries)
+
+
+if __name__ == "__main__":
+    main()
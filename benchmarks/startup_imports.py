@@ -0,0 +1,143 @@
+import os
+import sys
+import ast
+import argparse
+import statistics
+import subprocess
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Page scripts profiled by default; the billing page is the one cashiers wait on
+PAGES = [
+    "streamlit_app.py",
+    "pages/product_management.py",
+    "pages/search_dashboard.py",
+    "pages/analytics_dashboard.py",
+]
+# Every page pays for the framework, so its imports are reported separately
+BASELINE_IMPORTS = "import streamlit"
+# Libraries that must only be imported by the sections that use them
+HEAVY_PACKAGES = {"sklearn", "scipy", "plotly", "matplotlib", "reportlab", "PyPDF2", "fpdf", "fitz", "pymupdf", "PIL"}
+
+
+def get_page_imports(page):
+    """Return the module-level import statements of a page script as source code."""
+    with open(os.path.join(PROJECT_DIR, page), 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    return "\n".join(
+        ast.unparse(node) for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+    )
+
+
+def parse_importtime(stderr):
+    """
+    Parse the output of `python -X importtime`.
+
+    Returns:
+        list: (module, self_us, cumulative_us, depth) tuples in import order
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(fields[0]), int(fields[1]), depth))
+    return modules
+
+
+def profile_imports(source):
+    """
+    Run import statements in a fresh interpreter under `-X importtime`.
+
+    Returns:
+        dict: Module name -> (self_us, cumulative_us, depth), plus the total
+            import time in microseconds under the "__total__" key
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", source],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing failed:\n{source}\n{result.stderr[-2000:]}")
+    modules = parse_importtime(result.stderr)
+    profile = {name: (self_us, cumulative_us, depth) for name, self_us, cumulative_us, depth in modules}
+    profile["__total__"] = sum(cumulative_us for _, _, cumulative_us, depth in modules if depth == 0)
+    return profile
+
+
+def profile_page(page, repeat=3):
+    """
+    Profile the module-level imports of a page against the framework baseline.
+
+    Args:
+        page (str): Page script, relative to the project directory
+        repeat (int): Number of fresh interpreters to run; the fastest run is reported
+
+    Returns:
+        dict: Page import report
+    """
+    source = get_page_imports(page)
+    baseline_runs = [profile_imports(BASELINE_IMPORTS) for _ in range(repeat)]
+    page_runs = [profile_imports(source) for _ in range(repeat)]
+    baseline = min(baseline_runs, key=lambda run: run["__total__"])
+    fastest = min(page_runs, key=lambda run: run["__total__"])
+
+    added = {name: timing for name, timing in fastest.items() if name not in baseline and name != "__total__"}
+    heavy = sorted({name.split(".")[0] for name in added} & HEAVY_PACKAGES)
+    return {
+        "page": page,
+        "total_ms": fastest["__total__"] / 1000,
+        "median_ms": statistics.median(run["__total__"] for run in page_runs) / 1000,
+        "baseline_ms": baseline["__total__"] / 1000,
+        "added": added,
+        "heavy": heavy,
+    }
+
+
+def print_report(report, top=10):
+    """Print the import profile of a page, slowest imports first."""
+    print(f"{report['page']}: {report['total_ms']:.0f} ms imports "
+          f"(median {report['median_ms']:.0f} ms, streamlit baseline {report['baseline_ms']:.0f} ms), "
+          f"{len(report['added'])} modules beyond the baseline")
+    slowest = sorted(report['added'].items(), key=lambda item: item[1][1], reverse=True)[:top]
+    for name, (self_us, cumulative_us, depth) in slowest:
+        print(f"    {cumulative_us / 1000:>9.1f} ms  {self_us / 1000:>8.1f} ms self  {name}")
+    if report['heavy']:
+        print(f"    HEAVY: {', '.join(report['heavy'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile page import times and check for heavy imports")
+    parser.add_argument("pages", nargs="*", default=PAGES, help="Page scripts to profile (default: all pages)")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per page")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list per page")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="Fail if a page's imports take longer than this beyond the streamlit baseline")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for page in args.pages:
+        report = profile_page(page, args.repeat)
+        print_report(report, args.top)
+        if report['heavy']:
+            failed = True
+        if args.budget_ms is not None and report['total_ms'] - report['baseline_ms'] > args.budget_ms:
+            print(f"    Over budget: {report['total_ms'] - report['baseline_ms']:.0f} ms > {args.budget_ms:.0f} ms")
+            failed = True
+
+    if failed:
+        print("Startup import check failed")
+        return 1
+    print("Startup import check passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
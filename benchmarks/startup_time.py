@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import socket
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+import standalone_launcher
+
+# Default location of the executable built with `pyinstaller GroceryBillingApp.spec`
+PACKAGED_EXE = os.path.join(PROJECT_DIR, "dist", "GroceryBillingSystem.exe" if os.name == "nt" else "GroceryBillingSystem")
+# Bytecode caches removed before a cold run
+APP_DIRS = ["utils", "pages", "benchmarks", "."]
+
+
+def get_free_port():
+    """Return a free TCP port on localhost."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def clear_bytecode_cache():
+    """Remove the project's __pycache__ directories so modules are compiled again."""
+    for directory in APP_DIRS:
+        shutil.rmtree(os.path.join(PROJECT_DIR, directory, "__pycache__"), ignore_errors=True)
+
+
+def drop_os_caches():
+    """Drop the Linux page cache (needs root). Returns True if it was dropped."""
+    try:
+        os.sync()
+        with open("/proc/sys/vm/drop_caches", "w") as f:
+            f.write("3\n")
+        return True
+    except OSError:
+        return False
+
+
+def get_launch_command(mode, port, startup_log, exe=None):
+    """Return the command starting the app in source or packaged mode."""
+    launcher_args = ["--port", str(port), "--no-browser", "--startup-log", startup_log]
+    if mode == "packaged":
+        return [exe or PACKAGED_EXE] + launcher_args
+    return [sys.executable, os.path.join(PROJECT_DIR, "standalone_launcher.py")] + launcher_args
+
+
+def stop_process(process):
+    """Stop the server and any process it started."""
+    try:
+        if os.name == "nt":
+            process.terminate()
+        else:
+            os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=10)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        process.kill()
+        process.wait()
+
+
+def time_startup(mode, exe=None, timeout=120.0):
+    """
+    Start the app once and measure the time until its health endpoint answers.
+
+    Returns:
+        dict: External time-to-ready (from spawning the process) and the time
+            recorded by the launcher itself, in seconds; None if it did not start
+    """
+    port = get_free_port()
+    with tempfile.TemporaryDirectory() as log_dir:
+        startup_log = os.path.join(log_dir, "startup_times.jsonl")
+        command = get_launch_command(mode, port, startup_log, exe)
+        started_at = time.monotonic()
+        process = subprocess.Popen(
+            command,
+            cwd=PROJECT_DIR,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=(os.name != "nt")
+        )
+        try:
+            ready = standalone_launcher.wait_for_server(port, timeout=timeout, interval=0.02, process=process)
+            seconds = time.monotonic() - started_at
+        finally:
+            # Give the launcher a moment to write its own measurement
+            time.sleep(0.2)
+            stop_process(process)
+        if not ready:
+            return None
+
+        launcher_seconds = None
+        if os.path.exists(startup_log):
+            with open(startup_log, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            if lines:
+                launcher_seconds = json.loads(lines[-1])["seconds_to_ready"]
+        return {"seconds": seconds, "launcher_seconds": launcher_seconds}
+
+
+def benchmark_mode(mode, runs=5, exe=None, drop_caches=False):
+    """
+    Measure one cold start followed by warm starts.
+
+    The cold start runs after removing the project's bytecode caches and, with
+    drop_caches, the OS page cache. Warm starts reuse both.
+
+    Returns:
+        dict: Benchmark results for the mode
+    """
+    clear_bytecode_cache()
+    dropped = drop_os_caches() if drop_caches else False
+    cold = time_startup(mode, exe)
+    warm = [time_startup(mode, exe) for _ in range(runs)]
+    warm_seconds = [run["seconds"] for run in warm if run is not None]
+    return {
+        "mode": mode,
+        "cold_seconds": cold["seconds"] if cold else None,
+        "cold_launcher_seconds": cold["launcher_seconds"] if cold else None,
+        "os_cache_dropped": dropped,
+        "warm_runs": len(warm_seconds),
+        "warm_median_seconds": statistics.median(warm_seconds) if warm_seconds else None,
+        "warm_min_seconds": min(warm_seconds) if warm_seconds else None,
+        "warm_max_seconds": max(warm_seconds) if warm_seconds else None,
+    }
+
+
+def format_seconds(value):
+    return f"{value:.2f}" if value is not None else "-"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold and warm startup time of the launchers")
+    parser.add_argument("--mode", choices=["source", "packaged", "all"], default="all")
+    parser.add_argument("--runs", type=int, default=5, help="Warm starts per mode")
+    parser.add_argument("--exe", default=None, help=f"Packaged executable (default: {os.path.relpath(PACKAGED_EXE, PROJECT_DIR)})")
+    parser.add_argument("--drop-caches", action="store_true", help="Drop the OS page cache before the cold start (Linux, root)")
+    parser.add_argument("--json", default=None, help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    modes = ["source", "packaged"] if args.mode == "all" else [args.mode]
+    results = []
+    for mode in modes:
+        if mode == "packaged" and not os.path.exists(args.exe or PACKAGED_EXE):
+            print("packaged: skipped, build it first with `pyinstaller GroceryBillingApp.spec` or pass --exe")
+            continue
+        results.append(benchmark_mode(mode, args.runs, args.exe, args.drop_caches))
+
+    print(f"{'Mode':<10}{'Cold (s)':>10}{'Launcher (s)':>14}{'Warm median':>13}{'Warm min':>10}{'Warm max':>10}")
+    for result in results:
+        print(f"{result['mode']:<10}{format_seconds(result['cold_seconds']):>10}"
+              f"{format_seconds(result['cold_launcher_seconds']):>14}"
+              f"{format_seconds(result['warm_median_seconds']):>13}"
+              f"{format_seconds(result['warm_min_seconds']):>10}"
+              f"{format_seconds(result['warm_max_seconds']):>10}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "platform": sys.platform, "results": results}, f, indent=2)
+    return 0 if results and all(result['cold_seconds'] is not None for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import time
+import argparse
+import numpy as np
+from utils.trigram_index import BillIndex
+from benchmarks.customer_autocomplete import FIRST_NAMES, SURNAMES
+
+
+def make_bills(bill_count, seed=0):
+    """Generate (bill number, customer name) pairs in the app's bill number format."""
+    rng = np.random.default_rng(seed)
+    first = rng.integers(0, len(FIRST_NAMES), bill_count)
+    last = rng.integers(0, len(SURNAMES), bill_count)
+    start = np.datetime64("2024-01-01")
+    # As many bills a day as there are 4-digit suffixes
+    return [
+        (f"BILL-{str(start + i // 9000).replace('-', '')}-{1000 + i % 9000}",
+         f"{FIRST_NAMES[first[i]]} {SURNAMES[last[i]]}")
+        for i in range(bill_count)
+    ]
+
+
+def make_typo(word, rng):
+    """Drop, double or swap one character of a word."""
+    if len(word) < 4:
+        return word
+    i = int(rng.integers(1, len(word) - 1))
+    edit = int(rng.integers(3))
+    if edit == 0:
+        return word[:i] + word[i + 1:]
+    if edit == 1:
+        return word[:i] + word[i] + word[i:]
+    return word[:i - 1] + word[i] + word[i - 1] + word[i + 1:]
+
+
+def run(bill_count, query_count, new_bills):
+    bills = make_bills(bill_count + new_bills)
+    index = BillIndex()
+
+    start = time.perf_counter()
+    for bill_number, customer_name in bills[:bill_count]:
+        index.add_bill(bill_number, customer_name)
+    build_seconds = time.perf_counter() - start
+
+    customer_names = dict(bills)
+    rng = np.random.default_rng(1)
+    latencies = []
+    hits = 0
+    for i in range(query_count):
+        bill_number, customer_name = bills[int(rng.integers(bill_count))]
+        start = time.perf_counter()
+        if i % 2:
+            results = index.search(bill_number=bill_number[len("BILL-"):])
+            found = bill_number in dict(results)
+        else:
+            query = " ".join(make_typo(word, rng) for word in customer_name.split())
+            results = index.search(customer_name=query)
+            found = bool(results) and customer_names[results[0][0]] == customer_name
+        latencies.append(time.perf_counter() - start)
+        hits += found
+    latencies = np.array(latencies) * 1000
+
+    # Bills are added to the index as they are billed, without a rebuild
+    start = time.perf_counter()
+    for bill_number, customer_name in bills[bill_count:]:
+        index.add_bill(bill_number, customer_name)
+    add_seconds = time.perf_counter() - start
+    found = bills[-1][0] in dict(index.search(bill_number=bills[-1][0]))
+
+    print(f"{bill_count:,d} bills indexed in {build_seconds:.2f} s")
+    print(f"{query_count:,d} searches with typos: p50 {np.percentile(latencies, 50):.3f} ms, "
+          f"p99 {np.percentile(latencies, 99):.3f} ms, max {latencies.max():.3f} ms, {hits / query_count:.1%} found")
+    print(f"{new_bills:,d} new bills added in {add_seconds:.2f} s "
+          f"({add_seconds / max(new_bills, 1) * 1e6:.0f} µs each), last one found: {found}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure typo-tolerant bill search latency")
+    parser.add_argument("--bills", type=int, default=200_000, help="Number of bills to index")
+    parser.add_argument("--queries", type=int, default=2_000, help="Number of searches")
+    parser.add_argument("--new-bills", type=int, default=10_000, help="Bills added after the index is built")
+    args = parser.parse_args(argv)
+    run(args.bills, args.queries, args.new_bills)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,31 @@
 import os
 import subprocess
 import sys
+import time
 
-# Get the directory where the executable is located
-if getattr(sys, 'frozen', False):
-    # Running as executable
-    base_dir = os.path.dirname(sys.executable)
-else:
-    # Running as script
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-
-# Change to the base directory
-os.chdir(base_dir)
-
-# Run the Streamlit app
-# Update this line with your actual main file name (Home.py or main.py)
-main_file = "Home.py"  # Change this to your actual main file name
-
-subprocess.call([
-    "streamlit", "run", 
-    os.path.join(base_dir, main_file),
-    "--browser.serverAddress=localhost",
-    "--server.headless=true"
-])
\ No newline at end of file
+import standalone_launcher
+
+
+def main(argv=None):
+    # A packaged build has no Python interpreter to spawn, so run in-process
+    if getattr(sys, 'frozen', False):
+        return standalone_launcher.main(argv)
+
+    started_at = time.monotonic()
+    args = standalone_launcher.parse_args(argv)
+
+    # Change to the base directory
+    os.chdir(standalone_launcher.get_base_dir())
+
+    # Run the Streamlit app with the current interpreter
+    process = subprocess.Popen([sys.executable, "-m", "streamlit"] + standalone_launcher.get_streamlit_args(args.port))
+    try:
+        standalone_launcher.report_when_ready(started_at, args.port, not args.no_browser, args.startup_log, process=process)
+        return process.wait()
+    except KeyboardInterrupt:
+        process.terminate()
+        return process.wait()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+import streamlit as st
+import pandas as pd
+import os
+import time
+import sys
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from utils import tracing
+
+# Set page config
+st.set_page_config(
+    page_title="Checkout Metrics",
+    page_icon="⏱️",
+    layout="wide"
+)
+
+st.title("Checkout Stage Latencies")
+st.caption(
+    "Time spent in each checkout stage: pricing, bill text, text/PDF/Excel saves, "
+    "the master file, the inventory write and email."
+)
+
+SOURCES = {
+    "This app": "process",
+    "Trace log (all processes)": "log"
+}
+WINDOWS = {
+    "Last 5 minutes": 5,
+    "Last hour": 60,
+    "Last 24 hours": 24 * 60,
+    "Everything": None
+}
+
+control_col1, control_col2, control_col3 = st.columns([2, 2, 1])
+with control_col1:
+    source = SOURCES[st.radio("Source", list(SOURCES), horizontal=True)]
+with control_col2:
+    refresh_seconds = st.selectbox("Auto-refresh", [0, 2, 5, 15], index=2,
+                                   format_func=lambda seconds: f"Every {seconds} s" if seconds else "Off")
+with control_col3:
+    if source == "process" and st.button("Reset"):
+        tracing.reset()
+
+trace_log = tracing.get_trace_log()
+window = None
+if source == "log":
+    if not trace_log:
+        st.info(f"Set the {tracing.TRACE_LOG_ENV} environment variable to a file path before starting "
+                "the app, the POS API or a load test to record their spans in a shared trace log.")
+        st.stop()
+    window = WINDOWS[st.selectbox("Window", list(WINDOWS))]
+
+
+def get_registry():
+    """Return the registry to display for the chosen source."""
+    if source == "process":
+        return tracing.registry
+    since = time.time() - window * 60 if window else None
+    return tracing.load_trace_log(trace_log, since)
+
+
+def stats_frame(stats):
+    """Stage statistics as a DataFrame with millisecond timings."""
+    frame = pd.DataFrame(stats, columns=["stage", "count", "errors", "p50", "p99", "mean", "last", "total"])
+    for column in ("p50", "p99", "mean", "last"):
+        frame[column] = frame[column] * 1000
+    frame["total"] = frame["total"].round(2)
+    return frame.rename(columns={
+        "stage": "Stage",
+        "count": "Calls",
+        "errors": "Errors",
+        "p50": "p50 (ms)",
+        "p99": "p99 (ms)",
+        "mean": "Mean (ms)",
+        "last": "Last (ms)",
+        "total": "Total (s)"
+    })
+
+
+@st.fragment(run_every=refresh_seconds or None)
+def show_metrics():
+    registry = get_registry()
+    stats = registry.get_stage_stats()
+    if not stats:
+        st.info("No checkout stages recorded yet. Bill a cart and they will show up here.")
+        return
+
+    frame = stats_frame(stats)
+    slowest = frame.iloc[0]
+    metric_cols = st.columns(3)
+    metric_cols[0].metric("Slowest stage (total time)", slowest["Stage"], f"{slowest['Total (s)']:.2f} s",
+                          delta_color="off")
+    metric_cols[1].metric("Stage calls", int(frame["Calls"].sum()))
+    metric_cols[2].metric("Failed calls", int(frame["Errors"].sum()))
+
+    st.dataframe(frame.round(1), hide_index=True, use_container_width=True)
+    st.subheader("p50 / p99 by stage (ms)")
+    st.bar_chart(frame.set_index("Stage")[["p50 (ms)", "p99 (ms)"]], stack=False)
+
+    export_col1, export_col2 = st.columns(2)
+    with export_col1:
+        st.download_button("Download Prometheus metrics", registry.export_prometheus(),
+                           file_name="billing_metrics.prom", mime="text/plain")
+    with export_col2:
+        st.download_button("Download JSON lines", registry.export_json_lines(),
+                           file_name="billing_metrics.jsonl", mime="application/json")
+    st.caption(f"Updated {time.strftime('%H:%M:%S')}")
+
+
+show_metrics()
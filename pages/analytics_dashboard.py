@@ -1,16 +1,16 @@
 import streamlit as st
 import pandas as pd
 import os
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
 import calendar
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.cluster import KMeans
-import tempfile
-import re
-from collections import Counter
+import sys
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from utils import analytics_snapshot, analytics_frames, excel_export, forecasting, tracing
 
 # Set page config
 st.set_page_config(
@@ -19,10 +19,6 @@ st.set_page_config(
     layout="wide"
 )
 
-# Add auto-refresh functionality
-st.cache_data.clear()
-st.cache_resource.clear()
-
 # Add refresh button and auto-refresh interval
 refresh_col1, refresh_col2 = st.columns([1, 5])
 with refresh_col1:
@@ -47,896 +43,1006 @@ if auto_refresh != "Off":
 
 st.title("Real-time Billing Analytics Dashboard")
 
+# The dashboard is split into sections and only the selected one runs. Each
+# section's data is computed by a function cached per snapshot version (the
+# frames themselves are passed unhashed), so switching back to a section or
+# rerunning after a widget change reuses its results. Computations are timed
+# with utils.tracing spans named "analytics.<section>", which also shows them
+# on the Admin Metrics page.
+
+# Opt-in profiler overlay
+with st.sidebar:
+    st.subheader("⏱️ Section Profiling")
+    show_timings = st.checkbox("Show section timings", value=False)
+    profile_sections = st.checkbox("Profile sections (cProfile)", value=False)
+
 # Function to load billing data
 @st.cache_data(ttl=30)  # Cache data for 30 seconds
 def load_billing_data():
     try:
         # Use vdx_excel_bills.xlsx for real-time analytics
         vdx_excel = os.path.join(os.path.dirname(os.path.dirname(__file__)), "vdx_excel_bills.xlsx")
-        
+        # Bills exported since it was last read are still pending
+        excel_export.materialize_ledger(vdx_excel)
+
         if not os.path.exists(vdx_excel):
             st.error("vdx_excel_bills.xlsx not found. Please ensure the file exists in the project directory.")
             return None
-        
+
         try:
-            # Read the Excel file with purchase time information
-            df = pd.read_excel(vdx_excel)
-            
-            # Convert the dataframe to the required format
-            billing_df = pd.DataFrame({
-                'Bill Number': df['Bill Number'],
-                'Date': pd.to_datetime(df['Date'], format='%d-%m-%Y %H:%M:%S', errors='coerce'),
-                'Customer Name': df['Customer Name'],
-                'Phone Number': df['Phone Number'],
-                'Subtotal': df['Subtotal'],
-                'Tax': df['Tax'],
-                'Total': df['Total']
-            })
-            
-            # Try to extract product categories from bill data if available
-            try:
-                # Load bill text files to extract product information
-                bills_folder = os.path.join(os.path.dirname(os.path.dirname(__file__)), "saved_bills")
-                if os.path.exists(bills_folder):
-                    # Create dictionaries to store product information by bill number
-                    cosmetic_items_by_bill = {}
-                    grocery_items_by_bill = {}
-                    drink_items_by_bill = {}
-                    
-                    for txt_file in os.listdir(bills_folder):
-                        if txt_file.endswith(".txt"):
-                            bill_number = os.path.splitext(txt_file)[0]
-                            file_path = os.path.join(bills_folder, txt_file)
-                            
-                            with open(file_path, 'r', encoding='utf-8') as f:
-                                content = f.read()
-                                
-                                # Extract product categories
-                                cosmetics_match = re.search(r'COSMETICS:(.*?)(?=GROCERY:|DRINKS:|Subtotal:|$)', content, re.DOTALL)
-                                grocery_match = re.search(r'GROCERY:(.*?)(?=COSMETICS:|DRINKS:|Subtotal:|$)', content, re.DOTALL)
-                                drinks_match = re.search(r'DRINKS:(.*?)(?=COSMETICS:|GROCERY:|Subtotal:|$)', content, re.DOTALL)
-                                
-                                cosmetic_items = []
-                                grocery_items = []
-                                drink_items = []
-                                
-                                if cosmetics_match:
-                                    cosmetic_items = [item.strip() for item in cosmetics_match.group(1).strip().split('\n') if item.strip()]
-                                if grocery_match:
-                                    grocery_items = [item.strip() for item in grocery_match.group(1).strip().split('\n') if item.strip()]
-                                if drinks_match:
-                                    drink_items = [item.strip() for item in drinks_match.group(1).strip().split('\n') if item.strip()]
-                                
-                                cosmetic_items_by_bill[bill_number] = cosmetic_items
-                                grocery_items_by_bill[bill_number] = grocery_items
-                                drink_items_by_bill[bill_number] = drink_items
-                    
-                    # Add product category columns to the dataframe
-                    billing_df['Cosmetic Items'] = billing_df['Bill Number'].map(lambda x: cosmetic_items_by_bill.get(str(x), []))
-                    billing_df['Grocery Items'] = billing_df['Bill Number'].map(lambda x: grocery_items_by_bill.get(str(x), []))
-                    billing_df['Drink Items'] = billing_df['Bill Number'].map(lambda x: drink_items_by_bill.get(str(x), []))
-                    
-                    # Add category counts
-                    billing_df['Cosmetic Count'] = billing_df['Cosmetic Items'].apply(len)
-                    billing_df['Grocery Count'] = billing_df['Grocery Items'].apply(len)
-                    billing_df['Drink Count'] = billing_df['Drink Items'].apply(len)
-                    billing_df['Total Items'] = billing_df['Cosmetic Count'] + billing_df['Grocery Count'] + billing_df['Drink Count']
-            except Exception as e:
-                st.warning(f"Could not extract product information from bills: {str(e)}")
-                # Add empty product columns
-                billing_df['Cosmetic Items'] = [[] for _ in range(len(billing_df))]
-                billing_df['Grocery Items'] = [[] for _ in range(len(billing_df))]
-                billing_df['Drink Items'] = [[] for _ in range(len(billing_df))]
-                billing_df['Cosmetic Count'] = 0
-                billing_df['Grocery Count'] = 0
-                billing_df['Drink Count'] = 0
-                billing_df['Total Items'] = 0
-            
-            return billing_df
-            
+            # Load the columnar snapshot by memory mapping it. It is rebuilt
+            # from the Excel ledger and the bill manifests only when they changed.
+            bills_folder = os.path.join(os.path.dirname(os.path.dirname(__file__)), "saved_bills")
+            bills_df, line_items_df = analytics_snapshot.refresh_snapshot(
+                ledger_file=vdx_excel,
+                bills_directory=bills_folder
+            )
+
+            # Customers, phones and products are dictionary-encoded; the per-bill
+            # category counts are computed from the integer-coded line items
+            billing_df, line_items = analytics_frames.encode_analytics_frames(bills_df, line_items_df)
+            # Section caches are keyed by the snapshot version
+            return billing_df, line_items, analytics_snapshot.get_snapshot_version()
+
         except Exception as e:
             st.error(f"Error reading vdx_excel_bills.xlsx: {str(e)}")
             return None
-        
+
     except Exception as e:
         st.error(f"Error loading billing data: {str(e)}")
         return None
 
-# Load the billing data
-billing_data = load_billing_data()
 
-if billing_data is None:
-    st.warning("No billing data found. Please generate some bills first.")
-    st.info("The dashboard will automatically update when new bills are generated.")
-else:
-    # Overview Statistics Section
-    st.subheader("📊 Overview Statistics")
-    overview_tabs = st.tabs(["Key Metrics", "Growth Analysis"])
-    
-    with overview_tabs[0]:
-        col1, col2, col3, col4 = st.columns(4)
-        total_bills = len(billing_data)
-        total_revenue = billing_data['Total'].sum()
-        avg_bill = billing_data['Total'].mean()
-        total_tax = billing_data['Tax'].sum()
-        
-        with col1:
-            st.metric("Total Bills", f"{total_bills:,d}")
-        with col2:
-            st.metric("Total Revenue", f"₹{total_revenue:,.2f}")
-        with col3:
-            st.metric("Average Bill", f"₹{avg_bill:,.2f}")
-        with col4:
-            st.metric("Total Tax", f"₹{total_tax:,.2f}")
-    
-    with overview_tabs[1]:
+def get_season(month):
+    """Map a month number to its season."""
+    if month in [12, 1, 2]:  # Winter
+        return 'Winter'
+    elif month in [3, 4, 5]:  # Spring
+        return 'Spring'
+    elif month in [6, 7, 8]:  # Summer
+        return 'Summer'
+    else:  # Fall/Autumn
+        return 'Fall'
+
+
+def segment_customer(score):
+    """Map an RFM score (3-15) to a customer segment."""
+    if score >= 13:
+        return 'Champions'
+    elif score >= 10:
+        return 'Loyal Customers'
+    elif score >= 7:
+        return 'Potential Loyalists'
+    elif score >= 5:
+        return 'At Risk'
+    else:
+        return 'Needs Attention'
+
+
+SEASON_ORDER = ['Winter', 'Spring', 'Summer', 'Fall']
+COUNT_COLUMNS = ['Cosmetic Count', 'Grocery Count', 'Drink Count']
+
+
+# Cached section computations. The leading version argument is the only
+# hashed one; frames are passed as underscore arguments.
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def compute_key_metrics(version, _billing_data):
+    with tracing.span("analytics.key_metrics"):
+        return {
+            "total_bills": len(_billing_data),
+            "total_revenue": _billing_data['Total'].sum(),
+            "avg_bill": _billing_data['Total'].mean(),
+            "total_tax": _billing_data['Tax'].sum()
+        }
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def compute_growth(version, _billing_data):
+    with tracing.span("analytics.growth"):
         # Calculate day-over-day growth
-        daily_revenue = billing_data.groupby(billing_data['Date'].dt.date)['Total'].sum()
+        daily_revenue = _billing_data.groupby(_billing_data['Date'].dt.date)['Total'].sum()
         daily_growth = daily_revenue.pct_change() * 100
-        avg_growth = daily_growth.mean()
-        
-        growth_col1, growth_col2 = st.columns(2)
-        with growth_col1:
-            st.metric("Average Daily Growth", f"{avg_growth:.1f}%")
-        with growth_col2:
-            last_day_growth = daily_growth.iloc[-1] if len(daily_growth) > 0 else 0
-            st.metric("Last Day Growth", f"{last_day_growth:.1f}%")
-    
-    # Time Analysis Section
-    st.subheader("📅 Time Analysis")
-    time_tabs = st.tabs(["Daily Trends", "Hourly Analysis", "Monthly Overview"])
-    
-    with time_tabs[0]:
+        last_day_growth = daily_growth.iloc[-1] if len(daily_growth) > 0 else 0
+        return daily_growth.mean(), last_day_growth
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def compute_daily_trends(version, _billing_data):
+    with tracing.span("analytics.daily_trends"):
         # Enhanced daily trend with moving average
-        daily_data = billing_data.groupby(billing_data['Date'].dt.date).agg({
+        daily_data = _billing_data.groupby(_billing_data['Date'].dt.date).agg({
             'Total': 'sum',
             'Bill Number': 'count'
         }).reset_index()
         daily_data['MA7'] = daily_data['Total'].rolling(window=7).mean()
-        
-        fig_daily = px.line(daily_data, x='Date', y=['Total', 'MA7'],
-                           title='Daily Revenue with 7-day Moving Average',
-                           labels={'value': 'Revenue (₹)', 'Date': 'Date', 'variable': 'Metric'},
-                           color_discrete_map={'Total': 'blue', 'MA7': 'red'})
-        fig_daily.update_layout(legend_title_text='', 
-                               legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
-        st.plotly_chart(fig_daily, use_container_width=True)
-    
-    with time_tabs[1]:
-        # Hourly analysis
-        billing_data['Hour'] = billing_data['Date'].dt.hour
-        hourly_data = billing_data.groupby('Hour').agg({
+        return daily_data
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def compute_hourly(version, _billing_data):
+    with tracing.span("analytics.hourly"):
+        return _billing_data.groupby(_billing_data['Date'].dt.hour.rename('Hour')).agg({
             'Total': 'sum',
             'Bill Number': 'count'
         }).reset_index()
-        
-        fig_hourly = px.bar(hourly_data, x='Hour', y=['Total', 'Bill Number'],
-                            title='Hourly Distribution',
-                            barmode='group',
-                            labels={'Hour': 'Hour of Day', 'value': 'Count/Revenue', 'variable': 'Metric'})
-        st.plotly_chart(fig_hourly, use_container_width=True)
-    
-    with time_tabs[2]:
-        # Enhanced monthly analysis
-        billing_data['Month'] = billing_data['Date'].dt.strftime('%B %Y')
-        monthly_stats = billing_data.groupby('Month').agg({
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def compute_monthly_overview(version, _billing_data):
+    with tracing.span("analytics.monthly_overview"):
+        monthly_stats = _billing_data.groupby(_billing_data['Date'].dt.strftime('%B %Y').rename('Month')).agg({
             'Total': ['sum', 'mean', 'count', 'std'],
             'Tax': 'sum'
         }).round(2)
         monthly_stats.columns = ['Total Revenue', 'Avg Bill', 'Number of Bills', 'Std Dev', 'Total Tax']
-        monthly_stats = monthly_stats.reset_index()
-        
-        st.dataframe(
-            monthly_stats.style.format({
-                'Total Revenue': '₹{:,.2f}',
-                'Avg Bill': '₹{:,.2f}',
-                'Std Dev': '₹{:,.2f}',
-                'Total Tax': '₹{:,.2f}'
-            }),
-            use_container_width=True
-        )
-    
-    # Customer Analysis Section
-    st.subheader("👥 Customer Insights")
-    customer_tabs = st.tabs(["Top Customers", "Customer Distribution", "Purchase History", "Category Preferences", "RFM Analysis", "Customer Retention"])
-    
-    with customer_tabs[0]:
+        return monthly_stats.reset_index()
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def compute_customer_index(version, _billing_data):
+    with tracing.span("analytics.customer_index"):
+        return analytics_frames.customer_index(_billing_data)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def compute_top_customers(version, _billing_data):
+    with tracing.span("analytics.top_customers"):
         # Top customers by total spending
-        top_customers = billing_data.groupby('Customer Name').agg({
+        top_customers = _billing_data.groupby('Customer Name', observed=True).agg({
             'Total': 'sum',
             'Bill Number': 'count'
         }).reset_index()
         top_customers.columns = ['Customer Name', 'Total Spending', 'Number of Visits']
-        top_customers = top_customers.sort_values('Total Spending', ascending=False).head(10)
-        
-        fig_top_customers = px.bar(top_customers,
-                                   x='Customer Name',
-                                   y='Total Spending',
-                                   title='Top 10 Customers by Spending',
-                                   labels={'Total Spending': 'Total Spending (₹)'})
-        st.plotly_chart(fig_top_customers, use_container_width=True)
-    
-    with customer_tabs[1]:
-        # Customer spending distribution
-        fig_dist = px.histogram(billing_data,
-                               x='Total',
-                               title='Distribution of Bill Amounts',
-                               labels={'Total': 'Bill Amount (₹)', 'count': 'Number of Bills'})
-        st.plotly_chart(fig_dist, use_container_width=True)
-    
-    with customer_tabs[2]:
-        # Customer Purchase History Analysis
-        st.subheader("Customer Purchase History")
-        
-        # Customer selector
-        # Convert customer names to strings to avoid type comparison issues
-        customers = sorted([str(name) for name in billing_data['Customer Name'].unique() if name is not None and not pd.isna(name)])
-        if customers:
-            selected_customer = st.selectbox("Select Customer", customers)
-            
-            # Filter data for selected customer
-            customer_data = billing_data[billing_data['Customer Name'] == selected_customer]
-            
-            if not customer_data.empty:
-                # Show customer metrics
-                col1, col2, col3, col4 = st.columns(4)
-                with col1:
-                    st.metric("Total Visits", f"{len(customer_data)}")
-                with col2:
-                    st.metric("Total Spent", f"₹{customer_data['Total'].sum():,.2f}")
-                with col3:
-                    st.metric("Avg. Bill Amount", f"₹{customer_data['Total'].mean():,.2f}")
-                with col4:
-                    days_since_last = (datetime.now() - customer_data['Date'].max()).days
-                    st.metric("Last Visit", f"{days_since_last} days ago")
-                
-                # Purchase timeline
-                st.subheader("Purchase Timeline")
-                purchase_history = customer_data.sort_values('Date')
-                fig = px.line(purchase_history, 
-                              x='Date', 
-                              y='Total',
-                              markers=True,
-                              title=f"Purchase History for {selected_customer}",
-                              labels={'Total': 'Bill Amount (₹)', 'Date': 'Purchase Date'})
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # Purchase details table
-                st.subheader("Purchase Details")
-                purchase_details = purchase_history[['Date', 'Bill Number', 'Total', 'Total Items']]
-                purchase_details = purchase_details.sort_values('Date', ascending=False)
-                purchase_details.columns = ['Purchase Date', 'Bill Number', 'Amount (₹)', 'Items Purchased']
-                st.dataframe(purchase_details, use_container_width=True)
-            else:
-                st.info("No purchase data available for this customer.")
-        else:
-            st.info("No customer data available.")
-    
-    with customer_tabs[3]:
-        # Product Category Preferences by Customer
-        st.subheader("Category Preferences Analysis")
-        
-        # Check if we have category data
-        if 'Cosmetic Count' in billing_data.columns:
-            # Customer selector
-            # Convert customer names to strings to avoid type comparison issues
-            customers = sorted([str(name) for name in billing_data['Customer Name'].unique() if name is not None and not pd.isna(name)])
-            if customers:
-                selected_customer = st.selectbox("Select Customer", customers, key="cat_pref_customer")
-                
-                # Filter data for selected customer
-                customer_data = billing_data[billing_data['Customer Name'] == selected_customer]
-                
-                if not customer_data.empty:
-                    # Calculate category totals
-                    cosmetic_total = customer_data['Cosmetic Count'].sum()
-                    grocery_total = customer_data['Grocery Count'].sum()
-                    drink_total = customer_data['Drink Count'].sum()
-                    
-                    # Create category preference pie chart
-                    category_data = pd.DataFrame({
-                        'Category': ['Cosmetics', 'Grocery', 'Drinks'],
-                        'Count': [cosmetic_total, grocery_total, drink_total]
-                    })
-                    
-                    fig = px.pie(category_data, 
-                                values='Count', 
-                                names='Category',
-                                title=f"Category Preferences for {selected_customer}",
-                                color_discrete_sequence=px.colors.sequential.Viridis)
-                    st.plotly_chart(fig, use_container_width=True)
-                    
-                    # Show most frequently purchased items if available
-                    st.subheader("Most Frequently Purchased Items")
-                    
-                    # Combine all items from all bills
-                    all_cosmetic_items = []
-                    all_grocery_items = []
-                    all_drink_items = []
-                    
-                    for items in customer_data['Cosmetic Items']:
-                        all_cosmetic_items.extend(items)
-                    for items in customer_data['Grocery Items']:
-                        all_grocery_items.extend(items)
-                    for items in customer_data['Drink Items']:
-                        all_drink_items.extend(items)
-                    
-                    # Count item frequencies
-                    cosmetic_counts = pd.Series(all_cosmetic_items).value_counts().reset_index()
-                    grocery_counts = pd.Series(all_grocery_items).value_counts().reset_index()
-                    drink_counts = pd.Series(all_drink_items).value_counts().reset_index()
-                    
-                    # Display top items in each category
-                    col1, col2, col3 = st.columns(3)
-                    
-                    with col1:
-                        st.write("Top Cosmetic Items")
-                        if not cosmetic_counts.empty:
-                            cosmetic_counts.columns = ['Item', 'Count']
-                            st.dataframe(cosmetic_counts.head(5), use_container_width=True)
-                        else:
-                            st.info("No cosmetic items purchased")
-                    
-                    with col2:
-                        st.write("Top Grocery Items")
-                        if not grocery_counts.empty:
-                            grocery_counts.columns = ['Item', 'Count']
-                            st.dataframe(grocery_counts.head(5), use_container_width=True)
-                        else:
-                            st.info("No grocery items purchased")
-                    
-                    with col3:
-                        st.write("Top Drink Items")
-                        if not drink_counts.empty:
-                            drink_counts.columns = ['Item', 'Count']
-                            st.dataframe(drink_counts.head(5), use_container_width=True)
-                        else:
-                            st.info("No drink items purchased")
-                else:
-                    st.info("No purchase data available for this customer.")
-            else:
-                st.info("No customer data available.")
-        else:
-            st.info("Category data not available. Please ensure bills contain product information.")
-    
-    with customer_tabs[4]:
-        # RFM (Recency, Frequency, Monetary) Analysis
-        st.subheader("RFM Customer Segmentation")
-        
-        # Calculate RFM metrics
-        if len(billing_data) > 0:
-            # Get the most recent date in the dataset
-            max_date = billing_data['Date'].max()
-            
-            # Group by customer and calculate RFM metrics
-            rfm = billing_data.groupby('Customer Name').agg({
-                'Date': lambda x: (max_date - x.max()).days,  # Recency
-                'Bill Number': 'count',  # Frequency
-                'Total': 'sum'  # Monetary
-            }).reset_index()
-            
-            # Rename columns
-            rfm.columns = ['Customer Name', 'Recency', 'Frequency', 'Monetary']
-            
-            # Create RFM scores (1-5, 5 being the best)
-            # Handle potential duplicate values by using rank for all metrics
-            try:
-                # Try standard quantile cut first
-                rfm['R_Score'] = pd.qcut(rfm['Recency'], q=5, labels=[5, 4, 3, 2, 1])
-            except ValueError:
-                # If we get duplicate values error, use rank method
-                rfm['R_Score'] = pd.qcut(rfm['Recency'].rank(method='first'), q=5, labels=[5, 4, 3, 2, 1])
-                
-            # Always use rank method for frequency and monetary to be safe
-            rfm['F_Score'] = pd.qcut(rfm['Frequency'].rank(method='first'), q=5, labels=[1, 2, 3, 4, 5])
-            rfm['M_Score'] = pd.qcut(rfm['Monetary'].rank(method='first'), q=5, labels=[1, 2, 3, 4, 5])
-            
-            # Calculate RFM Score
-            rfm['RFM_Score'] = rfm['R_Score'].astype(int) + rfm['F_Score'].astype(int) + rfm['M_Score'].astype(int)
-            
-            # Create customer segments
-            def segment_customer(score):
-                if score >= 13:
-                    return 'Champions'
-                elif score >= 10:
-                    return 'Loyal Customers'
-                elif score >= 7:
-                    return 'Potential Loyalists'
-                elif score >= 5:
-                    return 'At Risk'
-                else:
-                    return 'Needs Attention'
-            
-            rfm['Segment'] = rfm['RFM_Score'].apply(segment_customer)
-            
-            # Display RFM segments
-            segment_counts = rfm['Segment'].value_counts().reset_index()
-            segment_counts.columns = ['Segment', 'Count']
-            
-            fig = px.pie(segment_counts, 
-                        values='Count', 
-                        names='Segment',
-                        title='Customer Segments Distribution',
-                        color_discrete_sequence=px.colors.sequential.RdBu)
-            st.plotly_chart(fig, use_container_width=True)
-            
-            # Display RFM metrics by segment
-            segment_metrics = rfm.groupby('Segment').agg({
-                'Recency': 'mean',
-                'Frequency': 'mean',
-                'Monetary': 'mean',
-                'Customer Name': 'count'
-            }).reset_index()
-            
-            segment_metrics.columns = ['Segment', 'Avg. Days Since Last Purchase', 'Avg. Purchase Frequency', 'Avg. Spending (₹)', 'Customer Count']
-            segment_metrics = segment_metrics.sort_values('Customer Count', ascending=False)
-            
-            st.dataframe(segment_metrics.style.format({
-                'Avg. Days Since Last Purchase': '{:.1f}',
-                'Avg. Purchase Frequency': '{:.1f}',
-                'Avg. Spending (₹)': '₹{:,.2f}'
-            }), use_container_width=True)
-            
-            # Show customer details by segment
-            selected_segment = st.selectbox("Select Segment to View Customers", rfm['Segment'].unique())
-            segment_customers = rfm[rfm['Segment'] == selected_segment].sort_values('RFM_Score', ascending=False)
-            
-            st.dataframe(segment_customers[['Customer Name', 'Recency', 'Frequency', 'Monetary', 'RFM_Score']].style.format({
-                'Recency': '{:.0f} days',
-                'Monetary': '₹{:,.2f}'
-            }), use_container_width=True)
-            
-            # Recommendations based on segments
-            st.subheader("Recommended Actions")
-            
-            recommendations = {
-                'Champions': "These are your best customers! Reward them with loyalty programs, exclusive offers, and premium services.",
-                'Loyal Customers': "Focus on maintaining their loyalty with personalized offers and regular communication.",
-                'Potential Loyalists': "Encourage more frequent purchases with targeted promotions and incentives.",
-                'At Risk': "Re-engage these customers with special offers, discounts, or personalized outreach.",
-                'Needs Attention': "Consider recovery campaigns with significant incentives to bring these customers back."
-            }
-            
-            st.info(recommendations.get(selected_segment, "No specific recommendations available."))
-        else:
-            st.info("Not enough data for RFM analysis. Please generate more bills.")
-    
-    with customer_tabs[5]:
-        # Customer Retention Analysis
-        st.subheader("Customer Retention Analysis")
-        
-        if len(billing_data) > 0:
-            # Calculate first and last purchase dates for each customer
-            customer_activity = billing_data.groupby('Customer Name').agg({
-                'Date': ['min', 'max', 'count']
-            }).reset_index()
-            
-            customer_activity.columns = ['Customer Name', 'First Purchase', 'Last Purchase', 'Purchase Count']
-            
-            # Calculate customer lifetime in days
-            customer_activity['Customer Lifetime (days)'] = (customer_activity['Last Purchase'] - customer_activity['First Purchase']).dt.days
-            
-            # Calculate days since last purchase
-            today = datetime.now()
-            customer_activity['Days Since Last Purchase'] = (today - customer_activity['Last Purchase']).dt.days
-            
-            # Define active customers (purchased in last 30 days)
-            customer_activity['Status'] = customer_activity['Days Since Last Purchase'].apply(
-                lambda x: 'Active' if x <= 30 else ('Inactive' if x <= 90 else 'Churned')
-            )
-            
-            # Customer status distribution
-            status_counts = customer_activity['Status'].value_counts().reset_index()
-            status_counts.columns = ['Status', 'Count']
-            
-            fig = px.pie(status_counts, 
-                        values='Count', 
-                        names='Status',
-                        title='Customer Status Distribution',
-                        color_discrete_map={'Active': 'green', 'Inactive': 'orange', 'Churned': 'red'})
-            st.plotly_chart(fig, use_container_width=True)
-            
-            # Customer retention over time
-            billing_data['YearMonth'] = billing_data['Date'].dt.strftime('%Y-%m')
-            monthly_active = billing_data.groupby('YearMonth')['Customer Name'].nunique().reset_index()
-            monthly_active.columns = ['Month', 'Active Customers']
-            
-            fig = px.line(monthly_active, 
-                         x='Month', 
-                         y='Active Customers',
-                         markers=True,
-                         title='Monthly Active Customers',
-                         labels={'Month': 'Month', 'Active Customers': 'Number of Active Customers'})
-            st.plotly_chart(fig, use_container_width=True)
-            
-            # Customer churn risk
-            st.subheader("Customers at Risk of Churning")
-            at_risk = customer_activity[
-                (customer_activity['Status'] == 'Inactive') & 
-                (customer_activity['Purchase Count'] > 1)
-            ].sort_values('Days Since Last Purchase', ascending=False)
-            
-            if not at_risk.empty:
-                at_risk_display = at_risk[['Customer Name', 'Last Purchase', 'Purchase Count', 'Days Since Last Purchase']]
-                at_risk_display.columns = ['Customer Name', 'Last Purchase Date', 'Total Purchases', 'Days Since Last Purchase']
-                
-                st.dataframe(at_risk_display, use_container_width=True)
-                
-                # Recommended re-engagement strategy
-                st.subheader("Re-engagement Recommendations")
-                st.info("Consider sending personalized offers to these customers based on their previous purchase history. "
-                       "A discount on their favorite product categories could encourage them to return.")
-            else:
-                st.info("No customers currently at risk of churning.")
-        else:
-            st.info("Not enough data for retention analysis. Please generate more bills.")
-    
-    # Product Analytics Section
-    st.subheader("📦 Product Analytics")
-    product_tabs = st.tabs(["Sales by Category", "Product Performance", "Cross-Category Insights", "Seasonal Trends"])
-    
-    with product_tabs[0]:
-        # Sales by Category Analysis
-        st.subheader("Sales by Category")
-        
-        if 'Cosmetic Count' in billing_data.columns and len(billing_data) > 0:
-            # Calculate total sales and count by category
-            category_data = pd.DataFrame({
-                'Category': ['Cosmetics', 'Grocery', 'Drinks'],
-                'Item Count': [billing_data['Cosmetic Count'].sum(), 
-                               billing_data['Grocery Count'].sum(), 
-                               billing_data['Drink Count'].sum()]
-            })
-            
-            # Filter out categories with zero items
-            category_data = category_data[category_data['Item Count'] > 0]
-            
-            if not category_data.empty:
-                # Create a pie chart for category distribution
-                fig = px.pie(category_data, 
-                            values='Item Count', 
-                            names='Category',
-                            title='Sales Distribution by Category',
-                            color_discrete_sequence=px.colors.qualitative.Pastel)
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # Category sales over time
-                billing_data['YearMonth'] = billing_data['Date'].dt.strftime('%Y-%m')
-                monthly_category = billing_data.groupby('YearMonth').agg({
-                    'Cosmetic Count': 'sum',
-                    'Grocery Count': 'sum',
-                    'Drink Count': 'sum'
-                }).reset_index()
-                
-                # Reshape for plotting
-                monthly_category_long = pd.melt(
-                    monthly_category, 
-                    id_vars=['YearMonth'],
-                    value_vars=['Cosmetic Count', 'Grocery Count', 'Drink Count'],
-                    var_name='Category', 
-                    value_name='Count'
-                )
-                
-                # Clean category names
-                monthly_category_long['Category'] = monthly_category_long['Category'].str.replace(' Count', '')
-                
-                # Create line chart
-                fig = px.line(monthly_category_long, 
-                             x='YearMonth', 
-                             y='Count',
-                             color='Category',
-                             markers=True,
-                             title='Category Sales Trends Over Time',
-                             labels={'YearMonth': 'Month', 'Count': 'Number of Items Sold'})
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.info("No category data available for analysis.")
-        else:
-            st.info("Category data not available. Please ensure bills contain product information.")
-    
-    with product_tabs[1]:
-        # Product Performance Analysis
-        st.subheader("Product Performance Analysis")
-        
-        if 'Cosmetic Items' in billing_data.columns and len(billing_data) > 0:
-            # Collect all items across all bills
-            all_cosmetic_items = []
-            all_grocery_items = []
-            all_drink_items = []
-            
-            for items in billing_data['Cosmetic Items']:
-                if isinstance(items, list):
-                    all_cosmetic_items.extend(items)
-            
-            for items in billing_data['Grocery Items']:
-                if isinstance(items, list):
-                    all_grocery_items.extend(items)
-            
-            for items in billing_data['Drink Items']:
-                if isinstance(items, list):
-                    all_drink_items.extend(items)
-            
-            # Count occurrences of each item
-            cosmetic_counts = pd.DataFrame(Counter(all_cosmetic_items).most_common(), columns=['Item', 'Count'])
-            grocery_counts = pd.DataFrame(Counter(all_grocery_items).most_common(), columns=['Item', 'Count'])
-            drink_counts = pd.DataFrame(Counter(all_drink_items).most_common(), columns=['Item', 'Count'])
-            
-            # Combine all products for overall analysis
-            all_products = []
-            if not cosmetic_counts.empty:
-                cosmetic_counts['Category'] = 'Cosmetics'
-                all_products.append(cosmetic_counts)
-            
-            if not grocery_counts.empty:
-                grocery_counts['Category'] = 'Grocery'
-                all_products.append(grocery_counts)
-            
-            if not drink_counts.empty:
-                drink_counts['Category'] = 'Drinks'
-                all_products.append(drink_counts)
-            
-            if all_products:
-                all_products_df = pd.concat(all_products, ignore_index=True)
-                
-                # Top 10 products overall
-                top_products = all_products_df.sort_values('Count', ascending=False).head(10)
-                
-                fig = px.bar(top_products, 
-                           x='Count', 
-                           y='Item',
-                           color='Category',
-                           title='Top 10 Best-Selling Products',
-                           labels={'Count': 'Number of Sales', 'Item': 'Product'},
-                           orientation='h')
-                st.plotly_chart(fig, use_container_width=True)
-                
-                # Allow filtering by category
-                selected_category = st.selectbox(
-                    "Select Category for Detailed Analysis",
-                    ['All Categories'] + list(all_products_df['Category'].unique())
-                )
-                
-                if selected_category == 'All Categories':
-                    filtered_products = all_products_df
-                else:
-                    filtered_products = all_products_df[all_products_df['Category'] == selected_category]
-                
-                # Show detailed table
-                st.subheader(f"Detailed Product Performance: {selected_category}")
-                st.dataframe(filtered_products.sort_values('Count', ascending=False), use_container_width=True)
-            else:
-                st.info("No product data available for analysis.")
-        else:
-            st.info("Product data not available. Please ensure bills contain product information.")
-    
-    with product_tabs[2]:
-        # Cross-Category Insights
-        st.subheader("Cross-Category Purchase Insights")
-        
-        if 'Cosmetic Count' in billing_data.columns and len(billing_data) > 0:
-            # Create category purchase indicators
-            billing_data['Bought Cosmetics'] = billing_data['Cosmetic Count'] > 0
-            billing_data['Bought Grocery'] = billing_data['Grocery Count'] > 0
-            billing_data['Bought Drinks'] = billing_data['Drink Count'] > 0
-            
-            # Calculate co-occurrence of categories
-            cosmetics_and_grocery = billing_data[(billing_data['Bought Cosmetics']) & (billing_data['Bought Grocery'])].shape[0]
-            cosmetics_and_drinks = billing_data[(billing_data['Bought Cosmetics']) & (billing_data['Bought Drinks'])].shape[0]
-            grocery_and_drinks = billing_data[(billing_data['Bought Grocery']) & (billing_data['Bought Drinks'])].shape[0]
-            all_categories = billing_data[(billing_data['Bought Cosmetics']) & (billing_data['Bought Grocery']) & (billing_data['Bought Drinks'])].shape[0]
-            
-            # Calculate total bills with each category
-            total_cosmetics = billing_data[billing_data['Bought Cosmetics']].shape[0]
-            total_grocery = billing_data[billing_data['Bought Grocery']].shape[0]
-            total_drinks = billing_data[billing_data['Bought Drinks']].shape[0]
-            
-            # Create co-occurrence matrix for heatmap
-            categories = ['Cosmetics', 'Grocery', 'Drinks']
-            co_occurrence = np.zeros((3, 3))
-            
-            # Fill the matrix
-            co_occurrence[0, 0] = total_cosmetics
-            co_occurrence[1, 1] = total_grocery
-            co_occurrence[2, 2] = total_drinks
-            co_occurrence[0, 1] = co_occurrence[1, 0] = cosmetics_and_grocery
-            co_occurrence[0, 2] = co_occurrence[2, 0] = cosmetics_and_drinks
-            co_occurrence[1, 2] = co_occurrence[2, 1] = grocery_and_drinks
-            
-            # Create heatmap
-            fig = go.Figure(data=go.Heatmap(
-                z=co_occurrence,
-                x=categories,
-                y=categories,
-                colorscale='Viridis',
-                showscale=True
-            ))
-            
-            fig.update_layout(
-                title='Category Co-occurrence Matrix',
-                xaxis_title='Category',
-                yaxis_title='Category'
-            )
-            
-            st.plotly_chart(fig, use_container_width=True)
-            
-            # Calculate and display cross-selling insights
-            st.subheader("Cross-Selling Opportunities")
-            
-            insights = []
-            if total_cosmetics > 0 and total_grocery > 0:
-                cosmetics_to_grocery = cosmetics_and_grocery / total_cosmetics * 100
-                grocery_to_cosmetics = cosmetics_and_grocery / total_grocery * 100
-                insights.append(f"• {cosmetics_to_grocery:.1f}% of customers who buy Cosmetics also buy Grocery items")
-                insights.append(f"• {grocery_to_cosmetics:.1f}% of customers who buy Grocery items also buy Cosmetics")
-            
-            if total_cosmetics > 0 and total_drinks > 0:
-                cosmetics_to_drinks = cosmetics_and_drinks / total_cosmetics * 100
-                drinks_to_cosmetics = cosmetics_and_drinks / total_drinks * 100
-                insights.append(f"• {cosmetics_to_drinks:.1f}% of customers who buy Cosmetics also buy Drinks")
-                insights.append(f"• {drinks_to_cosmetics:.1f}% of customers who buy Drinks also buy Cosmetics")
-            
-            if total_grocery > 0 and total_drinks > 0:
-                grocery_to_drinks = grocery_and_drinks / total_grocery * 100
-                drinks_to_grocery = grocery_and_drinks / total_drinks * 100
-                insights.append(f"• {grocery_to_drinks:.1f}% of customers who buy Grocery items also buy Drinks")
-                insights.append(f"• {drinks_to_grocery:.1f}% of customers who buy Drinks also buy Grocery items")
-            
-            if insights:
-                for insight in insights:
-                    st.write(insight)
-                
-                # Recommendations based on insights
-                st.subheader("Recommendations")
-                st.info("Consider these cross-selling strategies based on purchase patterns:\n" +
-                       "1. Bundle frequently co-purchased items for special promotions\n" +
-                       "2. Place related items from different categories near each other in store layout\n" +
-                       "3. Offer targeted discounts on complementary products from different categories")
-            else:
-                st.info("Not enough cross-category purchase data for insights.")
-        else:
-            st.info("Category data not available. Please ensure bills contain product information.")
-    
-    with product_tabs[3]:
-        # Seasonal Trends Analysis
-        st.subheader("Seasonal Product Trends")
-        
-        if 'Cosmetic Count' in billing_data.columns and len(billing_data) > 0:
-            # Add month and season columns
-            billing_data['Month'] = billing_data['Date'].dt.month
-            billing_data['Month Name'] = billing_data['Date'].dt.strftime('%B')
-            
-            # Define seasons based on month
-            def get_season(month):
-                if month in [12, 1, 2]:  # Winter
-                    return 'Winter'
-                elif month in [3, 4, 5]:  # Spring
-                    return 'Spring'
-                elif month in [6, 7, 8]:  # Summer
-                    return 'Summer'
-                else:  # Fall/Autumn
-                    return 'Fall'
-            
-            billing_data['Season'] = billing_data['Month'].apply(get_season)
-            
-            # Seasonal category analysis
-            seasonal_data = billing_data.groupby('Season').agg({
-                'Cosmetic Count': 'sum',
-                'Grocery Count': 'sum',
-                'Drink Count': 'sum',
-                'Bill Number': 'count'
-            }).reset_index()
-            
-            # Order seasons correctly
-            season_order = ['Winter', 'Spring', 'Summer', 'Fall']
-            seasonal_data['Season'] = pd.Categorical(seasonal_data['Season'], categories=season_order, ordered=True)
-            seasonal_data = seasonal_data.sort_values('Season')
-            
-            # Create seasonal category distribution chart
-            seasonal_data_long = pd.melt(
-                seasonal_data,
-                id_vars=['Season', 'Bill Number'],
-                value_vars=['Cosmetic Count', 'Grocery Count', 'Drink Count'],
-                var_name='Category',
-                value_name='Count'
-            )
-            
-            # Clean category names
-            seasonal_data_long['Category'] = seasonal_data_long['Category'].str.replace(' Count', '')
-            
-            fig = px.bar(seasonal_data_long,
-                        x='Season',
-                        y='Count',
-                        color='Category',
-                        title='Seasonal Category Sales',
-                        barmode='group',
-                        labels={'Count': 'Number of Items Sold', 'Season': 'Season'})
-            
-            st.plotly_chart(fig, use_container_width=True)
-            
-            # Monthly trends
-            monthly_data = billing_data.groupby(['Month', 'Month Name']).agg({
-                'Cosmetic Count': 'sum',
-                'Grocery Count': 'sum',
-                'Drink Count': 'sum'
-            }).reset_index()
-            
-            # Sort by month number
-            monthly_data = monthly_data.sort_values('Month')
-            
-            # Create monthly category distribution chart
-            monthly_data_long = pd.melt(
-                monthly_data,
-                id_vars=['Month', 'Month Name'],
-                value_vars=['Cosmetic Count', 'Grocery Count', 'Drink Count'],
-                var_name='Category',
-                value_name='Count'
-            )
-            
-            # Clean category names
-            monthly_data_long['Category'] = monthly_data_long['Category'].str.replace(' Count', '')
-            
-            fig = px.line(monthly_data_long,
-                         x='Month Name',
-                         y='Count',
-                         color='Category',
-                         markers=True,
-                         title='Monthly Category Sales Trends',
-                         labels={'Count': 'Number of Items Sold', 'Month Name': 'Month'},
-                         category_orders={'Month Name': list(calendar.month_name)[1:13]})
-            
-            st.plotly_chart(fig, use_container_width=True)
-            
-            # Seasonal product recommendations
-            st.subheader("Seasonal Inventory Recommendations")
-            
-            # Get the current season
-            current_month = datetime.now().month
-            current_season = get_season(current_month)
-            next_season_idx = (season_order.index(current_season) + 1) % 4
-            next_season = season_order[next_season_idx]
-            
-            st.write(f"Current Season: **{current_season}**")
-            st.write(f"Preparing for Next Season: **{next_season}**")
-            
-            # Recommendations based on seasonal data
-            season_recommendations = {
-                'Winter': "Focus on stocking more grocery essentials and hot beverages. Consider winter skincare cosmetics.",
-                'Spring': "Increase inventory of fresh produce and cleaning supplies. Spring-themed cosmetics and refreshing drinks.",
-                'Summer': "Stock up on cold beverages, summer fruits, and sun protection cosmetics.",
-                'Fall': "Prepare for seasonal grocery items, warm drinks, and moisturizing cosmetics."
-            }
-            
-            st.info(f"**Recommendation for {next_season}**: {season_recommendations.get(next_season, '')}")
-        else:
-            st.info("Category data not available for seasonal analysis. Please ensure bills contain product information.")
-    
-    # Predictive Analytics Section
-    st.subheader("🔮 Revenue Prediction")
-    if len(billing_data) >= 7:  # Only show prediction if we have enough data
-        # Prepare data for prediction
-        daily_data = billing_data.groupby(billing_data['Date'].dt.date)['Total'].sum().reset_index()
-        daily_data['Day Number'] = range(len(daily_data))
-        
-        # Create and train the model
-        model = LinearRegression()
-        X = daily_data['Day Number'].values.reshape(-1, 1)
-        y = daily_data['Total'].values
-        model.fit(X, y)
-        
-        # Make prediction for next 7 days
-        future_days = np.array(range(len(daily_data), len(daily_data) + 7)).reshape(-1, 1)
-        predictions = model.predict(future_days)
-        
-        # Create prediction dataframe
-        future_dates = [daily_data['Date'].iloc[-1] + timedelta(days=i+1) for i in range(7)]
-        pred_df = pd.DataFrame({
-            'Date': future_dates,
-            'Predicted Revenue': predictions
+        return top_customers.sort_values('Total Spending', ascending=False).head(10)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def compute_rfm(version, _billing_data):
+    with tracing.span("analytics.rfm"):
+        # Get the most recent date in the dataset
+        max_date = _billing_data['Date'].max()
+
+        # Group by customer and calculate RFM metrics
+        rfm = _billing_data.groupby('Customer Name', observed=True).agg({
+            'Date': lambda x: (max_date - x.max()).days,  # Recency
+            'Bill Number': 'count',  # Frequency
+            'Total': 'sum'  # Monetary
+        }).reset_index()
+
+        # Rename columns
+        rfm.columns = ['Customer Name', 'Recency', 'Frequency', 'Monetary']
+
+        # Create RFM scores (1-5, 5 being the best)
+        # Handle potential duplicate values by using rank for all metrics
+        try:
+            # Try standard quantile cut first
+            rfm['R_Score'] = pd.qcut(rfm['Recency'], q=5, labels=[5, 4, 3, 2, 1])
+        except ValueError:
+            # If we get duplicate values error, use rank method
+            rfm['R_Score'] = pd.qcut(rfm['Recency'].rank(method='first'), q=5, labels=[5, 4, 3, 2, 1])
+
+        # Always use rank method for frequency and monetary to be safe
+        rfm['F_Score'] = pd.qcut(rfm['Frequency'].rank(method='first'), q=5, labels=[1, 2, 3, 4, 5])
+        rfm['M_Score'] = pd.qcut(rfm['Monetary'].rank(method='first'), q=5, labels=[1, 2, 3, 4, 5])
+
+        # Calculate RFM Score
+        rfm['RFM_Score'] = rfm['R_Score'].astype(int) + rfm['F_Score'].astype(int) + rfm['M_Score'].astype(int)
+        rfm['Segment'] = rfm['RFM_Score'].apply(segment_customer)
+
+        segment_counts = rfm['Segment'].value_counts().reset_index()
+        segment_counts.columns = ['Segment', 'Count']
+
+        # RFM metrics by segment
+        segment_metrics = rfm.groupby('Segment').agg({
+            'Recency': 'mean',
+            'Frequency': 'mean',
+            'Monetary': 'mean',
+            'Customer Name': 'count'
+        }).reset_index()
+        segment_metrics.columns = ['Segment', 'Avg. Days Since Last Purchase', 'Avg. Purchase Frequency', 'Avg. Spending (₹)', 'Customer Count']
+        segment_metrics = segment_metrics.sort_values('Customer Count', ascending=False)
+        return rfm, segment_counts, segment_metrics
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def compute_retention(version, _billing_data, today):
+    with tracing.span("analytics.retention"):
+        # Calculate first and last purchase dates for each customer
+        customer_activity = _billing_data.groupby('Customer Name', observed=True).agg({
+            'Date': ['min', 'max', 'count']
+        }).reset_index()
+
+        customer_activity.columns = ['Customer Name', 'First Purchase', 'Last Purchase', 'Purchase Count']
+
+        # Calculate customer lifetime in days
+        customer_activity['Customer Lifetime (days)'] = (customer_activity['Last Purchase'] - customer_activity['First Purchase']).dt.days
+
+        # Calculate days since last purchase
+        customer_activity['Days Since Last Purchase'] = (pd.Timestamp(today) - customer_activity['Last Purchase']).dt.days
+
+        # Define active customers (purchased in last 30 days)
+        customer_activity['Status'] = customer_activity['Days Since Last Purchase'].apply(
+            lambda x: 'Active' if x <= 30 else ('Inactive' if x <= 90 else 'Churned')
+        )
+
+        # Customer status distribution
+        status_counts = customer_activity['Status'].value_counts().reset_index()
+        status_counts.columns = ['Status', 'Count']
+
+        # Customer retention over time
+        monthly_active = _billing_data.groupby(_billing_data['Date'].dt.strftime('%Y-%m'))['Customer Name'].nunique().reset_index()
+        monthly_active.columns = ['Month', 'Active Customers']
+        return customer_activity, status_counts, monthly_active
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def compute_sales_by_category(version, _billing_data):
+    with tracing.span("analytics.sales_by_category"):
+        # Calculate total sales and count by category
+        category_data = pd.DataFrame({
+            'Category': ['Cosmetics', 'Grocery', 'Drinks'],
+            'Item Count': [_billing_data[column].sum() for column in COUNT_COLUMNS]
         })
-        
-        st.write("Predicted Daily Revenue for Next 7 Days:")
-        st.dataframe(pred_df.style.format({
-            'Predicted Revenue': '₹{:,.2f}'
-        }), use_container_width=True)
+
+        # Filter out categories with zero items
+        category_data = category_data[category_data['Item Count'] > 0]
+
+        # Category sales over time
+        monthly_category = _billing_data.groupby(_billing_data['Date'].dt.strftime('%Y-%m').rename('YearMonth')).agg({
+            column: 'sum' for column in COUNT_COLUMNS
+        }).reset_index()
+
+        # Reshape for plotting
+        monthly_category_long = pd.melt(
+            monthly_category,
+            id_vars=['YearMonth'],
+            value_vars=COUNT_COLUMNS,
+            var_name='Category',
+            value_name='Count'
+        )
+
+        # Clean category names
+        monthly_category_long['Category'] = monthly_category_long['Category'].str.replace(' Count', '')
+        return category_data, monthly_category_long
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def compute_product_performance(version, _line_items):
+    with tracing.span("analytics.product_performance"):
+        # Count occurrences of each item from the SKU codes
+        all_products = []
+        for category, label in (('Cosmetics', 'Cosmetics'), ('Groceries', 'Grocery'), ('Drinks', 'Drinks')):
+            counts = analytics_frames.item_counts(_line_items, category)
+            if not counts.empty:
+                counts['Category'] = label
+                all_products.append(counts)
+        return pd.concat(all_products, ignore_index=True) if all_products else None
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def compute_cross_category(version, _billing_data):
+    with tracing.span("analytics.cross_category"):
+        # Create category purchase indicators
+        bought_cosmetics = (_billing_data['Cosmetic Count'] > 0).to_numpy()
+        bought_grocery = (_billing_data['Grocery Count'] > 0).to_numpy()
+        bought_drinks = (_billing_data['Drink Count'] > 0).to_numpy()
+
+        # Create co-occurrence matrix for heatmap
+        co_occurrence = np.zeros((3, 3))
+        co_occurrence[0, 0] = bought_cosmetics.sum()
+        co_occurrence[1, 1] = bought_grocery.sum()
+        co_occurrence[2, 2] = bought_drinks.sum()
+        co_occurrence[0, 1] = co_occurrence[1, 0] = (bought_cosmetics & bought_grocery).sum()
+        co_occurrence[0, 2] = co_occurrence[2, 0] = (bought_cosmetics & bought_drinks).sum()
+        co_occurrence[1, 2] = co_occurrence[2, 1] = (bought_grocery & bought_drinks).sum()
+        return co_occurrence
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def compute_seasonal(version, _billing_data):
+    with tracing.span("analytics.seasonal"):
+        months = _billing_data['Date'].dt.month
+        counts = _billing_data[COUNT_COLUMNS + ['Bill Number']]
+
+        # Seasonal category analysis
+        seasonal_data = counts.groupby(months.map(get_season).rename('Season')).agg({
+            'Cosmetic Count': 'sum',
+            'Grocery Count': 'sum',
+            'Drink Count': 'sum',
+            'Bill Number': 'count'
+        }).reset_index()
+
+        # Order seasons correctly
+        seasonal_data['Season'] = pd.Categorical(seasonal_data['Season'], categories=SEASON_ORDER, ordered=True)
+        seasonal_data = seasonal_data.sort_values('Season')
+
+        seasonal_data_long = pd.melt(
+            seasonal_data,
+            id_vars=['Season', 'Bill Number'],
+            value_vars=COUNT_COLUMNS,
+            var_name='Category',
+            value_name='Count'
+        )
+        seasonal_data_long['Category'] = seasonal_data_long['Category'].str.replace(' Count', '')
+
+        # Monthly trends, sorted by month number
+        monthly_data = counts[COUNT_COLUMNS].groupby([
+            months.rename('Month'),
+            _billing_data['Date'].dt.strftime('%B').rename('Month Name')
+        ]).sum().reset_index().sort_values('Month')
+
+        monthly_data_long = pd.melt(
+            monthly_data,
+            id_vars=['Month', 'Month Name'],
+            value_vars=COUNT_COLUMNS,
+            var_name='Category',
+            value_name='Count'
+        )
+        monthly_data_long['Category'] = monthly_data_long['Category'].str.replace(' Count', '')
+        return seasonal_data_long, monthly_data_long
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def compute_forecast(version, today):
+    with tracing.span("analytics.forecast"):
+        # Reads the saved predictions; the models are only refit (incrementally)
+        # when a day has closed since they were saved
+        project_dir = os.path.dirname(os.path.dirname(__file__))
+        state = forecasting.get_forecasts(
+            today=today,
+            ledger_file=os.path.join(project_dir, "vdx_excel_bills.xlsx"),
+            bills_directory=os.path.join(project_dir, "saved_bills")
+        )
+        return state["predictions"], state["days"], state["updated"]
+
+
+# Section renderers. Each takes the billing frame, the encoded line items and
+# the snapshot version, and draws one section.
+
+def render_key_metrics(billing_data, line_items, version):
+    metrics = compute_key_metrics(version, billing_data)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Total Bills", f"{metrics['total_bills']:,d}")
+    with col2:
+        st.metric("Total Revenue", f"₹{metrics['total_revenue']:,.2f}")
+    with col3:
+        st.metric("Average Bill", f"₹{metrics['avg_bill']:,.2f}")
+    with col4:
+        st.metric("Total Tax", f"₹{metrics['total_tax']:,.2f}")
+
+
+def render_growth(billing_data, line_items, version):
+    avg_growth, last_day_growth = compute_growth(version, billing_data)
+    growth_col1, growth_col2 = st.columns(2)
+    with growth_col1:
+        st.metric("Average Daily Growth", f"{avg_growth:.1f}%")
+    with growth_col2:
+        st.metric("Last Day Growth", f"{last_day_growth:.1f}%")
+
+
+def render_daily_trends(billing_data, line_items, version):
+    import plotly.express as px
+    daily_data = compute_daily_trends(version, billing_data)
+    fig_daily = px.line(daily_data, x='Date', y=['Total', 'MA7'],
+                       title='Daily Revenue with 7-day Moving Average',
+                       labels={'value': 'Revenue (₹)', 'Date': 'Date', 'variable': 'Metric'},
+                       color_discrete_map={'Total': 'blue', 'MA7': 'red'})
+    fig_daily.update_layout(legend_title_text='',
+                           legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1))
+    st.plotly_chart(fig_daily, use_container_width=True)
+
+
+def render_hourly(billing_data, line_items, version):
+    import plotly.express as px
+    hourly_data = compute_hourly(version, billing_data)
+    fig_hourly = px.bar(hourly_data, x='Hour', y=['Total', 'Bill Number'],
+                        title='Hourly Distribution',
+                        barmode='group',
+                        labels={'Hour': 'Hour of Day', 'value': 'Count/Revenue', 'variable': 'Metric'})
+    st.plotly_chart(fig_hourly, use_container_width=True)
+
+
+def render_monthly_overview(billing_data, line_items, version):
+    monthly_stats = compute_monthly_overview(version, billing_data)
+    st.dataframe(
+        monthly_stats.style.format({
+            'Total Revenue': '₹{:,.2f}',
+            'Avg Bill': '₹{:,.2f}',
+            'Std Dev': '₹{:,.2f}',
+            'Total Tax': '₹{:,.2f}'
+        }),
+        use_container_width=True
+    )
+
+
+def render_top_customers(billing_data, line_items, version):
+    import plotly.express as px
+    top_customers = compute_top_customers(version, billing_data)
+    fig_top_customers = px.bar(top_customers,
+                               x='Customer Name',
+                               y='Total Spending',
+                               title='Top 10 Customers by Spending',
+                               labels={'Total Spending': 'Total Spending (₹)'})
+    st.plotly_chart(fig_top_customers, use_container_width=True)
+
+
+def render_customer_distribution(billing_data, line_items, version):
+    import plotly.express as px
+    # Customer spending distribution
+    fig_dist = px.histogram(billing_data,
+                           x='Total',
+                           title='Distribution of Bill Amounts',
+                           labels={'Total': 'Bill Amount (₹)', 'count': 'Number of Bills'})
+    st.plotly_chart(fig_dist, use_container_width=True)
+
+
+def select_customer(billing_data, version, key):
+    """
+    Customer selector backed by the customer index.
+
+    Returns:
+        tuple: (profile, rows) - the customer's row of the index and the
+            positions of their bills in billing_data, oldest first - or None
+    """
+    index = compute_customer_index(version, billing_data)
+    customers = index["customers"]
+    if customers.empty:
+        st.info("No customer data available.")
+        return None
+    selected = st.selectbox("Select Customer", range(len(customers)),
+                            format_func=lambda position: customers['Customer'].iat[position], key=key)
+    return customers.iloc[selected], analytics_frames.customer_rows(index, selected)
+
+
+def render_purchase_history(billing_data, line_items, version):
+    import plotly.express as px
+    # Customer Purchase History Analysis
+    st.subheader("Customer Purchase History")
+
+    # Customers are identified by phone number; their bills come from the index
+    selection = select_customer(billing_data, version, key="history_customer")
+    if selection is None:
+        return
+    profile, rows = selection
+    selected_customer = profile['Customer']
+
+    if len(rows) == 0:
+        st.info("No purchase data available for this customer.")
+        return
+
+    # Show customer metrics
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Total Visits", f"{profile['Visits']}")
+    with col2:
+        st.metric("Total Spent", f"₹{profile['Total Spent']:,.2f}")
+    with col3:
+        st.metric("Avg. Bill Amount", f"₹{profile['Total Spent'] / profile['Visits']:,.2f}")
+    with col4:
+        days_since_last = (datetime.now() - profile['Last Visit']).days
+        st.metric("Last Visit", f"{days_since_last} days ago")
+
+    # Purchase timeline (the index keeps each customer's bills in date order)
+    st.subheader("Purchase Timeline")
+    purchase_history = billing_data.iloc[rows]
+    fig = px.line(purchase_history,
+                  x='Date',
+                  y='Total',
+                  markers=True,
+                  title=f"Purchase History for {selected_customer}",
+                  labels={'Total': 'Bill Amount (₹)', 'Date': 'Purchase Date'})
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Purchase details table
+    st.subheader("Purchase Details")
+    purchase_details = purchase_history[['Date', 'Bill Number', 'Total', 'Total Items']]
+    purchase_details = purchase_details.sort_values('Date', ascending=False)
+    purchase_details.columns = ['Purchase Date', 'Bill Number', 'Amount (₹)', 'Items Purchased']
+    st.dataframe(purchase_details, use_container_width=True)
+
+
+def render_category_preferences(billing_data, line_items, version):
+    import plotly.express as px
+    # Product Category Preferences by Customer
+    st.subheader("Category Preferences Analysis")
+
+    # Check if we have category data
+    if 'Cosmetic Count' not in billing_data.columns:
+        st.info("Category data not available. Please ensure bills contain product information.")
+        return
+
+    # Customer selector
+    selection = select_customer(billing_data, version, key="cat_pref_customer")
+    if selection is None:
+        return
+    profile, customer_rows = selection
+    selected_customer = profile['Customer']
+    customer_data = billing_data.iloc[customer_rows]
+
+    if customer_data.empty:
+        st.info("No purchase data available for this customer.")
+        return
+
+    # Create category preference pie chart
+    category_data = pd.DataFrame({
+        'Category': ['Cosmetics', 'Grocery', 'Drinks'],
+        'Count': [customer_data[column].sum() for column in COUNT_COLUMNS]
+    })
+
+    fig = px.pie(category_data,
+                values='Count',
+                names='Category',
+                title=f"Category Preferences for {selected_customer}",
+                color_discrete_sequence=px.colors.sequential.Viridis)
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Show most frequently purchased items if available
+    st.subheader("Most Frequently Purchased Items")
+
+    # Count item frequencies over the customer's bills from the SKU codes and
+    # display the top items in each category
+    columns = st.columns(3)
+    for column, category, label in zip(columns, ('Cosmetics', 'Groceries', 'Drinks'), ('Cosmetic', 'Grocery', 'Drink')):
+        counts = analytics_frames.item_counts(line_items, category, customer_rows)
+        with column:
+            st.write(f"Top {label} Items")
+            if not counts.empty:
+                st.dataframe(counts.head(5), use_container_width=True)
+            else:
+                st.info(f"No {label.lower()} items purchased")
+
+
+def render_rfm(billing_data, line_items, version):
+    import plotly.express as px
+    # RFM (Recency, Frequency, Monetary) Analysis
+    st.subheader("RFM Customer Segmentation")
+
+    if len(billing_data) == 0:
+        st.info("Not enough data for RFM analysis. Please generate more bills.")
+        return
+    rfm, segment_counts, segment_metrics = compute_rfm(version, billing_data)
+
+    # Display RFM segments
+    fig = px.pie(segment_counts,
+                values='Count',
+                names='Segment',
+                title='Customer Segments Distribution',
+                color_discrete_sequence=px.colors.sequential.RdBu)
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.dataframe(segment_metrics.style.format({
+        'Avg. Days Since Last Purchase': '{:.1f}',
+        'Avg. Purchase Frequency': '{:.1f}',
+        'Avg. Spending (₹)': '₹{:,.2f}'
+    }), use_container_width=True)
+
+    # Show customer details by segment
+    selected_segment = st.selectbox("Select Segment to View Customers", rfm['Segment'].unique())
+    segment_customers = rfm[rfm['Segment'] == selected_segment].sort_values('RFM_Score', ascending=False)
+
+    st.dataframe(segment_customers[['Customer Name', 'Recency', 'Frequency', 'Monetary', 'RFM_Score']].style.format({
+        'Recency': '{:.0f} days',
+        'Monetary': '₹{:,.2f}'
+    }), use_container_width=True)
+
+    # Recommendations based on segments
+    st.subheader("Recommended Actions")
+
+    recommendations = {
+        'Champions': "These are your best customers! Reward them with loyalty programs, exclusive offers, and premium services.",
+        'Loyal Customers': "Focus on maintaining their loyalty with personalized offers and regular communication.",
+        'Potential Loyalists': "Encourage more frequent purchases with targeted promotions and incentives.",
+        'At Risk': "Re-engage these customers with special offers, discounts, or personalized outreach.",
+        'Needs Attention': "Consider recovery campaigns with significant incentives to bring these customers back."
+    }
+
+    st.info(recommendations.get(selected_segment, "No specific recommendations available."))
+
+
+def render_retention(billing_data, line_items, version):
+    import plotly.express as px
+    # Customer Retention Analysis
+    st.subheader("Customer Retention Analysis")
+
+    if len(billing_data) == 0:
+        st.info("Not enough data for retention analysis. Please generate more bills.")
+        return
+    customer_activity, status_counts, monthly_active = compute_retention(version, billing_data, datetime.now().date())
+
+    fig = px.pie(status_counts,
+                values='Count',
+                names='Status',
+                title='Customer Status Distribution',
+                color_discrete_map={'Active': 'green', 'Inactive': 'orange', 'Churned': 'red'})
+    st.plotly_chart(fig, use_container_width=True)
+
+    fig = px.line(monthly_active,
+                 x='Month',
+                 y='Active Customers',
+                 markers=True,
+                 title='Monthly Active Customers',
+                 labels={'Month': 'Month', 'Active Customers': 'Number of Active Customers'})
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Customer churn risk
+    st.subheader("Customers at Risk of Churning")
+    at_risk = customer_activity[
+        (customer_activity['Status'] == 'Inactive') &
+        (customer_activity['Purchase Count'] > 1)
+    ].sort_values('Days Since Last Purchase', ascending=False)
+
+    if not at_risk.empty:
+        at_risk_display = at_risk[['Customer Name', 'Last Purchase', 'Purchase Count', 'Days Since Last Purchase']]
+        at_risk_display.columns = ['Customer Name', 'Last Purchase Date', 'Total Purchases', 'Days Since Last Purchase']
+
+        st.dataframe(at_risk_display, use_container_width=True)
+
+        # Recommended re-engagement strategy
+        st.subheader("Re-engagement Recommendations")
+        st.info("Consider sending personalized offers to these customers based on their previous purchase history. "
+               "A discount on their favorite product categories could encourage them to return.")
+    else:
+        st.info("No customers currently at risk of churning.")
+
+
+def render_sales_by_category(billing_data, line_items, version):
+    import plotly.express as px
+    # Sales by Category Analysis
+    st.subheader("Sales by Category")
+
+    if 'Cosmetic Count' not in billing_data.columns or len(billing_data) == 0:
+        st.info("Category data not available. Please ensure bills contain product information.")
+        return
+    category_data, monthly_category_long = compute_sales_by_category(version, billing_data)
+
+    if category_data.empty:
+        st.info("No category data available for analysis.")
+        return
+
+    # Create a pie chart for category distribution
+    fig = px.pie(category_data,
+                values='Item Count',
+                names='Category',
+                title='Sales Distribution by Category',
+                color_discrete_sequence=px.colors.qualitative.Pastel)
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Create line chart
+    fig = px.line(monthly_category_long,
+                 x='YearMonth',
+                 y='Count',
+                 color='Category',
+                 markers=True,
+                 title='Category Sales Trends Over Time',
+                 labels={'YearMonth': 'Month', 'Count': 'Number of Items Sold'})
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def render_product_performance(billing_data, line_items, version):
+    import plotly.express as px
+    # Product Performance Analysis
+    st.subheader("Product Performance Analysis")
+
+    if 'Cosmetic Count' not in billing_data.columns or len(billing_data) == 0:
+        st.info("Product data not available. Please ensure bills contain product information.")
+        return
+    all_products_df = compute_product_performance(version, line_items)
+
+    if all_products_df is None:
+        st.info("No product data available for analysis.")
+        return
+
+    # Top 10 products overall
+    top_products = all_products_df.sort_values('Count', ascending=False).head(10)
+
+    fig = px.bar(top_products,
+               x='Count',
+               y='Item',
+               color='Category',
+               title='Top 10 Best-Selling Products',
+               labels={'Count': 'Number of Sales', 'Item': 'Product'},
+               orientation='h')
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Allow filtering by category
+    selected_category = st.selectbox(
+        "Select Category for Detailed Analysis",
+        ['All Categories'] + list(all_products_df['Category'].unique())
+    )
+
+    if selected_category == 'All Categories':
+        filtered_products = all_products_df
+    else:
+        filtered_products = all_products_df[all_products_df['Category'] == selected_category]
+
+    # Show detailed table
+    st.subheader(f"Detailed Product Performance: {selected_category}")
+    st.dataframe(filtered_products.sort_values('Count', ascending=False), use_container_width=True)
+
+
+def render_cross_category(billing_data, line_items, version):
+    import plotly.graph_objects as go
+    # Cross-Category Insights
+    st.subheader("Cross-Category Purchase Insights")
+
+    if 'Cosmetic Count' not in billing_data.columns or len(billing_data) == 0:
+        st.info("Category data not available. Please ensure bills contain product information.")
+        return
+    co_occurrence = compute_cross_category(version, billing_data)
+    total_cosmetics, total_grocery, total_drinks = np.diag(co_occurrence)
+    cosmetics_and_grocery = co_occurrence[0, 1]
+    cosmetics_and_drinks = co_occurrence[0, 2]
+    grocery_and_drinks = co_occurrence[1, 2]
+
+    # Create heatmap
+    categories = ['Cosmetics', 'Grocery', 'Drinks']
+    fig = go.Figure(data=go.Heatmap(
+        z=co_occurrence,
+        x=categories,
+        y=categories,
+        colorscale='Viridis',
+        showscale=True
+    ))
+
+    fig.update_layout(
+        title='Category Co-occurrence Matrix',
+        xaxis_title='Category',
+        yaxis_title='Category'
+    )
+
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Calculate and display cross-selling insights
+    st.subheader("Cross-Selling Opportunities")
+
+    insights = []
+    if total_cosmetics > 0 and total_grocery > 0:
+        cosmetics_to_grocery = cosmetics_and_grocery / total_cosmetics * 100
+        grocery_to_cosmetics = cosmetics_and_grocery / total_grocery * 100
+        insights.append(f"• {cosmetics_to_grocery:.1f}% of customers who buy Cosmetics also buy Grocery items")
+        insights.append(f"• {grocery_to_cosmetics:.1f}% of customers who buy Grocery items also buy Cosmetics")
+
+    if total_cosmetics > 0 and total_drinks > 0:
+        cosmetics_to_drinks = cosmetics_and_drinks / total_cosmetics * 100
+        drinks_to_cosmetics = cosmetics_and_drinks / total_drinks * 100
+        insights.append(f"• {cosmetics_to_drinks:.1f}% of customers who buy Cosmetics also buy Drinks")
+        insights.append(f"• {drinks_to_cosmetics:.1f}% of customers who buy Drinks also buy Cosmetics")
+
+    if total_grocery > 0 and total_drinks > 0:
+        grocery_to_drinks = grocery_and_drinks / total_grocery * 100
+        drinks_to_grocery = grocery_and_drinks / total_drinks * 100
+        insights.append(f"• {grocery_to_drinks:.1f}% of customers who buy Grocery items also buy Drinks")
+        insights.append(f"• {drinks_to_grocery:.1f}% of customers who buy Drinks also buy Grocery items")
+
+    if insights:
+        for insight in insights:
+            st.write(insight)
+
+        # Recommendations based on insights
+        st.subheader("Recommendations")
+        st.info("Consider these cross-selling strategies based on purchase patterns:\n" +
+               "1. Bundle frequently co-purchased items for special promotions\n" +
+               "2. Place related items from different categories near each other in store layout\n" +
+               "3. Offer targeted discounts on complementary products from different categories")
     else:
-        st.info("Need at least 7 days of data for revenue prediction.")
\ No newline at end of file
+        st.info("Not enough cross-category purchase data for insights.")
+
+
+def render_seasonal(billing_data, line_items, version):
+    import plotly.express as px
+    # Seasonal Trends Analysis
+    st.subheader("Seasonal Product Trends")
+
+    if 'Cosmetic Count' not in billing_data.columns or len(billing_data) == 0:
+        st.info("Category data not available for seasonal analysis. Please ensure bills contain product information.")
+        return
+    seasonal_data_long, monthly_data_long = compute_seasonal(version, billing_data)
+
+    fig = px.bar(seasonal_data_long,
+                x='Season',
+                y='Count',
+                color='Category',
+                title='Seasonal Category Sales',
+                barmode='group',
+                labels={'Count': 'Number of Items Sold', 'Season': 'Season'})
+
+    st.plotly_chart(fig, use_container_width=True)
+
+    fig = px.line(monthly_data_long,
+                 x='Month Name',
+                 y='Count',
+                 color='Category',
+                 markers=True,
+                 title='Monthly Category Sales Trends',
+                 labels={'Count': 'Number of Items Sold', 'Month Name': 'Month'},
+                 category_orders={'Month Name': list(calendar.month_name)[1:13]})
+
+    st.plotly_chart(fig, use_container_width=True)
+
+    # Seasonal product recommendations
+    st.subheader("Seasonal Inventory Recommendations")
+
+    # Get the current season
+    current_season = get_season(datetime.now().month)
+    next_season = SEASON_ORDER[(SEASON_ORDER.index(current_season) + 1) % 4]
+
+    st.write(f"Current Season: **{current_season}**")
+    st.write(f"Preparing for Next Season: **{next_season}**")
+
+    # Recommendations based on seasonal data
+    season_recommendations = {
+        'Winter': "Focus on stocking more grocery essentials and hot beverages. Consider winter skincare cosmetics.",
+        'Spring': "Increase inventory of fresh produce and cleaning supplies. Spring-themed cosmetics and refreshing drinks.",
+        'Summer': "Stock up on cold beverages, summer fruits, and sun protection cosmetics.",
+        'Fall': "Prepare for seasonal grocery items, warm drinks, and moisturizing cosmetics."
+    }
+
+    st.info(f"**Recommendation for {next_season}**: {season_recommendations.get(next_season, '')}")
+
+
+def render_forecast(billing_data, line_items, version):
+    import plotly.express as px
+    predictions, days_fitted, updated = compute_forecast(version, datetime.now().date())
+    if days_fitted == 0:
+        st.info("Forecasts are made from closed days. They will appear after the first day of bills has closed.")
+        return
+
+    errors = predictions["mean_absolute_error"]
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Days Fitted", f"{days_fitted:,d}")
+    with col2:
+        hw_error = errors.get("holt_winters")
+        st.metric("Holt-Winters Error (MAE)", f"₹{hw_error:,.2f}" if hw_error is not None else "Warming up")
+    with col3:
+        weekday_error = errors.get("weekday")
+        st.metric("Weekday Baseline Error (MAE)", f"₹{weekday_error:,.2f}" if weekday_error is not None else "-")
+
+    # Daily revenue forecast of both models
+    daily = pd.DataFrame(predictions["daily"]).rename(columns={
+        'date': 'Date',
+        'weekday': 'Weekday',
+        'holt_winters': 'Holt-Winters',
+        'weekday_baseline': 'Weekday Baseline'
+    })
+    # Holt-Winters is None until it has warmed up
+    daily[['Holt-Winters', 'Weekday Baseline']] = daily[['Holt-Winters', 'Weekday Baseline']].astype(float)
+    fig = px.line(daily, x='Date', y=['Holt-Winters', 'Weekday Baseline'], markers=True,
+                  title=f'Daily Revenue Forecast for the Next {len(daily)} Days',
+                  labels={'value': 'Revenue (₹)', 'variable': 'Model'})
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(daily.style.format({
+        'Holt-Winters': '₹{:,.2f}',
+        'Weekday Baseline': '₹{:,.2f}'
+    }, na_rep='-'), use_container_width=True, hide_index=True)
+
+    # Expected revenue by hour of the day for today
+    hourly = pd.DataFrame(predictions["hourly"])
+    hourly = hourly[hourly['share'] > 0]
+    if not hourly.empty:
+        fig = px.bar(hourly, x='hour', y='expected_revenue',
+                     title="Today's Expected Revenue by Hour",
+                     labels={'hour': 'Hour of Day', 'expected_revenue': 'Revenue (₹)'})
+        st.plotly_chart(fig, use_container_width=True)
+
+    # Per-product demand
+    st.subheader(f"Expected Product Demand (next {predictions['sku_horizon']} days)")
+    skus = pd.DataFrame(predictions["skus"])
+    if not skus.empty:
+        skus.columns = ['Product', 'Expected Demand', 'Smoothed Daily Sales', 'Average Daily Sales']
+        st.dataframe(skus.head(25), use_container_width=True, hide_index=True)
+    else:
+        st.info("No product sales in the fitted days.")
+    st.caption(f"Models updated {updated}. They are refit incrementally once a day, when the previous day has closed.")
+
+
+# (heading, {section name: (renderer, span name of its computation)})
+SECTIONS = {
+    "📊 Overview Statistics": {
+        "Key Metrics": (render_key_metrics, "analytics.key_metrics"),
+        "Growth Analysis": (render_growth, "analytics.growth")
+    },
+    "📅 Time Analysis": {
+        "Daily Trends": (render_daily_trends, "analytics.daily_trends"),
+        "Hourly Analysis": (render_hourly, "analytics.hourly"),
+        "Monthly Overview": (render_monthly_overview, "analytics.monthly_overview")
+    },
+    "👥 Customer Insights": {
+        "Top Customers": (render_top_customers, "analytics.top_customers"),
+        "Customer Distribution": (render_customer_distribution, None),
+        "Purchase History": (render_purchase_history, "analytics.customer_index"),
+        "Category Preferences": (render_category_preferences, "analytics.customer_index"),
+        "RFM Analysis": (render_rfm, "analytics.rfm"),
+        "Customer Retention": (render_retention, "analytics.retention")
+    },
+    "📦 Product Analytics": {
+        "Sales by Category": (render_sales_by_category, "analytics.sales_by_category"),
+        "Product Performance": (render_product_performance, "analytics.product_performance"),
+        "Cross-Category Insights": (render_cross_category, "analytics.cross_category"),
+        "Seasonal Trends": (render_seasonal, "analytics.seasonal")
+    },
+    "🔮 Revenue Forecast": {
+        "Forecast": (render_forecast, "analytics.forecast")
+    }
+}
+
+
+def get_compute_count(stage):
+    """Number of times a section's computation has run in this process."""
+    histogram = tracing.registry.histograms.get(stage)
+    return histogram.count if histogram else 0
+
+
+def run_section(name, renderer, stage, billing_data, line_items, version):
+    """
+    Render one section, timing it and, if enabled, profiling it.
+
+    The section's wall time and whether its computation was served from the
+    cache are kept in st.session_state.section_timings for the overlay.
+    """
+    profiler = None
+    if profile_sections:
+        import cProfile
+        profiler = cProfile.Profile()
+    computed_before = get_compute_count(stage) if stage else 0
+    start = time.perf_counter()
+    with tracing.span(f"analytics.render.{name}"):
+        if profiler:
+            profiler.enable()
+        try:
+            renderer(billing_data, line_items, version)
+        finally:
+            if profiler:
+                profiler.disable()
+    elapsed = time.perf_counter() - start
+
+    computed = stage is not None and get_compute_count(stage) > computed_before
+    compute_seconds = tracing.registry.histograms[stage].last if computed else None
+    st.session_state.setdefault("section_timings", {})[name] = {
+        "Section": name,
+        "Run (ms)": round(elapsed * 1000, 1),
+        "Compute (ms)": round(compute_seconds * 1000, 1) if compute_seconds is not None else None,
+        "Cache": "-" if stage is None else ("miss" if computed else "hit"),
+        "At": datetime.now().strftime("%H:%M:%S")
+    }
+
+    if show_timings:
+        if stage is None:
+            detail = "not cached"
+        elif computed:
+            detail = f"computed in {compute_seconds * 1000:,.1f} ms"
+        else:
+            detail = "served from cache"
+        st.caption(f"⏱️ {name}: {elapsed * 1000:,.1f} ms ({detail})")
+    if profiler:
+        import io
+        import pstats
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(25)
+        with st.expander(f"Profile of {name}"):
+            st.code(output.getvalue())
+
+
+# Load the billing data
+loaded_data = load_billing_data()
+billing_data, line_items, data_version = loaded_data if loaded_data is not None else (None, None, None)
+
+if billing_data is None:
+    st.warning("No billing data found. Please generate some bills first.")
+    st.info("The dashboard will automatically update when new bills are generated.")
+else:
+    # Only the selected section is computed and drawn
+    heading = st.radio("Section", list(SECTIONS), horizontal=True, label_visibility="collapsed")
+    st.subheader(heading)
+    sections = SECTIONS[heading]
+    section = st.radio(heading, list(sections), horizontal=True, key=f"section_{heading}",
+                       label_visibility="collapsed")
+    renderer, stage = sections[section]
+    run_section(section, renderer, stage, billing_data, line_items, data_version)
+
+if show_timings and st.session_state.get("section_timings"):
+    with st.sidebar:
+        st.write("Section timings (this session)")
+        st.dataframe(pd.DataFrame(list(st.session_state.section_timings.values())), hide_index=True)
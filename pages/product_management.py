@@ -1,15 +1,27 @@
 import streamlit as st
 import pandas as pd
 import os
-import json
 from datetime import datetime
 import sys
-import pickle
 
 # Add the parent directory to the Python path
 sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
 
-from utils.data import cosmetic_products, grocery_products, drink_products, prices
+from utils.catalog import (
+    load_product_data,
+    save_product_data,
+    load_inventory_data,
+    locked_inventory,
+    update_prices_file,
+    search_products
+)
+from utils.replenishment import (
+    SalesVelocity,
+    get_reorder_recommendations,
+    DEFAULT_LEAD_TIME_DAYS,
+    DEFAULT_REVIEW_DAYS,
+    DEFAULT_SERVICE_LEVEL_Z
+)
 from utils.ui import set_page_style, display_success_message, display_error_message
 
 # Set page config
@@ -22,78 +34,10 @@ st.set_page_config(
 # Apply custom styling
 set_page_style()
 
-# Define file paths for product data and inventory
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-os.makedirs(DATA_DIR, exist_ok=True)
-PRODUCTS_FILE = os.path.join(DATA_DIR, "products.json")
-INVENTORY_FILE = os.path.join(DATA_DIR, "inventory.json")
-
 # Initialize session state for search results
 if "search_results" not in st.session_state:
     st.session_state.search_results = []
 
-# Function to load product data
-def load_product_data():
-    if os.path.exists(PRODUCTS_FILE):
-        with open(PRODUCTS_FILE, 'r') as f:
-            return json.load(f)
-    else:
-        # Initialize with existing data from utils/data.py
-        products = {
-            "Cosmetics": cosmetic_products,
-            "Groceries": grocery_products,
-            "Drinks": drink_products
-        }
-        save_product_data(products)
-        return products
-
-# Function to save product data
-def save_product_data(products):
-    with open(PRODUCTS_FILE, 'w') as f:
-        json.dump(products, f, indent=4)
-
-# Function to load inventory data
-def load_inventory_data():
-    if os.path.exists(INVENTORY_FILE):
-        with open(INVENTORY_FILE, 'r') as f:
-            return json.load(f)
-    else:
-        # Initialize empty inventory
-        inventory = {}
-        # Add all existing products with default inventory of 10
-        products = load_product_data()
-        for category, category_products in products.items():
-            for product_type, variants in category_products.items():
-                for variant in variants:
-                    product_name = variant["name"]
-                    inventory[product_name] = {
-                        "quantity": 10,
-                        "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    }
-        save_inventory_data(inventory)
-        return inventory
-
-# Function to save inventory data
-def save_inventory_data(inventory):
-    with open(INVENTORY_FILE, 'w') as f:
-        json.dump(inventory, f, indent=4)
-
-# Function to update prices.py
-def update_prices_file():
-    products = load_product_data()
-    all_prices = {}
-    
-    for category, category_products in products.items():
-        for product_type, variants in category_products.items():
-            for variant in variants:
-                all_prices[variant["name"]] = variant["price"]
-    
-    # Save to pickle file for easy loading
-    with open(os.path.join(DATA_DIR, "prices.pkl"), 'wb') as f:
-        pickle.dump(all_prices, f)
-    
-    return all_prices
-
 # Load data
 products = load_product_data()
 inventory = load_inventory_data()
@@ -102,7 +46,7 @@ inventory = load_inventory_data()
 st.title("Product Management System")
 
 # Create tabs for different functions
-tabs = st.tabs(["Product Categories", "Add New Products", "Inventory Management", "Search Products"])
+tabs = st.tabs(["Product Categories", "Add New Products", "Inventory Management", "Reorder Suggestions", "Search Products"])
 
 # Product Categories Tab
 with tabs[0]:
@@ -191,12 +135,13 @@ with tabs[1]:
                             })
                             save_product_data(products)
                             
-                            # Add to inventory
-                            inventory[product_name] = {
-                                "quantity": initial_stock,
-                                "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                            }
-                            save_inventory_data(inventory)
+                            # Add to inventory, read again under its lock so
+                            # that sales billed meanwhile are kept
+                            with locked_inventory() as inventory:
+                                inventory[product_name] = {
+                                    "quantity": initial_stock,
+                                    "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                                }
                             
                             # Update prices
                             update_prices_file()
@@ -216,8 +161,10 @@ with tabs[2]:
     search_term = st.text_input("Search Product", key="inventory_search")
     
     if search_term:
-        # Filter inventory based on search term
-        filtered_inventory = {k: v for k, v in inventory.items() if search_term.lower() in k.lower()}
+        # Filter inventory based on search term, best matches first and typos allowed
+        matches = [result["name"] for result in search_products(products, inventory, {}, search_term)]
+        matches += [k for k in inventory if search_term.lower() in k.lower() and k not in matches]
+        filtered_inventory = {k: inventory[k] for k in matches if k in inventory}
         
         if filtered_inventory:
             # Convert to DataFrame for better display
@@ -259,9 +206,9 @@ with tabs[2]:
                     submitted = st.form_submit_button("Update Inventory")
                     
                     if submitted:
-                        inventory[selected_product]["quantity"] = new_qty
-                        inventory[selected_product]["last_updated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        save_inventory_data(inventory)
+                        with locked_inventory() as inventory:
+                            inventory[selected_product]["quantity"] = new_qty
+                            inventory[selected_product]["last_updated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                         display_success_message(f"Inventory for '{selected_product}' updated successfully!")
                         st.rerun()
         else:
@@ -279,8 +226,69 @@ with tabs[2]:
         
         st.dataframe(inventory_df)
 
-# Search Products Tab
+# Reorder Suggestions Tab
+@st.cache_resource
+def get_sales_velocity():
+    """Sales history shared by all sessions; refreshed from the bill manifests that changed."""
+    return SalesVelocity()
+
 with tabs[3]:
+    st.header("Reorder Suggestions")
+    st.caption("Computed from the last 28 days of sales: products at or below their reorder point "
+               "get an order that covers the lead time and the days until the next order.")
+
+    param_col1, param_col2, param_col3 = st.columns(3)
+    with param_col1:
+        lead_time = st.number_input("Supplier Lead Time (days)", min_value=0.0, step=1.0, value=float(DEFAULT_LEAD_TIME_DAYS))
+    with param_col2:
+        review_days = st.number_input("Days Between Orders", min_value=1.0, step=1.0, value=float(DEFAULT_REVIEW_DAYS))
+    with param_col3:
+        service_z = st.number_input("Safety Stock (std. deviations)", min_value=0.0, step=0.1, value=DEFAULT_SERVICE_LEVEL_Z)
+
+    sales_velocity = get_sales_velocity()
+    sales_velocity.refresh()
+    recommendations = get_reorder_recommendations(
+        sales_velocity,
+        inventory,
+        products,
+        lead_time_days=lead_time,
+        review_days=review_days,
+        service_level_z=service_z
+    )
+    to_reorder = recommendations[recommendations["Suggested Order"] > 0]
+
+    metric_col1, metric_col2, metric_col3 = st.columns(3)
+    metric_col1.metric("Products to Reorder", len(to_reorder))
+    metric_col2.metric("Out of Stock", int((recommendations["Status"] == "Out of stock").sum()))
+    metric_col3.metric("Units to Order", int(to_reorder["Suggested Order"].sum()))
+
+    show_all = st.checkbox("Show all products", value=False)
+    st.dataframe(recommendations if show_all else to_reorder, hide_index=True)
+
+    if not to_reorder.empty:
+        st.download_button(
+            "Download Purchase Order (CSV)",
+            to_reorder[["Product", "Category", "Stock", "Suggested Order"]].to_csv(index=False),
+            file_name=f"purchase_order_{datetime.now().strftime('%Y%m%d')}.csv",
+            mime="text/csv"
+        )
+
+        with st.form("receive_order_form"):
+            st.write("Receive Stock")
+            received = st.multiselect("Products received with their suggested quantity", list(to_reorder["Product"]))
+            if st.form_submit_button("Add to Inventory") and received:
+                suggested = dict(zip(to_reorder["Product"], to_reorder["Suggested Order"]))
+                now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                with locked_inventory() as inventory:
+                    for product in received:
+                        entry = inventory.setdefault(product, {"quantity": 0})
+                        entry["quantity"] += int(suggested[product])
+                        entry["last_updated"] = now
+                display_success_message(f"Stock added for {len(received)} product(s)")
+                st.rerun()
+
+# Search Products Tab
+with tabs[4]:
     st.header("Search Products")
     
     search_col1, search_col2 = st.columns([3, 1])
@@ -292,27 +300,24 @@ with tabs[3]:
         search_category = st.selectbox("Category Filter", ["All Categories"] + list(products.keys()))
     
     if st.button("Search"):
-        results = []
-        
-        if search_category == "All Categories":
-            categories_to_search = products.keys()
-        else:
-            categories_to_search = [search_category]
-        
-        for category in categories_to_search:
-            for product_type, variants in products[category].items():
-                for variant in variants:
-                    if search_term.lower() in variant["name"].lower():
-                        # Check inventory
-                        stock = inventory.get(variant["name"], {}).get("quantity", 0)
-                        
-                        results.append({
-                            "Category": category,
-                            "Type": product_type,
-                            "Name": variant["name"],
-                            "Price": variant["price"],
-                            "Stock": stock
-                        })
+        # Ranked by similarity, so misspelt names are found too
+        results = [
+            {
+                "Category": result["category"],
+                "Type": result["type"],
+                "Name": result["name"],
+                "Price": result["price"],
+                "Stock": result["stock"],
+                "Match": result["score"]
+            }
+            for result in search_products(
+                products,
+                inventory,
+                {},
+                search_term,
+                None if search_category == "All Categories" else search_category
+            )
+        ]
         
         if results:
             st.session_state.search_results = results
@@ -352,8 +357,8 @@ with tabs[3]:
                         })
                         
                         # Update inventory
-                        inventory[product_info["Name"]]["quantity"] -= quantity
-                        save_inventory_data(inventory)
+                        with locked_inventory() as inventory:
+                            inventory[product_info["Name"]]["quantity"] -= quantity
                         
                         display_success_message(f"Added {quantity} x {product_info['Name']} to bill!")
                         st.rerun()
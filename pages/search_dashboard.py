@@ -1,13 +1,32 @@
 import streamlit as st
 import os
-import base64
-import fitz
 import pandas as pd
 from datetime import datetime
-from PIL import Image
 import io
-import glob
 import re
+import sys
+import html
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from utils import bill_store
+from utils.trigram_index import BillIndex
+from utils.excel_export import stream_rows_to_excel, format_export_stats
+
+# Results are kept server side in the session and shown one page at a time:
+# only the page's rows get widgets, file sizes and a DataFrame, so a broad
+# date range costs the same to render as a narrow one
+PAGE_SIZES = [10, 25, 50, 100]
+# Sort option -> (key, descending); "Best match" keeps the search order
+SORT_OPTIONS = {
+    "Best match": None,
+    "Newest first": (lambda bill: bill['created'], True),
+    "Oldest first": (lambda bill: bill['created'], False),
+    "Total: high to low": (lambda bill: bill['total'] or 0, True),
+    "Total: low to high": (lambda bill: bill['total'] or 0, False),
+    "Customer name": (lambda bill: (bill['customer_name'] or '').lower(), False)
+}
 
 def extract_bill_number_from_filename(filename):
     """Extract bill number from filename"""
@@ -23,58 +42,96 @@ def extract_bill_number_from_filename(filename):
     except Exception:
         return None
 
-def get_bill_files():
-    """Get list of bill files in the bills folder with metadata"""
-    bills_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'saved_bills')
+def get_bills_folder():
+    """Get the root folder of the partitioned bill store"""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'saved_bills')
+
+@st.cache_resource
+def get_bill_index():
+    """Trigram index of the bill numbers and customer names, shared across reruns and sessions"""
+    return BillIndex(get_bills_folder())
+
+def get_bill_files(start_date=None, end_date=None):
+    """Get list of bill files in the bills folder with metadata.
+    
+    Only the date partitions between start_date and end_date are opened, and the
+    metadata comes from the partition manifests instead of the bill files. File
+    sizes are left to get_page, which looks them up for the bills shown.
+    """
+    bills_folder = get_bills_folder()
     if not os.path.exists(bills_folder):
         st.error("Bills folder not found.")
         return []
     
     bill_files = []
-    for file in glob.glob(os.path.join(bills_folder, "*.txt")):
+    for entry in bill_store.iter_bills(bills_folder, start_date, end_date):
+        # Artifacts may be loose files or packed in the day's segment file
+        if not bill_store.has_artifact(entry, "txt"):
+            continue
+        file = bill_store.get_entry_file(entry, "txt")
         filename = os.path.basename(file)
         bill_number = extract_bill_number_from_filename(filename)
         
-        created_time = os.path.getctime(file)
-        modified_time = os.path.getmtime(file)
-        size_bytes = os.path.getsize(file)
-        size_kb = size_bytes / 1024
-        
-        # Try to find corresponding TXT file for metadata
-        txt_file = file.replace('.pdf', '.txt')
-        customer_name = None
-        total_amount = None
-        
-        if os.path.exists(txt_file):
-            try:
-                with open(txt_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                    customer_match = re.search(r'Customer Name: (.+)', content)
-                    if customer_match:
-                        customer_name = customer_match.group(1).strip()
-                    
-                    total_match = re.search(r'Total:\s+(\d+\.\d+)', content)
-                    if total_match:
-                        total_amount = float(total_match.group(1))
-            except Exception:
-                pass
+        try:
+            created = datetime.strptime(entry['date'], bill_store.MANIFEST_DATE_FORMAT)
+        except (KeyError, ValueError):
+            created = datetime.fromtimestamp(os.path.getctime(entry['partition']))
         
         bill_files.append({
             'filename': filename,
             'bill_number': bill_number,
             'path': file,
-            'created': datetime.fromtimestamp(created_time),
-            'modified': datetime.fromtimestamp(modified_time),
-            'size': size_kb,
-            'customer_name': customer_name,
-            'total': total_amount
+            'created': created,
+            'modified': created,
+            'customer_name': entry.get('customer_name'),
+            'total': entry.get('total'),
+            'entry': entry
         })
     
     bill_files.sort(key=lambda x: x['created'], reverse=True)
     return bill_files
 
-def display_pdf(pdf_path):
-    """Display PDF file in Streamlit with enhanced UI"""
+def get_partition_signature(start_date, end_date):
+    """Manifest modification times of the partitions in a date range, which change with every saved bill"""
+    signature = []
+    for partition_date, partition_dir in bill_store.list_partitions(get_bills_folder(), start_date, end_date):
+        try:
+            signature.append((partition_date, os.stat(os.path.join(partition_dir, bill_store.MANIFEST_FILE)).st_mtime_ns))
+        except FileNotFoundError:
+            continue
+    return tuple(signature)
+
+@st.cache_resource(max_entries=4)
+def get_cached_bill_files(start_date, end_date, signature):
+    """get_bill_files, read again only when a partition of the range changes (see get_partition_signature)"""
+    return get_bill_files(start_date, end_date)
+
+def sort_bills(bills, sort_by):
+    """Order search results by one of SORT_OPTIONS"""
+    option = SORT_OPTIONS[sort_by]
+    if option is None:
+        return bills
+    key, descending = option
+    return sorted(bills, key=key, reverse=descending)
+
+def get_page(bills, offset, page_size):
+    """Materialize one page of results, with the file sizes of its bills"""
+    return [
+        dict(bill, size=(bill_store.get_artifact_size(bill['entry'], "txt") or 0) / 1024)
+        for bill in bills[offset:offset + page_size]
+    ]
+
+def set_offset(offset):
+    """Move the results cursor (the index of the first bill shown)"""
+    st.session_state.search_offset = offset
+
+def display_pdf(pdf_data, file_name, filetype="pdf"):
+    """Display PDF file in Streamlit with enhanced UI
+    
+    The document is passed as bytes so that bills packed in segment files can
+    be shown without extracting them to disk.
+    """
+    mime = "application/pdf" if filetype == "pdf" else "text/plain"
     try:
         # Add a professional header for the PDF viewer
         st.markdown("""
@@ -92,20 +149,21 @@ def display_pdf(pdf_path):
         # Read PDF file and create images for preview
         try:
             # Create a download button for the PDF
-            with open(pdf_path, "rb") as file:
-                pdf_data = file.read()
-                st.download_button(
-                    label="📥 Download PDF",
-                    data=pdf_data,
-                    file_name=os.path.basename(pdf_path),
-                    mime="application/pdf",
-                )
+            st.download_button(
+                label="📥 Download PDF",
+                data=pdf_data,
+                file_name=file_name,
+                mime=mime,
+            )
             
             # Display PDF Preview header
             st.write("### PDF Preview")
             
-            # Use PyMuPDF to render PDF pages as images
-            doc = fitz.open(pdf_path)
+            # Use PyMuPDF to render PDF pages as images (imported here so the
+            # page loads without the PDF libraries until a bill is opened)
+            import fitz
+            from PIL import Image
+            doc = fitz.open(stream=pdf_data, filetype=filetype)
             for page_num in range(min(3, len(doc))):  # Show first 3 pages
                 page = doc.load_page(page_num)
                 pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # Zoom factor 2
@@ -128,14 +186,13 @@ def display_pdf(pdf_path):
             
             # Fallback to download only if preview fails
             st.warning("PDF preview could not be generated. Please download the PDF to view it.")
-            with open(pdf_path, "rb") as file:
-                st.download_button(
-                    label="📥 Download PDF",
-                    data=file,
-                    file_name=os.path.basename(pdf_path),
-                    mime="application/pdf",
-                    use_container_width=True
-                )
+            st.download_button(
+                label="📥 Download PDF",
+                data=pdf_data,
+                file_name=file_name,
+                mime=mime,
+                use_container_width=True
+            )
         
         # Add spacing
         st.markdown("<div style='height: 20px'></div>", unsafe_allow_html=True)
@@ -145,14 +202,13 @@ def display_pdf(pdf_path):
         
         with col1:
             # Download button
-            with open(pdf_path, "rb") as file:
-                st.download_button(
-                    label="📥 Download PDF",
-                    data=file,
-                    file_name=os.path.basename(pdf_path),
-                    mime="application/pdf",
-                    use_container_width=True
-                )
+            st.download_button(
+                label="📥 Download PDF",
+                data=pdf_data,
+                file_name=file_name,
+                mime=mime,
+                use_container_width=True
+            )
         
         with col2:
             # Print button with improved styling
@@ -162,7 +218,8 @@ def display_pdf(pdf_path):
             # Extract text button
             if st.button("📄 Extract Text", use_container_width=True):
                 try:
-                    with fitz.open(pdf_path) as doc:
+                    import fitz
+                    with fitz.open(stream=pdf_data, filetype=filetype) as doc:
                         text = ""
                         for page in doc:
                             text += page.get_text()
@@ -189,10 +246,45 @@ def display_pdf(pdf_path):
     except Exception as e:
         st.error(f"Error displaying PDF: {str(e)}")
 
-def search_bills(bills, search_term, date_range, amount_range, customer_name):
-    """Search bills based on various criteria"""
+def search_bills(bills, search_term, date_range, amount_range, customer_name, bill_index=None):
+    """Search bills based on various criteria
+    
+    With a bill index, bill numbers and customer names are matched by
+    similarity (typos allowed) and the bills come best match first, with the
+    score in 'score'; without one, they are matched as substrings. Substring
+    matches score 1.0 either way, as in catalog.search_products, and a bill
+    whose number is the search term comes first.
+    """
     filtered_bills = bills.copy()
     
+    if bill_index is not None and (search_term or customer_name):
+        # Each field is ranked over the whole index, then the bills on hand
+        # must match every field given and score the mean
+        number_scores = dict(bill_index.search(bill_number=search_term, limit=None)) if search_term else {}
+        name_scores = dict(bill_index.search(customer_name=customer_name, limit=None)) if customer_name else {}
+        ranked = []
+        for bill in filtered_bills:
+            bill_number = bill['entry']['bill_number']
+            scores = []
+            # Substring matches are full matches, as in catalog.search_products
+            if search_term:
+                if (search_term.lower() in bill['filename'].lower()
+                        or (bill['bill_number'] and search_term.lower() in bill['bill_number'].lower())):
+                    scores.append(1.0)
+                else:
+                    scores.append(number_scores.get(bill_number))
+            if customer_name:
+                if bill.get('customer_name') and customer_name.lower() in bill['customer_name'].lower():
+                    scores.append(1.0)
+                else:
+                    scores.append(name_scores.get(bill_number))
+            if None not in scores:
+                ranked.append(dict(bill, score=sum(scores) / len(scores)))
+        exact = search_term.lower() if search_term else None
+        ranked.sort(key=lambda bill: ((bill['bill_number'] or '').lower() != exact, -bill['score']))
+        filtered_bills = ranked
+        search_term = customer_name = None
+    
     # Filter by search term
     if search_term:
         filtered_bills = [
@@ -236,6 +328,10 @@ def main():
         st.session_state.search_results = None
     if 'viewing_bill' not in st.session_state:
         st.session_state.viewing_bill = None
+    if 'search_offset' not in st.session_state:
+        st.session_state.search_offset = 0
+    if 'sorted_results' not in st.session_state:
+        st.session_state.sorted_results = None
     
     st.title("📊 Bill Search Dashboard")
     
@@ -249,13 +345,23 @@ def main():
         with col2:
             st.subheader(f"Viewing Bill: {st.session_state.viewing_bill['filename']}")
         
-        display_pdf(st.session_state.viewing_bill['path'])
+        # Show the PDF when the bill has one, otherwise the text bill
+        entry = st.session_state.viewing_bill['entry']
+        kind = "pdf" if bill_store.has_artifact(entry, "pdf") else "txt"
+        document = bill_store.read_artifact(entry, kind)
+        if document is None:
+            st.error("Bill file not found.")
+            return
+        file_name = os.path.splitext(st.session_state.viewing_bill['filename'])[0] + f".{kind}"
+        display_pdf(document, file_name, filetype=kind)
         return
 
-    # Get bill files
-    bill_files = get_bill_files()
+    if bill_store.has_unmigrated_files(get_bills_folder()):
+        st.info("Some bills are still stored in the old flat layout. Run `python -m utils.bill_store migrate` to include them in the search.")
     
-    if not bill_files:
+    # The date bounds come from the partition directory names, no bill is opened here
+    partitions = bill_store.list_partitions(get_bills_folder())
+    if not partitions:
         st.warning("No bills found in the bills folder.")
         return
     
@@ -273,11 +379,15 @@ def main():
             # Date range filter
             date_range = st.date_input(
                 "📅 Date Range",
-                value=(
-                    min(bill['created'].date() for bill in bill_files),
-                    max(bill['created'].date() for bill in bill_files)
-                )
+                value=(partitions[0][0], partitions[-1][0])
             )
+            # The widget returns a single date while a range is being picked
+            if len(date_range) != 2:
+                date_range = (date_range[0], date_range[0]) if date_range else (partitions[0][0], partitions[-1][0])
+            
+            # Only the partitions of the selected date range are read, and
+            # only again when one of them changes
+            bill_files = get_cached_bill_files(*date_range, get_partition_signature(*date_range))
             
             # Amount range filter - Fixed to handle cases where all bills have the same amount
             bill_amounts = [bill.get('total') for bill in bill_files if bill.get('total') is not None]
@@ -311,13 +421,19 @@ def main():
     if search_clicked or st.session_state.search_results is not None:
         # Update search results if button clicked
         if search_clicked:
+            # Bills saved since the last search are added to the index
+            bill_index = get_bill_index()
+            bill_index.refresh()
             st.session_state.search_results = search_bills(
                 bill_files,
                 search_term,
                 date_range,
                 amount_range,
-                customer_name
+                customer_name,
+                bill_index
             )
+            st.session_state.search_offset = 0
+            st.session_state.sorted_results = None
         
         search_results = st.session_state.search_results
         
@@ -325,41 +441,69 @@ def main():
             st.info("No bills found matching your search criteria.")
             st.session_state.search_results = None
         else:
-            st.success(f"Found {len(search_results)} bills matching your criteria")
+            total_results = len(search_results)
+            st.success(f"Found {total_results} bills matching your criteria")
+            
+            # Sorting and paging happen here, over the results kept in the session
+            sort_col, size_col = st.columns([3, 1])
+            with sort_col:
+                sort_by = st.selectbox("Sort by", list(SORT_OPTIONS), key="search_sort", on_change=set_offset, args=(0,))
+            with size_col:
+                page_size = st.selectbox("Bills per page", PAGE_SIZES, index=1, key="search_page_size", on_change=set_offset, args=(0,))
+            
+            # The sorted order is kept until the results or the sort change
+            if st.session_state.sorted_results is None or st.session_state.sorted_results[0] != sort_by:
+                st.session_state.sorted_results = (sort_by, sort_bills(search_results, sort_by))
+            ordered_results = st.session_state.sorted_results[1]
+            
+            last_offset = (total_results - 1) // page_size * page_size
+            offset = min(st.session_state.search_offset, last_offset)
+            page = get_page(ordered_results, offset, page_size)
+            
+            nav_cols = st.columns([1, 1, 3, 1, 1])
+            nav_cols[0].button("⏮ First", on_click=set_offset, args=(0,), disabled=offset == 0, use_container_width=True)
+            nav_cols[1].button("← Previous", on_click=set_offset, args=(max(0, offset - page_size),), disabled=offset == 0, use_container_width=True)
+            nav_cols[2].markdown(
+                f"<p style='text-align: center; margin-top: 8px;'>Page {offset // page_size + 1} of {last_offset // page_size + 1} "
+                f"(bills {offset + 1}–{offset + len(page)} of {total_results})</p>",
+                unsafe_allow_html=True
+            )
+            nav_cols[3].button("Next →", on_click=set_offset, args=(offset + page_size,), disabled=offset >= last_offset, use_container_width=True)
+            nav_cols[4].button("Last ⏭", on_click=set_offset, args=(last_offset,), disabled=offset >= last_offset, use_container_width=True)
             
             # Create tabs for different views
             tab1, tab2 = st.tabs(["📑 Card View", "📊 Table View"])
             
             with tab1:
-                # Display bills in card format
-                for i, bill in enumerate(search_results):
-                    with st.container():
-                        st.markdown(f"""
-                        <div style='padding: 20px; border-radius: 10px; border: 1px solid #ddd; margin-bottom: 20px;'>
-                            <h3>Bill #{bill['bill_number'] or 'Unknown'}</h3>
-                            <p><strong>Filename:</strong> {bill['filename']}</p>
-                            <p><strong>Created:</strong> {bill['created'].strftime('%Y-%m-%d %H:%M')}</p>
-                            <p><strong>Size:</strong> {bill['size']:.1f} KB</p>
-                        """, unsafe_allow_html=True)
-                        
-                        if bill.get('customer_name') or bill.get('total'):
-                            st.markdown("<div style='background-color: #f8f9fa; padding: 10px; border-radius: 5px; margin: 10px 0;'>", unsafe_allow_html=True)
-                            if bill.get('customer_name'):
-                                st.markdown(f"<p><strong>Customer:</strong> {bill['customer_name']}</p>", unsafe_allow_html=True)
-                            if bill.get('total'):
-                                st.markdown(f"<p><strong>Total:</strong> ₹{bill['total']:.2f}</p>", unsafe_allow_html=True)
-                            st.markdown("</div>", unsafe_allow_html=True)
-                        
-                        st.markdown("</div>", unsafe_allow_html=True)
-                        
-                        # View button
-                        if st.button("👁️ View Bill", key=f"view_{i}", use_container_width=True):
-                            st.session_state.viewing_bill = bill
-                            st.rerun()
+                # Display the page's bills in card format, one block per bill
+                for bill in page:
+                    details = ""
+                    if bill.get('customer_name'):
+                        details += f"<p><strong>Customer:</strong> {html.escape(bill['customer_name'])}</p>"
+                    if bill.get('total'):
+                        details += f"<p><strong>Total:</strong> ₹{bill['total']:.2f}</p>"
+                    if details:
+                        details = f"<div style='background-color: #f8f9fa; padding: 10px; border-radius: 5px; margin: 10px 0;'>{details}</div>"
+                    match = f"<p><strong>Match:</strong> {bill['score']:.0%}</p>" if 'score' in bill else ""
+                    st.markdown(f"""
+                    <div style='padding: 20px; border-radius: 10px; border: 1px solid #ddd; margin-bottom: 20px;'>
+                        <h3>Bill #{bill['bill_number'] or 'Unknown'}</h3>
+                        <p><strong>Filename:</strong> {html.escape(bill['filename'])}</p>
+                        <p><strong>Created:</strong> {bill['created'].strftime('%Y-%m-%d %H:%M')}</p>
+                        <p><strong>Size:</strong> {bill['size']:.1f} KB</p>
+                        {match}
+                        {details}
+                    </div>
+                    """, unsafe_allow_html=True)
+                    
+                    # View button
+                    if st.button("👁️ View Bill", key=f"view_{bill['entry']['bill_number']}", use_container_width=True):
+                        st.session_state.viewing_bill = bill
+                        st.rerun()
             
             with tab2:
-                # Display bills in table format
-                df = pd.DataFrame(search_results)
+                # Display the page's bills in table format
+                df = pd.DataFrame(page).drop(columns=['entry'])
                 df['created'] = df['created'].dt.strftime('%Y-%m-%d %H:%M')
                 df['size'] = df['size'].round(1)
                 df = df.rename(columns={
@@ -368,15 +512,26 @@ def main():
                     'created': 'Created',
                     'size': 'Size (KB)',
                     'customer_name': 'Customer',
-                    'total': 'Total (₹)'
+                    'total': 'Total (₹)',
+                    'score': 'Match'
                 })
-                st.dataframe(df, use_container_width=True)
+                st.dataframe(df, use_container_width=True, hide_index=True)
                 
                 # Export button
                 if st.button("📊 Export to Excel", use_container_width=True):
                     export_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "search_results.xlsx")
-                    df.to_excel(export_path, index=False)
-                    st.success("Search results exported to Excel!")
+                    # Stream every result in the chosen order, not just the page shown
+                    stats = stream_rows_to_excel(
+                        (
+                            [bill['filename'], bill['bill_number'], bill['path'], bill['created'].strftime('%Y-%m-%d %H:%M'),
+                             bill['modified'].strftime('%Y-%m-%d %H:%M'), round(bill['size'], 1), bill['customer_name'], bill['total']]
+                            for export_offset in range(0, total_results, page_size)
+                            for bill in get_page(ordered_results, export_offset, page_size)
+                        ),
+                        export_path,
+                        headers=['Filename', 'Bill Number', 'path', 'Created', 'modified', 'Size (KB)', 'Customer', 'Total (₹)']
+                    )
+                    st.success(f"Search results exported to Excel! {format_export_stats(stats)}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,142 @@
+import streamlit as st
+import pandas as pd
+import os
+import sys
+from datetime import date, timedelta
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from utils import escpos, till
+from utils.billing_service import BillingService, BillingError
+from utils.ui import set_page_style, display_success_message, display_error_message
+
+# Set page config
+st.set_page_config(
+    page_title="Till Close",
+    page_icon="🧾",
+    layout="wide"
+)
+
+# Apply custom styling
+set_page_style()
+
+st.title("Shift and Day Close")
+st.caption(
+    "Counters are kept per lane as bills are billed and voided, so these reports never rescan the bills. "
+    "Closing a shift freezes its Z-report; closing a day freezes the day's summary from its shifts."
+)
+
+@st.cache_resource
+def get_billing_service():
+    """One billing service for every session, as in the billing app."""
+    return BillingService()
+
+
+billing_service = get_billing_service()
+lanes = sorted({billing_service.lane} | {counters["lane"] for counters in till.iter_lanes(billing_service.till_dir)})
+
+
+def show_report(record):
+    """Show an X/Z-report or a daily summary as metrics, a category table and printable text."""
+    metric_cols = st.columns(4)
+    metric_cols[0].metric("Bills", f"{record['bills']:,d}")
+    metric_cols[1].metric("Gross", f"₹{record['gross']:,.2f}")
+    metric_cols[2].metric("Voids", f"{record['voids']:,d}", f"-₹{record['void_amount']:,.2f}", delta_color="off")
+    metric_cols[3].metric("Net sales", f"₹{record['net']:,.2f}")
+    st.dataframe(
+        pd.DataFrame([
+            {"Category": category, "Quantity": sales["quantity"], "Amount": sales["amount"]}
+            for category, sales in record["categories"].items()
+        ]),
+        hide_index=True,
+        use_container_width=True
+    )
+    with st.expander("Report text"):
+        st.code(till.format_report(record), language=None)
+
+
+tabs = st.tabs(["Shift", "Void Bill", "Day Close", "Closed Days"])
+
+with tabs[0]:
+    lane = st.selectbox("Lane", lanes, index=lanes.index(billing_service.lane))
+    lane_till = billing_service.get_till(lane)
+    report = lane_till.x_report()
+    st.subheader(f"X-report: shift {report['shift']}, open since {report['opened_at']}")
+    show_report(report)
+
+    print_z = st.checkbox("Print the Z-report", value=False)
+    if st.button("Close Shift (Z-report)", type="primary"):
+        try:
+            record = lane_till.close_shift()
+        except till.TillError as e:
+            display_error_message(str(e))
+        else:
+            st.session_state.z_report = record
+            st.session_state.z_printed = None
+            if print_z:
+                text = till.format_report(record, escpos.DEFAULT_WIDTH)
+                st.session_state.z_printed = escpos.print_text(text, billing_service.get_printer(), f"z-{lane}-{record['shift']}")
+            # Show the new shift's counters above
+            st.rerun()
+    if "z_report" in st.session_state:
+        record = st.session_state.z_report
+        printed = st.session_state.z_printed
+        if printed:
+            (display_error_message if printed.startswith("Error") else display_success_message)(printed)
+        st.subheader(f"Z-report: lane {record['lane']}, shift {record['shift']}, closed {record['closed_at']}")
+        show_report(record)
+
+with tabs[1]:
+    st.caption("Voiding puts the bill's items back in stock and counts the void in this app's lane.")
+    void_bill_number = st.text_input("Bill Number", key="void_bill_number")
+    void_reason = st.text_input("Reason", key="void_reason")
+    if st.button("Void Bill"):
+        try:
+            entry = billing_service.void(void_bill_number.strip(), void_reason)
+            display_success_message(f"Bill {void_bill_number} voided; ₹{entry.get('total', 0):,.2f} taken off lane {billing_service.lane}")
+        except BillingError as e:
+            display_error_message(str(e))
+
+with tabs[2]:
+    close_date = st.date_input("Day", value=date.today(), max_value=date.today())
+    existing = till.load_day(close_date, billing_service.till_dir)
+    if existing is not None:
+        st.info(f"{close_date} was closed at {existing['closed_at']}.")
+        show_report(existing)
+    else:
+        close_open_shifts = st.checkbox("Close the lanes' open shifts first", value=False)
+        if st.button("Close Day", type="primary"):
+            try:
+                summary = till.close_day(close_date, billing_service.till_dir, close_open_shifts)
+            except till.TillError as e:
+                display_error_message(str(e))
+            else:
+                display_success_message(f"{close_date} closed: {summary['bills']:,d} bills, net ₹{summary['net']:,.2f}")
+                show_report(summary)
+
+with tabs[3]:
+    range_col1, range_col2 = st.columns(2)
+    with range_col1:
+        start_date = st.date_input("From", value=date.today() - timedelta(days=30))
+    with range_col2:
+        end_date = st.date_input("To", value=date.today())
+    days = list(till.iter_days(start_date, end_date, billing_service.till_dir))
+    if not days:
+        st.info("No closed days in this range.")
+    else:
+        days_df = pd.DataFrame([
+            {
+                "Day": summary["day"],
+                "Bills": summary["bills"],
+                "Gross": summary["gross"],
+                "Voids": summary["voids"],
+                "Void Amount": summary["void_amount"],
+                "Net": summary["net"],
+                "Tax": summary["tax"],
+                "Lanes": ", ".join(sorted(summary["lanes"]))
+            }
+            for summary in days
+        ])
+        st.dataframe(days_df, hide_index=True, use_container_width=True)
+        st.line_chart(days_df.set_index("Day")["Net"])
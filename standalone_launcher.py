@@ -1,45 +1,170 @@
 import os
 import sys
-import subprocess
-import threading
+import json
 import time
+import argparse
+import threading
 import webbrowser
+import urllib.request
+import urllib.error
+from datetime import datetime
 
-def open_browser():
-    """Open the browser after giving the server time to start."""
-    time.sleep(3)
-    webbrowser.open('http://localhost:8501')
+# Main entry point of the application
+MAIN_FILE = 'streamlit_app.py'
+DEFAULT_PORT = 8501
+# Streamlit answers "ok" here once the server accepts connections
+HEALTH_PATH = '/_stcore/health'
+STARTUP_LOG = os.path.join('data', 'startup_times.jsonl')
 
-def main():
-    # Get the directory where the executable is located
+
+def get_base_dir():
+    """Return the directory of the executable, or of this script when running from source."""
     if getattr(sys, 'frozen', False):
         # Running as executable
-        base_dir = os.path.dirname(sys.executable)
-    else:
-        # Running as script
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-    
+        return os.path.dirname(sys.executable)
+    # Running as script
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def get_app_dir():
+    """Return the directory holding the app sources (the unpack directory of a one-file build)."""
+    return getattr(sys, '_MEIPASS', get_base_dir())
+
+
+def get_launch_mode():
+    """Return "packaged" when running from a PyInstaller build, "source" otherwise."""
+    return 'packaged' if getattr(sys, 'frozen', False) else 'source'
+
+
+def get_health_url(port=DEFAULT_PORT):
+    """Return the health endpoint URL of the local server."""
+    return f'http://localhost:{port}{HEALTH_PATH}'
+
+
+def wait_for_server(port=DEFAULT_PORT, timeout=120.0, interval=0.05, process=None):
+    """
+    Poll the server's health endpoint until it reports ready.
+
+    Args:
+        port (int): Server port
+        timeout (float): Seconds to wait before giving up
+        interval (float): Seconds between polls
+        process (subprocess.Popen, optional): Server process; stop waiting if it exits
+
+    Returns:
+        bool: True if the server became ready, False on timeout or if the process exited
+    """
+    url = get_health_url(port)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(interval)
+    return False
+
+
+def record_startup(seconds, port, mode=None, log_file=None):
+    """
+    Append a time-to-ready measurement to the startup log.
+
+    Args:
+        seconds (float): Seconds from launch until the server was ready
+        port (int): Server port
+        mode (str, optional): "source" or "packaged" (default: detected)
+        log_file (str, optional): JSON-lines log file (default: data/startup_times.jsonl)
+    """
+    if log_file is None:
+        log_file = os.path.join(get_base_dir(), STARTUP_LOG)
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+        with open(log_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "mode": mode or get_launch_mode(),
+                "port": port,
+                "seconds_to_ready": round(seconds, 3)
+            }) + "\n")
+    except OSError as e:
+        print(f"Could not record startup time: {e}")
+
+
+def report_when_ready(started_at, port=DEFAULT_PORT, open_browser=True, log_file=None, process=None):
+    """
+    Wait for the server, record the time-to-ready and open the browser.
+
+    Args:
+        started_at (float): time.monotonic() value when the launch started
+        port (int): Server port
+        open_browser (bool): Open the app in the default browser once ready
+        log_file (str, optional): Startup log file
+        process (subprocess.Popen, optional): Server process, when launched as a subprocess
+
+    Returns:
+        float: Seconds to ready, or None if the server did not come up
+    """
+    if not wait_for_server(port, process=process):
+        print("The server did not become ready.")
+        return None
+    seconds = time.monotonic() - started_at
+    print(f"Grocery Billing System ready in {seconds:.2f}s at http://localhost:{port}")
+    record_startup(seconds, port, log_file=log_file)
+    if open_browser:
+        webbrowser.open(f'http://localhost:{port}')
+    return seconds
+
+
+def get_streamlit_args(port=DEFAULT_PORT):
+    """Return the `streamlit run` arguments for the main entry point."""
+    return [
+        "run", os.path.join(get_app_dir(), MAIN_FILE),
+        f"--server.port={port}",
+        "--browser.serverAddress=localhost",
+        # The launcher opens the browser itself once the server is ready
+        "--server.headless=true"
+    ]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Start the Grocery Billing System")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Server port (default: 8501)")
+    parser.add_argument("--no-browser", action="store_true", help="Do not open a browser window")
+    parser.add_argument("--startup-log", default=None, help="Startup time log (default: data/startup_times.jsonl)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    started_at = time.monotonic()
+    args = parse_args(argv)
+
     # Change to the base directory
-    os.chdir(base_dir)
-    
+    os.chdir(get_base_dir())
+
     # Print startup message
     print("=" * 60)
     print("Starting Grocery Billing System...")
     print("=" * 60)
     print("Please wait while the application loads...")
-    print("A browser window will open automatically.")
+    if not args.no_browser:
+        print("A browser window will open automatically.")
     print("=" * 60)
-    
-    # Start browser thread
-    threading.Thread(target=open_browser).start()
-    
-    # Update this to match your main file name
-    main_file = 'Home.py'  # Main entry point of the application
-    
+
+    # Wait for the server in the background, then open the browser
+    threading.Thread(
+        target=report_when_ready,
+        args=(started_at, args.port, not args.no_browser, args.startup_log),
+        daemon=True
+    ).start()
+
     # Run the Streamlit app
     import streamlit.web.cli as stcli
-    sys.argv = ["streamlit", "run", main_file, "--server.port=8501", "--browser.serverAddress=localhost"]
+    sys.argv = ["streamlit"] + get_streamlit_args(args.port)
     sys.exit(stcli.main())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
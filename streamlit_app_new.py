@@ -1,27 +1,17 @@
 import streamlit as st
 import pandas as pd
 import os
-import json
-import pickle
 from datetime import datetime
 import sys
-import tempfile
-from pathlib import Path
+import uuid
 
 # Add the parent directory to the Python path
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
-from utils.bill_operations import (
-    generate_bill_number, 
-    calculate_total, 
-    generate_bill, 
-    save_bill, 
-    print_bill, 
-    export_bill_to_excel
-)
-from utils.pdf_operations import extract_pdf_text, save_bill_to_pdf
-from utils.email_utils import send_email
-from utils.data import prices as default_prices, cosmetic_products as default_cosmetic_products, grocery_products as default_grocery_products, drink_products as default_drink_products
+from utils import bill_store, catalog
+from utils.billing_service import BillingService, BillingError, create_cart, set_item
+from utils.customer_autocomplete import CustomerAutocomplete
+from utils.customer_store import CustomerStore
 from utils.ui import (
     set_page_style,
     display_customer_info_section,
@@ -42,60 +32,6 @@ st.set_page_config(
 # Apply custom styling
 set_page_style()
 
-# Define file paths for product data and inventory
-DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
-os.makedirs(DATA_DIR, exist_ok=True)
-PRODUCTS_FILE = os.path.join(DATA_DIR, "products.json")
-INVENTORY_FILE = os.path.join(DATA_DIR, "inventory.json")
-PRICES_FILE = os.path.join(DATA_DIR, "prices.pkl")
-
-# Function to load product data
-def load_product_data():
-    if os.path.exists(PRODUCTS_FILE):
-        with open(PRODUCTS_FILE, 'r') as f:
-            return json.load(f)
-    else:
-        # Initialize with existing data from utils/data.py
-        products = {
-            "Cosmetics": default_cosmetic_products,
-            "Groceries": default_grocery_products,
-            "Drinks": default_drink_products
-        }
-        with open(PRODUCTS_FILE, 'w') as f:
-            json.dump(products, f, indent=4)
-        return products
-
-# Function to load inventory data
-def load_inventory_data():
-    if os.path.exists(INVENTORY_FILE):
-        with open(INVENTORY_FILE, 'r') as f:
-            return json.load(f)
-    else:
-        # Initialize empty inventory
-        inventory = {}
-        # Add all existing products with default inventory of 10
-        products = load_product_data()
-        for category, category_products in products.items():
-            for product_type, variants in category_products.items():
-                for variant in variants:
-                    product_name = variant["name"]
-                    inventory[product_name] = {
-                        "quantity": 10,
-                        "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    }
-        with open(INVENTORY_FILE, 'w') as f:
-            json.dump(inventory, f, indent=4)
-        return inventory
-
-# Function to load prices
-def load_prices():
-    if os.path.exists(PRICES_FILE):
-        with open(PRICES_FILE, 'rb') as f:
-            return pickle.load(f)
-    else:
-        # Use default prices
-        return default_prices
-
 # Define a function to get the appropriate bills directory
 def get_bills_directory():
     bills_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "saved_bills")
@@ -106,16 +42,36 @@ BILLS_DIRECTORY = get_bills_directory()
 st.session_state.bills_directory = BILLS_DIRECTORY
 
 # Initialize session state
+# Set when the cart is committed, from the day's bill number counter
 if "billnumber" not in st.session_state:
-    st.session_state.billnumber = generate_bill_number()
+    st.session_state.billnumber = None
+# Identifies this checkout, so that reruns and double-clicks commit it once
+if "cart_key" not in st.session_state:
+    st.session_state.cart_key = uuid.uuid4().hex
+
+@st.cache_resource
+def get_customer_autocomplete(bills_directory):
+    """Customer suggestions, indexed once and kept across reruns."""
+    return CustomerAutocomplete(CustomerStore(bills_directory))
+
+customer_autocomplete = get_customer_autocomplete(BILLS_DIRECTORY)
+# Pick up bills saved by other lanes and workers
+customer_autocomplete.refresh()
+
+@st.cache_resource
+def get_billing_service(bills_directory, _customers):
+    """One billing service for every session, so their commits share its locks and stock cache."""
+    return BillingService(bills_directory=bills_directory, customers=_customers)
+
+# All billing goes through the billing service; this script only renders it.
+# Saved bills update the shared customer store and so the suggestions.
+billing_service = get_billing_service(BILLS_DIRECTORY, customer_autocomplete.store)
 
 # Load product and inventory data
-products = load_product_data()
-cosmetic_products = products.get("Cosmetics", default_cosmetic_products)
-grocery_products = products.get("Groceries", default_grocery_products)
-drink_products = products.get("Drinks", default_drink_products)
-inventory = load_inventory_data()
-prices = load_prices()
+products = billing_service.products
+cosmetic_products, grocery_products, drink_products = catalog.get_category_products(products)
+inventory = billing_service.inventory
+prices = billing_service.prices
 
 # Initialize session state for selected products from search
 if "selected_products" not in st.session_state:
@@ -125,7 +81,7 @@ if "selected_products" not in st.session_state:
 st.title("Grocery Billing System")
 
 # Get customer information
-customer_name, phone_number = display_customer_info_section()
+customer_name, phone_number = display_customer_info_section(customer_autocomplete)
 
 # Add a search bar for products
 st.sidebar.markdown('<div class="section-header">Product Search</div>', unsafe_allow_html=True)
@@ -166,82 +122,54 @@ bill_op_cols = display_bill_operations_section()
 # Calculate button
 with bill_op_cols[0]:
     if st.button("Calculate Total", key="calc_button"):
-        if not customer_name:
-            display_error_message("Please enter customer name")
-        elif not phone_number:
-            display_error_message("Please enter phone number")
-        elif not any(qty > 0 for qty in {**cosmetic_items, **grocery_items, **drink_items}.values()) and not st.session_state.selected_products:
-            display_error_message("Please select at least one product")
+        cart = create_cart(
+            customer_name,
+            phone_number,
+            st.session_state.billnumber,
+            cosmetic_items,
+            grocery_items,
+            drink_items,
+            idempotency_key=st.session_state.cart_key
+        )
+        # Add products from search to the cart
+        for item in st.session_state.selected_products:
+            set_item(cart, item["category"], item["name"], item["quantity"])
+        
+        try:
+            # Price the cart, generate the bill and update inventory
+            bill = billing_service.commit(cart, save=False)
+        except BillingError as e:
+            display_error_message(str(e))
         else:
-            # Add products from search to appropriate categories
-            for item in st.session_state.selected_products:
-                category = item["category"]
-                if category == "Cosmetics":
-                    cosmetic_items[item["name"]] = item["quantity"]
-                elif category == "Groceries":
-                    grocery_items[item["name"]] = item["quantity"]
-                elif category == "Drinks":
-                    drink_items[item["name"]] = item["quantity"]
-            
-            # Calculate totals
-            totals = calculate_total(cosmetic_items, grocery_items, drink_items, prices)
-            st.session_state.totals = totals
-            
-            # Generate bill
-            bill_content = generate_bill(
-                customer_name, 
-                phone_number, 
-                st.session_state.billnumber, 
-                cosmetic_items, 
-                grocery_items, 
-                drink_items, 
-                totals,
-                prices
-            )
-            st.session_state.bill_content = bill_content
-            
-            # Update inventory after bill calculation
-            all_items = {**cosmetic_items, **grocery_items, **drink_items}
-            for product, quantity in all_items.items():
-                if quantity > 0 and product in inventory:
-                    inventory[product]["quantity"] = max(0, inventory[product]["quantity"] - quantity)
-                    inventory[product]["last_updated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Save updated inventory
-            with open(INVENTORY_FILE, 'w') as f:
-                json.dump(inventory, f, indent=4)
+            already_calculated = bill is st.session_state.get("bill")
+            st.session_state.bill = bill
+            st.session_state.billnumber = bill["bill_number"]
+            st.session_state.totals = bill["totals"]
+            st.session_state.bill_content = bill["content"]
             
             # Clear selected products from search
             st.session_state.selected_products = []
             
             # Display success message
-            display_success_message("Bill calculated successfully!")
+            if already_calculated:
+                display_success_message("Bill already calculated. Start a New Bill to bill another cart.", icon="ℹ️")
+            else:
+                display_success_message("Bill calculated successfully!")
 
 # Save Bill button
 with bill_op_cols[1]:
     if st.button("Save Bill", key="save_button"):
-        if "bill_content" in st.session_state:
-            result = save_bill(
-                st.session_state.bill_content,
-                st.session_state.billnumber,
-                customer_name,
-                phone_number,
-                cosmetic_items,
-                grocery_items,
-                drink_items,
-                st.session_state.totals,
-                prices
-            )
-            display_success_message(result)
+        if "bill" in st.session_state:
+            display_success_message(billing_service.save(st.session_state.bill))
         else:
             display_error_message("Please calculate the bill first")
 
 # Print Bill button
 with bill_op_cols[2]:
     if st.button("Print Bill", key="print_button"):
-        if "bill_content" in st.session_state:
-            result = print_bill(st.session_state.bill_content)
-            if result.startswith("Error") or "only available" in result:
+        if "bill" in st.session_state:
+            result = billing_service.print_receipt(st.session_state.bill)
+            if result.startswith("Error"):
                 display_error_message(result)
             else:
                 display_success_message(result)
@@ -259,19 +187,12 @@ with bill_op_cols[3]:
 # Export to Excel button
 with st.container():
     if st.button("Export to Excel", key="excel_button"):
-        if "totals" in st.session_state:
-            file_path = export_bill_to_excel(
-                customer_name,
-                phone_number,
-                st.session_state.billnumber,
-                cosmetic_items,
-                grocery_items,
-                drink_items,
-                st.session_state.totals,
-                prices,
-                bills_directory=st.session_state.bills_directory  # Pass the directory
-            )
-            display_success_message(f"Bill exported to {file_path}")
+        if "bill" in st.session_state:
+            result = billing_service.render(st.session_state.bill, ["xlsx"])["xlsx"]
+            if result.startswith("Error"):
+                display_error_message(result)
+            else:
+                display_success_message(result)
         else:
             display_error_message("Please calculate the bill first")
 
@@ -293,16 +214,12 @@ if "show_email_form" in st.session_state and st.session_state.show_email_form:
             if security_code and receiver_email:
                 try:
                     # Path to the PDF bill - UPDATED
-                    pdf_path = os.path.join(st.session_state.bills_directory, f"{st.session_state.billnumber}.pdf")
+                    pdf_path = bill_store.get_artifact_path(st.session_state.bills_directory, st.session_state.billnumber, ".pdf")
                     
                     # Check if PDF exists
                     if not os.path.exists(pdf_path):
                         # Try to save the bill to PDF first if it doesn't exist
-                        save_bill_to_pdf(
-                            st.session_state.bill_content,
-                            st.session_state.billnumber,
-                            bills_directory=st.session_state.bills_directory  # Pass the directory
-                        )
+                        billing_service.render(st.session_state.bill, ["pdf"])
                     
                     # Check again if PDF exists after trying to save
                     if os.path.exists(pdf_path):
@@ -355,11 +272,14 @@ if "bill_content" in st.session_state:
 # Reset button to clear the form
 st.sidebar.markdown("---")
 if st.sidebar.button("New Bill"):
-    # Generate a new bill number
-    st.session_state.billnumber = generate_bill_number()
+    # The next bill gets its number when it is committed
+    st.session_state.billnumber = None
+    st.session_state.cart_key = uuid.uuid4().hex
     # Clear session state
     if "bill_content" in st.session_state:
         del st.session_state.bill_content
+    if "bill" in st.session_state:
+        del st.session_state.bill
     if "totals" in st.session_state:
         del st.session_state.totals
     if "show_email_form" in st.session_state:
@@ -0,0 +1,140 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import bill_journal, bill_store, catalog
+from utils.bill_journal import BillJournal, get_incomplete_transactions, read_records
+
+
+def crash_during_commit(data_dir, bills_directory):
+    """Commit a bill and die once its journal record is durable, before any file is written."""
+    from utils.billing_service import BillingService
+    service = BillingService(data_dir, bills_directory)
+    service._write_inventory = lambda inventory: os._exit(1)
+    service.commit(service.create_cart("Asha", "9876543210", cosmetic_items={"Dove Bath Soap": 3}))
+
+
+def write_transactions(path, count, checkpoint_every):
+    bill_journal.CHECKPOINT_TRANSACTIONS = checkpoint_every
+    journal = BillJournal(path)
+    bill = {"bill_number": "BILL-20250101-1000", "content": "x" * 5000}
+    for i in range(count):
+        txn, seq = journal.begin("commit", bill=bill, stock={f"Product {os.getpid()}": i}, save=True)
+        journal.sync(seq)
+        journal.end(txn)
+    journal.close()
+
+
+class BillJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.workdir, bill_journal.JOURNAL_FILE)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_later_transaction_supersedes_stock(self):
+        records = [
+            {"type": "begin", "txn": "a", "stock": {"Soap": 5, "Rice": 3}},
+            {"type": "begin", "txn": "b", "stock": {"Soap": 4}},
+            {"type": "end", "txn": "b"}
+        ]
+        incomplete = get_incomplete_transactions(records)
+        self.assertEqual([record["txn"] for record in incomplete], ["a"])
+        self.assertEqual(incomplete[0]["stock"], {"Rice": 3})
+        # The records read are left as they were
+        self.assertEqual(records[0]["stock"], {"Soap": 5, "Rice": 3})
+
+    def test_torn_last_record_is_ignored(self):
+        journal = BillJournal(self.path)
+        txn, seq = journal.begin("save", bill={"bill_number": "BILL-20250101-1000"})
+        journal.sync(seq)
+        journal.close()
+        with open(self.path, 'ab') as f:
+            f.write(b"0badc0de {\"type\": \"end\"")
+        self.assertEqual([record["txn"] for record in read_records(self.path)], [txn])
+
+    def test_checkpoint_waits_for_other_writer(self):
+        # Two instances on one file lock each other like two processes
+        other = BillJournal(self.path)
+        journal = BillJournal(self.path)
+        in_flight, seq = other.begin("save", bill={"bill_number": "BILL-20250101-1000"})
+        other.sync(seq)
+        txn, seq = journal.begin("save", bill={"bill_number": "BILL-20250101-1001"})
+        journal.end(txn)
+
+        self.assertFalse(journal.checkpoint())
+        self.assertIsNone(journal.recover(lambda record: [], wait=0.05))
+        self.assertIn(in_flight, [record["txn"] for record in journal.incomplete_transactions()])
+
+        other.end(in_flight)
+        self.assertTrue(journal.checkpoint())
+        self.assertEqual(read_records(self.path), [])
+        other.close()
+        journal.close()
+
+    def test_checkpoint_keeps_dead_transactions(self):
+        dead = BillJournal(self.path)
+        dead_txn, seq = dead.begin("commit", bill={"bill_number": "BILL-20250101-1000"}, stock={"Soap": 5, "Rice": 3})
+        dead.sync(seq)
+        # Closing releases its locks, as the death of its process would
+        dead.close()
+
+        journal = BillJournal(self.path)
+        txn, seq = journal.begin("commit", bill={"bill_number": "BILL-20250101-1001"}, stock={"Soap": 4})
+        journal.end(txn)
+        self.assertTrue(journal.checkpoint())
+
+        records = read_records(self.path)
+        self.assertEqual([record["txn"] for record in records], [dead_txn])
+        self.assertEqual(records[0]["stock"], {"Rice": 3})
+
+        redone = journal.recover(lambda record: [])
+        self.assertEqual([record["txn"] for record in redone], [dead_txn])
+        self.assertEqual(read_records(self.path), [])
+        journal.close()
+
+    def test_two_processes_write_one_journal(self):
+        context = multiprocessing.get_context("spawn")
+        writers = [context.Process(target=write_transactions, args=(self.path, 300, 50)) for _ in range(2)]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join(120)
+            self.assertEqual(writer.exitcode, 0)
+        # Every record left is whole and every transaction ended
+        with open(self.path, 'rb') as f:
+            lines = f.read().splitlines(keepends=True)
+        self.assertEqual(len(read_records(self.path)), len(lines))
+        self.assertEqual(get_incomplete_transactions(read_records(self.path)), [])
+
+    def test_commit_is_redone_after_crash(self):
+        data_dir = os.path.join(self.workdir, "data")
+        bills_directory = os.path.join(self.workdir, "saved_bills")
+        stock = catalog.load_inventory_data(data_dir)["Dove Bath Soap"]["quantity"]
+
+        process = multiprocessing.get_context("spawn").Process(target=crash_during_commit, args=(data_dir, bills_directory))
+        process.start()
+        process.join(120)
+        self.assertEqual(process.exitcode, 1)
+        self.assertEqual(list(bill_store.iter_bills(bills_directory)), [])
+        [record] = get_incomplete_transactions(read_records(os.path.join(data_dir, bill_journal.JOURNAL_FILE)))
+
+        from utils.billing_service import BillingService
+        BillingService(data_dir, bills_directory)
+
+        self.assertEqual(catalog.load_inventory_data(data_dir)["Dove Bath Soap"]["quantity"], stock - 3)
+        entry = bill_store.find_bill(record["bill"]["bill_number"], bills_directory)
+        self.assertIsNotNone(entry)
+        self.assertEqual(entry["customer_name"], "Asha")
+        self.assertEqual(read_records(os.path.join(data_dir, bill_journal.JOURNAL_FILE)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import threading
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import bill_store, catalog
+from utils.billing_service import BillingError, BillingService
+from utils.customer_store import CustomerStore
+
+
+def commit_bills(data_dir, bills_directory, count):
+    """Commit count bills of one Dove Bath Soap each, from a process of its own."""
+    service = BillingService(data_dir, bills_directory)
+    for i in range(count):
+        service.commit(service.create_cart("Asha", "9876543210", cosmetic_items={"Dove Bath Soap": 1}))
+
+
+class BillingServiceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.data_dir = os.path.join(self.workdir, "data")
+        self.bills_directory = os.path.join(self.workdir, "saved_bills")
+        with catalog.locked_inventory(self.data_dir) as inventory:
+            inventory["Dove Bath Soap"]["quantity"] = 1000
+        self.customers = CustomerStore(self.bills_directory, os.path.join(self.data_dir, "customers.json"))
+        self.service = BillingService(self.data_dir, self.bills_directory, customers=self.customers)
+
+    def tearDown(self):
+        self.service.journal.close()
+        shutil.rmtree(self.workdir)
+
+    def get_stock(self, name="Dove Bath Soap"):
+        return catalog.load_inventory_data(self.data_dir)[name]["quantity"]
+
+    def create_cart(self, quantity=1, **fields):
+        return self.service.create_cart("Asha", "9876543210", cosmetic_items={"Dove Bath Soap": quantity}, **fields)
+
+    def test_retried_commit_bills_once(self):
+        stock = self.get_stock()
+        cart = self.create_cart(2)
+        bill = self.service.commit(cart)
+        self.assertIs(self.service.commit(dict(cart)), bill)
+        self.assertEqual(self.get_stock(), stock - 2)
+        self.assertEqual([entry["bill_number"] for entry in bill_store.iter_bills(self.bills_directory)], [bill["bill_number"]])
+
+    def test_concurrent_retries_bill_once(self):
+        stock = self.get_stock()
+        cart = self.create_cart()
+        bills = []
+        threads = [threading.Thread(target=lambda: bills.append(self.service.commit(dict(cart)))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(bill) for bill in bills}), 1)
+        self.assertEqual(self.get_stock(), stock - 1)
+
+    def test_failed_commit_releases_its_key(self):
+        cart = self.service.create_cart("", "9876543210", cosmetic_items={"Dove Bath Soap": 1})
+        with self.assertRaises(BillingError):
+            self.service.commit(cart)
+        cart["customer_name"] = "Asha"
+        self.assertEqual(self.service.commit(cart)["customer_name"], "Asha")
+
+    def test_concurrent_commits_take_every_item_out_of_stock(self):
+        stock = self.get_stock()
+        # A second service in the same process, like a second Streamlit session
+        other = BillingService(self.data_dir, self.bills_directory)
+        threads = [
+            threading.Thread(target=lambda service=service: [service.commit(self.create_cart()) for _ in range(10)])
+            for service in (self.service, other) * 3
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.get_stock(), stock - 60)
+        self.assertEqual(len(list(bill_store.iter_bills(self.bills_directory))), 60)
+
+    def test_two_processes_take_every_item_out_of_stock(self):
+        stock = self.get_stock()
+        context = multiprocessing.get_context("spawn")
+        workers = [context.Process(target=commit_bills, args=(self.data_dir, self.bills_directory, 20)) for _ in range(2)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(120)
+            self.assertEqual(worker.exitcode, 0)
+        self.assertEqual(self.get_stock(), stock - 40)
+        self.assertEqual(len(list(bill_store.iter_bills(self.bills_directory))), 40)
+
+    def test_unsaved_carts_get_different_numbers(self):
+        first = self.service.commit(self.create_cart(), save=False)
+        second = self.service.commit(self.create_cart(), save=False)
+        self.assertNotEqual(first["bill_number"], second["bill_number"])
+        self.assertNotIn("Error", self.service.save(second))
+        self.assertNotIn("Error", self.service.save(first))
+        # A number the caller picked that a saved bill has is replaced
+        third = self.service.commit(self.create_cart(bill_number=first["bill_number"]))
+        self.assertNotIn(third["bill_number"], (first["bill_number"], second["bill_number"]))
+
+    def test_void_returns_stock_and_takes_bill_out_of_customer(self):
+        stock = self.get_stock()
+        kept = self.service.commit(self.create_cart(1))
+        voided = self.service.commit(self.create_cart(3))
+        self.assertEqual(self.customers.get("9876543210")["visits"], 2)
+
+        entry = self.service.void(voided["bill_number"], reason="returned")
+        self.assertEqual(entry["voided"]["reason"], "returned")
+        self.assertEqual(self.get_stock(), stock - 1)
+        self.assertTrue(bill_store.find_bill(voided["bill_number"], self.bills_directory)["voided"])
+        profile = self.customers.get("9876543210")
+        self.assertEqual(profile["visits"], 1)
+        self.assertAlmostEqual(profile["total_spent"], kept["totals"]["grand_total"])
+        self.assertEqual(profile["bills"], [kept["bill_number"]])
+        # A store indexing the bills afresh leaves the voided bill out
+        fresh = CustomerStore(self.bills_directory, os.path.join(self.workdir, "fresh.json"))
+        fresh.refresh(save=False)
+        self.assertEqual(fresh.get("9876543210")["bills"], [kept["bill_number"]])
+
+        with self.assertRaises(BillingError):
+            self.service.void(voided["bill_number"])
+        self.assertEqual(self.get_stock(), stock - 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
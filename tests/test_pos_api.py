@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import socket
+import shutil
+import asyncio
+import tempfile
+import unittest
+import threading
+import http.client
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import catalog
+from utils.billing_service import BillingService
+from utils.pos_api import POSApi
+
+
+class POSApiTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.data_dir = os.path.join(self.workdir, "data")
+        self.service = BillingService(self.data_dir, os.path.join(self.workdir, "saved_bills"))
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(POSApi(self.service).start("127.0.0.1", 0), self.loop).result()
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def tearDown(self):
+        self.server.close()
+        asyncio.run_coroutine_threadsafe(self.server.wait_closed(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.service.journal.close()
+        shutil.rmtree(self.workdir)
+
+    def request(self, method, path, body=None, raw=None):
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=30)
+        try:
+            payload = raw if raw is not None else (json.dumps(body).encode("utf-8") if body is not None else None)
+            connection.request(method, path, payload)
+            response = connection.getresponse()
+            return response.status, json.loads(response.read())
+        finally:
+            connection.close()
+
+    def post_bill(self, **fields):
+        cart = {
+            "customer_name": "Asha",
+            "phone_number": "9876543210",
+            "items": [{"category": "Cosmetics", "name": "Dove Bath Soap", "quantity": 1}]
+        }
+        return self.request("POST", "/bills", {**cart, **fields})
+
+    def test_bad_quantities_are_rejected(self):
+        stock = catalog.load_inventory_data(self.data_dir)["Dove Bath Soap"]["quantity"]
+        for quantity in (2.7, True, "2.5", "-1", 0, None, [1]):
+            item = {"category": "Cosmetics", "name": "Dove Bath Soap", "quantity": quantity}
+            status, payload = self.post_bill(items=[item])
+            self.assertEqual(status, 400, quantity)
+            self.assertIn("positive integer", payload["error"])
+        self.assertEqual(catalog.load_inventory_data(self.data_dir)["Dove Bath Soap"]["quantity"], stock)
+
+    def test_digit_string_quantity_is_accepted(self):
+        item = {"category": "Cosmetics", "name": "Dove Bath Soap", "quantity": "2"}
+        status, payload = self.post_bill(items=[item])
+        self.assertEqual(status, 201)
+        self.assertEqual(payload["cosmetic_items"], {"Dove Bath Soap": 2})
+
+    def test_bad_carts_are_rejected(self):
+        for items in (5, [{"name": "Dove Bath Soap", "quantity": 1}], ["Dove Bath Soap"],
+                      [{"category": "Cosmetics", "name": "No Such Product", "quantity": 1}]):
+            status, payload = self.post_bill(items=items)
+            self.assertEqual(status, 400, items)
+            self.assertIn("error", payload)
+        self.assertEqual(self.request("POST", "/bills", [1, 2])[0], 400)
+        self.assertEqual(self.request("POST", "/bills", raw=b"{not json")[0], 400)
+
+    def test_bad_render_is_rejected_before_billing(self):
+        for render in ("pdf", {"pdf": True}, [1], ["pdf", None], ["docx"]):
+            status, payload = self.post_bill(render=render)
+            self.assertEqual(status, 400, render)
+        self.assertEqual(self.request("GET", "/bills/BILL-20250101-1000")[0], 404)
+
+    def test_retried_post_is_billed_once(self):
+        status, bill = self.post_bill(idempotency_key="lane-1-42")
+        self.assertEqual(status, 201)
+        status, retried = self.post_bill(idempotency_key="lane-1-42")
+        self.assertEqual(status, 200)
+        self.assertEqual(retried["bill_number"], bill["bill_number"])
+
+    def test_bad_content_length_is_rejected(self):
+        with socket.create_connection(("127.0.0.1", self.port), timeout=30) as sock:
+            sock.sendall(b"POST /bills HTTP/1.1\r\nContent-Length: lots\r\n\r\n")
+            response = sock.makefile("rb").read()
+        self.assertTrue(response.startswith(b"HTTP/1.1 400 "))
+        self.assertIn(b"Bad Content-Length", response)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import bill_store, till
+from utils.bill_model import Bill
+from utils.billing_service import BillingService
+
+
+def make_bill(number, quantity=1):
+    return Bill.from_items(f"BILL-20250101-{number}", datetime(2025, 1, 1, 10, 0), "Asha", "9876543210",
+                           {"Dove Bath Soap": quantity}, {}, {}, {"Dove Bath Soap": 50.0})
+
+
+def record_bills(till_dir, start, count):
+    """Count bills in lane 1 from a process of its own, through a Till of its own."""
+    lane = till.Till(till_dir, "1")
+    for number in range(start, start + count):
+        lane.record_bill(make_bill(number))
+
+
+class TillTest(unittest.TestCase):
+
+    def setUp(self):
+        self.till_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.till_dir)
+
+    def test_bills_and_voids_are_counted(self):
+        lane = till.Till(self.till_dir, "1")
+        lane.record_bill(make_bill(1000, 2))
+        lane.record_bill(make_bill(1001))
+        lane.record_void(make_bill(1000, 2))
+        report = lane.x_report()
+        self.assertEqual((report["bills"], report["voids"]), (2, 1))
+        self.assertEqual(report["categories"]["Cosmetics"]["quantity"], 1)
+        self.assertEqual(report["net"], make_bill(1001).grand_total)
+
+    def test_two_processes_count_one_lane(self):
+        context = multiprocessing.get_context("spawn")
+        workers = [context.Process(target=record_bills, args=(self.till_dir, start, 150)) for start in (1000, 2000)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(120)
+            self.assertEqual(worker.exitcode, 0)
+        report = till.Till(self.till_dir, "1").x_report()
+        self.assertEqual(report["bills"], 300)
+        self.assertEqual(report["categories"]["Cosmetics"]["quantity"], 300)
+        self.assertEqual([name for name in os.listdir(self.till_dir) if name.endswith(".tmp")], [])
+
+    def test_closed_shift_is_frozen_and_next_one_opens(self):
+        lane = till.Till(self.till_dir, "1")
+        # Another Till of the lane, as in another process
+        other = till.Till(self.till_dir, "1")
+        lane.record_bill(make_bill(1000))
+        closed = other.close_shift()
+        self.assertEqual((closed["shift"], closed["bills"]), (1, 1))
+        lane.record_bill(make_bill(1001))
+        report = lane.x_report()
+        self.assertEqual((report["shift"], report["bills"]), (2, 1))
+
+    def test_commit_survives_a_till_failure(self):
+        data_dir = os.path.join(self.till_dir, "data")
+        bills_directory = os.path.join(self.till_dir, "saved_bills")
+        service = BillingService(data_dir, bills_directory)
+
+        def fail(bill):
+            raise OSError("disk full")
+        service.get_till(service.lane).record_bill = fail
+        bill = service.commit(service.create_cart("Asha", "9876543210", cosmetic_items={"Dove Bath Soap": 1}))
+        self.assertIsNotNone(bill_store.find_bill(bill["bill_number"], bills_directory))
+        # The lane is recounted from the manifests
+        report = service.get_till(service.lane).rebuild(bills_directory)
+        self.assertEqual(report["bills"], 1)
+        service.journal.close()
+
+    def test_invalid_lane_is_refused(self):
+        with self.assertRaises(till.TillError):
+            till.get_lane("../1")
+
+
+if __name__ == "__main__":
+    unittest.main()
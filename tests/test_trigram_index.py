@@ -0,0 +1,110 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import bill_store
+from utils.trigram_index import BillIndex, TrigramIndex
+
+PRODUCTS = ["Coca Cola", "Coca Cola Zero", "Dove Bath Soap", "Lux Soap", "Colgate Toothpaste", "Tata Salt"]
+
+
+class TrigramIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = TrigramIndex()
+        for name in PRODUCTS:
+            self.index.add(name, phrases=[name])
+
+    def keys(self, query, **kwargs):
+        return [key for key, score in self.index.search(query, **kwargs)]
+
+    def test_typos_rank_the_intended_product_first(self):
+        self.assertEqual(self.keys("coka cola")[0], "Coca Cola")
+        self.assertEqual(self.keys("colgat")[0], "Colgate Toothpaste")
+        self.assertEqual(self.keys("tata slat")[0], "Tata Salt")
+
+    def test_exact_match_scores_highest(self):
+        [(key, score), (other, other_score)] = self.index.search("coca cola zero", limit=2)
+        self.assertEqual(key, "Coca Cola Zero")
+        self.assertEqual(score, 1.0)
+        self.assertEqual(other, "Coca Cola")
+        self.assertLess(other_score, score)
+
+    def test_word_finds_every_phrase_containing_it(self):
+        self.assertEqual(set(self.keys("soap")), {"Dove Bath Soap", "Lux Soap"})
+
+    def test_unrelated_and_empty_queries_find_nothing(self):
+        self.assertEqual(self.keys("xyzzy"), [])
+        self.assertEqual(self.keys("  "), [])
+
+    def test_limit_keeps_the_best(self):
+        self.assertEqual(self.keys("cola", limit=1), ["Coca Cola"])
+
+    def test_added_documents_are_found_without_rebuild(self):
+        self.assertEqual(self.keys("maggi noodles"), [])
+        self.index.add("Maggi Noodles", phrases=["Maggi Noodles"])
+        self.assertEqual(self.keys("magi nodles")[0], "Maggi Noodles")
+        self.assertEqual(len(self.index), len(PRODUCTS) + 1)
+
+    def test_removed_documents_are_not_found(self):
+        self.assertTrue(self.index.remove("Lux Soap"))
+        self.assertFalse(self.index.remove("Lux Soap"))
+        self.assertNotIn("Lux Soap", self.index)
+        self.assertEqual(self.keys("soap"), ["Dove Bath Soap"])
+
+    def test_adding_a_key_again_replaces_its_text(self):
+        self.index.add("Tata Salt", phrases=["Tata Rock Salt"])
+        self.assertEqual(self.keys("rock salt")[0], "Tata Salt")
+        self.assertEqual(self.keys("Tata Salt").count("Tata Salt"), 1)
+        self.assertEqual(len(self.index), len(PRODUCTS))
+
+
+class BillIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bills_directory = tempfile.mkdtemp()
+        self.partition_dir = bill_store.get_partition_dir(self.bills_directory, date(2025, 1, 1), create=True)
+        self.manifest = {"bills": {}}
+
+    def tearDown(self):
+        shutil.rmtree(self.bills_directory)
+
+    def save_bill(self, bill_number, customer_name):
+        self.manifest["bills"][bill_number] = {"bill_number": bill_number, "customer_name": customer_name}
+        bill_store.save_manifest(self.partition_dir, self.manifest)
+        # A new mtime even on file systems with coarse timestamps
+        stat = os.stat(os.path.join(self.partition_dir, bill_store.MANIFEST_FILE))
+        os.utime(os.path.join(self.partition_dir, bill_store.MANIFEST_FILE),
+                 ns=(stat.st_atime_ns, stat.st_mtime_ns + len(self.manifest["bills"]) * 10 ** 9))
+
+    def test_refresh_reads_only_changed_partitions(self):
+        self.save_bill("BILL-20250101-1000", "Mohit Patel")
+        self.save_bill("BILL-20250101-1001", "Asha Rao")
+        index = BillIndex(self.bills_directory)
+        self.assertEqual(index.refresh(), 2)
+        self.assertEqual(index.refresh(), 0)
+        self.assertEqual(index.search(customer_name="Mhoit Patl")[0][0], "BILL-20250101-1000")
+
+        self.save_bill("BILL-20250101-1002", "Asha Rao")
+        self.save_bill("BILL-20250101-1000", "Mohit Patil")
+        self.assertEqual(index.refresh(), 2)
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.search(customer_name="Mohit Patil", limit=1), [("BILL-20250101-1000", 1.0)])
+
+    def test_number_and_name_must_both_match(self):
+        self.save_bill("BILL-20250101-1000", "Mohit Patel")
+        self.save_bill("BILL-20250101-1001", "Asha Rao")
+        index = BillIndex(self.bills_directory)
+        index.refresh()
+        self.assertEqual(index.search(bill_number="BILL-20250101-1001")[0][0], "BILL-20250101-1001")
+        results = index.search(bill_number="BILL-20250101-1001", customer_name="Mohit")
+        self.assertNotIn("BILL-20250101-1001", [bill_number for bill_number, score in results])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,237 @@
+import numpy as np
+import pandas as pd
+from utils.analytics_snapshot import to_category
+from utils.customer_store import normalize_phone
+
+# Analytics frames keep customers, phones and products as integer codes into
+# small vocabularies instead of one Python string per row. Group-bys and item
+# counts then run on int32 arrays (np.bincount) rather than Python objects.
+#
+# Per-customer and per-bill lookups use CSR-style indexes: row positions sorted
+# by group plus an offsets array, so the rows of group i are
+# order[offsets[i]:offsets[i + 1]] and selecting one customer's bills or one
+# bill's line items never scans the whole frame.
+CATEGORIES = ['Cosmetics', 'Groceries', 'Drinks']
+CATEGORY_COUNT_COLUMNS = {
+    'Cosmetics': 'Cosmetic Count',
+    'Groceries': 'Grocery Count',
+    'Drinks': 'Drink Count'
+}
+
+
+def _csr_index(group_ids, group_count):
+    """Return (order, offsets) such that order[offsets[i]:offsets[i + 1]] are the positions of group i."""
+    order = np.argsort(group_ids, kind='stable').astype(np.int32)
+    return order, _offsets(group_ids, group_count)
+
+
+def _offsets(group_ids, group_count):
+    """Start of each group among the positions sorted by group, plus the total at the end."""
+    offsets = np.zeros(group_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(group_ids, minlength=group_count), out=offsets[1:])
+    return offsets
+
+
+def _gather(order, offsets, groups):
+    """Concatenate the positions of the given groups of a CSR index."""
+    groups = np.asarray(groups, dtype=np.int64)
+    starts = offsets[groups]
+    lengths = offsets[groups + 1] - starts
+    if lengths.sum() == 0:
+        return np.zeros(0, dtype=order.dtype)
+    # Position of each gathered element within its group, added to the group start
+    within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return order[np.repeat(starts, lengths) + within]
+
+
+def _encode(values):
+    """Dictionary-encode a column, returning (int32 codes, vocabulary Index)."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        categorical = values.cat.remove_unused_categories()
+    else:
+        categorical = to_category(values)
+    return categorical.cat.codes.to_numpy(dtype=np.int32), categorical.cat.categories
+
+
+def encode_analytics_frames(bills_df, line_items_df):
+    """
+    Build dictionary-encoded analytics frames from the snapshot frames.
+
+    The bill frame gets categorical customer and phone columns plus the
+    per-category item counts. The line item frame is reduced to integer arrays:
+    the row of its bill in the bill frame, the SKU id and the category id.
+
+    Args:
+        bills_df (pd.DataFrame): Bill summary frame (from analytics_snapshot)
+        line_items_df (pd.DataFrame): Line item frame (from analytics_snapshot)
+
+    Returns:
+        tuple: (billing_df, line_items) where line_items is a dict with the
+            "bill_index", "sku_id", "category_id" and "quantity" arrays, the
+            "skus" vocabulary and the "bill_order"/"bill_offsets" index of the
+            line items of each bill
+    """
+    billing_df = bills_df.reset_index(drop=True)
+    for column in ('Customer Name', 'Phone Number'):
+        if not isinstance(billing_df[column].dtype, pd.CategoricalDtype):
+            billing_df[column] = to_category(billing_df[column])
+
+    # Map each line item to the row(s) of its bill. The ledger can list a bill
+    # more than once, in which case every row gets the bill's items.
+    bill_rows = pd.DataFrame({
+        'Bill Number': billing_df['Bill Number'].astype(str),
+        'bill_index': np.arange(len(billing_df), dtype=np.int32)
+    })
+    joined = pd.DataFrame({
+        'Bill Number': line_items_df['Bill Number'].astype(str),
+        'Category': line_items_df['Category'],
+        'Item': line_items_df['Item'],
+        'Quantity': line_items_df['Quantity']
+    }).merge(bill_rows, on='Bill Number', how='inner')
+
+    sku_id, skus = _encode(joined['Item'])
+    category_id = pd.Categorical(joined['Category'].astype(str), categories=CATEGORIES).codes.astype(np.int8)
+    bill_index = joined['bill_index'].to_numpy(dtype=np.int32)
+    line_items = {
+        "bill_index": bill_index,
+        "sku_id": sku_id,
+        "category_id": category_id,
+        "quantity": joined['Quantity'].to_numpy(),
+        "skus": skus
+    }
+    # Line items grouped by bill row
+    line_items["bill_order"], line_items["bill_offsets"] = _csr_index(bill_index, len(billing_df))
+
+    # Number of product lines per bill and category in one bincount
+    bill_count = len(billing_df)
+    per_bill = np.bincount(
+        line_items["bill_index"].astype(np.int64) * len(CATEGORIES) + line_items["category_id"],
+        minlength=bill_count * len(CATEGORIES)
+    ).reshape(bill_count, len(CATEGORIES))
+    for i, category in enumerate(CATEGORIES):
+        billing_df[CATEGORY_COUNT_COLUMNS[category]] = per_bill[:, i].astype(np.int32)
+    billing_df['Total Items'] = per_bill.sum(axis=1).astype(np.int32)
+
+    return billing_df, line_items
+
+
+def customer_names(billing_df):
+    """Return the sorted customer names of an encoded billing frame."""
+    return sorted(
+        str(name) for name in billing_df['Customer Name'].cat.categories
+        if name is not None and not pd.isna(name)
+    )
+
+
+def customer_index(billing_df):
+    """
+    Group the bills of an encoded billing frame by customer.
+
+    Customers are identified by their normalized phone number, so bills entered
+    under different spellings of the same name share one history. Bills
+    without a phone number are grouped by customer name. Phone numbers are
+    normalized once per vocabulary entry, not once per bill.
+
+    Args:
+        billing_df (pd.DataFrame): Encoded billing frame from encode_analytics_frames
+
+    Returns:
+        dict: "customers", a frame with columns Customer (display label), Name
+            (most used name), Phone, Visits, Total Spent and Last Visit, one
+            row per customer sorted by label; and "order"/"offsets", the bill
+            rows of each customer in date order (see customer_rows)
+    """
+    phone_codes = billing_df['Phone Number'].cat.codes.to_numpy(dtype=np.int64)
+    name_codes = billing_df['Customer Name'].cat.codes.to_numpy(dtype=np.int64)
+    name_vocabulary = billing_df['Customer Name'].cat.categories.astype(str)
+
+    normalized = [normalize_phone(phone) for phone in billing_df['Phone Number'].cat.categories]
+    phone_ids, phones = pd.factorize(pd.Series(normalized, dtype=object))
+    # Per row: the normalized phone id, else a name id after the phones, else -1
+    row_phone = np.where(phone_codes >= 0, np.append(phone_ids, -1)[phone_codes], -1)
+    keys = np.where(row_phone >= 0, row_phone, np.where(name_codes >= 0, len(phones) + name_codes, -1))
+    known = np.flatnonzero(keys >= 0)
+    key_values, group = np.unique(keys[known], return_inverse=True)
+    customer_count = len(key_values)
+
+    dates = billing_df['Date'].to_numpy()[known]
+    totals = billing_df['Total'].to_numpy(dtype=float)[known]
+    by_customer = pd.DataFrame({'group': group, 'name': name_codes[known], 'date': dates})
+    # Most used name of each customer (ties go to the first name in the vocabulary)
+    name_counts = by_customer[by_customer['name'] >= 0].value_counts(['group', 'name']).reset_index()
+    top_names = name_counts.sort_values(['group', 'count', 'name'], ascending=[True, False, True],
+                                        kind='stable').drop_duplicates('group')
+    names = np.full(customer_count, '', dtype=object)
+    names[top_names['group'].to_numpy()] = name_vocabulary[top_names['name'].to_numpy()]
+    phone_labels = np.where(key_values < len(phones),
+                            np.append(phones.to_numpy(dtype=object), '')[np.minimum(key_values, len(phones))], '')
+
+    customers = pd.DataFrame({
+        'Name': names,
+        'Phone': phone_labels,
+        'Visits': np.bincount(group, minlength=customer_count),
+        'Total Spent': np.bincount(group, weights=np.nan_to_num(totals), minlength=customer_count),
+        'Last Visit': by_customer.groupby('group')['date'].max().reindex(range(customer_count)).to_numpy()
+    })
+    customers.insert(0, 'Customer', np.where(customers['Phone'] != '',
+                                             customers['Name'] + ' · ' + customers['Phone'], customers['Name']))
+
+    # Bill rows of each customer, oldest first
+    date_order = np.lexsort((dates, group))
+    order = known[date_order].astype(np.int32)
+    offsets = _offsets(group, customer_count)
+
+    # Sort the customers by label, carrying their position in the index along
+    customers['position'] = np.arange(customer_count)
+    customers = customers.sort_values('Customer', key=lambda labels: labels.str.lower(),
+                                      kind='stable').reset_index(drop=True)
+    return {"customers": customers, "order": order, "offsets": offsets}
+
+
+def customer_rows(index, customer):
+    """
+    Return the billing frame rows of one customer, oldest bill first.
+
+    Args:
+        index (dict): Customer index from customer_index
+        customer (int): Row of the customer in index["customers"]
+
+    Returns:
+        np.ndarray: Row positions in the billing frame
+    """
+    position = index["customers"]['position'].iat[customer]
+    return index["order"][index["offsets"][position]:index["offsets"][position + 1]]
+
+
+def item_counts(line_items, category=None, bill_rows=None):
+    """
+    Count how many bills each product appears on.
+
+    Args:
+        line_items (dict): Encoded line items from encode_analytics_frames
+        category (str, optional): Only count products of this category
+        bill_rows (array, optional): Boolean mask or row positions of the bills to include
+
+    Returns:
+        pd.DataFrame: Columns Item and Count, most frequent first
+    """
+    bill_rows = None if bill_rows is None else np.asarray(bill_rows)
+    if bill_rows is not None and bill_rows.dtype != bool:
+        # Only look at the line items of those bills, from the per-bill index
+        selected = _gather(line_items["bill_order"], line_items["bill_offsets"], bill_rows)
+    else:
+        selected = slice(None)
+    sku_id = line_items["sku_id"][selected]
+    mask = np.ones(len(sku_id), dtype=bool)
+    if category is not None:
+        mask &= line_items["category_id"][selected] == CATEGORIES.index(category)
+    if bill_rows is not None and bill_rows.dtype == bool:
+        mask &= bill_rows[line_items["bill_index"]]
+
+    counts = np.bincount(sku_id[mask], minlength=len(line_items["skus"]))
+    sold = np.flatnonzero(counts)
+    order = sold[np.argsort(-counts[sold], kind='stable')]
+    return pd.DataFrame({
+        'Item': line_items["skus"][order].astype(str),
+        'Count': counts[order]
+    })
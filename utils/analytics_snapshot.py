@@ -0,0 +1,221 @@
+import os
+import argparse
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from utils import bill_store, excel_export
+
+# Analytics read typed, uncompressed Feather snapshots of the bill ledger.
+# Uncompressed Arrow files can be memory mapped, so loading them does not parse
+# anything and only touches the pages that are actually used.
+PROJECT_DIR = os.path.dirname(os.path.dirname(__file__))
+SNAPSHOT_DIR = os.path.join(PROJECT_DIR, "data", "snapshots")
+BILLS_SNAPSHOT = "bills.feather"
+LINE_ITEMS_SNAPSHOT = "line_items.feather"
+DEFAULT_LEDGER_FILE = os.path.join(PROJECT_DIR, "vdx_excel_bills.xlsx")
+
+BILL_COLUMNS = ['Bill Number', 'Date', 'Customer Name', 'Phone Number', 'Subtotal', 'Tax', 'Total']
+LINE_ITEM_COLUMNS = ['Bill Number', 'Category', 'Item', 'Quantity', 'Price']
+
+
+def to_category(values):
+    """Convert a column to a categorical of strings, keeping missing values missing."""
+    return values.astype(str).where(values.notna()).astype('category')
+
+
+def _type_bills_frame(df):
+    """Apply the snapshot column types to a bill summary frame."""
+    return pd.DataFrame({
+        'Bill Number': df['Bill Number'].astype(str),
+        'Date': pd.to_datetime(df['Date'], errors='coerce'),
+        'Customer Name': to_category(df['Customer Name']),
+        'Phone Number': to_category(df['Phone Number']),
+        'Subtotal': pd.to_numeric(df['Subtotal'], errors='coerce').astype('float64'),
+        'Tax': pd.to_numeric(df['Tax'], errors='coerce').astype('float64'),
+        'Total': pd.to_numeric(df['Total'], errors='coerce').astype('float64')
+    })
+
+
+def _type_line_items_frame(df):
+    """Apply the snapshot column types to a line item frame."""
+    return pd.DataFrame({
+        'Bill Number': df['Bill Number'].astype(str),
+        'Category': to_category(df['Category']),
+        'Item': to_category(df['Item']),
+        'Quantity': pd.to_numeric(df['Quantity'], errors='coerce').fillna(0).astype('int32'),
+        'Price': pd.to_numeric(df['Price'], errors='coerce').astype('float64')
+    })
+
+
+def build_snapshot_frames(ledger_file=None, bills_directory=None):
+    """
+    Build the bill summary and line item frames from the ledger and the bill store.
+
+    Bill totals come from the ledger workbook (vdx_excel_bills.xlsx), line items
+    from the partition manifests, falling back to parsing the text bill for bills
+    saved without line items.
+
+    Args:
+        ledger_file (str, optional): Path of the ledger workbook
+        bills_directory (str, optional): Root bills directory
+
+    Returns:
+        tuple: (bills_df, line_items_df)
+    """
+    if ledger_file is None:
+        ledger_file = DEFAULT_LEDGER_FILE
+
+    ledger_df = pd.read_excel(ledger_file)
+    bills_df = _type_bills_frame(pd.DataFrame({
+        'Bill Number': ledger_df['Bill Number'],
+        'Date': pd.to_datetime(ledger_df['Date'], format='%d-%m-%Y %H:%M:%S', errors='coerce'),
+        'Customer Name': ledger_df['Customer Name'],
+        'Phone Number': ledger_df['Phone Number'],
+        'Subtotal': ledger_df['Subtotal'],
+        'Tax': ledger_df['Tax'],
+        'Total': ledger_df['Total']
+    }))
+
+    bill_numbers = []
+    categories = []
+    items = []
+    quantities = []
+    item_prices = []
+    for entry in bill_store.iter_bills(bills_directory):
+        line_items = entry.get('items')
+        if line_items is None:
+            content = bill_store.read_artifact(entry, 'txt')
+            if content is None:
+                continue
+            line_items = bill_store.parse_bill_text(content.decode('utf-8'))['items']
+        for item in line_items:
+            bill_numbers.append(entry['bill_number'])
+            categories.append(item['category'])
+            items.append(item['name'])
+            quantities.append(item['quantity'])
+            item_prices.append(item['price'])
+
+    line_items_df = _type_line_items_frame(pd.DataFrame({
+        'Bill Number': bill_numbers,
+        'Category': categories,
+        'Item': items,
+        'Quantity': quantities,
+        'Price': item_prices
+    }, columns=LINE_ITEM_COLUMNS))
+
+    return bills_df, line_items_df
+
+
+def write_snapshot(bills_df, line_items_df, snapshot_dir=None):
+    """
+    Write the analytics frames as uncompressed Feather files.
+
+    Files are written to a temporary name and renamed, so readers never see a
+    partially written snapshot.
+
+    Args:
+        bills_df (pd.DataFrame): Bill summary frame
+        line_items_df (pd.DataFrame): Line item frame
+        snapshot_dir (str, optional): Snapshot directory
+    """
+    if snapshot_dir is None:
+        snapshot_dir = SNAPSHOT_DIR
+    os.makedirs(snapshot_dir, exist_ok=True)
+    for df, filename in ((bills_df, BILLS_SNAPSHOT), (line_items_df, LINE_ITEMS_SNAPSHOT)):
+        path = os.path.join(snapshot_dir, filename)
+        table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+        feather.write_feather(table, path + ".tmp", compression='uncompressed')
+        os.replace(path + ".tmp", path)
+
+
+def load_snapshot(snapshot_dir=None):
+    """
+    Load the analytics frames by memory mapping the snapshot files.
+
+    Args:
+        snapshot_dir (str, optional): Snapshot directory
+
+    Returns:
+        tuple: (bills_df, line_items_df), or None if there is no snapshot
+    """
+    if snapshot_dir is None:
+        snapshot_dir = SNAPSHOT_DIR
+    bills_path = os.path.join(snapshot_dir, BILLS_SNAPSHOT)
+    line_items_path = os.path.join(snapshot_dir, LINE_ITEMS_SNAPSHOT)
+    if not (os.path.exists(bills_path) and os.path.exists(line_items_path)):
+        return None
+    bills_df = feather.read_table(bills_path, memory_map=True).to_pandas()
+    line_items_df = feather.read_table(line_items_path, memory_map=True).to_pandas()
+    return bills_df, line_items_df
+
+
+def get_snapshot_version(snapshot_dir=None):
+    """Return a token that changes whenever the snapshot is rewritten, or None."""
+    if snapshot_dir is None:
+        snapshot_dir = SNAPSHOT_DIR
+    try:
+        return max(os.stat(os.path.join(snapshot_dir, filename)).st_mtime_ns
+                   for filename in (BILLS_SNAPSHOT, LINE_ITEMS_SNAPSHOT))
+    except FileNotFoundError:
+        return None
+
+
+def get_sources_mtime(ledger_file=None, bills_directory=None):
+    """Return the latest modification time of the ledger and the partition manifests."""
+    if ledger_file is None:
+        ledger_file = DEFAULT_LEDGER_FILE
+    mtimes = [os.path.getmtime(ledger_file)] if os.path.exists(ledger_file) else [0.0]
+    for partition_date, partition_dir in bill_store.list_partitions(bills_directory):
+        manifest_path = os.path.join(partition_dir, bill_store.MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            mtimes.append(os.path.getmtime(manifest_path))
+    return max(mtimes)
+
+
+def is_snapshot_stale(snapshot_dir=None, ledger_file=None, bills_directory=None):
+    """Check whether the snapshot is missing or older than its sources."""
+    if snapshot_dir is None:
+        snapshot_dir = SNAPSHOT_DIR
+    snapshot_mtimes = []
+    for filename in (BILLS_SNAPSHOT, LINE_ITEMS_SNAPSHOT):
+        path = os.path.join(snapshot_dir, filename)
+        if not os.path.exists(path):
+            return True
+        snapshot_mtimes.append(os.path.getmtime(path))
+    return min(snapshot_mtimes) < get_sources_mtime(ledger_file, bills_directory)
+
+
+def refresh_snapshot(snapshot_dir=None, ledger_file=None, bills_directory=None, force=False):
+    """
+    Rebuild the snapshot if it is stale and return the analytics frames.
+
+    Args:
+        snapshot_dir (str, optional): Snapshot directory
+        ledger_file (str, optional): Path of the ledger workbook
+        bills_directory (str, optional): Root bills directory
+        force (bool): Rebuild even if the snapshot is up to date
+
+    Returns:
+        tuple: (bills_df, line_items_df)
+    """
+    # Bills exported since the ledger was last read are written into it first
+    excel_export.materialize_ledger(ledger_file or DEFAULT_LEDGER_FILE)
+    if force or is_snapshot_stale(snapshot_dir, ledger_file, bills_directory):
+        bills_df, line_items_df = build_snapshot_frames(ledger_file, bills_directory)
+        write_snapshot(bills_df, line_items_df, snapshot_dir)
+    return load_snapshot(snapshot_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the columnar analytics snapshot")
+    parser.add_argument("--ledger", default=None, help="Ledger workbook (default: vdx_excel_bills.xlsx)")
+    parser.add_argument("--bills-dir", default=None, help="Bills directory (default: saved_bills)")
+    parser.add_argument("--snapshot-dir", default=None, help="Snapshot directory (default: data/snapshots)")
+    args = parser.parse_args(argv)
+
+    bills_df, line_items_df = refresh_snapshot(args.snapshot_dir, args.ledger, args.bills_dir, force=True)
+    print(f"Snapshot written with {len(bills_df):,d} bills and {len(line_items_df):,d} line items")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,47 @@ import os
 import pandas as pd
 from datetime import datetime
 from utils.bill_storage import save_bill_to_master
+from utils import bill_store
+from utils.bill_model import Bill, LineItem, TAX_RATE, traverse
+
+
+class FrameRenderer:
+    """Renders a bill_model.Bill as the Item/Quantity/Price/Total DataFrame of the master file."""
+
+    def begin(self, bill):
+        self.rows = [
+            self._row('BILL INFORMATION'),
+            self._row(f"Bill Number: {bill.bill_number}"),
+            self._row(f"Date: {bill.date.strftime('%Y-%m-%d %H:%M:%S')}"),
+            self._row(f"Customer: {bill.customer_name}"),
+            self._row(f"Phone: {bill.phone_number}"),
+            self._separator()
+        ]
+
+    @staticmethod
+    def _row(item, quantity='', price='', total=''):
+        return {'Item': item, 'Quantity': quantity, 'Price': price, 'Total': total}
+
+    @staticmethod
+    def _separator():
+        return {'Item': '------------------------', 'Quantity': '--------', 'Price': '--------', 'Total': '--------'}
+
+    def category(self, category):
+        # The master file has no category sections
+        pass
+
+    def line(self, item):
+        self.rows.append(self._row(item.name, item.quantity, item.price, item.total))
+
+    def end(self, bill):
+        self.rows.extend([
+            self._separator(),
+            self._row('Subtotal:', total=bill.subtotal),
+            self._row(f'Tax ({int(TAX_RATE * 100)}%):', total=bill.total_tax),
+            self._row('Grand Total:', total=bill.grand_total)
+        ])
+        return pd.DataFrame(self.rows)
+
 
 def generate_bill(items, customer_info, bill_number=None, date=None):
     """
@@ -24,113 +65,26 @@ def generate_bill(items, customer_info, bill_number=None, date=None):
     if bill_number is None:
         bill_number = f"BILL-{date.strftime('%Y%m%d')}-{str(hash(str(customer_info) + str(date)))[-4:]}"
     
-    # Create bill DataFrame
-    bill_rows = []
-    
-    # Add header information
-    bill_rows.append({
-        'Item': 'BILL INFORMATION',
-        'Quantity': '',
-        'Price': '',
-        'Total': ''
-    })
-    
-    bill_rows.append({
-        'Item': f"Bill Number: {bill_number}",
-        'Quantity': '',
-        'Price': '',
-        'Total': ''
-    })
-    
-    bill_rows.append({
-        'Item': f"Date: {date.strftime('%Y-%m-%d %H:%M:%S')}",
-        'Quantity': '',
-        'Price': '',
-        'Total': ''
-    })
-    
-    bill_rows.append({
-        'Item': f"Customer: {customer_info.get('name', 'N/A')}",
-        'Quantity': '',
-        'Price': '',
-        'Total': ''
-    })
-    
-    bill_rows.append({
-        'Item': f"Phone: {customer_info.get('phone', 'N/A')}",
-        'Quantity': '',
-        'Price': '',
-        'Total': ''
-    })
-    
-    # Add separator
-    bill_rows.append({
-        'Item': '------------------------',
-        'Quantity': '--------',
-        'Price': '--------',
-        'Total': '--------'
-    })
-    
-    # Add items
-    subtotal = 0
-    for item_name, details in items.items():
-        if details.get('quantity', 0) > 0:
-            price = details.get('price', 0)
-            quantity = details.get('quantity', 0)
-            total = price * quantity
-            subtotal += total
-            
-            bill_rows.append({
-                'Item': item_name,
-                'Quantity': quantity,
-                'Price': price,
-                'Total': total
-            })
-    
-    # Add totals
-    tax_rate = 0.18  # 18% GST
-    tax = subtotal * tax_rate
-    grand_total = subtotal + tax
-    
-    # Add separator
-    bill_rows.append({
-        'Item': '------------------------',
-        'Quantity': '--------',
-        'Price': '--------',
-        'Total': '--------'
-    })
-    
-    # Add subtotal, tax, and grand total
-    bill_rows.append({
-        'Item': 'Subtotal:',
-        'Quantity': '',
-        'Price': '',
-        'Total': subtotal
-    })
-    
-    bill_rows.append({
-        'Item': f'Tax ({int(tax_rate*100)}%):',
-        'Quantity': '',
-        'Price': '',
-        'Total': tax
-    })
-    
-    bill_rows.append({
-        'Item': 'Grand Total:',
-        'Quantity': '',
-        'Price': '',
-        'Total': grand_total
-    })
-    
-    # Create DataFrame
-    bill_df = pd.DataFrame(bill_rows)
+    bill = Bill.from_lines(
+        bill_number,
+        date,
+        customer_info.get('name', 'N/A'),
+        customer_info.get('phone', 'N/A'),
+        [
+            LineItem(details.get('category', 'Items'), item_name, details.get('quantity', 0), details.get('price', 0))
+            for item_name, details in items.items()
+        ]
+    )
+    bill_df = traverse(bill, {"frame": FrameRenderer()})["frame"]
     
     # Save to individual bill file
-    # Save to bills directory in project root
-    bills_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "saved_bills")
-    os.makedirs(bills_dir, exist_ok=True)
-    bill_file_path = os.path.join(bills_dir, f"bill_{bill_number}_{date.strftime('%Y%m%d')}.xlsx")
+    # Save to the bill's date partition in the project's bills directory
+    bills_dir = bill_store.get_default_bills_directory()
+    bill_file_path = bill_store.get_artifact_path(
+        bills_dir, bill_number, ".xlsx", filename=f"bill_{bill_number}_{date.strftime('%Y%m%d')}.xlsx"
+    )
     bill_df.to_excel(bill_file_path, index=False)
+    bill_store.record_artifact(bills_dir, bill_number, "generator_xlsx", bill_file_path)
     
     # Also save to the master file
     master_file_path = save_bill_to_master(bill_df)
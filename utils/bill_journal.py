@@ -0,0 +1,402 @@
+import os
+import json
+import zlib
+import time
+import uuid
+import argparse
+import threading
+from datetime import datetime
+from utils import tracing
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: only the threads of one process are coordinated
+    fcntl = None
+
+# Write-ahead journal for bill commits. A bill touches several files (the
+# inventory, the text bill and its manifest entry, the PDF, the per-bill
+# workbook and the ledger), which cannot be updated atomically together.
+# Each change is therefore a transaction: its "begin" record, holding
+# everything needed to redo it, is made durable in the journal before any file
+# is touched, and an "end" record is appended once every file has been
+# written. A process that opens the journal redoes the transactions that began
+# but never ended, so a crash between two files leaves the bill complete
+# instead of half written.
+#
+# Records are JSON lines prefixed with their CRC-32; a torn last line (a crash
+# during the append) fails the check and ends the log. Only begin records need
+# to be durable before work starts, and they are synced in groups: a thread
+# that needs its record on disk fsyncs everything written so far, and threads
+# that append meanwhile wait for that fsync or the next one, so concurrent
+# checkouts share fsyncs instead of paying one each. End records are only
+# synced with the next group (a transaction redone after a power loss
+# overwrites files with the same content), abort records right away. Once
+# CHECKPOINT_TRANSACTIONS transactions have ended and none is in flight, the
+# files they wrote are fsynced and the journal is truncated.
+#
+# Every process using a data directory (the app, the POS API) shares its
+# journal, so records are appended with single unbuffered O_APPEND writes and
+# processes coordinate with flock: a process holds a shared lock while it has
+# transactions in flight, and checkpoints and recovery take an exclusive lock
+# (through a second descriptor, so they also exclude the process's own
+# threads). Holding it, every unfinished transaction in the file belongs to a
+# process that died. Checkpoints never block for it: when it is busy they are
+# left to the next one, and when dead transactions are in the file they are
+# kept (see get_incomplete_transactions) for the next process that recovers.
+#
+# Stock levels are journaled as the levels after the transaction, so redoing
+# one twice is harmless. A later transaction that set the stock of the same
+# product wrote a level that already counts the earlier one, so redoing the
+# earlier level would undo the later sale: those products are dropped from
+# the earlier transaction instead.
+JOURNAL_FILE = "bill_journal.wal"
+CHECKPOINT_TRANSACTIONS = 256
+# Seconds recovery waits for other processes to finish their transactions
+RECOVERY_WAIT = 2.0
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def _encode(record):
+    payload = json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return b"%08x %s\n" % (zlib.crc32(payload), payload)
+
+
+def _decode(line):
+    """Decode a journal line, or return None if it is torn or corrupt."""
+    if not line.endswith(b"\n") or len(line) < 10:
+        return None
+    checksum, payload = line[:8], line[9:-1]
+    try:
+        if int(checksum, 16) != zlib.crc32(payload):
+            return None
+        return json.loads(payload)
+    except ValueError:
+        return None
+
+
+def read_records(path):
+    """Return the records of a journal file up to the first torn or corrupt line."""
+    records = []
+    try:
+        with open(path, 'rb') as f:
+            for line in f:
+                record = _decode(line)
+                if record is None:
+                    break
+                records.append(record)
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def get_incomplete_transactions(records):
+    """
+    Return the begin records of the transactions without an end record, in log order.
+
+    Products whose stock a later transaction set again are removed from the
+    records' "stock" (see the module comment).
+    """
+    begun = {}
+    for record in records:
+        if record["type"] == "begin":
+            stock = record.get("stock")
+            if stock:
+                for earlier in begun.values():
+                    for name in stock:
+                        earlier["stock"].pop(name, None)
+            if stock is not None:
+                record = dict(record, stock=dict(stock))
+            begun[record["txn"]] = record
+        else:
+            begun.pop(record["txn"], None)
+    return list(begun.values())
+
+
+def _lock_shared(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_SH)
+
+
+def _try_lock_exclusive(fd):
+    """Take an exclusive lock without waiting; returns whether it was taken."""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+def _unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def _fsync_path(path):
+    """Flush a file (or, where supported, a directory) to disk; missing files are skipped."""
+    try:
+        if os.path.isdir(path):
+            fd = os.open(path, os.O_RDONLY)
+        else:
+            # Opened for appending because Windows only flushes writable handles
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class BillJournal:
+    """
+    Append-only transaction journal with group commit.
+
+    Use open_journal() to get the journal of a file, so that every service of
+    a process shares one instance.
+
+    Args:
+        path (str): Journal file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._cond = threading.Condition()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        # Exclusive locks are taken on a descriptor of their own, which
+        # conflicts with this process's shared lock on _fd
+        self._lock_fd = os.open(path, os.O_RDONLY)
+        # Transactions in flight holding the shared lock, and its guard
+        self._holders = 0
+        self._holders_lock = threading.Lock()
+        # Sequence numbers of the last record written and the last one on disk
+        self._written = 0
+        self._synced = 0
+        self._syncing = False
+        self._active = set()
+        self._ended = 0
+        self._touched = set()
+        self.fsyncs = 0
+        # Set by the first service that recovers this journal
+        self.recovered = False
+
+    def _append(self, record):
+        with self._cond:
+            os.write(self._fd, _encode(record))
+            self._written += 1
+            return self._written
+
+    def _hold(self):
+        """Hold the shared lock for a transaction, waiting out another process's checkpoint."""
+        with self._holders_lock:
+            if self._holders == 0:
+                _lock_shared(self._fd)
+            self._holders += 1
+
+    def _release(self):
+        with self._holders_lock:
+            self._holders -= 1
+            if self._holders == 0:
+                _unlock(self._fd)
+
+    def sync(self, seq):
+        """Wait until record seq is on disk, fsyncing for every waiting writer at once."""
+        with self._cond:
+            while self._synced < seq:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+                self._syncing = True
+                target = self._written
+                self._cond.release()
+                try:
+                    with tracing.span("journal_sync"):
+                        os.fsync(self._fd)
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                    self._cond.notify_all()
+                self._synced = max(self._synced, target)
+                self.fsyncs += 1
+
+    def begin(self, kind, **data):
+        """
+        Append the begin record of a transaction without waiting for it to be durable.
+
+        Call sync() with the returned sequence number before applying the
+        transaction. Appending and syncing are separate so that callers can
+        append under their own lock and wait for the disk outside it.
+
+        Args:
+            kind (str): Transaction kind
+            **data: JSON-serializable data needed to redo the transaction
+
+        Returns:
+            tuple: (transaction id, sequence number of the record)
+        """
+        txn = uuid.uuid4().hex
+        record = {
+            "type": "begin",
+            "txn": txn,
+            "kind": kind,
+            "time": datetime.now().isoformat(timespec="seconds"),
+            **data
+        }
+        self._hold()
+        try:
+            with self._cond:
+                seq = self._append(record)
+                self._active.add(txn)
+        except BaseException:
+            self._release()
+            raise
+        return txn, seq
+
+    def end(self, txn, touched=(), aborted=False):
+        """
+        Mark a transaction as applied (or aborted) and remember the files it wrote.
+
+        Args:
+            txn (str): Transaction id from begin()
+            touched (iterable): Paths written by the transaction, fsynced at the next checkpoint
+            aborted (bool): The transaction was rolled back instead of applied
+        """
+        with self._cond:
+            # Written unbuffered, so that only a power loss (not a crash of
+            # the process) can make an applied transaction look unfinished
+            seq = self._append({"type": "abort" if aborted else "end", "txn": txn})
+            self._active.discard(txn)
+            self._touched.update(path for path in touched if path)
+            self._ended += 1
+        if aborted:
+            # Redoing a rolled back transaction would undo the rollback
+            self.sync(seq)
+        self._release()
+        if self._ended >= CHECKPOINT_TRANSACTIONS:
+            self.checkpoint()
+
+    def _try_exclusive(self):
+        """Take the exclusive lock if no transaction of any process is in flight; call with _cond held."""
+        return not self._active and _try_lock_exclusive(self._lock_fd)
+
+    def checkpoint(self):
+        """
+        Fsync the files written by ended transactions and empty the journal.
+
+        Transactions of processes that died are kept in it.
+
+        Returns:
+            bool: False if a transaction was in flight and nothing was done
+        """
+        with self._cond:
+            if not self._try_exclusive():
+                return False
+            try:
+                self._checkpoint(get_incomplete_transactions(read_records(self.path)))
+            finally:
+                _unlock(self._lock_fd)
+            return True
+
+    def _checkpoint(self, kept=()):
+        directories = set()
+        for path in self._touched:
+            _fsync_path(path)
+            directories.add(os.path.dirname(path))
+        # Renames (atomic writes) are only durable once their directory is
+        for directory in directories:
+            _fsync_path(directory)
+        os.ftruncate(self._fd, 0)
+        for record in kept:
+            os.write(self._fd, _encode(record))
+        os.fsync(self._fd)
+        self._touched.clear()
+        self._ended = 0
+        self._synced = self._written
+
+    def recover(self, redo, wait=RECOVERY_WAIT):
+        """
+        Redo the transactions that processes (including earlier runs of this
+        one) began but never ended, then empty the journal.
+
+        Args:
+            redo (callable): Called with each begin record; applies it again
+                and returns the paths it wrote
+            wait (float): Seconds to wait for other processes' transactions in flight
+
+        Returns:
+            list: Begin records redone, or None if the journal stayed busy
+        """
+        deadline = time.monotonic() + wait
+        while True:
+            with self._cond:
+                if self._try_exclusive():
+                    try:
+                        records = get_incomplete_transactions(read_records(self.path))
+                        for record in records:
+                            self._touched.update(path for path in redo(record) if path)
+                            self._append({"type": "end", "txn": record["txn"]})
+                        self._checkpoint()
+                        return records
+                    finally:
+                        _unlock(self._lock_fd)
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.01)
+
+    def incomplete_transactions(self):
+        """Return the begin records of the transactions in the file that never ended."""
+        with self._cond:
+            return [
+                record for record in get_incomplete_transactions(read_records(self.path))
+                if record["txn"] not in self._active
+            ]
+
+    def close(self):
+        with self._cond:
+            os.close(self._fd)
+            os.close(self._lock_fd)
+
+
+def open_journal(path):
+    """Return the shared journal of a file, opening it on first use."""
+    path = os.path.abspath(path)
+    with _journals_lock:
+        journal = _journals.get(path)
+        if journal is None:
+            journal = _journals[path] = BillJournal(path)
+        return journal
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or recover the bill journal")
+    parser.add_argument("command", choices=["status", "recover"], help="Show incomplete transactions, or redo them")
+    parser.add_argument("--data-dir", default=None, help="Catalog directory holding the journal (default: data)")
+    parser.add_argument("--bills-dir", default=None, help="Bills directory (default: saved_bills)")
+    args = parser.parse_args(argv)
+
+    # Imported here because the billing service itself uses this module
+    from utils import catalog
+    from utils.billing_service import BillingService
+
+    path = catalog.get_data_file(JOURNAL_FILE, args.data_dir)
+    if args.command == "status":
+        records = read_records(path)
+        incomplete = get_incomplete_transactions(records)
+        print(f"{path}: {len(records):,d} records, {len(incomplete):,d} incomplete transactions")
+        for record in incomplete:
+            print(f"  {record['time']}  {record['kind']:<8}{record.get('bill', {}).get('bill_number', '')}")
+    else:
+        service = BillingService(args.data_dir, args.bills_dir, recover=False)
+        recovered = service.recover()
+        print(f"Redid {len(recovered):,d} incomplete transactions" + (": " + ", ".join(recovered) if recovered else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+import io
+import json
+import html
+from datetime import datetime
+from dataclasses import dataclass
+
+# The bill as one immutable value. It is priced once, when it is created,
+# and every format (text, PDF, Excel, HTML, JSON) is rendered from it, so
+# they can no longer disagree, and the PDF no longer parses the text bill back.
+#
+# Renderers receive the bill as a traversal: begin(bill), then for each
+# category with purchased items category(name) followed by line(item) for
+# each of them, then end(bill), which returns the output. render() walks the
+# bill once and feeds every requested renderer at each step, so producing all
+# formats costs a single pass over the line items.
+CATEGORIES = ("Cosmetics", "Groceries", "Drinks")
+CATEGORY_TOTALS = {"Cosmetics": "cosmetic_total", "Groceries": "grocery_total", "Drinks": "drink_total"}
+# Headings of the category sections of the text, Excel and PDF bills
+CATEGORY_HEADINGS = {"Cosmetics": "COSMETICS:", "Groceries": "GROCERY:", "Drinks": "DRINKS:"}
+TAX_RATE = 0.18  # 18% GST
+TITLE = "GROCERY BILLING SYSTEM"
+DISPLAY_DATE_FORMAT = "%d-%m-%Y %H:%M:%S"
+# Same as bill_store.MANIFEST_DATE_FORMAT
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+FORMATS = ("txt", "pdf", "xlsx", "html", "json")
+
+
+def compute_totals(cosmetic_items, grocery_items, drink_items, prices):
+    """Per-category totals, subtotal, tax and grand total of a cart (see bill_operations.calculate_total)."""
+    cosmetic_total = sum(qty * prices.get(item, 0) for item, qty in cosmetic_items.items() if qty > 0)
+    grocery_total = sum(qty * prices.get(item, 0) for item, qty in grocery_items.items() if qty > 0)
+    drink_total = sum(qty * prices.get(item, 0) for item, qty in drink_items.items() if qty > 0)
+    subtotal = cosmetic_total + grocery_total + drink_total
+    tax = subtotal * TAX_RATE
+    return {
+        "cosmetic_total": cosmetic_total,
+        "grocery_total": grocery_total,
+        "drink_total": drink_total,
+        "subtotal": subtotal,
+        "total_tax": tax,
+        "grand_total": subtotal + tax
+    }
+
+
+def get_heading(category):
+    return CATEGORY_HEADINGS.get(category) or f"{category.upper()}:"
+
+
+@dataclass(frozen=True)
+class LineItem:
+    category: str
+    name: str
+    quantity: int
+    price: float
+
+    @property
+    def total(self):
+        return self.quantity * self.price
+
+
+@dataclass(frozen=True)
+class Bill:
+    """
+    A priced bill. Create it with from_items (a cart), from_dict (a bill
+    committed by BillingService) or from_manifest_entry (a stored bill).
+    """
+    bill_number: str
+    date: datetime
+    customer_name: str
+    phone_number: str
+    # Purchased items, grouped by category in CATEGORIES order
+    items: tuple
+    cosmetic_total: float
+    grocery_total: float
+    drink_total: float
+    subtotal: float
+    total_tax: float
+    grand_total: float
+
+    @classmethod
+    def from_items(cls, bill_number, date, customer_name, phone_number,
+                   cosmetic_items, grocery_items, drink_items, prices):
+        """
+        Price a cart.
+
+        Args:
+            bill_number (str): Bill number
+            date (datetime, optional): Bill date (default: now)
+            customer_name (str): Customer name
+            phone_number (str): Customer phone number
+            cosmetic_items, grocery_items, drink_items (dict): Product name -> quantity
+            prices (dict): Product name -> price
+        """
+        items = [
+            LineItem(category, name, qty, prices.get(name, 0))
+            for category, category_items in zip(CATEGORIES, (cosmetic_items, grocery_items, drink_items))
+            for name, qty in category_items.items()
+            if qty > 0
+        ]
+        return cls.from_lines(bill_number, date, customer_name, phone_number, items)
+
+    @classmethod
+    def from_lines(cls, bill_number, date, customer_name, phone_number, items):
+        """
+        Price a bill from its line items, which may belong to other
+        categories than CATEGORIES (they count in the subtotal only).
+
+        Args:
+            items (iterable): LineItem objects, grouped by category
+        """
+        items = tuple(item for item in items if item.quantity > 0)
+        category_totals = {key: 0 for key in CATEGORY_TOTALS.values()}
+        other_total = 0
+        for item in items:
+            key = CATEGORY_TOTALS.get(item.category)
+            if key is None:
+                other_total += item.total
+            else:
+                category_totals[key] += item.total
+        # Added in the same order as compute_totals, so the totals are identical
+        subtotal = category_totals["cosmetic_total"] + category_totals["grocery_total"] + category_totals["drink_total"]
+        subtotal += other_total
+        tax = subtotal * TAX_RATE
+        return cls(bill_number, date or datetime.now(), customer_name, phone_number, items,
+                   subtotal=subtotal, total_tax=tax, grand_total=subtotal + tax, **category_totals)
+
+    @classmethod
+    def from_dict(cls, bill):
+        """Rebuild the bill committed by BillingService.commit."""
+        return cls.from_items(
+            bill["bill_number"],
+            datetime.strptime(bill["date"], DATE_FORMAT),
+            bill["customer_name"],
+            bill["phone_number"],
+            bill["cosmetic_items"],
+            bill["grocery_items"],
+            bill["drink_items"],
+            bill["prices"]
+        )
+
+    @classmethod
+    def from_manifest_entry(cls, entry):
+        """Rebuild a bill from its bill store manifest entry (see bill_store.record_artifact)."""
+        items = {category: {} for category in CATEGORIES}
+        prices = {}
+        for item in entry.get("items", []):
+            if item["category"] in items:
+                items[item["category"]][item["name"]] = item["quantity"]
+                prices[item["name"]] = item["price"]
+        return cls.from_items(
+            entry["bill_number"],
+            datetime.strptime(entry["date"], DATE_FORMAT),
+            entry.get("customer_name", ""),
+            entry.get("phone_number", ""),
+            items["Cosmetics"],
+            items["Groceries"],
+            items["Drinks"],
+            prices
+        )
+
+    @property
+    def totals(self):
+        """Totals as returned by bill_operations.calculate_total."""
+        return {
+            "cosmetic_total": self.cosmetic_total,
+            "grocery_total": self.grocery_total,
+            "drink_total": self.drink_total,
+            "subtotal": self.subtotal,
+            "total_tax": self.total_tax,
+            "grand_total": self.grand_total
+        }
+
+    @property
+    def display_date(self):
+        return self.date.strftime(DISPLAY_DATE_FORMAT)
+
+    def get_category_items(self):
+        """Yield (category, line items) for each category with purchased items."""
+        start = 0
+        while start < len(self.items):
+            category = self.items[start].category
+            end = start
+            while end < len(self.items) and self.items[end].category == category:
+                end += 1
+            yield category, self.items[start:end]
+            start = end
+
+
+class TextRenderer:
+    """The 60-column text bill (the bill's content)."""
+
+    def begin(self, bill):
+        self.lines = [
+            "=" * 60,
+            f"                 {TITLE}",
+            "=" * 60,
+            f"Bill Number: {bill.bill_number}",
+            f"Date: {bill.display_date}",
+            f"Customer Name: {bill.customer_name}",
+            f"Phone Number: {bill.phone_number}",
+            "-" * 60,
+            f"{'Item':<30}{'Qty':<10}{'Price':<10}{'Total':<10}",
+            "-" * 60
+        ]
+
+    def category(self, category):
+        self.lines.append(get_heading(category))
+
+    def line(self, item):
+        self.lines.append(f"{item.name:<30}{item.quantity:<10}{item.price:<10.2f}{item.total:<10.2f}")
+
+    def end(self, bill):
+        self.lines.extend([
+            "-" * 60,
+            f"{'Subtotal:':<40}{bill.subtotal:<20.2f}",
+            f"{'Tax (18%):':<40}{bill.total_tax:<20.2f}",
+            f"{'Total:':<40}{bill.grand_total:<20.2f}",
+            "-" * 60,
+            "Thank you for shopping with us!",
+            "=" * 60
+        ])
+        return "\n".join(self.lines)
+
+
+class ExcelRenderer:
+    """The per-bill workbook, as xlsx bytes."""
+
+    def begin(self, bill):
+        self.rows = [
+            [TITLE, "", "", ""],
+            ["Bill Number:", bill.bill_number, "", ""],
+            ["Date:", bill.display_date, "", ""],
+            ["Customer Name:", bill.customer_name, "", ""],
+            ["Phone Number:", bill.phone_number, "", ""],
+            ["", "", "", ""],
+            ["Item", "Quantity", "Price", "Total"]
+        ]
+
+    def category(self, category):
+        self.rows.append([get_heading(category), "", "", ""])
+
+    def line(self, item):
+        self.rows.append([item.name, item.quantity, item.price, item.total])
+
+    def end(self, bill):
+        self.rows.extend([
+            ["", "", "", ""],
+            ["Subtotal:", "", "", bill.subtotal],
+            ["Tax (18%):", "", "", bill.total_tax],
+            ["Total:", "", "", bill.grand_total]
+        ])
+        import xlsxwriter
+
+        output = io.BytesIO()
+        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+        worksheet = workbook.add_worksheet("Sheet1")
+        for i in range(4):
+            worksheet.set_column(i, i, max(len(str(row[i])) for row in self.rows) + 2)
+        for row_index, row in enumerate(self.rows):
+            worksheet.write_row(row_index, 0, row)
+        workbook.close()
+        return output.getvalue()
+
+
+class PDFRenderer:
+    """The printable bill, as PDF bytes (needs reportlab)."""
+
+    def begin(self, bill):
+        # reportlab is only imported when a PDF is rendered
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.platypus import Paragraph
+
+        self.styles = getSampleStyleSheet()
+        self.Paragraph = Paragraph
+        self.flowables = [Paragraph(TITLE, self.styles['Title']), self._rule()]
+        for label, value in (("Bill Number", bill.bill_number), ("Date", bill.display_date),
+                             ("Customer Name", bill.customer_name), ("Phone Number", bill.phone_number)):
+            self.flowables.append(Paragraph(f"<b>{label}: {html.escape(str(value))}</b>", self.styles['Normal']))
+        self.flowables.append(self._rule())
+        self.rows = []
+
+    def _rule(self):
+        return self.Paragraph('<hr/>', self.styles['Normal'])
+
+    def _flush_table(self):
+        if not self.rows:
+            return
+        from reportlab.platypus import Table, TableStyle
+
+        table = Table([["Item", "Qty", "Price", "Total"]] + self.rows, colWidths=[220, 60, 80, 80], hAlign="LEFT")
+        table.setStyle(TableStyle([
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("ALIGN", (1, 0), (-1, -1), "RIGHT"),
+            ("LINEBELOW", (0, 0), (-1, 0), 0.5, "#888888")
+        ]))
+        self.flowables.append(table)
+        self.rows = []
+
+    def category(self, category):
+        self._flush_table()
+        self.flowables.append(self.Paragraph(f"<b>{get_heading(category)}</b>", self.styles['Heading2']))
+
+    def line(self, item):
+        self.rows.append([item.name, item.quantity, f"{item.price:.2f}", f"{item.total:.2f}"])
+
+    def end(self, bill):
+        from reportlab.lib.pagesizes import letter
+        from reportlab.platypus import SimpleDocTemplate
+
+        self._flush_table()
+        self.flowables.append(self._rule())
+        for label, value in (("Subtotal", bill.subtotal), ("Tax (18%)", bill.total_tax), ("Total", bill.grand_total)):
+            self.flowables.append(self.Paragraph(f"<b>{label}: {value:.2f}</b>", self.styles['Normal']))
+        self.flowables.append(self.Paragraph("Thank you for shopping with us!", self.styles['Normal']))
+        output = io.BytesIO()
+        doc = SimpleDocTemplate(output, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
+        doc.build(self.flowables)
+        return output.getvalue()
+
+
+class HTMLRenderer:
+    """A standalone HTML page, e.g. for email bodies."""
+
+    def begin(self, bill):
+        escape = html.escape
+        self.parts = [
+            "<!DOCTYPE html>",
+            f"<html><head><meta charset=\"utf-8\"><title>Bill {escape(bill.bill_number)}</title></head><body>",
+            f"<h1>{TITLE}</h1>",
+            "<p>"
+            f"<b>Bill Number:</b> {escape(bill.bill_number)}<br>"
+            f"<b>Date:</b> {escape(bill.display_date)}<br>"
+            f"<b>Customer Name:</b> {escape(str(bill.customer_name))}<br>"
+            f"<b>Phone Number:</b> {escape(str(bill.phone_number))}"
+            "</p>",
+            "<table>",
+            "<tr><th align=\"left\">Item</th><th align=\"right\">Qty</th>"
+            "<th align=\"right\">Price</th><th align=\"right\">Total</th></tr>"
+        ]
+
+    def category(self, category):
+        self.parts.append(f"<tr><th colspan=\"4\" align=\"left\">{get_heading(category)}</th></tr>")
+
+    def line(self, item):
+        self.parts.append(
+            f"<tr><td>{html.escape(item.name)}</td><td align=\"right\">{item.quantity}</td>"
+            f"<td align=\"right\">{item.price:.2f}</td><td align=\"right\">{item.total:.2f}</td></tr>"
+        )
+
+    def end(self, bill):
+        for label, value in (("Subtotal", bill.subtotal), ("Tax (18%)", bill.total_tax), ("Total", bill.grand_total)):
+            self.parts.append(f"<tr><th colspan=\"3\" align=\"right\">{label}:</th><td align=\"right\">{value:.2f}</td></tr>")
+        self.parts.extend(["</table>", "<p>Thank you for shopping with us!</p>", "</body></html>"])
+        return "\n".join(self.parts)
+
+
+class JSONRenderer:
+    """The bill as a JSON document."""
+
+    def begin(self, bill):
+        self.items = []
+
+    def category(self, category):
+        pass
+
+    def line(self, item):
+        self.items.append({
+            "category": item.category,
+            "name": item.name,
+            "quantity": item.quantity,
+            "price": item.price,
+            "total": item.total
+        })
+
+    def end(self, bill):
+        return json.dumps({
+            "bill_number": bill.bill_number,
+            "date": bill.date.strftime(DATE_FORMAT),
+            "customer_name": bill.customer_name,
+            "phone_number": bill.phone_number,
+            "items": self.items,
+            "totals": bill.totals
+        }, ensure_ascii=False)
+
+
+RENDERERS = {
+    "txt": TextRenderer,
+    "pdf": PDFRenderer,
+    "xlsx": ExcelRenderer,
+    "html": HTMLRenderer,
+    "json": JSONRenderer
+}
+
+
+def render(bill, formats=FORMATS):
+    """
+    Render a bill to several formats in one pass over its line items.
+
+    Args:
+        bill (Bill): Bill to render
+        formats (iterable): Any of FORMATS
+
+    Returns:
+        dict: Format -> output (str for txt, html and json; bytes for pdf and xlsx)
+    """
+    unknown = [kind for kind in formats if kind not in RENDERERS]
+    if unknown:
+        raise ValueError(f"Unknown bill format: {', '.join(unknown)}")
+    return traverse(bill, {kind: RENDERERS[kind]() for kind in formats})
+
+
+def traverse(bill, renderers):
+    """
+    Walk a bill once, feeding every renderer at each step.
+
+    Args:
+        bill (Bill): Bill to render
+        renderers (dict): Name -> renderer (an object with begin, category, line and end)
+
+    Returns:
+        dict: Name -> what the renderer's end() returned
+    """
+    for renderer in renderers.values():
+        renderer.begin(bill)
+    for category, items in bill.get_category_items():
+        for renderer in renderers.values():
+            renderer.category(category)
+        for item in items:
+            for renderer in renderers.values():
+                renderer.line(item)
+    return {name: renderer.end(bill) for name, renderer in renderers.items()}
@@ -1,13 +1,16 @@
 import os
+import json
 import datetime
 import random
-import pandas as pd
-from fpdf import FPDF
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
-import tempfile
+from utils import bill_store, escpos, excel_export, tracing
+from utils.bill_model import Bill, compute_totals, render
+
+# Ledger of every exported bill, one row per bill
+LEDGER_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "vdx_excel_bills.xlsx")
 
 # No need for Windows-specific modules in cloud deployment
 class DummyWin32Print:
@@ -23,6 +26,9 @@ class DummyWin32Api:
 win32print = DummyWin32Print()
 win32api = DummyWin32Api()
 
+# Written by utils.email_utils.setup_email_credentials (kept in sync with its CREDENTIALS_FILE)
+EMAIL_CREDENTIALS_FILE = os.path.join(os.path.dirname(__file__), "email_credentials.json")
+
 def generate_bill_number():
     """Generate a unique bill number based on date and random number."""
     now = datetime.datetime.now()
@@ -30,216 +36,106 @@ def generate_bill_number():
     random_part = random.randint(1000, 9999)
     return f"BILL-{date_part}-{random_part}"
 
+@tracing.traced("price")
 def calculate_total(cosmetic_items, grocery_items, drink_items, prices):
     """Calculate the total amount for all items."""
-    # Calculate subtotals for each category
-    cosmetic_total = sum(qty * prices.get(item, 0) for item, qty in cosmetic_items.items() if qty > 0)
-    grocery_total = sum(qty * prices.get(item, 0) for item, qty in grocery_items.items() if qty > 0)
-    drink_total = sum(qty * prices.get(item, 0) for item, qty in drink_items.items() if qty > 0)
-    
-    # Calculate overall total
-    subtotal = cosmetic_total + grocery_total + drink_total
-    tax = subtotal * 0.18  # 18% GST
-    total = subtotal + tax
-    
-    return {
-        "cosmetic_total": cosmetic_total,
-        "grocery_total": grocery_total,
-        "drink_total": drink_total,
-        "subtotal": subtotal,
-        "total_tax": tax,  # Renamed for consistency
-        "grand_total": total  # Renamed for consistency
-    }
+    return compute_totals(cosmetic_items, grocery_items, drink_items, prices)
 
-def generate_bill(customer_name, phone_number, bill_number, cosmetic_items, grocery_items, drink_items, totals, prices):
-    """Generate the bill content as a formatted string."""
-    now = datetime.datetime.now()
-    date_str = now.strftime("%d-%m-%Y %H:%M:%S")
-    
-    # Start building the bill
-    bill = []
-    bill.append("=" * 60)
-    bill.append("                 GROCERY BILLING SYSTEM")
-    bill.append("=" * 60)
-    bill.append(f"Bill Number: {bill_number}")
-    bill.append(f"Date: {date_str}")
-    bill.append(f"Customer Name: {customer_name}")
-    bill.append(f"Phone Number: {phone_number}")
-    bill.append("-" * 60)
-    bill.append(f"{'Item':<30}{'Qty':<10}{'Price':<10}{'Total':<10}")
-    bill.append("-" * 60)
-    
-    # Add cosmetic items
-    if any(qty > 0 for qty in cosmetic_items.values()):
-        bill.append("COSMETICS:")
-        for item, qty in cosmetic_items.items():
-            if qty > 0:
-                price = prices.get(item, 0)
-                total = qty * price
-                bill.append(f"{item:<30}{qty:<10}{price:<10.2f}{total:<10.2f}")
-    
-    # Add grocery items
-    if any(qty > 0 for qty in grocery_items.values()):
-        bill.append("GROCERY:")
-        for item, qty in grocery_items.items():
-            if qty > 0:
-                price = prices.get(item, 0)
-                total = qty * price
-                bill.append(f"{item:<30}{qty:<10}{price:<10.2f}{total:<10.2f}")
-    
-    # Add drink items
-    if any(qty > 0 for qty in drink_items.values()):
-        bill.append("DRINKS:")
-        for item, qty in drink_items.items():
+@tracing.traced("format")
+def generate_bill(customer_name, phone_number, bill_number, cosmetic_items, grocery_items, drink_items, totals, prices, date=None):
+    """
+    Generate the bill content as a formatted string.
+
+    The totals are those of the bill (see bill_model.Bill); the argument is
+    kept for existing callers. date defaults to now.
+    """
+    bill = Bill.from_items(bill_number, date, customer_name, phone_number, cosmetic_items, grocery_items, drink_items, prices)
+    return render(bill, ["txt"])["txt"]
+
+def get_bill_line_items(cosmetic_items, grocery_items, drink_items, prices):
+    """Return the purchased items of a bill as a list of dicts with category, name, quantity and price."""
+    line_items = []
+    for category, items in (("Cosmetics", cosmetic_items), ("Groceries", grocery_items), ("Drinks", drink_items)):
+        for item, qty in items.items():
             if qty > 0:
-                price = prices.get(item, 0)
-                total = qty * price
-                bill.append(f"{item:<30}{qty:<10}{price:<10.2f}{total:<10.2f}")
-    
-    # Add totals
-    bill.append("-" * 60)
-    bill.append(f"{'Subtotal:':<40}{totals['subtotal']:<20.2f}")
-    bill.append(f"{'Tax (18%):':<40}{totals['total_tax']:<20.2f}")
-    bill.append(f"{'Total:':<40}{totals['grand_total']:<20.2f}")
-    bill.append("-" * 60)
-    bill.append("Thank you for shopping with us!")
-    bill.append("=" * 60)
-    
-    return "\n".join(bill)
+                line_items.append({
+                    "category": category,
+                    "name": item,
+                    "quantity": qty,
+                    "price": prices.get(item, 0)
+                })
+    return line_items
 
-def save_bill(bill_content, bill_number, customer_name, phone_number, cosmetic_items, grocery_items, drink_items, totals, prices):
-    """Save bill to a text file"""
+@tracing.traced("save_txt")
+def save_bill(bill_content, bill_number, customer_name, phone_number, cosmetic_items, grocery_items, drink_items, totals, prices, bills_directory=None, date=None,
+              lane=None):
+    """Save bill to a text file in its date partition and record it in the partition manifest (with the lane that billed it, if given)"""
     try:
-        # Use the original path
-        bills_directory = os.path.join(os.path.dirname(os.path.dirname(__file__)), "saved_bills")
-        
-        # Ensure the directory exists
-        os.makedirs(bills_directory, exist_ok=True)
-        
-        # Save as text file
-        txt_path = os.path.join(bills_directory, f"{bill_number}.txt")
-        with open(txt_path, "w") as f:
+        # Save as text file in the bill's date partition (written to a
+        # temporary file and renamed, so it is never left half written)
+        txt_path = bill_store.get_artifact_path(bills_directory, bill_number, ".txt")
+        with open(txt_path + ".tmp", "w") as f:
             f.write(bill_content)
+        os.replace(txt_path + ".tmp", txt_path)
+        
+        bill_store.record_artifact(
+            bills_directory,
+            bill_number,
+            "txt",
+            txt_path,
+            date=date or datetime.datetime.now().strftime(bill_store.MANIFEST_DATE_FORMAT),
+            customer_name=customer_name,
+            phone_number=phone_number,
+            subtotal=totals['subtotal'],
+            tax=totals['total_tax'],
+            total=totals['grand_total'],
+            items=get_bill_line_items(cosmetic_items, grocery_items, drink_items, prices),
+            lane=lane
+        )
         
         return f"Bill saved successfully as {txt_path}"
     except Exception as e:
         return f"Error saving bill: {str(e)}"
 
-def export_bill_to_excel(customer_name, phone_number, bill_number, cosmetic_items, grocery_items, drink_items, totals, prices):
-    """Export bill to Excel file"""
+@tracing.traced("export_excel")
+def export_bill_to_excel(customer_name, phone_number, bill_number, cosmetic_items, grocery_items, drink_items, totals, prices, bills_directory=None, ledger_file=None,
+                         bill=None, rendered=None):
+    """
+    Export bill to Excel file and append it to the ledger (vdx_excel_bills.xlsx by default)
+
+    Pass the bill (a bill_model.Bill) to export it instead of pricing the
+    items again, and rendered (its xlsx bytes) if it was already rendered.
+    """
     try:
         # Use the provided directory or default to the original path
         if bills_directory is None:
-            bills_directory = os.path.join(os.path.dirname(os.path.dirname(__file__)), "saved_bills")
-        
-        # Ensure the directory exists
-        os.makedirs(bills_directory, exist_ok=True)
-        
-        # Create Excel file path
-        excel_path = os.path.join(bills_directory, f"{bill_number}.xlsx")
-        
-        # Get the bills directory from session state or use a default
-        import streamlit as st
-        import tempfile  # Add this import
-        bills_directory = getattr(st.session_state, 'bills_directory', os.path.join(os.path.dirname(os.path.dirname(__file__)), "saved_bills"))
-        os.makedirs(bills_directory, exist_ok=True)
-        
-        # Create the Excel file path
-        file_path = os.path.join(bills_directory, f"{bill_number}.xlsx")
-        
-        # Create excel_bills directory if it doesn't exist
-        excel_directory = os.path.join(bills_directory, "excel_bills")
-        os.makedirs(excel_directory, exist_ok=True)
-        
-        # Individual bill Excel file
-        excel_file = os.path.join(excel_directory, f"{bill_number}.xlsx")
-        
-        # Create a pandas DataFrame for the bill
-        data = []
-        
-        # Add header information
-        now = datetime.datetime.now()
-        date_str = now.strftime("%d-%m-%Y %H:%M:%S")
-        
-        data.append(["GROCERY BILLING SYSTEM", "", "", ""])
-        data.append(["Bill Number:", bill_number, "", ""])
-        data.append(["Date:", date_str, "", ""])
-        data.append(["Customer Name:", customer_name, "", ""])
-        data.append(["Phone Number:", phone_number, "", ""])
-        data.append(["", "", "", ""])
-        data.append(["Item", "Quantity", "Price", "Total"])
-        
-        # Add cosmetic items
-        if any(qty > 0 for qty in cosmetic_items.values()):
-            data.append(["COSMETICS:", "", "", ""])
-            for item, qty in cosmetic_items.items():
-                if qty > 0:
-                    price = prices.get(item, 0)
-                    total = qty * price
-                    data.append([item, qty, price, total])
-        
-        # Add grocery items
-        if any(qty > 0 for qty in grocery_items.values()):
-            data.append(["GROCERY:", "", "", ""])
-            for item, qty in grocery_items.items():
-                if qty > 0:
-                    price = prices.get(item, 0)
-                    total = qty * price
-                    data.append([item, qty, price, total])
-        
-        # Add drink items
-        if any(qty > 0 for qty in drink_items.values()):
-            data.append(["DRINKS:", "", "", ""])
-            for item, qty in drink_items.items():
-                if qty > 0:
-                    price = prices.get(item, 0)
-                    total = qty * price
-                    data.append([item, qty, price, total])
-        
-        # Add totals
-        data.append(["", "", "", ""])
-        data.append(["Subtotal:", "", "", totals['subtotal']])
-        data.append(["Tax (18%):", "", "", totals['total_tax']])
-        data.append(["Total:", "", "", totals['grand_total']])
-        
-        # Create DataFrame and export to individual Excel file
-        df = pd.DataFrame(data)
-        with pd.ExcelWriter(excel_file, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, header=False)
-            
-            # Auto-adjust column widths
-            worksheet = writer.sheets['Sheet1']
-            for i, col in enumerate(df.columns):
-                max_length = max(df[col].astype(str).map(len).max(), len(str(col)))
-                worksheet.column_dimensions[chr(65 + i)].width = max_length + 2
-        
-        # Save to vdx_excel_bills.xlsx in the project root directory
-        main_excel_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), "vdx_excel_bills.xlsx")
-        
-        # Prepare data for the main Excel file
-        main_data = {
-            'Bill Number': bill_number,
-            'Date': date_str,
-            'Customer Name': customer_name,
-            'Phone Number': phone_number,
-            'Subtotal': totals['subtotal'],
-            'Tax': totals['total_tax'],
-            'Total': totals['grand_total']
-        }
-        
-        # Convert to DataFrame (single row)
-        main_df = pd.DataFrame([main_data])
-        
+            bills_directory = bill_store.get_default_bills_directory()
+        if bill is None:
+            bill = Bill.from_items(bill_number, None, customer_name, phone_number, cosmetic_items, grocery_items, drink_items, prices)
+        if rendered is None:
+            rendered = render(bill, ["xlsx"])["xlsx"]
+        
+        # Individual bill Excel file in the excel_bills folder of the bill's date partition
+        excel_file = bill_store.get_artifact_path(bills_directory, bill_number, ".xlsx", subdir=bill_store.EXCEL_SUBDIR)
+        with open(excel_file + ".tmp", "wb") as f:
+            f.write(rendered)
+        os.replace(excel_file + ".tmp", excel_file)
+        
+        bill_store.record_artifact(bills_directory, bill_number, "xlsx", excel_file)
+        
+        # Add the bill to vdx_excel_bills.xlsx in the project root directory.
+        # The row is appended to the ledger's pending rows, which are written
+        # into the workbook when it is next read (see excel_export.materialize_ledger)
         try:
-            # Check if the main Excel file exists
-            if os.path.exists(main_excel_file):
-                # If it exists, read it and append the new data
-                existing_df = pd.read_excel(main_excel_file)
-                updated_df = pd.concat([existing_df, main_df], ignore_index=True)
-                updated_df.to_excel(main_excel_file, index=False)
-            else:
-                # If it doesn't exist, create a new file
-                main_df.to_excel(main_excel_file, index=False)
+            excel_export.append_ledger_row(ledger_file or LEDGER_FILE, [
+                bill.bill_number,
+                bill.display_date,
+                bill.customer_name,
+                bill.phone_number,
+                bill.subtotal,
+                bill.total_tax,
+                bill.grand_total
+            ])
         except Exception as e:
             print(f"Error saving to main Excel file: {str(e)}")
         
@@ -248,7 +144,18 @@ def export_bill_to_excel(customer_name, phone_number, bill_number, cosmetic_item
         return f"Error exporting to Excel: {str(e)}"
 
 
-def send_bill_pdf_to_customer(customer_email, bill_number, pdf_path=None):
+def load_email_credentials():
+    """Load the email credentials saved by utils.email_utils.setup_email_credentials, or {}."""
+    try:
+        with open(EMAIL_CREDENTIALS_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+@tracing.traced("send_email")
+def send_bill_pdf_to_customer(customer_email, bill_number, pdf_path=None, bills_directory=None,
+                              sender_email=None, sender_password=None):
     """
     Send the bill PDF to the customer via email.
     
@@ -256,6 +163,9 @@ def send_bill_pdf_to_customer(customer_email, bill_number, pdf_path=None):
         customer_email (str): Customer's email address
         bill_number (str): Bill number for reference
         pdf_path (str, optional): Path to the PDF file. If None, it will be constructed
+        bills_directory (str, optional): Bills directory used to construct the PDF path
+        sender_email (str, optional): Sender address (default: saved email credentials)
+        sender_password (str, optional): Sender password (default: saved email credentials)
         
     Returns:
         str: Success or error message
@@ -263,24 +173,21 @@ def send_bill_pdf_to_customer(customer_email, bill_number, pdf_path=None):
     try:
         # Construct PDF path if not provided
         if pdf_path is None:
-            # Use temporary directory for cloud deployment
-            import tempfile
-            import streamlit as st
-            bills_directory = getattr(st.session_state, 'bills_directory', 
-                                     os.path.join(tempfile.gettempdir(), "grocery_billing_bills"))
-            pdf_path = os.path.join(bills_directory, f"{bill_number}.pdf")
+            if bills_directory is None:
+                bills_directory = bill_store.get_default_bills_directory()
+            pdf_path = bill_store.get_artifact_path(bills_directory, bill_number, ".pdf")
         
         # Check if PDF exists
         if not os.path.exists(pdf_path):
             return f"Error: PDF file not found at {pdf_path}"
         
-        # Get email credentials from Streamlit secrets
-        try:
-            import streamlit as st
-            sender_email = st.secrets["email"]["sender_email"]
-            sender_password = st.secrets["email"]["sender_password"]
-        except Exception as e:
-            return f"Error: Email credentials not found in Streamlit secrets. Please configure them."
+        # Fall back to the credentials saved from the Email Setup section
+        if not (sender_email and sender_password):
+            credentials = load_email_credentials()
+            sender_email = sender_email or credentials.get("sender_email")
+            sender_password = sender_password or credentials.get("sender_password")
+        if not (sender_email and sender_password):
+            return "Error: Email credentials not found. Please configure them."
         
         # Create message
         msg = MIMEMultipart()
@@ -321,8 +228,19 @@ def send_bill_pdf_to_customer(customer_email, bill_number, pdf_path=None):
         return f"Error sending bill PDF: {str(e)}"
 
 
-def print_bill(bill_content):
-    """Print functionality is not available in cloud deployment.
-    This function is maintained for compatibility but returns a message.
+def print_bill(bill_content, printer=None):
     """
-    return "Printing is not available in cloud deployment. Please download the PDF and print locally."
\ No newline at end of file
+    Print a text bill on a thermal receipt printer (see utils.escpos).
+
+    Args:
+        bill_content (str): Text bill
+        printer (str, optional): Spool directory or device (default: RECEIPT_PRINTER or data/receipt_spool)
+
+    Returns:
+        str: Success or error message
+    """
+    try:
+        path = escpos.send(escpos.render_text_receipt(bill_content), printer)
+        return f"Receipt sent to {path}"
+    except Exception as e:
+        return f"Error printing bill: {str(e)}"
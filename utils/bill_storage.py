@@ -1,6 +1,8 @@
 import pandas as pd
 import os
+from utils import tracing
 
+@tracing.traced("save_master")
 def save_bill_to_master(bill_data, master_file_path=None):
     """
     Save bill data to a master Excel file.
@@ -0,0 +1,692 @@
+import os
+import re
+import json
+import zlib
+import shutil
+import argparse
+import threading
+from datetime import datetime, date, timedelta
+try:
+    import fcntl
+except ImportError:
+    # Windows: only the threads of one process are coordinated
+    fcntl = None
+
+# Bills are stored in date partitions (saved_bills/YYYY/MM/DD/) so that listing
+# a day or a date range never has to walk the whole history.
+MANIFEST_FILE = "manifest.json"
+EXCEL_SUBDIR = "excel_bills"
+MANIFEST_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Closed days can be compacted into a single segment file per partition. Each
+# artifact is zlib-compressed on its own and the manifest keeps its offset and
+# length, so reading one bill is a single range read from one file.
+SEGMENT_FILE = "segment.pack"
+
+# The manifest keeps a CRC-32 of every artifact as it was written, so damaged
+# or replaced files can be told apart from good ones (see utils.integrity)
+CHECKSUMS_KEY = "checksums"
+
+# Manifest updates are read-modify-write, so writers in the same process
+# (Streamlit sessions, API worker threads) take this lock around them
+_manifest_lock = threading.RLock()
+
+# Bill numbers (BILL-YYYYMMDD-NNNN) are handed out from a counter kept in the
+# day's partition, so two carts never get the same number even before either
+# bill is saved. The counter is read and advanced under an flock on
+# BILL_NUMBERS_LOCK_FILE, as the app and the POS API reserve from the same
+# days, and starts after the highest number already in the manifest.
+BILL_NUMBERS_FILE = "bill_numbers.json"
+BILL_NUMBERS_LOCK_FILE = "bill_numbers.lock"
+FIRST_BILL_NUMBER = 1000
+_bill_numbers_lock = threading.Lock()
+
+_BILL_NUMBER_PATTERN = re.compile(r"BILL-(\d{8})-(\d+)")
+_ITEM_LINE_PATTERN = re.compile(r"^(.*?)\s+(\d+)\s+(\d+(?:\.\d+)?)\s+(\d+(?:\.\d+)?)\s*$")
+_SECTION_CATEGORIES = {
+    "COSMETICS:": "Cosmetics",
+    "GROCERY:": "Groceries",
+    "DRINKS:": "Drinks"
+}
+
+
+def get_default_bills_directory():
+    """Return the project's saved_bills directory."""
+    return os.path.join(os.path.dirname(os.path.dirname(__file__)), "saved_bills")
+
+
+def bill_date_from_number(bill_number, default=None):
+    """
+    Extract the bill date encoded in a bill number (BILL-YYYYMMDD-NNNN).
+
+    Args:
+        bill_number (str): Bill number
+        default (date, optional): Date to use if the bill number has no date part.
+            If None, today's date is used.
+
+    Returns:
+        date: The date the bill belongs to
+    """
+    match = _BILL_NUMBER_PATTERN.search(str(bill_number))
+    if match:
+        try:
+            return datetime.strptime(match.group(1), "%Y%m%d").date()
+        except ValueError:
+            pass
+    return default if default is not None else date.today()
+
+
+def get_partition_dir(bills_directory, bill_date, create=False):
+    """
+    Get the partition directory (YYYY/MM/DD) for a date.
+
+    Args:
+        bills_directory (str): Root bills directory
+        bill_date (date): Date of the partition
+        create (bool): Create the directory if it does not exist
+
+    Returns:
+        str: Path to the partition directory
+    """
+    partition_dir = os.path.join(
+        bills_directory,
+        f"{bill_date.year:04d}",
+        f"{bill_date.month:02d}",
+        f"{bill_date.day:02d}"
+    )
+    if create:
+        os.makedirs(partition_dir, exist_ok=True)
+    return partition_dir
+
+
+def get_artifact_path(bills_directory, bill_number, extension, subdir=None, filename=None):
+    """
+    Get the path where an artifact of a bill should be written.
+
+    The partition is derived from the date in the bill number and is created
+    if needed.
+
+    Args:
+        bills_directory (str): Root bills directory. If None, the default is used.
+        bill_number (str): Bill number
+        extension (str): File extension including the dot (e.g. ".txt")
+        subdir (str, optional): Sub-directory inside the partition (e.g. "excel_bills")
+        filename (str, optional): File name to use instead of bill_number + extension
+
+    Returns:
+        str: Full path of the artifact
+    """
+    if not bills_directory:
+        bills_directory = get_default_bills_directory()
+    directory = get_partition_dir(bills_directory, bill_date_from_number(bill_number))
+    if subdir:
+        directory = os.path.join(directory, subdir)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, filename or f"{bill_number}{extension}")
+
+
+def load_manifest(partition_dir):
+    """
+    Load the manifest of a partition.
+
+    Args:
+        partition_dir (str): Partition directory
+
+    Returns:
+        dict: Manifest with a "bills" mapping of bill number to entry
+    """
+    manifest_path = os.path.join(partition_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return {"bills": {}}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        manifest.setdefault("bills", {})
+        return manifest
+    except Exception as e:
+        print(f"Error reading manifest {manifest_path}: {e}")
+        return {"bills": {}}
+
+
+def save_manifest(partition_dir, manifest):
+    """Write a partition manifest atomically."""
+    os.makedirs(partition_dir, exist_ok=True)
+    manifest_path = os.path.join(partition_dir, MANIFEST_FILE)
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(temp_path, manifest_path)
+
+
+def get_checksum(content):
+    """Return the checksum of an artifact's content as recorded in manifests."""
+    return f"{zlib.crc32(content):08x}"
+
+
+def record_artifact(bills_directory, bill_number, kind, path, **fields):
+    """
+    Register an artifact of a bill, with the checksum of its content, in its
+    partition manifest.
+
+    Args:
+        bills_directory (str): Root bills directory. If None, the default is used.
+        bill_number (str): Bill number
+        kind (str): Artifact kind ("txt", "pdf", "xlsx", "generator_xlsx")
+        path (str): Path of the artifact file
+        **fields: Bill metadata to store with the entry (customer_name, total, items, ...).
+            Fields set to None are ignored.
+
+    Returns:
+        dict: The updated manifest entry
+    """
+    if not bills_directory:
+        bills_directory = get_default_bills_directory()
+    partition_dir = get_partition_dir(bills_directory, bill_date_from_number(bill_number), create=True)
+    with open(path, 'rb') as f:
+        checksum = get_checksum(f.read())
+    with _manifest_lock:
+        manifest = load_manifest(partition_dir)
+
+        entry = manifest["bills"].setdefault(bill_number, {"bill_number": bill_number, "files": {}})
+        entry.setdefault("files", {})
+        entry["files"][kind] = os.path.relpath(path, partition_dir)
+        entry.setdefault(CHECKSUMS_KEY, {})[kind] = checksum
+        for key, value in fields.items():
+            if value is not None:
+                entry[key] = value
+        if "date" not in entry:
+            entry["date"] = datetime.now().strftime(MANIFEST_DATE_FORMAT)
+
+        save_manifest(partition_dir, manifest)
+    return entry
+
+
+def update_bill(bills_directory, bill_number, **fields):
+    """
+    Set fields of a bill's manifest entry.
+
+    Args:
+        bills_directory (str): Root bills directory. If None, the default is used.
+        bill_number (str): Bill number
+        **fields: Fields to set
+
+    Returns:
+        dict: The updated manifest entry, or None if the bill is not in the store
+    """
+    if not bills_directory:
+        bills_directory = get_default_bills_directory()
+    partition_dir = get_partition_dir(bills_directory, bill_date_from_number(bill_number))
+    with _manifest_lock:
+        manifest = load_manifest(partition_dir)
+        entry = manifest["bills"].get(bill_number)
+        if entry is None:
+            return None
+        entry.update(fields)
+        save_manifest(partition_dir, manifest)
+    return entry
+
+
+def _list_numeric_dirs(directory, width):
+    """List sub-directories whose names are numbers of the given width."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        int(name) for name in names
+        if len(name) == width and name.isdigit() and os.path.isdir(os.path.join(directory, name))
+    )
+
+
+def list_partitions(bills_directory=None, start_date=None, end_date=None):
+    """
+    List the partitions of the bill store, optionally restricted to a date range.
+
+    Only the year and month directories that overlap the range are listed, so a
+    narrow range does not touch the rest of the history.
+
+    Args:
+        bills_directory (str, optional): Root bills directory
+        start_date (date, optional): First date to include
+        end_date (date, optional): Last date to include
+
+    Returns:
+        list: Sorted list of (date, partition_dir) tuples
+    """
+    if not bills_directory:
+        bills_directory = get_default_bills_directory()
+
+    partitions = []
+    for year in _list_numeric_dirs(bills_directory, 4):
+        if (start_date and year < start_date.year) or (end_date and year > end_date.year):
+            continue
+        year_dir = os.path.join(bills_directory, f"{year:04d}")
+        for month in _list_numeric_dirs(year_dir, 2):
+            if start_date and (year, month) < (start_date.year, start_date.month):
+                continue
+            if end_date and (year, month) > (end_date.year, end_date.month):
+                continue
+            month_dir = os.path.join(year_dir, f"{month:02d}")
+            for day in _list_numeric_dirs(month_dir, 2):
+                try:
+                    partition_date = date(year, month, day)
+                except ValueError:
+                    continue
+                if start_date and partition_date < start_date:
+                    continue
+                if end_date and partition_date > end_date:
+                    continue
+                partitions.append((partition_date, os.path.join(month_dir, f"{day:02d}")))
+    return partitions
+
+
+def iter_bills(bills_directory=None, start_date=None, end_date=None):
+    """
+    Iterate over the manifest entries of all bills in a date range.
+
+    Each yielded entry is a copy of the manifest entry with an added
+    "partition" key holding the partition directory.
+
+    Args:
+        bills_directory (str, optional): Root bills directory
+        start_date (date, optional): First date to include
+        end_date (date, optional): Last date to include
+
+    Yields:
+        dict: Manifest entry of a bill
+    """
+    for partition_date, partition_dir in list_partitions(bills_directory, start_date, end_date):
+        manifest = load_manifest(partition_dir)
+        for entry in manifest["bills"].values():
+            entry = dict(entry)
+            entry["partition"] = partition_dir
+            yield entry
+
+
+def get_entry_file(entry, kind):
+    """
+    Get the full path of an artifact recorded in a manifest entry.
+
+    Args:
+        entry (dict): Manifest entry as yielded by iter_bills
+        kind (str): Artifact kind
+
+    Returns:
+        str: Full path, or None if the artifact is not recorded
+    """
+    relative_path = entry.get("files", {}).get(kind)
+    if not relative_path:
+        return None
+    return os.path.join(entry["partition"], relative_path)
+
+
+def has_artifact(entry, kind):
+    """Check whether a manifest entry has an artifact of the given kind, loose or packed."""
+    return kind in entry.get("files", {}) or kind in entry.get("packed", {})
+
+
+def get_artifact_size(entry, kind):
+    """
+    Get the uncompressed size in bytes of an artifact of a bill.
+
+    Args:
+        entry (dict): Manifest entry as yielded by iter_bills
+        kind (str): Artifact kind
+
+    Returns:
+        int: Size in bytes, or None if the artifact does not exist
+    """
+    path = get_entry_file(entry, kind)
+    if path and os.path.exists(path):
+        return os.path.getsize(path)
+    packed = entry.get("packed", {}).get(kind)
+    if packed:
+        return packed["size"]
+    return None
+
+
+def read_artifact(entry, kind):
+    """
+    Read an artifact of a bill, whether it is a loose file or packed in the partition segment.
+
+    Args:
+        entry (dict): Manifest entry as yielded by iter_bills or find_bill
+        kind (str): Artifact kind
+
+    Returns:
+        bytes: Content of the artifact, or None if it does not exist
+    """
+    path = get_entry_file(entry, kind)
+    if path and os.path.exists(path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    packed = entry.get("packed", {}).get(kind)
+    if not packed:
+        return None
+    with open(os.path.join(entry["partition"], SEGMENT_FILE), 'rb') as f:
+        f.seek(packed["offset"])
+        return zlib.decompress(f.read(packed["length"]))
+
+
+def compact_partition(partition_dir):
+    """
+    Pack the loose artifacts of a partition into its segment file.
+
+    Artifacts are appended to the segment, so a partition can be compacted
+    again if bills are added to it later. The manifest is updated before the
+    loose files are removed, so an interrupted compaction never loses a bill.
+
+    Args:
+        partition_dir (str): Partition directory
+
+    Returns:
+        int: Number of artifacts packed
+    """
+    with _manifest_lock:
+        return _compact_partition(partition_dir)
+
+
+def _compact_partition(partition_dir):
+    manifest = load_manifest(partition_dir)
+    loose_files = [
+        (entry, kind, os.path.join(partition_dir, relative_path))
+        for entry in manifest["bills"].values()
+        for kind, relative_path in entry.get("files", {}).items()
+        if os.path.exists(os.path.join(partition_dir, relative_path))
+    ]
+    if not loose_files:
+        return 0
+
+    packed_files = []
+    with open(os.path.join(partition_dir, SEGMENT_FILE), 'ab') as segment:
+        offset = segment.tell()
+        for entry, kind, path in loose_files:
+            with open(path, 'rb') as f:
+                content = f.read()
+            compressed = zlib.compress(content, 6)
+            segment.write(compressed)
+            entry.setdefault("packed", {})[kind] = {
+                "offset": offset,
+                "length": len(compressed),
+                "size": len(content)
+            }
+            offset += len(compressed)
+            packed_files.append(path)
+        segment.flush()
+        os.fsync(segment.fileno())
+
+    save_manifest(partition_dir, manifest)
+    for path in packed_files:
+        os.remove(path)
+    excel_dir = os.path.join(partition_dir, EXCEL_SUBDIR)
+    if os.path.isdir(excel_dir) and not os.listdir(excel_dir):
+        os.rmdir(excel_dir)
+    return len(packed_files)
+
+
+def compact_closed_days(bills_directory=None, before=None):
+    """
+    Compact every partition older than a given date.
+
+    Args:
+        bills_directory (str, optional): Root bills directory
+        before (date, optional): First day that is still open. Defaults to today.
+
+    Returns:
+        dict: Number of partitions and artifacts compacted
+    """
+    if before is None:
+        before = date.today()
+    partitions = 0
+    artifacts = 0
+    for partition_date, partition_dir in list_partitions(bills_directory, end_date=before - timedelta(days=1)):
+        packed = compact_partition(partition_dir)
+        if packed:
+            partitions += 1
+            artifacts += packed
+    return {"partitions": partitions, "artifacts": artifacts}
+
+
+def _load_last_bill_number(partition_dir):
+    """Return the last bill number reserved in a partition."""
+    path = os.path.join(partition_dir, BILL_NUMBERS_FILE)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return int(json.load(f)["last"])
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Error reading bill numbers {path}: {e}")
+    # First bill of the day, or a lost counter: continue after the saved bills
+    last = FIRST_BILL_NUMBER - 1
+    for bill_number in load_manifest(partition_dir)["bills"]:
+        match = _BILL_NUMBER_PATTERN.fullmatch(bill_number)
+        if match:
+            last = max(last, int(match.group(2)))
+    return last
+
+
+def reserve_bill_number(bills_directory=None, bill_date=None):
+    """
+    Reserve the next bill number of a day.
+
+    Args:
+        bills_directory (str, optional): Root bills directory
+        bill_date (date, optional): Day of the bill (default: today)
+
+    Returns:
+        str: Bill number no other caller has been given
+    """
+    if not bills_directory:
+        bills_directory = get_default_bills_directory()
+    bill_date = bill_date or date.today()
+    partition_dir = get_partition_dir(bills_directory, bill_date, create=True)
+    path = os.path.join(partition_dir, BILL_NUMBERS_FILE)
+    with _bill_numbers_lock:
+        fd = os.open(os.path.join(partition_dir, BILL_NUMBERS_LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            number = _load_last_bill_number(partition_dir) + 1
+            # Durable before the number is used, so a crash never hands it out again
+            temp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({"last": number}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        finally:
+            os.close(fd)
+    return f"BILL-{bill_date:%Y%m%d}-{number}"
+
+
+def find_bill(bill_number, bills_directory=None):
+    """
+    Look up a single bill by number, opening only its own partition.
+
+    Args:
+        bill_number (str): Bill number
+        bills_directory (str, optional): Root bills directory
+
+    Returns:
+        dict: Manifest entry with "partition" set, or None if not found
+    """
+    if not bills_directory:
+        bills_directory = get_default_bills_directory()
+    partition_dir = get_partition_dir(bills_directory, bill_date_from_number(bill_number))
+    entry = load_manifest(partition_dir)["bills"].get(bill_number)
+    if entry is None:
+        return None
+    entry = dict(entry)
+    entry["partition"] = partition_dir
+    return entry
+
+
+def parse_bill_text(content):
+    """
+    Parse the text produced by generate_bill back into bill metadata.
+
+    Args:
+        content (str): Bill text
+
+    Returns:
+        dict: Bill fields (bill_number, date, customer_name, phone_number,
+            subtotal, tax, total, items)
+    """
+    fields = {"items": []}
+    category = None
+    for line in content.split('\n'):
+        stripped = line.strip()
+        if stripped.startswith("Bill Number:"):
+            fields["bill_number"] = stripped.split(":", 1)[1].strip()
+        elif stripped.startswith("Date:"):
+            try:
+                bill_datetime = datetime.strptime(stripped.split(":", 1)[1].strip(), "%d-%m-%Y %H:%M:%S")
+                fields["date"] = bill_datetime.strftime(MANIFEST_DATE_FORMAT)
+            except ValueError:
+                pass
+        elif stripped.startswith("Customer Name:"):
+            fields["customer_name"] = stripped.split(":", 1)[1].strip()
+        elif stripped.startswith("Phone Number:"):
+            fields["phone_number"] = stripped.split(":", 1)[1].strip()
+        elif stripped in _SECTION_CATEGORIES:
+            category = _SECTION_CATEGORIES[stripped]
+        elif stripped.startswith("Subtotal:"):
+            fields["subtotal"] = float(stripped.split(":", 1)[1].strip())
+            category = None
+        elif category is None and stripped.startswith("Tax"):
+            fields["tax"] = float(stripped.split(":", 1)[1].strip())
+        elif category is None and stripped.startswith("Total:"):
+            fields["total"] = float(stripped.split(":", 1)[1].strip())
+        elif category and stripped and not stripped.startswith("-"):
+            match = _ITEM_LINE_PATTERN.match(stripped)
+            if match:
+                fields["items"].append({
+                    "category": category,
+                    "name": match.group(1).strip(),
+                    "quantity": int(match.group(2)),
+                    "price": float(match.group(3))
+                })
+    return fields
+
+
+def _classify_flat_file(path, in_excel_dir):
+    """Return (bill_number, kind) for a legacy flat file, or (None, None)."""
+    filename = os.path.basename(path)
+    match = _BILL_NUMBER_PATTERN.search(filename)
+    if not match:
+        return None, None
+    extension = os.path.splitext(filename)[1].lower()
+    if in_excel_dir and extension == ".xlsx":
+        return match.group(0), "xlsx"
+    if filename.startswith("bill_") and extension == ".xlsx":
+        return match.group(0), "generator_xlsx"
+    if extension in (".txt", ".pdf"):
+        return match.group(0), extension[1:]
+    return None, None
+
+
+def has_unmigrated_files(bills_directory=None):
+    """Check whether flat (pre-partitioning) bill files are still present."""
+    if not bills_directory:
+        bills_directory = get_default_bills_directory()
+    if not os.path.isdir(bills_directory):
+        return False
+    with os.scandir(bills_directory) as entries:
+        for entry in entries:
+            if entry.is_file() and _classify_flat_file(entry.path, False)[0]:
+                return True
+    return False
+
+
+def migrate_flat_bills(bills_directory=None, dry_run=False):
+    """
+    Move bills from the flat saved_bills layout into date partitions.
+
+    Text bills are parsed so that the partition manifest carries the bill
+    metadata. Files that are not bill artifacts (e.g. master_bills.xlsx) are left in place.
+
+    Args:
+        bills_directory (str, optional): Root bills directory
+        dry_run (bool): Only report what would be moved
+
+    Returns:
+        dict: Counts of moved and skipped files
+    """
+    if not bills_directory:
+        bills_directory = get_default_bills_directory()
+
+    candidates = []
+    for directory, in_excel_dir in ((bills_directory, False), (os.path.join(bills_directory, EXCEL_SUBDIR), True)):
+        if not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            path = os.path.join(directory, filename)
+            if os.path.isfile(path):
+                candidates.append((path, in_excel_dir))
+
+    moved = 0
+    skipped = 0
+    for path, in_excel_dir in candidates:
+        bill_number, kind = _classify_flat_file(path, in_excel_dir)
+        if not bill_number:
+            skipped += 1
+            continue
+
+        filename = os.path.basename(path)
+        target = get_artifact_path(
+            bills_directory,
+            bill_number,
+            os.path.splitext(filename)[1],
+            subdir=EXCEL_SUBDIR if kind == "xlsx" else None,
+            filename=filename
+        ) if not dry_run else None
+
+        if dry_run:
+            print(f"Would move {path}")
+            moved += 1
+            continue
+
+        fields = {}
+        if kind == "txt":
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    fields = parse_bill_text(f.read())
+                fields.pop("bill_number", None)
+            except Exception as e:
+                print(f"Could not parse {path}: {e}")
+        if "date" not in fields and find_bill(bill_number, bills_directory) is None:
+            fields["date"] = datetime.fromtimestamp(os.path.getmtime(path)).strftime(MANIFEST_DATE_FORMAT)
+
+        shutil.move(path, target)
+        record_artifact(bills_directory, bill_number, kind, target, **fields)
+        moved += 1
+
+    return {"moved": moved, "skipped": skipped}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the partitioned bill store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="Move flat saved_bills files into date partitions")
+    migrate_parser.add_argument("--bills-dir", default=None, help="Bills directory (default: saved_bills)")
+    migrate_parser.add_argument("--dry-run", action="store_true", help="Only list the files that would be moved")
+
+    compact_parser = subparsers.add_parser("compact", help="Pack the bills of closed days into segment files")
+    compact_parser.add_argument("--bills-dir", default=None, help="Bills directory (default: saved_bills)")
+    compact_parser.add_argument("--before", default=None, help="Compact days before this date (YYYY-MM-DD, default: today)")
+
+    args = parser.parse_args(argv)
+    if args.command == "migrate":
+        result = migrate_flat_bills(args.bills_dir, dry_run=args.dry_run)
+        print(f"Moved {result['moved']} files, skipped {result['skipped']}")
+    elif args.command == "compact":
+        before = datetime.strptime(args.before, "%Y-%m-%d").date() if args.before else None
+        result = compact_closed_days(args.bills_dir, before=before)
+        print(f"Packed {result['artifacts']} files from {result['partitions']} days")
+
+
+if __name__ == "__main__":
+    main()
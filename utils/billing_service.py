@@ -0,0 +1,864 @@
+import os
+import uuid
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from utils import bill_journal, bill_store, catalog, customer_store, escpos, excel_export, replenishment, till, tracing
+from utils.bill_model import Bill, render as render_bill
+from utils.bill_operations import (
+    LEDGER_FILE,
+    calculate_total,
+    get_bill_line_items,
+    save_bill,
+    export_bill_to_excel
+)
+
+# Billing without Streamlit: carts are plain dicts and BillingService prices,
+# commits and renders them, so the same code runs in the app, in workers,
+# from the command line and under load tests.
+CATEGORIES = ("Cosmetics", "Groceries", "Drinks")
+RENDER_KINDS = ("pdf", "xlsx")
+
+# Every cart carries an idempotency key. Committing a cart whose key was
+# committed recently returns the bill of the first commit instead of taking
+# the items out of stock (and writing the bill) again, which absorbs
+# double-clicks, Streamlit reruns and client retries. The most recent
+# RECENT_COMMITS keys are kept in memory, shared by the services of a process
+# that use the same data directory.
+RECENT_COMMITS = 1024
+# Carts get their bill number when committed, from the day's counter in the
+# bill store (bill_store.reserve_bill_number). Numbers a caller picked itself
+# may already be saved, so this many reserved ones are tried past them
+BILL_NUMBER_ATTEMPTS = 100
+
+
+class BillingError(ValueError):
+    """Raised when a cart cannot be billed."""
+
+
+class CommitError(RuntimeError):
+    """Raised when a committed bill could not be saved; its stock changes are undone."""
+
+
+# Held while a service redoes the transactions left in its journal
+_recovery_lock = threading.Lock()
+# Held by render_once, as retries of a cart share one bill dict across services
+_render_once_lock = threading.Lock()
+
+_recent_commits = {}
+_recent_commits_lock = threading.Lock()
+
+
+class RecentCommits:
+    """
+    Bounded index from idempotency key to committed bill, oldest keys evicted first.
+
+    Args:
+        capacity (int): Number of keys kept
+    """
+
+    def __init__(self, capacity=RECENT_COMMITS):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def claim(self, key):
+        """
+        Look up a key, claiming it if it is new.
+
+        Returns:
+            tuple: (entry, owner). The owner commits the cart and calls
+                finish(); other callers wait for entry["done"] and use entry["bill"].
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry, False
+            entry = self._entries[key] = {"done": threading.Event(), "bill": None}
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+            return entry, True
+
+    def finish(self, key, entry, bill):
+        """Record the bill of a claimed key, or release the key if the commit failed (bill is None)."""
+        with self._lock:
+            entry["bill"] = bill
+            if bill is None and self._entries.get(key) is entry:
+                del self._entries[key]
+        entry["done"].set()
+
+
+def get_recent_commits(path):
+    """Return the shared recent commits index of a journal file."""
+    path = os.path.abspath(path)
+    with _recent_commits_lock:
+        recent = _recent_commits.get(path)
+        if recent is None:
+            recent = _recent_commits[path] = RecentCommits()
+        return recent
+
+
+def create_cart(customer_name="", phone_number="", bill_number=None,
+                cosmetic_items=None, grocery_items=None, drink_items=None, idempotency_key=None, lane=None):
+    """
+    Create a cart.
+
+    Args:
+        customer_name (str): Customer name
+        phone_number (str): Customer phone number
+        bill_number (str, optional): Bill number (default: the next number of
+            the day, reserved when the cart is committed)
+        cosmetic_items, grocery_items, drink_items (dict, optional): Product name -> quantity
+        idempotency_key (str, optional): Key identifying the checkout, kept by
+            the caller across retries (default: a new one)
+        lane (str, optional): Lane billing the cart, whose till counts it
+            (default: the service's lane)
+
+    Returns:
+        dict: Cart with bill_number, idempotency_key, lane, customer_name,
+            phone_number and per-category items
+    """
+    cart = {
+        "bill_number": bill_number or None,
+        "idempotency_key": idempotency_key or uuid.uuid4().hex,
+        "lane": lane,
+        "customer_name": customer_name,
+        "phone_number": phone_number,
+        "items": {category: {} for category in CATEGORIES}
+    }
+    for category, items in zip(CATEGORIES, (cosmetic_items, grocery_items, drink_items)):
+        for name, quantity in (items or {}).items():
+            set_item(cart, category, name, quantity)
+    return cart
+
+
+def set_item(cart, category, name, quantity):
+    """Set the quantity of a product in the cart; a quantity of 0 removes it."""
+    if category not in CATEGORIES:
+        raise BillingError(f"Unknown category: {category}")
+    if quantity > 0:
+        cart["items"][category][name] = quantity
+    else:
+        cart["items"][category].pop(name, None)
+
+
+def get_cart_items(cart):
+    """Return the cart's (cosmetic_items, grocery_items, drink_items) dicts."""
+    return tuple(cart["items"][category] for category in CATEGORIES)
+
+
+def validate_items(cart, products):
+    """Raise BillingError if the cart holds a product that is not in the catalog under its category, or a quantity below 1."""
+    known = {(category, variant["name"]) for category, product_type, variant in catalog.iter_catalog_items(products)}
+    for category in CATEGORIES:
+        for name, quantity in cart["items"][category].items():
+            if (category, name) not in known:
+                raise BillingError(f"Unknown product in {category}: {name}")
+            if not isinstance(quantity, int) or quantity <= 0:
+                raise BillingError(f"Quantity of {name} must be a positive integer")
+
+
+def validate_cart(cart, products=None):
+    """
+    Raise BillingError if the cart is missing customer details or products.
+
+    With the catalog's products, its items are checked too (see validate_items).
+    """
+    if not cart["customer_name"]:
+        raise BillingError("Please enter customer name")
+    if not cart["phone_number"]:
+        raise BillingError("Please enter phone number")
+    if not any(qty > 0 for items in get_cart_items(cart) for qty in items.values()):
+        raise BillingError("Please select at least one product")
+    if cart.get("lane") is not None:
+        try:
+            till.get_lane(cart["lane"])
+        except till.TillError as e:
+            raise BillingError(str(e))
+    if products is not None:
+        validate_items(cart, products)
+
+
+def is_same_bill(entry, bill):
+    """Whether a manifest entry was saved from a committed bill (saving a bill again is allowed)."""
+    return (
+        entry.get("date") == bill["date"]
+        and entry.get("customer_name") == bill["customer_name"]
+        and entry.get("phone_number") == bill["phone_number"]
+        and entry.get("total") == bill["totals"]["grand_total"]
+    )
+
+
+class BillingService:
+    """
+    Prices, commits and renders bills against the catalog and the bill store.
+
+    Catalog files are cached in memory and read again when their modification
+    time changes, so several processes (the Streamlit app, the POS API) can
+    share one data directory. Commits are serialized so that concurrent
+    callers see consistent stock levels. Saved bills are recorded in the
+    customer store; pass a CustomerStore as customers to share one store
+    between several services.
+
+    Commits, saves and renders go through the bill journal (see
+    utils.bill_journal) in the data directory. The first service of a process
+    to open the journal redoes what a crash left unfinished, unless recover
+    is False.
+
+    Commits are idempotent: committing again a cart whose idempotency key is
+    among the RECENT_COMMITS most recent ones returns the original bill.
+
+    Committed and voided bills are counted in the till of the lane that
+    billed them (see utils.till): the cart's lane, else the service's lane
+    (default: BILLING_LANE, else till.DEFAULT_LANE).
+    """
+
+    def __init__(self, data_dir=None, bills_directory=None, customers=None, recover=True, lane=None):
+        self.data_dir = data_dir
+        self.bills_directory = bills_directory or bill_store.get_default_bills_directory()
+        self.lane = till.get_lane(lane)
+        self.till_dir = till.get_till_dir(data_dir)
+        # The ledger sits next to the bills directory, as vdx_excel_bills.xlsx
+        # sits next to saved_bills, and receipts spool in the data directory
+        self.ledger_file = os.path.join(os.path.dirname(os.path.abspath(self.bills_directory)), os.path.basename(LEDGER_FILE))
+        self.spool_dir = catalog.get_data_file(os.path.basename(escpos.DEFAULT_SPOOL_DIR), data_dir)
+        self._lock = threading.RLock()
+        # Taken before self._lock by every stock change (see _hold_stock)
+        self.inventory_lock = catalog.InventoryLock(data_dir)
+        # name -> (file mtime when loaded, value)
+        self._cache = {}
+        # Created on first use of sales_velocity, then updated with every commit
+        self._sales_velocity = None
+        # Created on first use of customers (or passed in to share one store),
+        # then updated with every saved bill
+        self._customers = customers
+        self.journal = bill_journal.open_journal(catalog.get_data_file(bill_journal.JOURNAL_FILE, data_dir))
+        self.recent_commits = get_recent_commits(self.journal.path)
+        if recover and not self.journal.recovered:
+            self.recover()
+
+    def _get_mtime(self, filename):
+        try:
+            return os.stat(catalog.get_data_file(filename, self.data_dir)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self, filename, loader):
+        with self._lock:
+            mtime = self._get_mtime(filename)
+            cached = self._cache.get(filename)
+            if cached is None or cached[0] != mtime:
+                value = loader(self.data_dir)
+                # The loader may have created the file
+                cached = (self._get_mtime(filename), value)
+                self._cache[filename] = cached
+            return cached[1]
+
+    @property
+    def products(self):
+        return self._load(catalog.PRODUCTS_FILE, catalog.load_product_data)
+
+    @property
+    def inventory(self):
+        return self._load(catalog.INVENTORY_FILE, catalog.load_inventory_data)
+
+    @property
+    def prices(self):
+        return self._load(catalog.PRICES_FILE, catalog.load_prices)
+
+    @property
+    def price_history(self):
+        return self._load(catalog.PRICE_HISTORY_FILE, catalog.load_price_history)
+
+    def prices_at(self, when, names=None):
+        """Price list at a point in time (see PriceHistory.prices_at)."""
+        return self.price_history.prices_at(when, names)
+
+    def reload(self):
+        """Drop the cached catalog so it is read again from disk."""
+        with self._lock:
+            self._cache.clear()
+
+    @property
+    def sales_velocity(self):
+        """Rolling per-product sales, loaded from the bill store on first use."""
+        with self._lock:
+            if self._sales_velocity is None:
+                self._sales_velocity = replenishment.SalesVelocity(self.bills_directory)
+            return self._sales_velocity
+
+    def reorder_recommendations(self, **params):
+        """
+        Reorder recommendations for the whole catalog (see
+        replenishment.get_reorder_recommendations for the parameters).
+        """
+        sales_velocity = self.sales_velocity
+        sales_velocity.refresh()
+        return replenishment.get_reorder_recommendations(sales_velocity, self.inventory, self.products, **params)
+
+    @property
+    def customers(self):
+        """Customer profiles keyed by phone number, loaded on first use."""
+        with self._lock:
+            if self._customers is None:
+                path = catalog.get_data_file(os.path.basename(customer_store.CUSTOMERS_FILE), self.data_dir)
+                self._customers = customer_store.CustomerStore(self.bills_directory, path)
+            return self._customers
+
+    def customer_history(self, phone_number):
+        """
+        Profile and bills of a customer.
+
+        Args:
+            phone_number (str): Phone number in any format
+
+        Returns:
+            tuple: (profile, manifest entries of the bills, oldest first), or
+                None if no bill has this phone number
+        """
+        customers = self.customers
+        customers.refresh()
+        profile = customers.get(phone_number)
+        if profile is None:
+            return None
+        return profile, customers.get_bills(phone_number)
+
+    def create_cart(self, customer_name="", phone_number="", bill_number=None, **items):
+        return create_cart(customer_name, phone_number, bill_number, **items)
+
+    def get_till(self, lane=None):
+        """Return the till of a lane (default: the service's lane)."""
+        return till.get_till(self.till_dir, lane or self.lane)
+
+    def price(self, cart, as_of=None):
+        """
+        Return the totals of a cart (see bill_operations.calculate_total).
+
+        Args:
+            cart (dict): Cart from create_cart
+            as_of (datetime, date or str, optional): Price the cart with the
+                prices in effect then, e.g. the date of an old bill (default:
+                current prices)
+
+        Raises:
+            BillingError: If the cart holds a product that is not in the catalog
+        """
+        validate_items(cart, self.products)
+        items = get_cart_items(cart)
+        if as_of is None:
+            prices = self.prices
+        else:
+            prices = self.prices_at(as_of, [name for category_items in items for name in category_items])
+        return calculate_total(*items, prices)
+
+    def decrement_stock(self, items):
+        """
+        Take sold quantities out of stock and save the inventory.
+
+        Args:
+            items (dict): Product name -> quantity sold
+
+        Returns:
+            list: Names of the products whose stock changed
+        """
+        self._hold_stock()
+        try:
+            with self._lock:
+                inventory = self.inventory
+                changed = catalog.decrement_stock(inventory, items)
+                if changed:
+                    self._write_inventory(inventory)
+                return changed
+        finally:
+            self.inventory_lock.release()
+
+    def _hold_stock(self):
+        """
+        Take the inventory lock for a stock change, up to its write.
+
+        Other processes write the inventory too, so it is read again from
+        disk when the lock was not already held by this service. The lock is
+        taken before self._lock, and before the journal's.
+        """
+        if self.inventory_lock.hold():
+            with self._lock:
+                self._cache.pop(catalog.INVENTORY_FILE, None)
+
+    def _write_inventory(self, inventory):
+        """Save the inventory and keep it as the cached copy; returns the path written."""
+        with self._lock:
+            catalog.save_inventory_data(inventory, self.data_dir)
+            self._cache[catalog.INVENTORY_FILE] = (self._get_mtime(catalog.INVENTORY_FILE), inventory)
+            return catalog.get_data_file(catalog.INVENTORY_FILE, self.data_dir)
+
+    def _set_stock(self, quantities):
+        """Set the stock of some products (name -> quantity) and save the inventory."""
+        self._hold_stock()
+        try:
+            with self._lock:
+                inventory = self.inventory
+                for name, quantity in quantities.items():
+                    if name in inventory:
+                        inventory[name]["quantity"] = quantity
+                return self._write_inventory(inventory)
+        finally:
+            self.inventory_lock.release()
+
+    def commit(self, cart, save=True):
+        """
+        Bill a cart: price it, build the bill text, take the items out of stock
+        and (with save) store the text bill in the bill store.
+
+        The commit is journaled: the bill and the new stock levels are on disk
+        in the journal before the inventory or the bill files are written, so a
+        crash part way is redone when the journal is next opened.
+
+        A cart whose idempotency key was committed recently is not committed
+        again: its original bill is returned, and a commit of the same key
+        still in progress is waited for. Failed commits release their key.
+
+        Args:
+            cart (dict): Cart from create_cart
+            save (bool): Save the text bill and its manifest entry
+
+        A cart without a bill number gets the next number of the day. A number
+        the caller picked is kept unless a saved bill already has it, in which
+        case the bill gets the next number instead.
+
+        Returns:
+            dict: Committed bill with bill_number, date, customer_name,
+                phone_number, the per-category items, prices, totals and content
+
+        Raises:
+            BillingError: If the cart is incomplete or holds a product that is not in the catalog
+            CommitError: If the bill could not be saved (the stock is restored)
+        """
+        key = cart.get("idempotency_key")
+        if key is None:
+            return self._commit(cart, save)
+        while True:
+            entry, owner = self.recent_commits.claim(key)
+            if owner:
+                break
+            entry["done"].wait()
+            if entry["bill"] is not None:
+                tracing.increment("bills_deduplicated_total")
+                return entry["bill"]
+        bill = None
+        try:
+            bill = self._commit(cart, save)
+        finally:
+            self.recent_commits.finish(key, entry, bill)
+        return bill
+
+    def _commit(self, cart, save):
+        # Held from the stock change until the inventory is written
+        self._hold_stock()
+        try:
+            return self._commit_holding_stock(cart, save)
+        finally:
+            self.inventory_lock.release()
+
+    def _commit_holding_stock(self, cart, save):
+        validate_cart(cart, self.products)
+        cosmetic_items, grocery_items, drink_items = (dict(items) for items in get_cart_items(cart))
+        with self._lock, tracing.span("commit"):
+            bill_number = self._get_bill_number(cart.get("bill_number"))
+            prices = self.prices
+            with tracing.span("price"):
+                model = Bill.from_items(
+                    bill_number,
+                    datetime.now().replace(microsecond=0),
+                    cart["customer_name"],
+                    cart["phone_number"],
+                    cosmetic_items,
+                    grocery_items,
+                    drink_items,
+                    prices
+                )
+            with tracing.span("format"):
+                content = render_bill(model, ["txt"])["txt"]
+            bill = {
+                "bill_number": model.bill_number,
+                "date": model.date.strftime(bill_store.MANIFEST_DATE_FORMAT),
+                "lane": cart.get("lane") or self.lane,
+                "customer_name": model.customer_name,
+                "phone_number": model.phone_number,
+                "cosmetic_items": cosmetic_items,
+                "grocery_items": grocery_items,
+                "drink_items": drink_items,
+                "prices": {item.name: item.price for item in model.items},
+                "totals": model.totals,
+                "content": content
+            }
+            # Take the items out of the cached inventory; the file is written
+            # once the journal record is durable
+            sold = {**cosmetic_items, **grocery_items, **drink_items}
+            inventory = self.inventory
+            before = {name: inventory[name]["quantity"] for name in sold if name in inventory}
+            changed = catalog.decrement_stock(inventory, sold)
+            stock = {name: inventory[name]["quantity"] for name in changed}
+            if self._sales_velocity is not None:
+                self._sales_velocity.record_sale(sold)
+            # Appended under the lock so the journal order is the order of the
+            # stock changes; the fsync is waited for outside it
+            txn, seq = self.journal.begin("commit", bills_directory=self.bills_directory, bill=bill,
+                                          stock=stock, save=save)
+
+        self.journal.sync(seq)
+        touched = [self._write_inventory(inventory)] if changed else []
+        if save:
+            status, written = self._write_bill(bill)
+            touched.extend(written)
+            if tracing.is_error_result(status):
+                # Put back what this bill took; other bills may have changed the stock since
+                with self._lock:
+                    inventory = self.inventory
+                    for name in changed:
+                        inventory[name]["quantity"] += before[name] - stock[name]
+                    touched.append(self._write_inventory(inventory))
+                self.journal.end(txn, touched, aborted=True)
+                raise CommitError(status)
+        self.journal.end(txn, touched)
+        self._count_in_till(bill["lane"], "record_bill", model)
+        tracing.increment("bills_committed_total")
+        return bill
+
+    def _count_in_till(self, lane, method, model):
+        """
+        Count a committed or voided bill in its lane's till.
+
+        The bill is already durable, so a failure is reported rather than
+        raised (a retry would bill it again); `python -m utils.till rebuild`
+        recounts the lane from the manifests.
+        """
+        try:
+            with tracing.span("till"):
+                getattr(self.get_till(lane), method)(model)
+        except Exception as e:
+            tracing.increment("till_errors_total")
+            print(f"Error counting bill {model.bill_number} in lane {lane}: {e} "
+                  f"(recount with python -m utils.till rebuild --lane {lane})")
+
+    def _get_bill_number(self, bill_number):
+        """Return bill_number unless a saved bill already has it, else reserve the day's next one."""
+        if bill_number and bill_store.find_bill(bill_number, self.bills_directory) is None:
+            return bill_number
+        for attempt in range(BILL_NUMBER_ATTEMPTS):
+            bill_number = bill_store.reserve_bill_number(self.bills_directory)
+            if bill_store.find_bill(bill_number, self.bills_directory) is None:
+                return bill_number
+        raise BillingError("No unused bill number left for today")
+
+    def save(self, bill):
+        """Save the text bill in its date partition; returns the status message."""
+        txn, seq = self.journal.begin("save", bills_directory=self.bills_directory, bill=bill)
+        self.journal.sync(seq)
+        status, touched = self._write_bill(bill)
+        self.journal.end(txn, touched, aborted=tracing.is_error_result(status))
+        return status
+
+    def _write_bill(self, bill):
+        """
+        Write the text bill and its manifest entry; returns (status, paths written).
+
+        A different bill saved under the same number since the commit is not
+        overwritten: an error status is returned instead.
+        """
+        existing = bill_store.find_bill(bill["bill_number"], self.bills_directory)
+        if existing is not None and not is_same_bill(existing, bill):
+            return f"Error saving bill: bill number {bill['bill_number']} is already used by another bill", []
+        status = save_bill(
+            bill["content"],
+            bill["bill_number"],
+            bill["customer_name"],
+            bill["phone_number"],
+            bill["cosmetic_items"],
+            bill["grocery_items"],
+            bill["drink_items"],
+            bill["totals"],
+            bill["prices"],
+            bills_directory=self.bills_directory,
+            date=bill["date"],
+            lane=bill.get("lane")
+        )
+        if self._customers is not None and not tracing.is_error_result(status):
+            self._customers.record_bill(
+                bill["bill_number"],
+                bill["phone_number"],
+                bill["customer_name"],
+                bill["totals"]["grand_total"],
+                bill["date"],
+                get_bill_line_items(bill["cosmetic_items"], bill["grocery_items"], bill["drink_items"], bill["prices"])
+            )
+        partition_dir = bill_store.get_partition_dir(self.bills_directory, bill_store.bill_date_from_number(bill["bill_number"]))
+        touched = [
+            bill_store.get_artifact_path(self.bills_directory, bill["bill_number"], ".txt"),
+            os.path.join(partition_dir, bill_store.MANIFEST_FILE)
+        ]
+        return status, touched
+
+    def render(self, bill, kinds=RENDER_KINDS):
+        """
+        Render a committed bill to PDF and/or Excel in the bill store.
+
+        Args:
+            bill (dict): Bill returned by commit
+            kinds (iterable): Any of "pdf" and "xlsx"
+
+        Returns:
+            dict: Kind -> status message (or PDF path)
+        """
+        kinds = list(kinds)
+        unknown = [kind for kind in kinds if kind not in RENDER_KINDS]
+        if unknown:
+            raise BillingError(f"Unknown artifact kind: {', '.join(unknown)}")
+        if not kinds:
+            return {}
+        txn, seq = self.journal.begin("render", bills_directory=self.bills_directory, bill=bill, kinds=kinds)
+        self.journal.sync(seq)
+        results, touched = self._render(bill, kinds)
+        self.journal.end(txn, touched)
+        return results
+
+    def render_once(self, bill, kinds=RENDER_KINDS):
+        """
+        Render a committed bill unless it was rendered already.
+
+        Retried commits of a cart return the same bill dict, so only the first
+        caller renders it; the artifacts are kept in bill["artifacts"].
+
+        Returns:
+            bool: True if this call rendered the bill
+        """
+        with _render_once_lock:
+            if "artifacts" in bill:
+                return False
+            bill["artifacts"] = self.render(bill, kinds)
+            return True
+
+    def _render(self, bill, kinds):
+        """Render artifacts in one pass over the bill; returns (kind -> status, paths written)."""
+        results = {}
+        bill_number = bill["bill_number"]
+        model = Bill.from_dict(bill)
+        try:
+            with tracing.span("render"):
+                rendered = render_bill(model, kinds)
+        except Exception:
+            # Each artifact then renders itself and reports its own error
+            rendered = {}
+        partition_dir = bill_store.get_partition_dir(self.bills_directory, bill_store.bill_date_from_number(bill_number))
+        touched = [os.path.join(partition_dir, bill_store.MANIFEST_FILE)]
+        for kind in kinds:
+            if kind == "pdf":
+                from utils.pdf_operations import save_bill_to_pdf
+                results[kind] = save_bill_to_pdf(
+                    bill["content"],
+                    bill_number,
+                    bills_directory=self.bills_directory,
+                    bill=model,
+                    rendered=rendered.get(kind)
+                )
+                touched.append(bill_store.get_artifact_path(self.bills_directory, bill_number, ".pdf"))
+            elif kind == "xlsx":
+                results[kind] = export_bill_to_excel(
+                    bill["customer_name"],
+                    bill["phone_number"],
+                    bill_number,
+                    bill["cosmetic_items"],
+                    bill["grocery_items"],
+                    bill["drink_items"],
+                    bill["totals"],
+                    bill["prices"],
+                    bills_directory=self.bills_directory,
+                    ledger_file=self.ledger_file,
+                    bill=model,
+                    rendered=rendered.get(kind)
+                )
+                touched.append(bill_store.get_artifact_path(self.bills_directory, bill_number, ".xlsx",
+                                                            subdir=bill_store.EXCEL_SUBDIR))
+                touched.append(excel_export.get_pending_ledger_file(self.ledger_file))
+        return results, touched
+
+    def void(self, bill_number, reason="", lane=None):
+        """
+        Void a saved bill: put its items back in stock, mark it voided in its
+        manifest entry, take it out of its customer's profile and count the
+        void in the lane's till.
+
+        The bill and its artifacts are kept. Voids are journaled like commits.
+
+        Args:
+            bill_number (str): Bill number
+            reason (str): Why the bill is voided
+            lane (str, optional): Lane voiding the bill (default: the service's lane)
+
+        Returns:
+            dict: The bill's manifest entry
+
+        Raises:
+            BillingError: If the bill is not in the store or is already voided
+        """
+        try:
+            lane = till.get_lane(lane or self.lane)
+        except till.TillError as e:
+            raise BillingError(str(e))
+        self._hold_stock()
+        try:
+            with self._lock:
+                entry = bill_store.find_bill(bill_number, self.bills_directory)
+                if entry is None:
+                    raise BillingError(f"Unknown bill: {bill_number}")
+                if entry.get("voided"):
+                    raise BillingError(f"Bill {bill_number} was already voided on {entry['voided']['voided_at']}")
+                model = Bill.from_manifest_entry(entry)
+                returned = {}
+                for item in model.items:
+                    returned[item.name] = returned.get(item.name, 0) + item.quantity
+                inventory = self.inventory
+                changed = catalog.return_stock(inventory, returned)
+                stock = {name: inventory[name]["quantity"] for name in changed}
+                voided = {
+                    "voided_at": datetime.now().strftime(bill_store.MANIFEST_DATE_FORMAT),
+                    "reason": reason,
+                    "lane": lane
+                }
+                txn, seq = self.journal.begin("void", bills_directory=self.bills_directory,
+                                              bill={"bill_number": bill_number}, stock=stock, voided=voided)
+                # Marked in the manifest under the lock, so a second void of the bill is refused
+                self.journal.sync(seq)
+                touched = [self._write_inventory(inventory)] if changed else []
+                touched.append(self._mark_voided(bill_number, voided))
+        finally:
+            self.inventory_lock.release()
+        self.journal.end(txn, touched)
+        self._count_in_till(lane, "record_void", model)
+        tracing.increment("bills_voided_total")
+        entry["voided"] = voided
+        return entry
+
+    def _mark_voided(self, bill_number, voided):
+        """Record the void in the bill's manifest entry and customer profile; returns the manifest path."""
+        entry = bill_store.update_bill(self.bills_directory, bill_number, voided=voided)
+        if self._customers is not None and entry is not None:
+            self._customers.record_void(bill_number, entry.get("total"), entry.get("items", []))
+        partition_dir = bill_store.get_partition_dir(self.bills_directory, bill_store.bill_date_from_number(bill_number))
+        return os.path.join(partition_dir, bill_store.MANIFEST_FILE)
+
+    def print_receipt(self, bill, printer=None, width=escpos.DEFAULT_WIDTH):
+        """
+        Print a committed bill as an ESC/POS receipt (see utils.escpos).
+
+        Args:
+            bill (dict): Bill returned by commit
+            printer (str, optional): Spool directory or device (see get_printer)
+            width (int): Characters per line
+
+        Returns:
+            str: Status message
+        """
+        return escpos.print_receipt(Bill.from_dict(bill), self.get_printer(printer), width)
+
+    def get_printer(self, printer=None):
+        """Return the printer path: printer, else RECEIPT_PRINTER, else receipt_spool in the service's data directory."""
+        return escpos.get_printer(printer, self.spool_dir)
+
+    def recover(self):
+        """
+        Redo the journaled transactions that never ended, once per journal and process.
+
+        While other processes have transactions in flight for longer than
+        bill_journal.RECOVERY_WAIT, recovery is left to the next service created.
+
+        Returns:
+            list: Bill numbers of the transactions redone
+        """
+        journal = self.journal
+        # The inventory and service locks are taken before the journal's, as commits do
+        self._hold_stock()
+        try:
+            with _recovery_lock, self._lock:
+                if journal.recovered:
+                    return []
+                redone = journal.recover(self._redo_any)
+                if redone is None:
+                    return []
+                journal.recovered = True
+                return [record["bill"]["bill_number"] for record in redone]
+        finally:
+            self.inventory_lock.release()
+
+    def _redo_any(self, record):
+        """
+        Redo a transaction. Its stock is set by this service, which holds the
+        inventory lock, and its bill files are written by a service of its own
+        bills directory, in case another one shares the journal.
+        """
+        touched = []
+        if record["kind"] in ("commit", "void") and record["stock"]:
+            touched.append(self._set_stock(record["stock"]))
+        service = self if record["bills_directory"] == self.bills_directory else \
+            BillingService(self.data_dir, record["bills_directory"], customers=self._customers, recover=False)
+        return touched + service._redo(record)
+
+    def _redo(self, record):
+        """
+        Write a journaled transaction's bill files again (see _redo_any for
+        its stock); every step overwrites rather than adds.
+
+        Returns:
+            list: Paths written
+        """
+        bill = record["bill"]
+        touched = []
+        if record["kind"] == "commit":
+            if record["save"]:
+                touched.extend(self._write_bill(bill)[1])
+        elif record["kind"] == "save":
+            touched.extend(self._write_bill(bill)[1])
+        elif record["kind"] == "render":
+            touched.extend(self._render(bill, record["kinds"])[1])
+        elif record["kind"] == "void":
+            touched.append(self._mark_voided(bill["bill_number"], record["voided"]))
+        return touched
+
+
+def parse_item(value):
+    """Parse a "Category:Product name:quantity" command line item."""
+    parts = value.rsplit(":", 2)
+    if len(parts) != 3 or not parts[2].strip().isdigit():
+        raise argparse.ArgumentTypeError(f"Expected Category:Product name:quantity, got {value!r}")
+    return parts[0], parts[1], int(parts[2])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bill a cart without the Streamlit app")
+    parser.add_argument("--customer", required=True, help="Customer name")
+    parser.add_argument("--phone", required=True, help="Customer phone number")
+    parser.add_argument("--item", action="append", type=parse_item, default=[], required=True,
+                        help="Item as Category:Product name:quantity (repeatable)")
+    parser.add_argument("--render", nargs="*", choices=RENDER_KINDS, default=[], help="Artifacts to render")
+    parser.add_argument("--bills-dir", default=None, help="Bills directory (default: saved_bills)")
+    parser.add_argument("--data-dir", default=None, help="Catalog directory (default: data)")
+    args = parser.parse_args(argv)
+
+    service = BillingService(args.data_dir, args.bills_dir)
+    cart = service.create_cart(args.customer, args.phone)
+    try:
+        for category, name, quantity in args.item:
+            set_item(cart, category, name, quantity)
+        bill = service.commit(cart)
+    except BillingError as e:
+        parser.error(str(e))
+    print(bill["content"])
+    for kind, result in service.render(bill, args.render).items():
+        print(f"{kind}: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+import os
+import json
+import pickle
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from utils import tracing
+from utils.trigram_index import TrigramIndex, DEFAULT_THRESHOLD
+from utils.price_history import PriceHistory, PRICE_HISTORY_FILE, BEGINNING
+from utils.data import (
+    prices as default_prices,
+    cosmetic_products as default_cosmetic_products,
+    grocery_products as default_grocery_products,
+    drink_products as default_drink_products
+)
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: only the threads of one process are coordinated
+    fcntl = None
+
+# Product catalog, stock levels and prices shared by the billing app, the
+# product management page and the billing service
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+PRODUCTS_FILE = "products.json"
+INVENTORY_FILE = "inventory.json"
+PRICES_FILE = "prices.pkl"
+INVENTORY_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Stock changes (load, change, write) are made holding an flock on this file,
+# so processes sharing a data directory (the app, the POS API) never write an
+# inventory that misses another one's change
+INVENTORY_LOCK_FILE = "inventory.lock"
+DEFAULT_STOCK = 10
+
+
+def get_data_file(filename, data_dir=None):
+    """Return the path of a catalog file, creating the data directory if needed."""
+    if data_dir is None:
+        data_dir = DATA_DIR
+    os.makedirs(data_dir, exist_ok=True)
+    return os.path.join(data_dir, filename)
+
+
+def load_product_data(data_dir=None):
+    """Load the product catalog, initializing it from utils/data.py on first use."""
+    products_file = get_data_file(PRODUCTS_FILE, data_dir)
+    if os.path.exists(products_file):
+        with open(products_file, 'r') as f:
+            return json.load(f)
+    # Initialize with existing data from utils/data.py
+    products = {
+        "Cosmetics": default_cosmetic_products,
+        "Groceries": default_grocery_products,
+        "Drinks": default_drink_products
+    }
+    save_product_data(products, data_dir)
+    return products
+
+
+def save_product_data(products, data_dir=None):
+    with open(get_data_file(PRODUCTS_FILE, data_dir), 'w') as f:
+        json.dump(products, f, indent=4)
+
+
+def load_inventory_data(data_dir=None):
+    """Load stock levels, giving every catalog product DEFAULT_STOCK units on first use."""
+    inventory_file = get_data_file(INVENTORY_FILE, data_dir)
+    if os.path.exists(inventory_file):
+        with open(inventory_file, 'r') as f:
+            return json.load(f)
+    inventory = {}
+    for category, category_products in load_product_data(data_dir).items():
+        for product_type, variants in category_products.items():
+            for variant in variants:
+                inventory[variant["name"]] = {
+                    "quantity": DEFAULT_STOCK,
+                    "last_updated": datetime.now().strftime(INVENTORY_DATE_FORMAT)
+                }
+    save_inventory_data(inventory, data_dir)
+    return inventory
+
+
+@tracing.traced("save_inventory")
+def save_inventory_data(inventory, data_dir=None):
+    # Written to a temporary file and renamed, so readers and crashes never
+    # see a partly written inventory (one temporary file per writer)
+    inventory_file = get_data_file(INVENTORY_FILE, data_dir)
+    temp_file = f"{inventory_file}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(inventory, f, indent=4)
+    os.replace(temp_file, inventory_file)
+
+
+class InventoryLock:
+    """
+    Cross-process lock of a data directory's inventory.
+
+    The flock is taken by the first hold() and released by the last matching
+    release(), so the threads of one holder share it while other processes
+    (and other InventoryLock instances) wait.
+
+    Args:
+        data_dir (str, optional): Catalog directory
+    """
+
+    def __init__(self, data_dir=None):
+        self.path = get_data_file(INVENTORY_LOCK_FILE, data_dir)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._holders = 0
+        self._lock = threading.Lock()
+
+    def hold(self):
+        """
+        Take the lock, waiting for other holders.
+
+        Returns:
+            bool: Whether the flock was just taken, in which case the
+                inventory may have been changed by another process
+        """
+        with self._lock:
+            self._holders += 1
+            if self._holders > 1:
+                return False
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            return True
+
+    def release(self):
+        with self._lock:
+            self._holders -= 1
+            if self._holders == 0 and fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self):
+        os.close(self._fd)
+
+
+@contextmanager
+def locked_inventory(data_dir=None):
+    """
+    Load the inventory holding its lock, and save it when the block ends without an error.
+
+    Yields:
+        dict: Stock levels (see load_inventory_data), to change in place
+    """
+    lock = InventoryLock(data_dir)
+    try:
+        lock.hold()
+        inventory = load_inventory_data(data_dir)
+        yield inventory
+        save_inventory_data(inventory, data_dir)
+    finally:
+        # Closing releases the flock
+        lock.close()
+
+
+def load_prices(data_dir=None):
+    """Load product prices, falling back to the defaults in utils/data.py."""
+    prices_file = get_data_file(PRICES_FILE, data_dir)
+    if os.path.exists(prices_file):
+        with open(prices_file, 'rb') as f:
+            return pickle.load(f)
+    return default_prices
+
+
+def load_price_history(data_dir=None):
+    """
+    Load the price history, starting it from the current prices (effective
+    since BEGINNING) on first use.
+    """
+    history = PriceHistory(get_data_file(PRICE_HISTORY_FILE, data_dir))
+    if not len(history):
+        history.record(load_prices(data_dir), BEGINNING)
+        history.save()
+    return history
+
+
+def update_prices_file(data_dir=None):
+    """
+    Rebuild the price file from the product catalog and return the prices.
+
+    Prices that changed are recorded in the price history, effective now.
+    """
+    all_prices = {}
+    for category, category_products in load_product_data(data_dir).items():
+        for product_type, variants in category_products.items():
+            for variant in variants:
+                all_prices[variant["name"]] = variant["price"]
+
+    # The history starts from the prices in use before this update
+    history = load_price_history(data_dir)
+    history.record(all_prices)
+    history.save()
+
+    # Save to pickle file for easy loading
+    with open(get_data_file(PRICES_FILE, data_dir), 'wb') as f:
+        pickle.dump(all_prices, f)
+
+    return all_prices
+
+
+def get_category_products(products):
+    """Return the (cosmetic, grocery, drink) product trees of the catalog."""
+    return (
+        products.get("Cosmetics", default_cosmetic_products),
+        products.get("Groceries", default_grocery_products),
+        products.get("Drinks", default_drink_products)
+    )
+
+
+def decrement_stock(inventory, items):
+    """
+    Take sold quantities out of the inventory, never going below zero.
+
+    Args:
+        inventory (dict): Inventory as returned by load_inventory_data (updated in place)
+        items (dict): Product name -> quantity sold
+
+    Returns:
+        list: Names of the products whose stock changed
+    """
+    now = datetime.now().strftime(INVENTORY_DATE_FORMAT)
+    changed = []
+    for product, quantity in items.items():
+        if quantity > 0 and product in inventory:
+            inventory[product]["quantity"] = max(0, inventory[product]["quantity"] - quantity)
+            inventory[product]["last_updated"] = now
+            changed.append(product)
+    return changed
+
+
+def return_stock(inventory, items):
+    """
+    Put returned quantities (of a voided bill) back into the inventory.
+
+    Args:
+        inventory (dict): Inventory as returned by load_inventory_data (updated in place)
+        items (dict): Product name -> quantity returned
+
+    Returns:
+        list: Names of the products whose stock changed
+    """
+    now = datetime.now().strftime(INVENTORY_DATE_FORMAT)
+    changed = []
+    for product, quantity in items.items():
+        if quantity > 0 and product in inventory:
+            inventory[product]["quantity"] += quantity
+            inventory[product]["last_updated"] = now
+            changed.append(product)
+    return changed
+
+
+def iter_catalog_items(products):
+    """Yield (category, product_type, variant) for every product in the catalog."""
+    for category, category_products in products.items():
+        for product_type, variants in category_products.items():
+            for variant in variants:
+                yield category, product_type, variant
+
+
+# (catalog signature, TrigramIndex) of the last catalog searched
+_product_index = [None]
+
+
+def get_product_index(products):
+    """
+    Return a trigram index of the catalog's products, keyed by product name.
+
+    The index is rebuilt only when the catalog's products change.
+    """
+    signature = tuple(
+        (category, product_type, variant["name"])
+        for category, product_type, variant in iter_catalog_items(products)
+    )
+    cached = _product_index[0]
+    if cached and cached[0] == signature:
+        return cached[1]
+    index = TrigramIndex()
+    for category, product_type, name in signature:
+        index.add(name, phrases=[name, product_type])
+    _product_index[0] = (signature, index)
+    return index
+
+
+def search_products(products, inventory, prices, query=None, category=None):
+    """
+    Look up products by name or type, typos and all (see utils.trigram_index).
+
+    Products whose name or type contains the query count as full matches, so
+    the results include every product the plain substring search found.
+
+    Args:
+        products (dict): Product catalog
+        inventory (dict): Stock levels
+        prices (dict): Product prices
+        query (str, optional): Text to look for (default: every product)
+        category (str, optional): Only return products of this category
+
+    Returns:
+        list: Dicts with category, type, name, price, stock and the match
+            score (1.0 without a query), best matches first
+    """
+    scores = {}
+    if query:
+        scores = dict(get_product_index(products).search(query, limit=None))
+        query = query.lower()
+    results = []
+    for product_category, product_type, variant in iter_catalog_items(products):
+        name = variant["name"]
+        if category and product_category != category:
+            continue
+        score = 1.0
+        if query and query not in name.lower() and query not in product_type.lower():
+            score = scores.get(name, 0)
+            if score < DEFAULT_THRESHOLD:
+                continue
+        results.append({
+            "category": product_category,
+            "type": product_type,
+            "name": name,
+            "price": prices.get(name, variant.get("price", 0)),
+            "stock": inventory.get(name, {}).get("quantity", 0),
+            "score": round(score, 3)
+        })
+    # Stable, so equal matches keep their catalog order
+    results.sort(key=lambda result: -result["score"])
+    return results
@@ -0,0 +1,233 @@
+import re
+import time
+import bisect
+import functools
+import argparse
+import threading
+import numpy as np
+from utils.customer_store import CustomerStore, COUNTRY_CODE, normalize_phone
+
+# Name and phone suggestions for returning customers. Every customer of the
+# customer store is indexed under their phone number and under each word of
+# every name they have been billed as, so "dub" finds "Vishal Dubey" and a
+# misspelt alias still suggests the customer's usual name.
+#
+# Each index is a sorted list of keys with a parallel numpy array of customer
+# ids: the keys starting with a prefix are one contiguous range found with two
+# binary searches. Keys added after the index was built go to a small sorted
+# buffer that is merged in once it holds MERGE_THRESHOLD keys (or 1/64 of the
+# index, for large ones), so recording a bill never re-sorts the whole index.
+# Matches are ranked by number of visits with np.argpartition, which stays
+# fast however many customers share a prefix.
+MERGE_THRESHOLD = 4096
+MIN_QUERY_LENGTH = 2
+DEFAULT_LIMIT = 8
+_NON_WORD = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=65536)
+def normalize_name(name):
+    """Case-fold a name and reduce punctuation and runs of spaces to single spaces."""
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", str(name).casefold())).strip()
+
+
+def name_keys(normalized_name):
+    """Index keys of a normalized name: the name from the start of each of its words."""
+    if not normalized_name:
+        return []
+    words = normalized_name.split(" ")
+    return [" ".join(words[start:]) for start in range(len(words))]
+
+
+def normalize_phone_prefix(query):
+    """Digits of a partly typed phone number, without country code or trunk prefix."""
+    query = query.strip()
+    digits = re.sub(r"\D+", "", query)
+    if query.startswith("+") and digits.startswith(COUNTRY_CODE):
+        digits = digits[len(COUNTRY_CODE):]
+    return digits.lstrip("0")
+
+
+class PrefixIndex:
+    """Sorted keys, each belonging to a customer id, searchable by prefix."""
+
+    def __init__(self, pairs=()):
+        pairs = sorted(pairs)
+        self.keys = [key for key, _ in pairs]
+        self.ids = np.array([customer_id for _, customer_id in pairs], dtype=np.int32)
+        # Sorted (key, id) pairs added since the keys were last merged
+        self._pending = []
+
+    def __len__(self):
+        return len(self.keys) + len(self._pending)
+
+    def add(self, key, customer_id):
+        bisect.insort(self._pending, (key, customer_id))
+        if len(self._pending) >= max(MERGE_THRESHOLD, len(self.keys) // 64):
+            self._merge()
+
+    def _merge(self):
+        # Both lists are sorted, which Timsort merges in linear time
+        pairs = sorted(list(zip(self.keys, self.ids.tolist())) + self._pending)
+        self.keys = [key for key, _ in pairs]
+        self.ids = np.array([customer_id for _, customer_id in pairs], dtype=np.int32)
+        self._pending = []
+
+    def search(self, prefix):
+        """Return the ids of every key starting with prefix (one per matching key)."""
+        low = bisect.bisect_left(self.keys, prefix)
+        high = bisect.bisect_left(self.keys, prefix + "\U0010ffff", low)
+        ids = self.ids[low:high]
+        position = bisect.bisect_left(self._pending, (prefix,))
+        pending = []
+        while position < len(self._pending) and self._pending[position][0].startswith(prefix):
+            pending.append(self._pending[position][1])
+            position += 1
+        if pending:
+            ids = np.concatenate([ids, np.array(pending, dtype=np.int32)])
+        return ids
+
+
+class CustomerAutocomplete:
+    """
+    Suggestions of returning customers by name or phone prefix.
+
+    The index follows its customer store: bills recorded in the store, or
+    picked up by refresh(), update the suggestions as they are added.
+
+    Args:
+        customer_store (CustomerStore, optional): Store to index (default: a
+            store over the default bills directory)
+    """
+
+    def __init__(self, customer_store=None):
+        self.store = customer_store or CustomerStore()
+        self._lock = threading.RLock()
+        self.phones = []
+        self.names = []
+        self._ids = {}
+        self._visits = np.zeros(1024, dtype=np.int64)
+        # (customer id, normalized name) pairs already indexed
+        self._indexed_names = set()
+        with self._lock:
+            self.store.refresh()
+            self._build(self.store.customers.values())
+            self.store.listeners.append(self.add_profile)
+
+    def _build(self, profiles):
+        name_pairs = []
+        phone_pairs = []
+        for profile in profiles:
+            customer_id = self._customer_id(profile)
+            phone_pairs.append((profile["phone"], customer_id))
+            for name in profile["names"]:
+                name_pairs.extend((key, customer_id) for key in self._new_name_keys(customer_id, name))
+        self.name_index = PrefixIndex(name_pairs)
+        self.phone_index = PrefixIndex(phone_pairs)
+
+    def _customer_id(self, profile):
+        """Id of a profile's customer, updating its display name and visits."""
+        customer_id = self._ids.get(profile["phone"])
+        if customer_id is None:
+            customer_id = self._ids[profile["phone"]] = len(self.phones)
+            self.phones.append(profile["phone"])
+            self.names.append(None)
+            if customer_id >= len(self._visits):
+                self._visits = np.concatenate([self._visits, np.zeros(len(self._visits), dtype=np.int64)])
+        self.names[customer_id] = profile["name"] or ""
+        self._visits[customer_id] = profile["visits"]
+        return customer_id
+
+    def _new_name_keys(self, customer_id, name):
+        normalized = normalize_name(name)
+        if not normalized or (customer_id, normalized) in self._indexed_names:
+            return []
+        self._indexed_names.add((customer_id, normalized))
+        return name_keys(normalized)
+
+    def add_profile(self, profile):
+        """Index a new or updated customer profile."""
+        with self._lock:
+            is_new = profile["phone"] not in self._ids
+            customer_id = self._customer_id(profile)
+            if is_new:
+                self.phone_index.add(profile["phone"], customer_id)
+            for name in profile["names"]:
+                for key in self._new_name_keys(customer_id, name):
+                    self.name_index.add(key, customer_id)
+
+    def refresh(self):
+        """Pick up bills saved by other processes (see CustomerStore.refresh)."""
+        return self.store.refresh()
+
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        """
+        Suggest customers matching a partly typed name or phone number.
+
+        Args:
+            query (str): Start of any word of a name, or start of a phone number
+            limit (int): Maximum number of suggestions
+
+        Returns:
+            list: Dicts with name, phone and visits, most frequent customers first
+        """
+        query = query or ""
+        is_phone = any(ch.isdigit() for ch in query) and not any(ch.isalpha() for ch in query)
+        prefix = normalize_phone_prefix(query) if is_phone else normalize_name(query)
+        if len(prefix) < MIN_QUERY_LENGTH:
+            return []
+        with self._lock:
+            ids = (self.phone_index if is_phone else self.name_index).search(prefix)
+            if len(ids) == 0:
+                return []
+            visits = self._visits[ids]
+            # Keep the most visited candidates; a customer can match several keys
+            keep = min(len(ids), limit * 4)
+            if keep < len(ids):
+                top = np.argpartition(-visits, keep - 1)[:keep]
+                ids, visits = ids[top], visits[top]
+            ids = ids[np.lexsort((ids, -visits))]
+            suggestions = []
+            seen = set()
+            for customer_id in ids.tolist():
+                if customer_id in seen:
+                    continue
+                seen.add(customer_id)
+                suggestions.append({
+                    "name": self.names[customer_id],
+                    "phone": self.phones[customer_id],
+                    "visits": int(self._visits[customer_id])
+                })
+                if len(suggestions) == limit:
+                    break
+            return suggestions
+
+    def lookup_phone(self, phone_number):
+        """Return the suggestion for an exact phone number, or None."""
+        customer_id = self._ids.get(normalize_phone(phone_number))
+        if customer_id is None:
+            return None
+        return {"name": self.names[customer_id], "phone": self.phones[customer_id],
+                "visits": int(self._visits[customer_id])}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Suggest returning customers by name or phone prefix")
+    parser.add_argument("query", help="Start of a name or phone number")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help="Maximum number of suggestions")
+    parser.add_argument("--bills-dir", default=None, help="Bills directory (default: saved_bills)")
+    parser.add_argument("--store", default=None, help="Customer store file (default: data/customers.json)")
+    args = parser.parse_args(argv)
+
+    autocomplete = CustomerAutocomplete(CustomerStore(args.bills_dir, args.store))
+    start = time.perf_counter()
+    suggestions = autocomplete.suggest(args.query, args.limit)
+    elapsed = time.perf_counter() - start
+    for suggestion in suggestions:
+        print(f"{suggestion['phone']:<14}{suggestion['name']:<30}{suggestion['visits']:>6} visits")
+    print(f"{len(suggestions)} suggestions in {elapsed * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+import os
+import re
+import json
+import argparse
+import threading
+from utils import bill_store
+
+# Customer profiles keyed by normalized phone number. Names are free text and
+# get typed differently from one visit to the next, so the phone number is
+# the customer's identity and the names are kept as aliases. Each profile
+# holds running aggregates (visits, spending, per-category quantities) and
+# the ids of the customer's bills, updated bill by bill, so looking up a
+# customer never scans the bill history.
+#
+# The store is saved to data/customers.json along with the manifest mtime of
+# every partition it has indexed; refresh() only reads partitions that are new
+# or changed since, and bills already indexed are skipped by bill number.
+# Voided bills are taken back out of their profile (record_void).
+CUSTOMERS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "customers.json")
+STORE_VERSION = 1
+COUNTRY_CODE = "91"
+PHONE_DIGITS = 10
+_NON_DIGITS = re.compile(r"\D+")
+
+
+def normalize_phone(phone):
+    """
+    Reduce a phone number to its digits without country code or trunk prefix.
+
+    "+91 98765-43210", "098765 43210" and "9876543210" all become "9876543210".
+
+    Returns:
+        str: Normalized number, or None if there are no digits
+    """
+    if phone is None:
+        return None
+    if isinstance(phone, float):
+        if phone != phone:
+            return None
+        phone = int(phone) if phone.is_integer() else phone
+    phone = str(phone).strip()
+    if phone.endswith(".0"):
+        # Phone numbers read back from Excel are floats ("9876543210.0")
+        phone = phone[:-2]
+    digits = _NON_DIGITS.sub("", phone)
+    if len(digits) == PHONE_DIGITS + len(COUNTRY_CODE) and digits.startswith(COUNTRY_CODE):
+        digits = digits[len(COUNTRY_CODE):]
+    elif len(digits) == PHONE_DIGITS + 1 and digits.startswith("0"):
+        digits = digits[1:]
+    return digits or None
+
+
+def new_profile(phone):
+    return {
+        "phone": phone,
+        "name": None,
+        "names": {},
+        "visits": 0,
+        "total_spent": 0.0,
+        "first_visit": None,
+        "last_visit": None,
+        "category_quantities": {},
+        "bills": []
+    }
+
+
+class CustomerStore:
+    """
+    Customer profiles with an index from customer to bills.
+
+    Args:
+        bills_directory (str, optional): Root bills directory
+        path (str, optional): File the store is saved to (default: data/customers.json)
+    """
+
+    def __init__(self, bills_directory=None, path=None):
+        self.bills_directory = bills_directory or bill_store.get_default_bills_directory()
+        self.path = path or CUSTOMERS_FILE
+        self._lock = threading.RLock()
+        self.customers = {}
+        # bill number -> customer phone
+        self.bill_index = {}
+        # partition directory (relative) -> manifest mtime when indexed
+        self.partitions = {}
+        # Called with the updated profile whenever a bill is recorded
+        self.listeners = []
+        self._dirty = False
+        self.load()
+
+    def load(self):
+        """Load the saved store, if there is one."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != STORE_VERSION:
+            return
+        with self._lock:
+            self.customers = data.get("customers", {})
+            self.partitions = data.get("partitions", {})
+            self.bill_index = {
+                bill_number: phone
+                for phone, profile in self.customers.items()
+                for bill_number in profile["bills"]
+            }
+
+    def save(self):
+        """Write the store atomically if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump({"version": STORE_VERSION, "customers": self.customers, "partitions": self.partitions}, f)
+            os.replace(self.path + ".tmp", self.path)
+            self._dirty = False
+
+    def record_bill(self, bill_number, phone_number, customer_name, total, date, items=()):
+        """
+        Add a bill to its customer's profile (once per bill number).
+
+        Args:
+            bill_number (str): Bill number
+            phone_number (str): Phone number as entered
+            customer_name (str): Customer name as entered
+            total (float): Bill total
+            date (str): Bill date (bill_store.MANIFEST_DATE_FORMAT)
+            items (iterable): Line items (dicts with category and quantity)
+
+        Returns:
+            dict: The customer's profile, or None if the bill has no phone number
+        """
+        phone = normalize_phone(phone_number)
+        if phone is None:
+            return None
+        with self._lock:
+            if bill_number in self.bill_index:
+                return self.customers.get(self.bill_index[bill_number])
+            profile = self.customers.setdefault(phone, new_profile(phone))
+            if customer_name:
+                profile["names"][customer_name] = profile["names"].get(customer_name, 0) + 1
+                profile["name"] = max(profile["names"], key=profile["names"].get)
+            profile["visits"] += 1
+            profile["total_spent"] += float(total or 0)
+            if date:
+                if profile["first_visit"] is None or date < profile["first_visit"]:
+                    profile["first_visit"] = date
+                if profile["last_visit"] is None or date > profile["last_visit"]:
+                    profile["last_visit"] = date
+            for item in items:
+                category = item.get("category", "")
+                profile["category_quantities"][category] = profile["category_quantities"].get(category, 0) + item.get("quantity", 0)
+            profile["bills"].append(bill_number)
+            self.bill_index[bill_number] = phone
+            self._dirty = True
+            for listener in self.listeners:
+                listener(profile)
+            return profile
+
+    def record_void(self, bill_number, total, items=()):
+        """
+        Take a voided bill out of its customer's profile.
+
+        The visit and its spending no longer count; first and last visit are
+        kept. Bills not in the store are ignored, so a void is taken out once.
+
+        Args:
+            bill_number (str): Bill number
+            total (float): Bill total
+            items (iterable): Line items (dicts with category and quantity)
+
+        Returns:
+            dict: The customer's profile, or None if the bill is not in the store
+        """
+        with self._lock:
+            phone = self.bill_index.pop(bill_number, None)
+            profile = self.customers.get(phone) if phone else None
+            if profile is None:
+                return None
+            profile["visits"] -= 1
+            profile["total_spent"] -= float(total or 0)
+            for item in items:
+                category = item.get("category", "")
+                profile["category_quantities"][category] = profile["category_quantities"].get(category, 0) - item.get("quantity", 0)
+            if bill_number in profile["bills"]:
+                profile["bills"].remove(bill_number)
+            self._dirty = True
+            for listener in self.listeners:
+                listener(profile)
+            return profile
+
+    def refresh(self, save=True):
+        """
+        Index the bills of partitions that are new or changed since the last refresh.
+
+        Returns:
+            int: Number of bills added
+        """
+        added = 0
+        with self._lock:
+            for partition_date, partition_dir in bill_store.list_partitions(self.bills_directory):
+                manifest_path = os.path.join(partition_dir, bill_store.MANIFEST_FILE)
+                try:
+                    mtime = os.stat(manifest_path).st_mtime_ns
+                except FileNotFoundError:
+                    continue
+                key = os.path.relpath(partition_dir, self.bills_directory)
+                if self.partitions.get(key) == mtime:
+                    continue
+                for entry in bill_store.load_manifest(partition_dir)["bills"].values():
+                    if entry.get("voided"):
+                        # Voided by another process since it was indexed
+                        self.record_void(entry["bill_number"], entry.get("total"), entry.get("items", []))
+                        continue
+                    if entry["bill_number"] in self.bill_index or not entry.get("phone_number"):
+                        continue
+                    if self.record_bill(entry["bill_number"], entry.get("phone_number"), entry.get("customer_name"),
+                                        entry.get("total"), entry.get("date"), entry.get("items", [])):
+                        added += 1
+                self.partitions[key] = mtime
+                self._dirty = True
+            if save:
+                self.save()
+        return added
+
+    def get(self, phone_number):
+        """Return the profile of a phone number (in any format), or None."""
+        return self.customers.get(normalize_phone(phone_number))
+
+    def get_customer_of_bill(self, bill_number):
+        """Return the profile of the customer a bill belongs to, or None."""
+        phone = self.bill_index.get(bill_number)
+        return self.customers.get(phone) if phone else None
+
+    def get_bills(self, phone_number):
+        """Return the manifest entries of a customer's bills, oldest first."""
+        profile = self.get(phone_number)
+        if profile is None:
+            return []
+        entries = [bill_store.find_bill(bill_number, self.bills_directory) for bill_number in profile["bills"]]
+        return sorted((entry for entry in entries if entry), key=lambda entry: entry.get("date", ""))
+
+    def search(self, query, limit=20):
+        """Find customers whose phone or any of whose names contain query."""
+        query = query.strip().lower()
+        digits = normalize_phone(query) if any(ch.isdigit() for ch in query) else None
+        results = []
+        with self._lock:
+            for phone, profile in self.customers.items():
+                if (digits and digits in phone) or any(query in name.lower() for name in profile["names"]):
+                    results.append(profile)
+        results.sort(key=lambda profile: profile["total_spent"], reverse=True)
+        return results[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index customers by phone and look them up")
+    parser.add_argument("query", nargs="?", default=None, help="Phone number or part of a name")
+    parser.add_argument("--bills-dir", default=None, help="Bills directory (default: saved_bills)")
+    parser.add_argument("--store", default=None, help="Customer store file (default: data/customers.json)")
+    args = parser.parse_args(argv)
+
+    store = CustomerStore(args.bills_dir, args.store)
+    added = store.refresh()
+    print(f"{len(store.customers):,d} customers, {len(store.bill_index):,d} bills ({added:,d} newly indexed)")
+    if args.query:
+        for profile in store.search(args.query):
+            aliases = ", ".join(name for name in profile["names"] if name != profile["name"])
+            print(f"{profile['phone']:<14}{profile['name'] or '':<30}{profile['visits']:>6} visits  "
+                  f"₹{profile['total_spent']:>12,.2f}  last {profile['last_visit']}"
+                  + (f"  (also: {aliases})" if aliases else ""))
+
+
+if __name__ == "__main__":
+    main()
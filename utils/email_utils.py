@@ -6,6 +6,7 @@ import os
 import json
 import hashlib
 import streamlit as st
+from utils import tracing
 
 # We'll use Streamlit secrets for cloud deployment
 # For local development, we'll use a fallback file
@@ -103,6 +104,7 @@ def verify_security_code(security_code):
         print(f"Error verifying security code: {e}")
         return False, None
 
+@tracing.traced("send_email")
 def send_bill_pdf_with_security_code(security_code, receiver_email, subject, message, pdf_path):
     """
     Send an email with a PDF bill attachment using stored credentials and a security code.
@@ -161,6 +163,7 @@ def send_bill_pdf_with_security_code(security_code, receiver_email, subject, mes
     except Exception as e:
         return f"Error sending email: {str(e)}"
 
+@tracing.traced("send_email")
 def send_email(receiver_email, subject, message):
     """
     Send a simple email without attachments.
@@ -0,0 +1,218 @@
+import os
+import time
+import argparse
+import functools
+from utils import bill_store, tracing
+from utils.bill_model import Bill, TITLE, get_heading, traverse
+
+# ESC/POS receipts for thermal lane printers. The receipt is rendered from
+# the bill model into the printer's own command language, so printing needs
+# no PDF: a receipt is a few hundred bytes written to the printer.
+#
+# The command sequences (initialize, code page, alignment, emphasis, cut) and
+# the receipt's fixed parts are compiled to bytes once per paper width; a
+# receipt is then those byte templates joined with the encoded item lines.
+#
+# Receipts go to a printer path: a directory is a spool (each receipt is
+# written as its own file and renamed into place, for a spooler to pick
+# up), anything else is a device node such as /dev/usb/lp0 (or a plain file)
+# that the receipt is appended to. RECEIPT_PRINTER_ENV overrides the default
+# spool directory, data/receipt_spool.
+RECEIPT_PRINTER_ENV = "RECEIPT_PRINTER"
+DEFAULT_SPOOL_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "receipt_spool")
+# Characters per line in font A: 48 on 80 mm paper, 32 on 58 mm paper
+DEFAULT_WIDTH = 48
+ENCODING = "cp437"
+FEED_LINES = 4
+
+ESC = b"\x1b"
+GS = b"\x1d"
+INITIALIZE = ESC + b"@"
+CODE_PAGE_437 = ESC + b"t\x00"
+ALIGN_LEFT = ESC + b"a\x00"
+ALIGN_CENTER = ESC + b"a\x01"
+BOLD_ON = ESC + b"E\x01"
+BOLD_OFF = ESC + b"E\x00"
+DOUBLE_SIZE = GS + b"!\x11"
+NORMAL_SIZE = GS + b"!\x00"
+# Feed the paper past the cutter, then cut partially
+CUT = ESC + b"d" + bytes([FEED_LINES]) + GS + b"V\x01"
+
+
+def encode(text):
+    """Encode text for the printer's code page (₹ is not in it)."""
+    return text.replace("₹", "Rs.").encode(ENCODING, errors="replace")
+
+
+class ReceiptLayout:
+    """Byte templates and line formats of a receipt for one paper width."""
+
+    def __init__(self, width):
+        self.width = width
+        self.rule = encode("-" * width) + b"\n"
+        self.double_rule = encode("=" * width) + b"\n"
+        # Double-size characters are twice as wide
+        title_size = DOUBLE_SIZE if len(TITLE) * 2 <= width else NORMAL_SIZE
+        self.start = (
+            INITIALIZE + CODE_PAGE_437
+            + ALIGN_CENTER + title_size + BOLD_ON + encode(TITLE) + b"\n"
+            + NORMAL_SIZE + BOLD_OFF + ALIGN_LEFT + self.double_rule
+        )
+        # Narrow paper puts the item name on a line of its own
+        self.two_line_items = width < 40
+        name_width = width if self.two_line_items else width - 24
+        self.name_format = f"{{:<{name_width}.{name_width}}}"
+        self.numbers_format = "{:>4}{:>9.2f}{:>11.2f}"
+        numbers_header = f"{'Qty':>4}{'Price':>9}{'Total':>11}"
+        if self.two_line_items:
+            item_header = "Item\n" + numbers_header.rjust(width)
+        else:
+            item_header = self.name_format.format("Item") + numbers_header
+        self.item_header = encode(item_header) + b"\n" + self.rule
+        self.total_format = f"{{:<{width - 14}}}{{:>14.2f}}"
+        self.end = (
+            ALIGN_CENTER + encode("Thank you for shopping with us!") + b"\n"
+            + ALIGN_LEFT + CUT
+        )
+
+    def item(self, name, quantity, price, total):
+        name = self.name_format.format(name)
+        numbers = self.numbers_format.format(quantity, price, total)
+        if self.two_line_items:
+            return encode(name.rstrip() + "\n" + numbers.rjust(self.width)) + b"\n"
+        return encode(name + numbers) + b"\n"
+
+
+@functools.lru_cache(maxsize=None)
+def get_layout(width=DEFAULT_WIDTH):
+    return ReceiptLayout(width)
+
+
+class ReceiptRenderer:
+    """Renders a bill_model.Bill as ESC/POS bytes (see bill_model.traverse)."""
+
+    def __init__(self, width=DEFAULT_WIDTH):
+        self.layout = get_layout(width)
+
+    def begin(self, bill):
+        layout = self.layout
+        self.parts = [
+            layout.start,
+            encode(f"Bill: {bill.bill_number}\nDate: {bill.display_date}\n"
+                   f"Customer: {bill.customer_name}\nPhone: {bill.phone_number}\n"),
+            layout.rule,
+            layout.item_header
+        ]
+
+    def category(self, category):
+        self.parts.append(BOLD_ON + encode(get_heading(category)) + BOLD_OFF + b"\n")
+
+    def line(self, item):
+        self.parts.append(self.layout.item(item.name, item.quantity, item.price, item.total))
+
+    def end(self, bill):
+        layout = self.layout
+        self.parts.extend([
+            layout.rule,
+            encode(layout.total_format.format("Subtotal:", bill.subtotal)) + b"\n",
+            encode(layout.total_format.format("Tax (18%):", bill.total_tax)) + b"\n",
+            BOLD_ON + encode(layout.total_format.format("Total:", bill.grand_total)) + BOLD_OFF + b"\n",
+            layout.double_rule,
+            layout.end
+        ])
+        return b"".join(self.parts)
+
+
+def render_receipt(bill, width=DEFAULT_WIDTH):
+    """Return the ESC/POS receipt of a bill_model.Bill."""
+    return traverse(bill, {"escpos": ReceiptRenderer(width)})["escpos"]
+
+
+def render_text_receipt(text):
+    """Return an ESC/POS receipt printing a text bill as it is."""
+    return INITIALIZE + CODE_PAGE_437 + encode(text.rstrip("\n")) + b"\n" + CUT
+
+
+def get_printer(printer=None, spool_dir=DEFAULT_SPOOL_DIR):
+    """Return the printer path: printer, else RECEIPT_PRINTER, else the spool directory (created if needed)."""
+    printer = printer or os.environ.get(RECEIPT_PRINTER_ENV) or spool_dir
+    if printer == spool_dir:
+        os.makedirs(printer, exist_ok=True)
+    return printer
+
+
+@tracing.traced("print_receipt", is_error=None)
+def send(data, printer=None, name="receipt"):
+    """
+    Write a receipt to a printer.
+
+    Args:
+        data (bytes): ESC/POS receipt
+        printer (str, optional): Spool directory, device node or file (see get_printer)
+        name (str): Receipt name, used for the spool file
+
+    Returns:
+        str: Path written
+    """
+    printer = get_printer(printer)
+    if os.path.isdir(printer):
+        path = os.path.join(printer, f"{name}-{time.time_ns()}.bin")
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        return path
+    # Unbuffered, so the receipt reaches the device in one write
+    with open(printer, "ab", buffering=0) as f:
+        f.write(data)
+    return printer
+
+
+def print_receipt(bill, printer=None, width=DEFAULT_WIDTH):
+    """
+    Print a bill_model.Bill on a thermal printer.
+
+    Returns:
+        str: Status message
+    """
+    try:
+        path = send(render_receipt(bill, width), printer, bill.bill_number)
+        return f"Receipt sent to {path}"
+    except Exception as e:
+        return f"Error printing receipt: {str(e)}"
+
+
+def print_text(text, printer=None, name="report"):
+    """
+    Print plain text (a report) as it is on a thermal printer.
+
+    Returns:
+        str: Status message
+    """
+    try:
+        return f"Sent to {send(render_text_receipt(text), printer, name)}"
+    except Exception as e:
+        return f"Error printing: {str(e)}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print a stored bill as an ESC/POS receipt")
+    parser.add_argument("bill_number", help="Bill number")
+    parser.add_argument("--printer", default=None,
+                        help=f"Spool directory or device, e.g. /dev/usb/lp0 (default: ${RECEIPT_PRINTER_ENV} or data/receipt_spool)")
+    parser.add_argument("--width", type=int, default=DEFAULT_WIDTH, help="Characters per line (48 for 80 mm, 32 for 58 mm paper)")
+    parser.add_argument("--bills-dir", default=None, help="Bills directory (default: saved_bills)")
+    args = parser.parse_args(argv)
+
+    entry = bill_store.find_bill(args.bill_number, args.bills_dir or bill_store.get_default_bills_directory())
+    if entry is None:
+        parser.error(f"Unknown bill: {args.bill_number}")
+    start = time.perf_counter()
+    data = render_receipt(Bill.from_manifest_entry(entry), args.width)
+    rendered = time.perf_counter() - start
+    path = send(data, args.printer, args.bill_number)
+    elapsed = time.perf_counter() - start
+    print(f"{len(data):,d} bytes sent to {path} in {elapsed * 1000:.2f} ms (rendering {rendered * 1000:.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+import os
+import json
+import time
+import random
+import argparse
+import itertools
+import threading
+import tracemalloc
+from datetime import datetime, timedelta
+import xlsxwriter
+from utils import bill_store
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: only the threads of one process are coordinated
+    fcntl = None
+
+# Columns of the bill ledger, same layout as vdx_excel_bills.xlsx
+LEDGER_HEADERS = ['Bill Number', 'Date', 'Customer Name', 'Phone Number', 'Subtotal', 'Tax', 'Total']
+# Constant-memory worksheets need the column widths before the first row is written
+LEDGER_COLUMN_WIDTHS = [22, 21, 25, 15, 12, 12, 12]
+
+# A workbook cannot be appended to, so exporting a bill does not touch the
+# ledger workbook: its row is appended as a JSON line to a pending file next
+# to it (vdx_excel_bills.pending.jsonl) with one O_APPEND write. Readers of the
+# ledger call materialize_ledger() first, which streams the workbook's rows
+# and the pending ones into a new workbook (a bill exported again replaces its
+# row, so redoing an export is harmless) and empties the pending file. Appends hold a shared flock on the pending file and
+# materializing an exclusive one, so no row is lost in between.
+PENDING_LEDGER_SUFFIX = ".pending.jsonl"
+
+_ledger_lock = threading.Lock()
+
+
+def stream_rows_to_excel(rows, excel_file, headers=None, column_widths=None, track_memory=False):
+    """
+    Write rows to an Excel file using an xlsxwriter workbook in constant-memory mode.
+
+    Rows are pulled from the iterable one at a time and flushed to disk as
+    soon as they are written, so memory use does not grow with the number of rows.
+
+    Args:
+        rows (iterable): Iterable of row lists/tuples
+        excel_file (str): Path of the Excel file to create
+        headers (list, optional): Header row written before the data
+        column_widths (list, optional): Width of each column
+        track_memory (bool): Measure peak Python memory with tracemalloc (slower)
+
+    Returns:
+        dict: Export statistics (rows, seconds, rows_per_second, peak_memory_mb)
+    """
+    if track_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+
+    os.makedirs(os.path.dirname(os.path.abspath(excel_file)), exist_ok=True)
+    workbook = xlsxwriter.Workbook(excel_file, {'constant_memory': True})
+    worksheet = workbook.add_worksheet("Sheet1")
+    if column_widths:
+        for i, width in enumerate(column_widths):
+            worksheet.set_column(i, i, width)
+
+    row_index = 0
+    if headers:
+        worksheet.write_row(row_index, 0, headers)
+        row_index += 1
+    row_count = 0
+    for row in rows:
+        worksheet.write_row(row_index, 0, row)
+        row_index += 1
+        row_count += 1
+    workbook.close()
+
+    seconds = time.perf_counter() - start
+    peak_memory_mb = None
+    if track_memory:
+        peak_memory_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+
+    return {
+        "rows": row_count,
+        "seconds": seconds,
+        "rows_per_second": row_count / seconds if seconds > 0 else 0.0,
+        "peak_memory_mb": peak_memory_mb
+    }
+
+
+def iter_ledger_rows(bills_directory=None, start_date=None, end_date=None):
+    """
+    Generate ledger rows from the partition manifests of the bill store.
+
+    Args:
+        bills_directory (str, optional): Root bills directory
+        start_date (date, optional): First date to include
+        end_date (date, optional): Last date to include
+
+    Yields:
+        list: Row in LEDGER_HEADERS order
+    """
+    for entry in bill_store.iter_bills(bills_directory, start_date, end_date):
+        try:
+            date_str = datetime.strptime(entry['date'], bill_store.MANIFEST_DATE_FORMAT).strftime("%d-%m-%Y %H:%M:%S")
+        except (KeyError, ValueError):
+            date_str = entry.get('date', '')
+        yield [
+            entry['bill_number'],
+            date_str,
+            entry.get('customer_name', ''),
+            entry.get('phone_number', ''),
+            entry.get('subtotal'),
+            entry.get('tax'),
+            entry.get('total')
+        ]
+
+
+def get_pending_ledger_file(ledger_file):
+    """Return the path of the ledger's pending rows file."""
+    return os.path.splitext(ledger_file)[0] + PENDING_LEDGER_SUFFIX
+
+
+def append_ledger_row(ledger_file, row):
+    """
+    Add a bill's row to the ledger without rewriting the workbook.
+
+    Args:
+        ledger_file (str): Path of the ledger workbook
+        row (list): Row in LEDGER_HEADERS order
+
+    Returns:
+        str: Path of the pending rows file written
+    """
+    pending_file = get_pending_ledger_file(ledger_file)
+    line = (json.dumps(row, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+    with _ledger_lock:
+        fd = os.open(pending_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_SH)
+            os.write(fd, line)
+        finally:
+            # Closing releases the lock
+            os.close(fd)
+    return pending_file
+
+
+def iter_workbook_rows(excel_file):
+    """Yield the rows of a ledger workbook after its header row."""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(excel_file, read_only=True)
+    try:
+        for row in workbook.active.iter_rows(min_row=2, max_col=len(LEDGER_HEADERS), values_only=True):
+            if any(value is not None for value in row):
+                yield list(row)
+    finally:
+        workbook.close()
+
+
+def materialize_ledger(ledger_file):
+    """
+    Write the pending rows into the ledger workbook, if there are any.
+
+    Args:
+        ledger_file (str): Path of the ledger workbook
+
+    Returns:
+        int: Number of pending rows written
+    """
+    pending_file = get_pending_ledger_file(ledger_file)
+    with _ledger_lock:
+        try:
+            fd = os.open(pending_file, os.O_RDWR)
+        except FileNotFoundError:
+            return 0
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            with open(pending_file, 'rb') as f:
+                lines = f.read().splitlines()
+            pending = {}
+            for line in lines:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    # Torn by a crash during the append
+                    continue
+                # The last export of a bill wins and goes to the end
+                pending.pop(str(row[0]), None)
+                pending[str(row[0])] = row
+            if not pending:
+                return 0
+
+            existing = iter_workbook_rows(ledger_file) if os.path.exists(ledger_file) else ()
+            rows = (row for row in existing if str(row[0]) not in pending)
+            root, extension = os.path.splitext(ledger_file)
+            temp_file = f"{root}.{os.getpid()}.tmp{extension}"
+            stream_rows_to_excel(
+                itertools.chain(rows, pending.values()),
+                temp_file,
+                headers=LEDGER_HEADERS,
+                column_widths=LEDGER_COLUMN_WIDTHS
+            )
+            os.replace(temp_file, ledger_file)
+            # A crash before this writes the same rows again next time
+            os.ftruncate(fd, 0)
+            return len(pending)
+        finally:
+            os.close(fd)
+
+
+def iter_synthetic_ledger_rows(count, seed=0):
+    """
+    Generate synthetic ledger rows, used to measure export throughput.
+
+    Args:
+        count (int): Number of bills to generate
+        seed (int): Random seed
+
+    Yields:
+        list: Row in LEDGER_HEADERS order
+    """
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1, 9, 0, 0)
+    for i in range(count):
+        bill_time = start + timedelta(seconds=i * 30)
+        subtotal = round(rng.uniform(20, 5000), 2)
+        tax = round(subtotal * 0.18, 2)
+        yield [
+            f"BILL-{bill_time.strftime('%Y%m%d')}-{i:07d}",
+            bill_time.strftime("%d-%m-%Y %H:%M:%S"),
+            f"Customer {rng.randint(1, 50000)}",
+            f"9{rng.randint(100000000, 999999999)}",
+            subtotal,
+            tax,
+            round(subtotal + tax, 2)
+        ]
+
+
+def export_ledger_to_excel(excel_file, bills_directory=None, start_date=None, end_date=None, track_memory=False):
+    """
+    Export the bill ledger (or a date range of it) to Excel at bounded memory.
+
+    Args:
+        excel_file (str): Path of the Excel file to create
+        bills_directory (str, optional): Root bills directory
+        start_date (date, optional): First date to include
+        end_date (date, optional): Last date to include
+        track_memory (bool): Measure peak Python memory
+
+    Returns:
+        dict: Export statistics as returned by stream_rows_to_excel
+    """
+    return stream_rows_to_excel(
+        iter_ledger_rows(bills_directory, start_date, end_date),
+        excel_file,
+        headers=LEDGER_HEADERS,
+        column_widths=LEDGER_COLUMN_WIDTHS,
+        track_memory=track_memory
+    )
+
+
+def format_export_stats(stats):
+    """Format export statistics as a one-line report."""
+    report = f"Exported {stats['rows']:,d} rows in {stats['seconds']:.2f}s ({stats['rows_per_second']:,.0f} rows/s)"
+    if stats.get('peak_memory_mb') is not None:
+        report += f", peak memory {stats['peak_memory_mb']:.1f} MB"
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream the bill ledger to an Excel file")
+    parser.add_argument("output", help="Excel file to create")
+    parser.add_argument("--bills-dir", default=None, help="Bills directory (default: saved_bills)")
+    parser.add_argument("--start", default=None, help="First date to export (YYYY-MM-DD)")
+    parser.add_argument("--end", default=None, help="Last date to export (YYYY-MM-DD)")
+    parser.add_argument("--synthetic", type=int, default=None,
+                        help="Export this many generated bills instead of the ledger, to measure throughput")
+    parser.add_argument("--track-memory", action="store_true", help="Report peak Python memory")
+    args = parser.parse_args(argv)
+
+    if args.synthetic is not None:
+        stats = stream_rows_to_excel(
+            iter_synthetic_ledger_rows(args.synthetic),
+            args.output,
+            headers=LEDGER_HEADERS,
+            column_widths=LEDGER_COLUMN_WIDTHS,
+            track_memory=args.track_memory
+        )
+    else:
+        start_date = datetime.strptime(args.start, "%Y-%m-%d").date() if args.start else None
+        end_date = datetime.strptime(args.end, "%Y-%m-%d").date() if args.end else None
+        stats = export_ledger_to_excel(args.output, args.bills_dir, start_date, end_date, track_memory=args.track_memory)
+    print(format_export_stats(stats))
+
+
+if __name__ == "__main__":
+    main()
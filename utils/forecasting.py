@@ -0,0 +1,413 @@
+import os
+import json
+import argparse
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+from utils import analytics_snapshot
+
+# Revenue and demand forecasts built from the analytics snapshot. All models
+# are online: each closed day (every day before today) is fed to them once,
+# and their state is saved in data/forecasts/forecast_state.json together
+# with the predictions, so the dashboard only reads that file. When a new day
+# closes, only that day's bills are aggregated and fed to the models; days
+# without bills are fed as days that sold nothing, so every model step is one
+# calendar day. If the already-fitted history changed (bills backdated or
+# removed), everything is refit from scratch.
+#
+# Models:
+#   - weekday baseline: mean revenue of each day of the week
+#   - hourly profile: share of revenue taken in each hour of the day
+#   - Holt-Winters: additive level, trend and day-of-week seasonality
+#   - per-SKU demand: exponentially smoothed daily quantity, scaled by the
+#     weekday profile of the store
+FORECAST_DIR = os.path.join(analytics_snapshot.PROJECT_DIR, "data", "forecasts")
+STATE_FILE = "forecast_state.json"
+STATE_VERSION = 1
+DATE_FORMAT = "%Y-%m-%d"
+DEFAULT_HORIZON = 14
+SKU_HORIZON = 7
+# Smoothing factors of the level, trend and seasonal components, and of the
+# per-SKU demand level
+ALPHA = 0.3
+BETA = 0.05
+GAMMA = 0.2
+SKU_ALPHA = 0.2
+# Days of history needed before Holt-Winters is initialized
+WARMUP_DAYS = 7
+
+
+def new_state():
+    """Return the state of models that have not seen any data."""
+    return {
+        "version": STATE_VERSION,
+        "first_day": None,
+        "last_day": None,
+        "days": 0,
+        "revenue_total": 0.0,
+        "weekday": {"sum": [0.0] * 7, "count": [0] * 7},
+        "hourly": [0.0] * 24,
+        "holt_winters": {"level": None, "trend": 0.0, "season": [0.0] * 7, "warmup": []},
+        "errors": {"holt_winters": {"abs": 0.0, "count": 0}, "weekday": {"abs": 0.0, "count": 0}},
+        "skus": {},
+        "sku_days": 0,
+        "updated": None,
+        "predictions": None
+    }
+
+
+def get_daily_revenue(bills_df):
+    """Return the revenue of every day with bills as a Series indexed by date."""
+    if bills_df is None or bills_df.empty:
+        return pd.Series(dtype=float)
+    dates = pd.to_datetime(bills_df['Date'])
+    return bills_df['Total'].astype(float).groupby(dates.dt.date).sum().sort_index()
+
+
+def get_hourly_revenue(bills_df):
+    """Return a 24-element array of revenue by hour of day."""
+    hours = pd.to_datetime(bills_df['Date']).dt.hour.to_numpy()
+    return np.bincount(hours, weights=bills_df['Total'].astype(float).to_numpy(), minlength=24)
+
+
+def get_daily_sku_quantities(bills_df, line_items_df):
+    """
+    Total quantity sold of each product per day.
+
+    Args:
+        bills_df (pd.DataFrame): Bills with Bill Number and Date
+        line_items_df (pd.DataFrame): Line items with Bill Number, Item and Quantity
+
+    Returns:
+        pd.DataFrame: One row per day (date index) and one column per product
+    """
+    if bills_df.empty or line_items_df.empty:
+        return pd.DataFrame()
+    bill_days = pd.DataFrame({
+        'Bill Number': bills_df['Bill Number'].astype(str),
+        'Day': pd.to_datetime(bills_df['Date']).dt.date
+    }).drop_duplicates('Bill Number')
+    items = pd.DataFrame({
+        'Bill Number': line_items_df['Bill Number'].astype(str),
+        'Item': line_items_df['Item'].astype(str),
+        'Quantity': pd.to_numeric(line_items_df['Quantity'], errors='coerce').fillna(0)
+    }).merge(bill_days, on='Bill Number', how='inner')
+    return items.pivot_table(index='Day', columns='Item', values='Quantity', aggfunc='sum', fill_value=0)
+
+
+def forecast_holt_winters(model, day, steps=1):
+    """Holt-Winters forecast for a day, steps days after the last update; None before warm-up."""
+    if model["level"] is None:
+        return None
+    return max(0.0, model["level"] + steps * model["trend"] + model["season"][day.weekday()])
+
+
+def forecast_weekday(state, day):
+    """Mean revenue of the day's weekday (or of all days if that weekday was never seen)."""
+    weekday = state["weekday"]
+    count = weekday["count"][day.weekday()]
+    if count:
+        return weekday["sum"][day.weekday()] / count
+    return state["revenue_total"] / state["days"] if state["days"] else None
+
+
+def get_weekday_index(state):
+    """Ratio of each weekday's mean revenue to the overall mean (1.0 when unknown)."""
+    overall = state["revenue_total"] / state["days"] if state["days"] else 0
+    index = []
+    for total, count in zip(state["weekday"]["sum"], state["weekday"]["count"]):
+        index.append(total / count / overall if count and overall else 1.0)
+    return index
+
+
+def update_revenue_models(state, day, revenue):
+    """Feed one closed day of revenue to the weekday baseline and Holt-Winters."""
+    # One-step-ahead errors, measured before the models see the day
+    for name, predicted in (("holt_winters", forecast_holt_winters(state["holt_winters"], day)),
+                            ("weekday", forecast_weekday(state, day))):
+        if predicted is not None:
+            state["errors"][name]["abs"] += abs(revenue - predicted)
+            state["errors"][name]["count"] += 1
+
+    weekday = day.weekday()
+    state["weekday"]["sum"][weekday] += revenue
+    state["weekday"]["count"][weekday] += 1
+
+    model = state["holt_winters"]
+    if model["level"] is None:
+        model["warmup"].append([day.strftime(DATE_FORMAT), revenue])
+        if len(model["warmup"]) >= WARMUP_DAYS:
+            values = [value for _, value in model["warmup"]]
+            model["level"] = float(np.mean(values))
+            model["trend"] = 0.0
+            model["season"] = [0.0] * 7
+            for warmup_day, value in model["warmup"]:
+                model["season"][datetime.strptime(warmup_day, DATE_FORMAT).weekday()] = value - model["level"]
+            model["warmup"] = []
+    else:
+        level = model["level"]
+        model["level"] = ALPHA * (revenue - model["season"][weekday]) + (1 - ALPHA) * (level + model["trend"])
+        model["trend"] = BETA * (model["level"] - level) + (1 - BETA) * model["trend"]
+        model["season"][weekday] = GAMMA * (revenue - model["level"]) + (1 - GAMMA) * model["season"][weekday]
+
+    if state["first_day"] is None:
+        state["first_day"] = day.strftime(DATE_FORMAT)
+    state["last_day"] = day.strftime(DATE_FORMAT)
+    state["days"] += 1
+    state["revenue_total"] += revenue
+
+
+def update_sku_models(state, quantities):
+    """
+    Feed one closed day of sales to the per-SKU demand levels.
+
+    Args:
+        state (dict): Forecast state
+        quantities (dict): Product name -> quantity sold that day (products
+            not listed sold nothing)
+    """
+    skus = state["skus"]
+    for name in set(skus) | set(quantities):
+        sold = float(quantities.get(name, 0))
+        model = skus.get(name)
+        if model is None:
+            # Products appearing later start from their first day's sales
+            skus[name] = {"level": sold, "sold": sold, "days": 1}
+        else:
+            model["level"] = SKU_ALPHA * sold + (1 - SKU_ALPHA) * model["level"]
+            model["sold"] += sold
+            model["days"] += 1
+    state["sku_days"] += 1
+
+
+def fit(state, bills_df, line_items_df, until):
+    """
+    Feed the closed days after state["last_day"] up to and including until.
+
+    Args:
+        state (dict): Forecast state (updated in place)
+        bills_df (pd.DataFrame): Bill frame of the analytics snapshot
+        line_items_df (pd.DataFrame): Line item frame of the analytics snapshot
+        until (date): Last closed day
+
+    Returns:
+        int: Number of days fed to the models
+    """
+    dates = pd.to_datetime(bills_df['Date'])
+    days = dates.dt.date
+    after = datetime.strptime(state["last_day"], DATE_FORMAT).date() if state["last_day"] else None
+    new_rows = (days <= until) if after is None else ((days > after) & (days <= until))
+    new_bills = bills_df[new_rows.to_numpy()]
+    if after is None:
+        if new_bills.empty:
+            return 0
+        after = days[new_rows].min() - timedelta(days=1)
+    if after >= until:
+        return 0
+
+    # Every calendar day is a step of the models: days without bills are fed
+    # as days that sold nothing
+    calendar = [after + timedelta(days=offset) for offset in range(1, (until - after).days + 1)]
+    daily_revenue = get_daily_revenue(new_bills).reindex(calendar, fill_value=0.0)
+    state["hourly"] = (np.asarray(state["hourly"]) + get_hourly_revenue(new_bills)).tolist()
+    new_bill_numbers = set(new_bills['Bill Number'].astype(str))
+    sku_quantities = get_daily_sku_quantities(
+        new_bills,
+        line_items_df[line_items_df['Bill Number'].astype(str).isin(new_bill_numbers).to_numpy()]
+    )
+
+    for day, revenue in daily_revenue.items():
+        update_revenue_models(state, day, float(revenue))
+        if day in sku_quantities.index:
+            row = sku_quantities.loc[day]
+            update_sku_models(state, {name: quantity for name, quantity in row.items() if quantity})
+        else:
+            update_sku_models(state, {})
+    return len(daily_revenue)
+
+
+def predict(state, start, horizon=DEFAULT_HORIZON, sku_horizon=SKU_HORIZON):
+    """
+    Build the predictions from the fitted models.
+
+    Args:
+        state (dict): Fitted forecast state
+        start (date): First day to predict (usually today)
+        horizon (int): Number of days of revenue to predict
+        sku_horizon (int): Number of days of product demand to sum
+
+    Returns:
+        dict: "daily" (per-day Holt-Winters and weekday baseline revenue),
+            "hourly" (expected revenue per hour of the first day), "skus"
+            (expected demand per product, highest first) and the one-step
+            mean absolute error of each model
+    """
+    last_day = datetime.strptime(state["last_day"], DATE_FORMAT).date() if state["last_day"] else None
+    daily = []
+    for offset in range(horizon):
+        day = start + timedelta(days=offset)
+        steps = (day - last_day).days if last_day else 1
+        daily.append({
+            "date": day.strftime(DATE_FORMAT),
+            "weekday": day.strftime("%A"),
+            "holt_winters": forecast_holt_winters(state["holt_winters"], day, steps),
+            "weekday_baseline": forecast_weekday(state, day)
+        })
+
+    first_day = daily[0]["holt_winters"] if daily and daily[0]["holt_winters"] is not None else (
+        daily[0]["weekday_baseline"] if daily else None)
+    hourly_total = sum(state["hourly"])
+    hourly = [
+        {
+            "hour": hour,
+            "share": revenue / hourly_total if hourly_total else 0.0,
+            "expected_revenue": first_day * revenue / hourly_total if hourly_total and first_day else 0.0
+        }
+        for hour, revenue in enumerate(state["hourly"])
+    ]
+
+    weekday_index = get_weekday_index(state)
+    demand_days = [start + timedelta(days=offset) for offset in range(sku_horizon)]
+    skus = []
+    for name, model in state["skus"].items():
+        expected = sum(model["level"] * weekday_index[day.weekday()] for day in demand_days)
+        skus.append({
+            "name": name,
+            "expected_demand": round(expected, 2),
+            "daily_level": round(model["level"], 3),
+            "average_daily": round(model["sold"] / model["days"], 3) if model["days"] else 0.0
+        })
+    skus.sort(key=lambda row: row["expected_demand"], reverse=True)
+
+    errors = {
+        name: error["abs"] / error["count"] if error["count"] else None
+        for name, error in state["errors"].items()
+    }
+    return {
+        "start": start.strftime(DATE_FORMAT),
+        "daily": daily,
+        "hourly": hourly,
+        "skus": skus,
+        "sku_horizon": sku_horizon,
+        "mean_absolute_error": errors
+    }
+
+
+def get_state_path(forecast_dir=None):
+    if forecast_dir is None:
+        forecast_dir = FORECAST_DIR
+    return os.path.join(forecast_dir, STATE_FILE)
+
+
+def load_forecasts(forecast_dir=None):
+    """
+    Load the saved forecast state and predictions.
+
+    Args:
+        forecast_dir (str, optional): Forecast directory (default: data/forecasts)
+
+    Returns:
+        dict: Forecast state with its "predictions", or None if there is none
+    """
+    try:
+        with open(get_state_path(forecast_dir), 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if state.get("version") == STATE_VERSION else None
+
+
+def save_forecasts(state, forecast_dir=None):
+    path = get_state_path(forecast_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", 'w') as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def is_forecast_stale(state, today=None):
+    """Check whether a day has closed since the forecasts were made."""
+    today = today or date.today()
+    return state is None or not state.get("predictions") or state["predictions"]["start"] != today.strftime(DATE_FORMAT)
+
+
+def history_changed(state, daily_revenue):
+    """Check whether the bills of already fitted days differ from what was fitted."""
+    if not state["last_day"]:
+        return False
+    last_day = datetime.strptime(state["last_day"], DATE_FORMAT).date()
+    fitted = daily_revenue[[day <= last_day for day in daily_revenue.index]]
+    # Days without bills were fitted too, so the fitted days are every day
+    # from the first one with bills
+    first_day = fitted.index.min().strftime(DATE_FORMAT) if len(fitted) else None
+    return first_day != state["first_day"] or not np.isclose(fitted.sum(), state["revenue_total"])
+
+
+def update_forecasts(forecast_dir=None, snapshot_dir=None, ledger_file=None, bills_directory=None,
+                     today=None, rebuild=False, frames=None):
+    """
+    Feed newly closed days to the models, predict from today and save.
+
+    Args:
+        forecast_dir (str, optional): Forecast directory
+        snapshot_dir, ledger_file, bills_directory (str, optional): Sources of
+            the analytics snapshot
+        today (date, optional): First day to predict (default: today)
+        rebuild (bool): Refit every model from the whole history
+        frames (tuple, optional): (bills_df, line_items_df) to use instead of the snapshot
+
+    Returns:
+        dict: Forecast state with its "predictions"
+    """
+    today = today or date.today()
+    if frames is None:
+        frames = analytics_snapshot.refresh_snapshot(snapshot_dir, ledger_file, bills_directory)
+    bills_df, line_items_df = frames if frames is not None else (pd.DataFrame(columns=['Bill Number', 'Date', 'Total']), pd.DataFrame())
+
+    state = None if rebuild else load_forecasts(forecast_dir)
+    if state is None or history_changed(state, get_daily_revenue(bills_df)):
+        state = new_state()
+    fit(state, bills_df, line_items_df, today - timedelta(days=1))
+    state["predictions"] = predict(state, today)
+    state["updated"] = datetime.now().isoformat(timespec="seconds")
+    save_forecasts(state, forecast_dir)
+    return state
+
+
+def get_forecasts(forecast_dir=None, today=None, **sources):
+    """Return the saved forecasts, updating them first if a day has closed since."""
+    state = load_forecasts(forecast_dir)
+    if is_forecast_stale(state, today):
+        state = update_forecasts(forecast_dir, today=today, **sources)
+    return state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Update the revenue and demand forecasts")
+    parser.add_argument("--rebuild", action="store_true", help="Refit every model from the whole history")
+    parser.add_argument("--forecast-dir", default=None, help="Forecast directory (default: data/forecasts)")
+    parser.add_argument("--snapshot-dir", default=None, help="Snapshot directory (default: data/snapshots)")
+    parser.add_argument("--ledger", default=None, help="Ledger workbook (default: vdx_excel_bills.xlsx)")
+    parser.add_argument("--bills-dir", default=None, help="Bills directory (default: saved_bills)")
+    parser.add_argument("--top", type=int, default=10, help="Number of products to show")
+    args = parser.parse_args(argv)
+
+    state = update_forecasts(args.forecast_dir, args.snapshot_dir, args.ledger, args.bills_dir, rebuild=args.rebuild)
+    predictions = state["predictions"]
+    print(f"Fitted {state['days']:,d} days ({state['first_day']} to {state['last_day']}), "
+          f"{len(state['skus']):,d} products")
+    for name, error in predictions["mean_absolute_error"].items():
+        if error is not None:
+            print(f"  {name} one-day-ahead MAE: {error:,.2f}")
+    print(f"{'Date':<12}{'Weekday':<11}{'Holt-Winters':>14}{'Weekday mean':>14}")
+    for row in predictions["daily"]:
+        hw = f"{row['holt_winters']:,.2f}" if row['holt_winters'] is not None else "-"
+        baseline = f"{row['weekday_baseline']:,.2f}" if row['weekday_baseline'] is not None else "-"
+        print(f"{row['date']:<12}{row['weekday']:<11}{hw:>14}{baseline:>14}")
+    print(f"Top products by expected demand over {predictions['sku_horizon']} days:")
+    for row in predictions["skus"][:args.top]:
+        print(f"  {row['name']:<40}{row['expected_demand']:>10,.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+import io
+import os
+import json
+import time
+import zipfile
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from utils import bill_store, catalog, excel_export
+from utils.bill_model import Bill
+from utils.price_history import format_time
+
+# Reconciliation of the bill stores: the partition manifests and the bill
+# artifacts (text, PDF and Excel files, loose or packed), the ledger
+# workbook (vdx_excel_bills.xlsx) and the inventory.
+#
+# Every day partition is checked on its own in a worker process: artifacts
+# are read and compared with the checksums recorded when they were written,
+# their format is checked, bill totals are recomputed from the line items
+# and the text bill's total is compared with the manifest. A worker sends
+# back its mismatches, the quantities sold per product and the totals of the
+# bills that were exported to the ledger; nothing else crosses processes.
+# The ledger is streamed row by row by one more worker while the partitions
+# are checked, and its rows are matched against the exported bills as the
+# partition results come in, so memory grows with the ledger's row count and
+# not with the size of the artifacts.
+#
+# Stock movements are replayed from the line items: a product sold on a bill
+# newer than its inventory entry lost a stock update, and, given an opening
+# inventory, the stock each product should have now is compared with the
+# inventory (restocks made since the opening inventory show up as drift).
+#
+# Mismatch kinds:
+#   missing_artifact      the manifest lists an artifact that is not there
+#   checksum_mismatch     an artifact changed after it was written
+#   unreadable_artifact   an artifact is damaged (bad PDF, workbook or segment)
+#   orphan_file           a file in a partition that no manifest entry lists
+#   total_mismatch        the recorded totals differ from the line items
+#   text_mismatch         the text bill's total differs from the manifest
+#   ledger_missing        an exported bill has no ledger row
+#   ledger_mismatch       a ledger row's totals differ from the bill
+#   ledger_orphan         a ledger row has no bill in the store
+#   ledger_duplicate      a bill has more than one ledger row
+#   unknown_product       a product was sold that is not in the inventory
+#   negative_stock        the inventory holds a negative quantity
+#   stale_stock           a product was sold after its stock was last updated
+#   stock_drift           the stock differs from the opening stock minus sales
+DEFAULT_EXAMPLES = 5
+LEDGER_COLUMNS = ("Bill Number", "Subtotal", "Tax", "Total")
+_KNOWN_FILES = {bill_store.MANIFEST_FILE, bill_store.SEGMENT_FILE,
+                bill_store.BILL_NUMBERS_FILE, bill_store.BILL_NUMBERS_LOCK_FILE}
+
+
+def to_cents(amount):
+    """Round an amount to whole paise, so totals compare exactly."""
+    return round(float(amount) * 100)
+
+
+def format_cents(cents):
+    return f"{cents / 100:.2f}"
+
+
+def _check_artifact(kind, content):
+    """Return the reason an artifact's content is damaged, or None."""
+    if kind == "pdf":
+        if not content.startswith(b"%PDF-") or b"%%EOF" not in content[-1024:]:
+            return "not a complete PDF"
+    elif kind in ("xlsx", "generator_xlsx"):
+        try:
+            with zipfile.ZipFile(io.BytesIO(content)) as workbook:
+                damaged = workbook.testzip()
+        except zipfile.BadZipFile:
+            return "not a workbook"
+        if damaged:
+            return f"damaged workbook part {damaged}"
+    return None
+
+
+def check_partition(partition_dir, since=None):
+    """
+    Check the bills of one day partition.
+
+    Args:
+        partition_dir (str): Partition directory
+        since (str, optional): Only count sales of bills from this time on
+            (MANIFEST_DATE_FORMAT), for the stock replay
+
+    Returns:
+        dict: Counts ("bills", "artifacts", "bytes"), "mismatches" as
+            (kind, subject, detail) tuples, "sold" (product -> quantity),
+            "last_sold" (product -> date of the newest bill selling it) and
+            "exported" (bill number -> (subtotal, tax, total) in paise)
+    """
+    result = {"bills": 0, "artifacts": 0, "bytes": 0, "mismatches": [], "sold": Counter(), "last_sold": {}, "exported": {}}
+    mismatches = result["mismatches"]
+    try:
+        manifest = bill_store.load_manifest(partition_dir)
+    except (OSError, ValueError) as e:
+        mismatches.append(("unreadable_artifact", os.path.join(partition_dir, bill_store.MANIFEST_FILE), str(e)))
+        return result
+
+    listed = set()
+    for bill_number, entry in manifest["bills"].items():
+        entry = dict(entry, partition=partition_dir)
+        result["bills"] += 1
+        listed.update(os.path.normpath(relative_path) for relative_path in entry.get("files", {}).values())
+        checksums = entry.get(bill_store.CHECKSUMS_KEY, {})
+
+        text = None
+        for kind in set(entry.get("files", {})) | set(entry.get("packed", {})):
+            try:
+                content = bill_store.read_artifact(entry, kind)
+            except Exception as e:
+                mismatches.append(("unreadable_artifact", f"{bill_number} {kind}", str(e)))
+                continue
+            if content is None:
+                mismatches.append(("missing_artifact", f"{bill_number} {kind}", entry.get("files", {}).get(kind, "")))
+                continue
+            result["artifacts"] += 1
+            result["bytes"] += len(content)
+            if kind in checksums:
+                checksum = bill_store.get_checksum(content)
+                if checksum != checksums[kind]:
+                    mismatches.append(("checksum_mismatch", f"{bill_number} {kind}", f"recorded {checksums[kind]}, found {checksum}"))
+                    continue
+            else:
+                # Artifacts recorded before checksums were kept can only be
+                # checked for damage
+                damage = _check_artifact(kind, content)
+                if damage:
+                    mismatches.append(("unreadable_artifact", f"{bill_number} {kind}", damage))
+                    continue
+            if kind == "txt":
+                text = content.decode("utf-8", errors="replace")
+
+        if "items" not in entry:
+            continue
+        try:
+            bill = Bill.from_manifest_entry(entry)
+        except (KeyError, TypeError, ValueError) as e:
+            mismatches.append(("total_mismatch", bill_number, f"line items cannot be priced: {e}"))
+            continue
+        recorded = tuple(to_cents(entry.get(key, 0)) for key in ("subtotal", "tax", "total"))
+        computed = (to_cents(bill.subtotal), to_cents(bill.total_tax), to_cents(bill.grand_total))
+        if recorded != computed:
+            mismatches.append(("total_mismatch", bill_number,
+                               f"recorded total {format_cents(recorded[2])}, line items give {format_cents(computed[2])}"))
+        if text is not None:
+            text_total = bill_store.parse_bill_text(text).get("total")
+            if text_total is None or to_cents(text_total) != recorded[2]:
+                mismatches.append(("text_mismatch", bill_number,
+                                   f"text total {text_total}, manifest total {format_cents(recorded[2])}"))
+        if bill_store.has_artifact(entry, "xlsx"):
+            result["exported"][bill_number] = computed
+
+        if entry.get("voided"):
+            # Its items went back into stock
+            continue
+        if since is None or entry["date"] >= since:
+            for item in bill.items:
+                result["sold"][item.name] += item.quantity
+        for item in bill.items:
+            if entry["date"] > result["last_sold"].get(item.name, ""):
+                result["last_sold"][item.name] = entry["date"]
+
+    for directory in (partition_dir, os.path.join(partition_dir, bill_store.EXCEL_SUBDIR)):
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            continue
+        for name in names:
+            path = os.path.join(directory, name)
+            relative_path = os.path.normpath(os.path.relpath(path, partition_dir))
+            if name in _KNOWN_FILES or relative_path in listed or os.path.isdir(path):
+                continue
+            mismatches.append(("orphan_file", path, "not in the manifest"))
+    return result
+
+
+def read_ledger(ledger_file):
+    """
+    Stream the ledger workbook.
+
+    Returns:
+        dict: "rows" (bill number -> (subtotal, tax, total) in paise), the
+            number of rows read ("count") and "mismatches" (duplicate and
+            unreadable rows)
+    """
+    # Imported here so partition workers do not load openpyxl
+    import openpyxl
+
+    result = {"rows": {}, "count": 0, "mismatches": []}
+    if not os.path.exists(ledger_file):
+        return result
+    try:
+        workbook = openpyxl.load_workbook(ledger_file, read_only=True)
+    except Exception as e:
+        result["mismatches"].append(("unreadable_artifact", ledger_file, str(e)))
+        return result
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, ())
+        try:
+            columns = [header.index(column) for column in LEDGER_COLUMNS]
+        except ValueError:
+            result["mismatches"].append(("unreadable_artifact", ledger_file, f"expected columns {', '.join(LEDGER_COLUMNS)}"))
+            return result
+        for row_number, row in enumerate(rows, start=2):
+            bill_number, subtotal, tax, total = (row[i] if i < len(row) else None for i in columns)
+            if bill_number is None:
+                continue
+            bill_number = str(bill_number)
+            result["count"] += 1
+            try:
+                totals = (to_cents(subtotal), to_cents(tax), to_cents(total))
+            except (TypeError, ValueError):
+                result["mismatches"].append(("ledger_mismatch", bill_number, f"row {row_number} has no totals"))
+                continue
+            if bill_number in result["rows"]:
+                result["mismatches"].append(("ledger_duplicate", bill_number, f"row {row_number}"))
+            result["rows"][bill_number] = totals
+    finally:
+        workbook.close()
+    return result
+
+
+class Report:
+    """Mismatch counts with the first few examples of each kind."""
+
+    def __init__(self, examples=DEFAULT_EXAMPLES, output=None):
+        self.examples = examples
+        self.output = output
+        self.counts = Counter()
+        self.samples = {}
+        self.stats = Counter()
+
+    def add(self, kind, subject, detail=""):
+        self.counts[kind] += 1
+        samples = self.samples.setdefault(kind, [])
+        if len(samples) < self.examples:
+            samples.append((subject, detail))
+        if self.output:
+            self.output.write(json.dumps({"kind": kind, "subject": subject, "detail": detail}) + "\n")
+
+    @property
+    def mismatches(self):
+        return sum(self.counts.values())
+
+    def format(self):
+        stats = self.stats
+        lines = [
+            f"Checked {stats['bills']:,d} bills in {stats['partitions']:,d} days, "
+            f"{stats['artifacts']:,d} artifacts ({stats['bytes'] / 1e6:,.1f} MB), "
+            f"{stats['ledger_rows']:,d} ledger rows and {stats['products']:,d} products "
+            f"in {stats['seconds']:.2f} s with {stats['workers']} workers"
+        ]
+        if not self.counts:
+            lines.append("No mismatches")
+            return "\n".join(lines)
+        lines.append(f"{self.mismatches:,d} mismatches:")
+        for kind, count in sorted(self.counts.items()):
+            lines.append(f"  {kind:<22}{count:>10,d}")
+            for subject, detail in self.samples[kind]:
+                lines.append(f"      {subject}: {detail}" if detail else f"      {subject}")
+            if count > len(self.samples[kind]):
+                lines.append(f"      ... and {count - len(self.samples[kind]):,d} more")
+        return "\n".join(lines)
+
+
+def replay_stock(report, inventory, sold, last_sold, opening=None):
+    """
+    Check the inventory against the stock movements of the bills.
+
+    Args:
+        report (Report): Report the mismatches are added to
+        inventory (dict): Inventory as returned by catalog.load_inventory_data
+        sold (dict): Product -> quantity sold (since the opening inventory, if given)
+        last_sold (dict): Product -> date of the newest bill selling it
+        opening (dict, optional): Inventory the sales are replayed from
+    """
+    for name in sorted(set(sold) | set(last_sold)):
+        if name not in inventory:
+            report.add("unknown_product", name, f"{sold.get(name, 0):,d} sold")
+    for name, stock in sorted(inventory.items()):
+        quantity = stock.get("quantity", 0)
+        if quantity < 0:
+            report.add("negative_stock", name, str(quantity))
+        if name in last_sold and last_sold[name] > stock.get("last_updated", ""):
+            report.add("stale_stock", name, f"sold on {last_sold[name]}, stock last updated {stock.get('last_updated')}")
+        if opening is not None and name in opening:
+            # Stock never goes below zero, so the sales can be taken out at once
+            expected = max(0, opening[name].get("quantity", 0) - sold.get(name, 0))
+            if expected != quantity:
+                report.add("stock_drift", name, f"expected {expected:,d}, found {quantity:,d}")
+
+
+def check(bills_directory=None, ledger_file=None, data_dir=None, opening_stock=None, since=None,
+          workers=None, examples=DEFAULT_EXAMPLES, output=None):
+    """
+    Reconcile the bill store, the ledger and the inventory.
+
+    Args:
+        bills_directory (str, optional): Root bills directory
+        ledger_file (str, optional): Ledger workbook (default: vdx_excel_bills.xlsx)
+        data_dir (str, optional): Catalog directory holding inventory.json
+        opening_stock (str, optional): Inventory file to replay the sales from
+        since (str, optional): Time of the opening inventory, e.g.
+            "2025-01-01 08:00" (default: its newest last_updated); only sales
+            from then on are replayed
+        workers (int, optional): Worker processes (default: one per CPU)
+        examples (int): Mismatches listed per kind in the report
+        output (file, optional): Text file every mismatch is written to as a JSON line
+
+    Returns:
+        Report: The counts and examples of the mismatches found
+    """
+    # Imported here because bill_operations loads the email and rendering modules
+    from utils.bill_operations import LEDGER_FILE
+
+    bills_directory = bills_directory or bill_store.get_default_bills_directory()
+    ledger_file = ledger_file or LEDGER_FILE
+    # Bills exported since the workbook was last read are still pending
+    excel_export.materialize_ledger(ledger_file)
+    workers = workers or os.cpu_count() or 1
+    report = Report(examples, output)
+    start = time.perf_counter()
+
+    opening = None
+    if opening_stock:
+        with open(opening_stock, 'r') as f:
+            opening = json.load(f)
+        if since is None:
+            since = max((stock.get("last_updated", "") for stock in opening.values()), default=None)
+    if since is not None:
+        since = format_time(since)
+
+    partitions = [partition_dir for partition_date, partition_dir in bill_store.list_partitions(bills_directory)]
+    if bill_store.has_unmigrated_files(bills_directory):
+        report.add("orphan_file", bills_directory, "flat bill files not in any partition (run python -m utils.bill_store migrate)")
+
+    sold = Counter()
+    last_sold = {}
+    ledger_pending = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        ledger_future = executor.submit(read_ledger, ledger_file)
+        # Small chunks keep the workers busy when partition sizes differ
+        chunksize = max(1, min(16, len(partitions) // (workers * 4)))
+        results = executor.map(check_partition, partitions, [since] * len(partitions), chunksize=chunksize)
+
+        ledger = None
+        for result in results:
+            report.stats.update(bills=result["bills"], artifacts=result["artifacts"], bytes=result["bytes"], partitions=1)
+            for mismatch in result["mismatches"]:
+                report.add(*mismatch)
+            sold.update(result["sold"])
+            for name, sold_on in result["last_sold"].items():
+                if sold_on > last_sold.get(name, ""):
+                    last_sold[name] = sold_on
+            if ledger is None and ledger_future.done():
+                ledger = ledger_future.result()
+                _match_ledger(report, ledger["rows"], ledger_pending)
+                ledger_pending = None
+            if ledger is None:
+                ledger_pending.update(result["exported"])
+            else:
+                _match_ledger(report, ledger["rows"], result["exported"])
+        if ledger is None:
+            ledger = ledger_future.result()
+            _match_ledger(report, ledger["rows"], ledger_pending)
+
+    report.stats["ledger_rows"] = ledger["count"]
+    for mismatch in ledger["mismatches"]:
+        report.add(*mismatch)
+    # The rows left are the ones no exported bill matched
+    for bill_number in sorted(ledger["rows"]):
+        report.add("ledger_orphan", bill_number, "no exported bill in the store")
+
+    inventory = catalog.load_inventory_data(data_dir)
+    report.stats["products"] = len(inventory)
+    replay_stock(report, inventory, sold, last_sold, opening)
+
+    report.stats["seconds"] = time.perf_counter() - start
+    report.stats["workers"] = workers
+    return report
+
+
+def _match_ledger(report, rows, exported):
+    """Match exported bills with their ledger rows, taking the matched rows out of rows."""
+    for bill_number, totals in exported.items():
+        row = rows.pop(bill_number, None)
+        if row is None:
+            report.add("ledger_missing", bill_number, "exported but not in the ledger")
+        elif row != totals:
+            report.add("ledger_mismatch", bill_number,
+                       f"ledger total {format_cents(row[2])}, bill total {format_cents(totals[2])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that the bills, the ledger and the inventory agree")
+    parser.add_argument("--bills-dir", default=None, help="Bills directory (default: saved_bills)")
+    parser.add_argument("--ledger", default=None, help="Ledger workbook (default: vdx_excel_bills.xlsx)")
+    parser.add_argument("--data-dir", default=None, help="Catalog directory (default: data)")
+    parser.add_argument("--opening-stock", default=None,
+                        help="Copy of inventory.json to replay the sales from, to check every product's stock")
+    parser.add_argument("--since", default=None,
+                        help="Time of the opening stock, e.g. '2025-01-01 00:00:00' (default: its newest last_updated)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--examples", type=int, default=DEFAULT_EXAMPLES, help="Mismatches listed per kind")
+    parser.add_argument("--output", default=None, help="Write every mismatch to this file as JSON lines")
+    args = parser.parse_args(argv)
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else None
+    try:
+        report = check(args.bills_dir, args.ledger, args.data_dir, args.opening_stock, args.since,
+                       args.workers, args.examples, output)
+    finally:
+        if output:
+            output.close()
+    print(report.format())
+    if report.mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
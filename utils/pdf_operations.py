@@ -1,71 +1,55 @@
+import io
 import os
 from datetime import datetime
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from PyPDF2 import PdfReader
+from utils import bill_store, tracing
+from utils.bill_model import Bill, render
 
+@tracing.traced("save_pdf")
 def save_bill_to_pdf(bill_content, bill_number, bills_directory=None, customer_name=None, phone_number=None, 
-                    cosmetic_items=None, grocery_items=None, drink_items=None, totals=None, prices=None):
-    """Save bill content to a PDF file."""
+                    cosmetic_items=None, grocery_items=None, drink_items=None, totals=None, prices=None,
+                    bill=None, rendered=None):
+    """
+    Save a bill to a PDF file.
+
+    The PDF is rendered from the bill (a bill_model.Bill), or from the
+    customer details, items and prices if they are given; rendered is the
+    PDF if it was already rendered. With only the text content, the text is
+    laid out as it is.
+    """
     # Always use the provided directory, or default to project 'saved_bills'
     if not bills_directory:
         bills_directory = os.path.join(os.getcwd(), "saved_bills")
-    os.makedirs(bills_directory, exist_ok=True)
     
-    # Create the PDF file path
-    pdf_path = os.path.join(bills_directory, f"{bill_number}.pdf")
+    # Create the PDF file path in the bill's date partition
+    pdf_path = bill_store.get_artifact_path(bills_directory, bill_number, ".pdf")
     
     try:
-        # Create a PDF document
-        doc = SimpleDocTemplate(
-            pdf_path,
-            pagesize=letter,
-            rightMargin=72,
-            leftMargin=72,
-            topMargin=72,
-            bottomMargin=72
-        )
-        
-        # Create the content for the PDF
-        styles = getSampleStyleSheet()
-        flowables = []
-        
-        # Add bill content to PDF
-        for line in bill_content.split('\n'):
-            if line.startswith('='):
-                # Section separator
-                flowables.append(Paragraph('<hr/>', styles['Normal']))
-            elif line.startswith('-'):
-                # Line separator
-                flowables.append(Paragraph('<hr/>', styles['Normal']))
-            elif 'GROCERY BILLING SYSTEM' in line:
-                # Title
-                flowables.append(Paragraph(line, styles['Title']))
-            elif line.startswith('Bill Number:') or line.startswith('Date:') or line.startswith('Customer Name:') or line.startswith('Phone Number:'):
-                # Header information
-                flowables.append(Paragraph(f'<b>{line}</b>', styles['Normal']))
-            elif line.startswith('COSMETICS:') or line.startswith('GROCERY:') or line.startswith('DRINKS:'):
-                # Section headers
-                flowables.append(Paragraph(f'<b>{line}</b>', styles['Heading2']))
-            elif line.startswith('Subtotal:') or line.startswith('Tax') or line.startswith('Total:'):
-                # Totals
-                flowables.append(Paragraph(f'<b>{line}</b>', styles['Normal']))
-            elif line.strip():
-                # Regular content
-                flowables.append(Paragraph(line, styles['Normal']))
-        
-        # Build the PDF
-        doc.build(flowables)
+        if rendered is None:
+            if bill is None and prices is not None and any(items for items in (cosmetic_items, grocery_items, drink_items)):
+                bill = Bill.from_items(bill_number, None, customer_name, phone_number,
+                                       cosmetic_items or {}, grocery_items or {}, drink_items or {}, prices)
+            rendered = render(bill, ["pdf"])["pdf"] if bill is not None else _render_text_pdf(bill_content)
+        with open(pdf_path + ".tmp", "wb") as f:
+            f.write(rendered)
+        os.replace(pdf_path + ".tmp", pdf_path)
+        bill_store.record_artifact(bills_directory, bill_number, "pdf", pdf_path)
         
         return f"Bill saved as PDF: {pdf_path}"
     except Exception as e:
-        # Add this missing except block
         return f"Error creating PDF: {str(e)}"
 
+def _render_text_pdf(bill_content):
+    """Lay a text bill out in a PDF as it is, in a fixed-width font."""
+    # reportlab is imported on first use so importing this module stays cheap
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Preformatted
+
+    output = io.BytesIO()
+    doc = SimpleDocTemplate(output, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
+    doc.build([Preformatted(bill_content, getSampleStyleSheet()['Code'])])
+    return output.getvalue()
+
 def extract_pdf_text(pdf_path):
     """
     Extract text content from a PDF file.
@@ -80,6 +64,8 @@ def extract_pdf_text(pdf_path):
         if not os.path.exists(pdf_path):
             return "PDF file not found."
         
+        from PyPDF2 import PdfReader
+
         pdf_text = ""
         pdf = PdfReader(pdf_path)
         
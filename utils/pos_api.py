@@ -0,0 +1,410 @@
+import re
+import json
+import asyncio
+import argparse
+import functools
+from http import HTTPStatus
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qs, unquote
+from utils import bill_store, catalog, escpos, till, tracing
+from utils.bill_model import Bill, render as render_bill
+from utils.billing_service import BillingService, BillingError, RENDER_KINDS, set_item
+
+# JSON over HTTP/1.1 for POS lanes. The server is a single asyncio loop that
+# parses requests itself (keep-alive, Content-Length bodies) and runs the
+# billing calls, which do file I/O, in the default thread pool. It uses the
+# same catalog files and bill store as the Streamlit app.
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8600
+MAX_BODY_SIZE = 1024 * 1024
+ARTIFACT_CONTENT_TYPES = {
+    "txt": "text/plain; charset=utf-8",
+    "pdf": "application/pdf",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "html": "text/html; charset=utf-8",
+    "json": "application/json"
+}
+# Formats rendered from the bill's manifest entry instead of read from a file
+RENDERED_KINDS = ("html", "json")
+
+
+class HTTPError(Exception):
+    """Error returned to the client as a JSON {"error": message} response."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class POSApi:
+    """
+    Routes HTTP requests to a BillingService.
+
+    Endpoints:
+        GET  /health                      Liveness check
+        GET  /metrics                     Stage latencies (Prometheus text format)
+        GET  /catalog?q=&category=        Product lookup with price and stock
+        GET  /stock                       Stock of every product
+        GET  /stock/<product>             Stock of one product
+        GET  /replenishment?all=1         Reorder suggestions (lead_time, review_days)
+        GET  /customers?q=                Customers whose phone or name matches
+        GET  /customers/<phone>           Customer profile and bills
+        POST /carts/price                 Totals of a cart without billing it
+        POST /bills                       Commit a bill (and render artifacts)
+        GET  /bills/<bill_number>         Bill metadata and text
+        GET  /bills/<bill_number>/<kind>  Bill artifact (txt, pdf or xlsx), or the
+                                          bill rendered as html or json
+        POST /bills/<bill_number>/print   Print the ESC/POS receipt ({"width"} optional)
+        POST /bills/<bill_number>/void    Void a bill ({"reason", "lane"} optional)
+        GET  /till/<lane>                 X-report: the lane's open shift counters
+        POST /till/<lane>/close           Z-report: close the lane's shift
+        POST /days/<YYYY-MM-DD>/close     Freeze the day's summary ({"close_open_shifts"} optional)
+        GET  /days?start=&end=            Summaries of closed days
+
+    Carts are posted as {"customer_name", "phone_number", "items": [{"category",
+    "name", "quantity"}], "bill_number" (optional), "render" (optional list),
+    "lane" (optional, default: the server's BILLING_LANE)}.
+    """
+
+    def __init__(self, service=None):
+        self.service = service or BillingService()
+        self.routes = [
+            ("GET", r"/health", self.health),
+            ("GET", r"/metrics", self.metrics),
+            ("GET", r"/catalog", self.get_catalog),
+            ("GET", r"/stock", self.get_stock),
+            ("GET", r"/stock/(?P<name>[^/]+)", self.get_product_stock),
+            ("GET", r"/replenishment", self.get_replenishment),
+            ("GET", r"/customers", self.search_customers),
+            ("GET", r"/customers/(?P<phone_number>[^/]+)", self.get_customer),
+            ("POST", r"/carts/price", self.price_cart),
+            ("POST", r"/bills", self.create_bill),
+            ("POST", r"/bills/(?P<bill_number>[^/]+)/print", self.print_bill),
+            ("POST", r"/bills/(?P<bill_number>[^/]+)/void", self.void_bill),
+            ("GET", r"/bills/(?P<bill_number>[^/]+)", self.get_bill),
+            ("GET", r"/bills/(?P<bill_number>[^/]+)/(?P<kind>txt|pdf|xlsx|html|json)", self.get_bill_artifact),
+            ("GET", r"/till/(?P<lane>[^/]+)", self.get_till),
+            ("POST", r"/till/(?P<lane>[^/]+)/close", self.close_shift),
+            ("GET", r"/days", self.get_days),
+            ("POST", r"/days/(?P<day>\d{4}-\d{2}-\d{2})/close", self.close_day),
+        ]
+        self.routes = [(method, re.compile(pattern), handler) for method, pattern, handler in self.routes]
+
+    # Handlers take the query dict, the decoded JSON body and the path
+    # parameters, and return (status, payload). A bytes payload is returned as
+    # is with the content type given as a third element.
+
+    def health(self, query, body):
+        return HTTPStatus.OK, {"status": "ok"}
+
+    def metrics(self, query, body):
+        return HTTPStatus.OK, tracing.export_prometheus().encode("utf-8"), "text/plain; version=0.0.4"
+
+    def get_catalog(self, query, body):
+        service = self.service
+        products = catalog.search_products(
+            service.products,
+            service.inventory,
+            service.prices,
+            query=query.get("q"),
+            category=query.get("category")
+        )
+        return HTTPStatus.OK, {"products": products}
+
+    def get_stock(self, query, body):
+        return HTTPStatus.OK, {"stock": {name: entry["quantity"] for name, entry in self.service.inventory.items()}}
+
+    def get_product_stock(self, query, body, name):
+        entry = self.service.inventory.get(name)
+        if entry is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown product: {name}")
+        return HTTPStatus.OK, {"name": name, **entry}
+
+    def get_replenishment(self, query, body):
+        try:
+            params = {
+                name: float(query[key])
+                for name, key in (("lead_time_days", "lead_time"), ("review_days", "review_days"))
+                if key in query
+            }
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "lead_time and review_days must be numbers")
+        recommendations = self.service.reorder_recommendations(**params)
+        if query.get("all") not in ("1", "true"):
+            recommendations = recommendations[recommendations["Suggested Order"] > 0]
+        records = recommendations.to_dict(orient="records")
+        for record in records:
+            # Products without sales have infinite cover, which JSON cannot hold
+            if record["Days of Cover"] == float("inf"):
+                record["Days of Cover"] = None
+        return HTTPStatus.OK, {"products": records}
+
+    def search_customers(self, query, body):
+        customers = self.service.customers
+        customers.refresh()
+        try:
+            limit = int(query.get("limit", 20))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "limit must be an integer")
+        profiles = customers.search(query.get("q", ""), limit)
+        return HTTPStatus.OK, {"customers": [{key: value for key, value in profile.items() if key != "bills"}
+                                             for profile in profiles]}
+
+    def get_customer(self, query, body, phone_number):
+        history = self.service.customer_history(phone_number)
+        if history is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown customer: {phone_number}")
+        profile, entries = history
+        bills = [
+            {key: value for key, value in entry.items() if key not in ("partition", "packed", "files", "items")}
+            for entry in entries
+        ]
+        return HTTPStatus.OK, {**{key: value for key, value in profile.items() if key != "bills"}, "bills": bills}
+
+    def cart_from_json(self, body):
+        """Build a cart from a JSON request body."""
+        if not isinstance(body, dict):
+            raise BillingError("Expected a JSON object")
+        cart = self.service.create_cart(
+            body.get("customer_name", ""),
+            body.get("phone_number", ""),
+            body.get("bill_number"),
+            idempotency_key=body.get("idempotency_key"),
+            lane=body.get("lane")
+        )
+        items = body.get("items", [])
+        if not isinstance(items, list):
+            raise BillingError("Expected a list of items")
+        for item in items:
+            try:
+                category, name, quantity = item["category"], item["name"], item["quantity"]
+            except (KeyError, TypeError):
+                raise BillingError("Each item needs a category, a name and an integer quantity")
+            if not isinstance(category, str) or not isinstance(name, str):
+                raise BillingError("Each item needs a category, a name and an integer quantity")
+            # Digit strings are taken as integers, but 2.7 or true is not a quantity
+            if isinstance(quantity, str) and quantity.isascii() and quantity.isdigit():
+                quantity = int(quantity)
+            # set_item takes 0 as "remove", which a posted cart never means
+            if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+                raise BillingError(f"Quantity of {name} must be a positive integer")
+            set_item(cart, category, name, quantity)
+        return cart
+
+    def price_cart(self, query, body):
+        cart = self.cart_from_json(body)
+        return HTTPStatus.OK, {"bill_number": cart["bill_number"], "totals": self.service.price(cart)}
+
+    def create_bill(self, query, body):
+        cart = self.cart_from_json(body)
+        render = body.get("render", [])
+        if not isinstance(render, list) or not all(isinstance(kind, str) for kind in render):
+            raise BillingError("Expected render to be a list of artifact kinds")
+        unknown = [kind for kind in render if kind not in RENDER_KINDS]
+        if unknown:
+            raise BillingError(f"Unknown artifact kind: {', '.join(unknown)}")
+        bill = self.service.commit(cart)
+        # A retry with the same idempotency key gets the same bill back
+        if not self.service.render_once(bill, render):
+            return HTTPStatus.OK, bill
+        return HTTPStatus.CREATED, bill
+
+    def _find_bill(self, bill_number):
+        entry = bill_store.find_bill(bill_number, self.service.bills_directory)
+        if entry is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown bill: {bill_number}")
+        return entry
+
+    def get_bill(self, query, body, bill_number):
+        entry = self._find_bill(bill_number)
+        content = bill_store.read_artifact(entry, "txt")
+        bill = {key: value for key, value in entry.items() if key not in ("partition", "packed", "files")}
+        bill["artifacts"] = sorted(entry.get("files", {}))
+        bill["content"] = content.decode("utf-8") if content is not None else None
+        return HTTPStatus.OK, bill
+
+    def get_bill_artifact(self, query, body, bill_number, kind):
+        entry = self._find_bill(bill_number)
+        if kind in RENDERED_KINDS:
+            content = render_bill(Bill.from_manifest_entry(entry), [kind])[kind].encode("utf-8")
+            return HTTPStatus.OK, content, ARTIFACT_CONTENT_TYPES[kind]
+        content = bill_store.read_artifact(entry, kind)
+        if content is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Bill {bill_number} has no {kind} artifact")
+        return HTTPStatus.OK, content, ARTIFACT_CONTENT_TYPES[kind]
+
+    def print_bill(self, query, body, bill_number):
+        entry = self._find_bill(bill_number)
+        try:
+            width = int(body.get("width", escpos.DEFAULT_WIDTH))
+        except (AttributeError, TypeError, ValueError):
+            raise BillingError("width must be an integer")
+        # Always the server's printer (RECEIPT_PRINTER or its spool): clients do not choose paths
+        result = escpos.print_receipt(Bill.from_manifest_entry(entry), self.service.get_printer(), width)
+        if result.startswith("Error"):
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, result)
+        return HTTPStatus.OK, {"bill_number": bill_number, "result": result}
+
+    def void_bill(self, query, body, bill_number):
+        entry = self.service.void(bill_number, body.get("reason", ""), body.get("lane"))
+        return HTTPStatus.OK, {"bill_number": bill_number, "voided": entry["voided"]}
+
+    def _get_till(self, lane):
+        try:
+            return self.service.get_till(lane)
+        except till.TillError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+
+    def get_till(self, query, body, lane):
+        return HTTPStatus.OK, self._get_till(lane).x_report()
+
+    def close_shift(self, query, body, lane):
+        return HTTPStatus.OK, self._get_till(lane).close_shift()
+
+    def _parse_day(self, value):
+        try:
+            return datetime.strptime(value, till.DAY_FORMAT).date() if value else None
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Expected a YYYY-MM-DD date, got {value!r}")
+
+    def close_day(self, query, body, day):
+        summary = till.close_day(self._parse_day(day), self.service.till_dir, bool(body.get("close_open_shifts")))
+        return HTTPStatus.OK, summary
+
+    def get_days(self, query, body):
+        days = till.iter_days(self._parse_day(query.get("start")), self._parse_day(query.get("end")), self.service.till_dir)
+        return HTTPStatus.OK, {"days": list(days)}
+
+    def route(self, method, path):
+        """Return (handler, path parameters) for a request."""
+        allowed = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if match:
+                if route_method == method:
+                    return handler, {key: unquote(value) for key, value in match.groupdict().items()}
+                allowed = True
+        if allowed:
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} is not allowed on {path}")
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No such endpoint: {path}")
+
+    async def dispatch(self, method, target, body):
+        """Handle one request and return (status, payload bytes, content type)."""
+        try:
+            url = urlsplit(target)
+            handler, params = self.route(method, url.path.rstrip("/") or "/")
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            try:
+                data = json.loads(body) if body else {}
+            except ValueError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body is not valid JSON")
+            if not isinstance(data, dict):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Request body must be a JSON object")
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(None, functools.partial(handler, query, data, **params))
+        except HTTPError as e:
+            result = (e.status, {"error": e.message})
+        except BillingError as e:
+            result = (HTTPStatus.BAD_REQUEST, {"error": str(e)})
+        except till.TillError as e:
+            result = (HTTPStatus.CONFLICT, {"error": str(e)})
+        except Exception as e:
+            result = (HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"})
+
+        if len(result) == 3:
+            return result
+        status, payload = result
+        return status, json.dumps(payload, default=str).encode("utf-8"), "application/json"
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one connection until the client closes it."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self.write_response(writer, HTTPStatus.BAD_REQUEST, b'{"error": "Bad request line"}',
+                                              "application/json", keep_alive=False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length", 0) or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self.write_response(writer, HTTPStatus.BAD_REQUEST, b'{"error": "Bad Content-Length"}',
+                                              "application/json", keep_alive=False)
+                    break
+                if length > MAX_BODY_SIZE:
+                    await self.write_response(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, b'{"error": "Body too large"}',
+                                              "application/json", keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                status, payload, content_type = await self.dispatch(method.upper(), target, body)
+                await self.write_response(writer, status, payload, content_type, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def write_response(self, writer, status, payload, content_type, keep_alive=True):
+        status = HTTPStatus(status)
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode("latin-1") + payload)
+        await writer.drain()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Start listening and return the asyncio server."""
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, data_dir=None, bills_directory=None):
+    api = POSApi(BillingService(data_dir, bills_directory))
+    server = await api.start(host, port)
+    print(f"POS API listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the billing API to POS lanes over HTTP/JSON")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("--bills-dir", default=None, help="Bills directory (default: saved_bills)")
+    parser.add_argument("--data-dir", default=None, help="Catalog directory (default: data)")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.data_dir, args.bills_dir))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import os
+import json
+import time
+import bisect
+import argparse
+import threading
+from datetime import datetime, date
+import numpy as np
+
+# Effective-dated product prices. prices.pkl only holds today's prices, so a
+# bill priced again later would silently use them. The history keeps, per
+# product, the sorted times its price changed and the price from each of
+# them on; the price at a point in time is the one of the last change at or
+# before it, found by bisection.
+#
+# Batch lookups (many products, or many bill lines, at once) run on a flat
+# copy of every product's changes: each change is encoded as one int64,
+# (product number << TIME_BITS) | seconds since ORIGIN, and as the products
+# follow one another in the flat arrays, with their changes in time order,
+# the encoded keys are a single sorted array that np.searchsorted answers all
+# the queries on at once. The arrays are rebuilt on the first batch lookup
+# after a change.
+PRICE_HISTORY_FILE = "price_history.json"
+HISTORY_VERSION = 1
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Effective date of the prices a new history starts with, so that bills from
+# before the history existed are priced with them
+BEGINNING = "1970-01-01 00:00:00"
+TIME_BITS = 40
+ORIGIN = np.datetime64("1900-01-01T00:00:00", "s")
+
+
+def format_time(when=None):
+    """
+    Format a point in time as DATE_FORMAT.
+
+    Args:
+        when (datetime, date or str, optional): A date means its start (default: now)
+    """
+    if when is None:
+        when = datetime.now()
+    if isinstance(when, str):
+        when = parse_time(when)
+    elif not isinstance(when, datetime):
+        when = datetime(when.year, when.month, when.day)
+    return when.strftime(DATE_FORMAT)
+
+
+def parse_time(value):
+    """Parse "YYYY-MM-DD[ HH:MM[:SS]]" (or "T" separated)."""
+    value = value.strip().replace("T", " ")
+    for fmt in (DATE_FORMAT, "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid date: {value!r}")
+
+
+def to_seconds(when):
+    """Seconds since ORIGIN (naive local time) of one point in time or an array of them."""
+    if isinstance(when, (str, datetime, date)) or when is None:
+        when = format_time(when)
+    try:
+        when = np.asarray(when, dtype="datetime64[s]")
+    except (TypeError, ValueError):
+        when = np.asarray([format_time(value) for value in when], dtype="datetime64[s]")
+    return np.clip((when - ORIGIN).astype(np.int64), 0, (1 << TIME_BITS) - 1)
+
+
+class PriceHistory:
+    """
+    Price changes of every product, with point-in-time lookups.
+
+    Args:
+        path (str): File the history is saved to
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        # name -> sorted effective-from times, and the prices from each of them
+        self.times = {}
+        self.prices = {}
+        self._arrays = None
+        self._dirty = False
+        self.load()
+
+    def __len__(self):
+        return len(self.times)
+
+    def __contains__(self, name):
+        return name in self.times
+
+    def load(self):
+        """Load the saved history, if there is one."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != HISTORY_VERSION:
+            return
+        with self._lock:
+            self.times = {name: changes["from"] for name, changes in data["products"].items()}
+            self.prices = {name: changes["price"] for name, changes in data["products"].items()}
+            self._arrays = None
+
+    def save(self):
+        """Write the history atomically if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            products = {name: {"from": self.times[name], "price": self.prices[name]} for name in self.times}
+            with open(self.path + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump({"version": HISTORY_VERSION, "products": products}, f)
+            os.replace(self.path + ".tmp", self.path)
+            self._dirty = False
+
+    def record(self, prices, effective_from=None):
+        """
+        Record prices effective from a point in time.
+
+        Only products whose price at that time differs are recorded, so the
+        whole price list can be passed after any change. A change at a time
+        that already has one replaces it.
+
+        Args:
+            prices (dict): Product name -> price
+            effective_from (datetime, date or str, optional): Default: now
+
+        Returns:
+            list: Names of the products whose price changed
+        """
+        effective_from = format_time(effective_from)
+        changed = []
+        with self._lock:
+            for name, price in prices.items():
+                price = float(price)
+                times = self.times.setdefault(name, [])
+                product_prices = self.prices.setdefault(name, [])
+                i = bisect.bisect_right(times, effective_from)
+                if i and product_prices[i - 1] == price:
+                    continue
+                if i and times[i - 1] == effective_from:
+                    product_prices[i - 1] = price
+                else:
+                    times.insert(i, effective_from)
+                    product_prices.insert(i, price)
+                changed.append(name)
+            if changed:
+                self._arrays = None
+                self._dirty = True
+        return changed
+
+    def get_changes(self, name):
+        """Return a product's (effective from, price) changes, oldest first."""
+        return list(zip(self.times.get(name, []), self.prices.get(name, [])))
+
+    def price_at(self, name, when=None, default=None):
+        """
+        Return a product's price at a point in time.
+
+        Args:
+            name (str): Product name
+            when (datetime, date or str, optional): Default: now
+            default: Returned if the product had no price then
+        """
+        when = format_time(when)
+        with self._lock:
+            times = self.times.get(name)
+            if not times:
+                return default
+            i = bisect.bisect_right(times, when)
+            return self.prices[name][i - 1] if i else default
+
+    def _build_arrays(self):
+        names = list(self.times)
+        counts = np.array([len(self.times[name]) for name in names], dtype=np.int64)
+        product_ids = np.repeat(np.arange(len(names), dtype=np.int64), counts)
+        times = to_seconds(np.array([t for name in names for t in self.times[name]], dtype="datetime64[s]"))
+        self._arrays = {
+            "ids": {name: i for i, name in enumerate(names)},
+            "starts": np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64),
+            "keys": (product_ids << TIME_BITS) | times,
+            "prices": np.array([p for name in names for p in self.prices[name]], dtype=np.float64)
+        }
+        return self._arrays
+
+    def lookup(self, names, when=None):
+        """
+        Prices of many products at once.
+
+        Args:
+            names (sequence): Product names
+            when: One point in time for every name, or an array of them (one per name)
+
+        Returns:
+            numpy.ndarray: Prices (float64), NaN where a product had no price then
+        """
+        with self._lock:
+            arrays = self._arrays or self._build_arrays()
+        ids = arrays["ids"]
+        product_ids = np.fromiter((ids.get(name, -1) for name in names), dtype=np.int64, count=len(names))
+        known = product_ids >= 0
+        seconds = np.broadcast_to(to_seconds(when), product_ids.shape)
+        result = np.full(len(product_ids), np.nan)
+        if not known.any() or not len(arrays["keys"]):
+            return result
+        product_ids = product_ids[known]
+        positions = np.searchsorted(arrays["keys"], (product_ids << TIME_BITS) | seconds[known], side="right") - 1
+        # A position before the product's first change means it had no price yet
+        in_effect = positions >= arrays["starts"][product_ids]
+        found = np.full(len(product_ids), np.nan)
+        found[in_effect] = arrays["prices"][positions[in_effect]]
+        result[known] = found
+        return result
+
+    def prices_at(self, when=None, names=None):
+        """
+        Return the price list at a point in time.
+
+        Args:
+            when (datetime, date or str, optional): Default: now
+            names (iterable, optional): Products to price (default: every product)
+
+        Returns:
+            dict: Product name -> price, for the products that had a price then
+        """
+        names = list(self.times if names is None else names)
+        prices = self.lookup(names, when)
+        return {name: float(price) for name, price in zip(names, prices.tolist()) if price == price}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show product prices at a point in time")
+    parser.add_argument("names", nargs="*", help="Products to price (default: every product)")
+    parser.add_argument("--as-of", default=None, help="Date or time, e.g. 2025-01-31 or '2025-01-31 18:00' (default: now)")
+    parser.add_argument("--changes", action="store_true", help="List every price change of the products")
+    parser.add_argument("--data-dir", default=None, help="Catalog directory (default: data)")
+    args = parser.parse_args(argv)
+
+    # Imported here because the catalog itself uses this module
+    from utils import catalog
+
+    history = catalog.load_price_history(args.data_dir)
+    if args.changes:
+        for name in args.names or sorted(history.times):
+            for effective_from, price in history.get_changes(name):
+                print(f"{name:<40}{effective_from}  ₹{price:>10,.2f}")
+        return
+    start = time.perf_counter()
+    prices = history.prices_at(args.as_of, args.names or None)
+    elapsed = time.perf_counter() - start
+    for name, price in sorted(prices.items()):
+        print(f"{name:<40}₹{price:>10,.2f}")
+    print(f"{len(prices):,d} prices as of {format_time(args.as_of)} in {elapsed * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
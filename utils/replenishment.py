@@ -0,0 +1,271 @@
+import os
+import math
+import argparse
+import threading
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from utils import bill_store, catalog
+
+# Reorder recommendations from sales velocity. Daily quantities sold of every
+# product over the last HISTORY_DAYS days are kept in one (products x days)
+# array, filled from the line items of the partition manifests. A refresh only
+# rereads the partitions whose manifest changed since it was last read (in
+# practice today's), and record_sale() adds a bill as soon as it is committed,
+# so the array stays current without rescanning the history. Velocities,
+# reorder points and order quantities are then computed for the whole catalog
+# at once with numpy. Voided bills are left out: their items went back into
+# stock. The array's rows are allocated in doublings, so adding products one by
+# one does not copy it every time.
+#
+# For each product, with d the daily velocity, s the standard deviation of
+# daily sales, L the supplier lead time and R the review period (days between
+# orders):
+#   safety stock   = z * s * sqrt(L)
+#   reorder point  = d * L + safety stock
+#   order-up-to    = d * (L + R) + safety stock
+#   suggested order = order-up-to - stock, when stock is at or below the reorder point
+VELOCITY_WINDOWS = (7, 28)
+HISTORY_DAYS = max(VELOCITY_WINDOWS)
+# Weight of the short window in the blended velocity; the rest goes to the long one
+SHORT_WINDOW_WEIGHT = 0.6
+DEFAULT_LEAD_TIME_DAYS = 3
+DEFAULT_REVIEW_DAYS = 7
+# z-score of the service level (1.65 is about 95% of lead times without a stockout)
+DEFAULT_SERVICE_LEVEL_Z = 1.65
+
+
+class SalesVelocity:
+    """
+    Rolling daily sales per product, kept current incrementally.
+
+    Args:
+        bills_directory (str, optional): Root bills directory
+        history_days (int): Number of days of sales to keep
+    """
+
+    def __init__(self, bills_directory=None, history_days=HISTORY_DAYS):
+        self.bills_directory = bills_directory or bill_store.get_default_bills_directory()
+        self.history_days = history_days
+        self._lock = threading.RLock()
+        self.products = []
+        self._rows = {}
+        # Rows beyond len(products) are spare capacity; quantities is a view of the used ones
+        self._buffer = np.zeros((0, history_days))
+        self.quantities = self._buffer
+        self.last_day = None
+        # partition date -> manifest mtime when its column was filled
+        self._partition_mtimes = {}
+
+    def _row(self, product):
+        row = self._rows.get(product)
+        if row is None:
+            row = self._rows[product] = len(self.products)
+            self.products.append(product)
+            if row == len(self._buffer):
+                buffer = np.zeros((max(2 * row, 16), self.history_days))
+                buffer[:row] = self._buffer
+                self._buffer = buffer
+            self.quantities = self._buffer[:row + 1]
+        return row
+
+    def _column(self, day):
+        """Array column of a day, or None if it is outside the window."""
+        offset = (self.last_day - day).days
+        if 0 <= offset < self.history_days:
+            return self.history_days - 1 - offset
+        return None
+
+    def _advance(self, today):
+        """Move the window so that its last column is today."""
+        if self.last_day is None:
+            self.last_day = today
+            return
+        shift = (today - self.last_day).days
+        if shift <= 0:
+            return
+        if shift >= self.history_days:
+            self.quantities[:] = 0
+        else:
+            self.quantities[:, :-shift] = self.quantities[:, shift:]
+            self.quantities[:, -shift:] = 0
+        self.last_day = today
+        first_day = today - timedelta(days=self.history_days - 1)
+        self._partition_mtimes = {day: mtime for day, mtime in self._partition_mtimes.items() if day >= first_day}
+
+    def refresh(self, today=None):
+        """
+        Reread the partitions in the window whose manifest changed.
+
+        Returns:
+            int: Number of partitions reread
+        """
+        today = today or date.today()
+        with self._lock:
+            self._advance(today)
+            first_day = today - timedelta(days=self.history_days - 1)
+            reread = 0
+            for partition_date, partition_dir in bill_store.list_partitions(self.bills_directory, first_day, today):
+                manifest_path = os.path.join(partition_dir, bill_store.MANIFEST_FILE)
+                try:
+                    mtime = os.stat(manifest_path).st_mtime_ns
+                except FileNotFoundError:
+                    continue
+                if self._partition_mtimes.get(partition_date) == mtime:
+                    continue
+                column = self._column(partition_date)
+                self.quantities[:, column] = 0
+                for entry in bill_store.load_manifest(partition_dir)["bills"].values():
+                    if entry.get("voided"):
+                        # Its items went back into stock
+                        continue
+                    for item in entry.get("items", []):
+                        # _row() may grow the array, so it runs before indexing
+                        row = self._row(item["name"])
+                        self.quantities[row, column] += item.get("quantity", 0)
+                self._partition_mtimes[partition_date] = mtime
+                reread += 1
+            return reread
+
+    def record_sale(self, items, day=None):
+        """
+        Add a committed bill's quantities without rereading its partition.
+
+        Args:
+            items (dict): Product name -> quantity sold
+            day (date, optional): Day of the sale (default: today)
+        """
+        day = day or date.today()
+        with self._lock:
+            self._advance(day)
+            column = self._column(day)
+            if column is None:
+                return
+            for product, quantity in items.items():
+                if quantity > 0:
+                    row = self._row(product)
+                    self.quantities[row, column] += quantity
+
+    def get_quantities(self, products):
+        """Daily quantities (len(products) x history_days) for the given products, in that order."""
+        with self._lock:
+            rows = np.array([self._rows.get(product, -1) for product in products], dtype=np.int64)
+            result = np.zeros((len(products), self.history_days))
+            known = rows >= 0
+            result[known] = self.quantities[rows[known]]
+            return result
+
+
+def compute_reorder_plan(quantities, stock, lead_time_days=DEFAULT_LEAD_TIME_DAYS,
+                         review_days=DEFAULT_REVIEW_DAYS, service_level_z=DEFAULT_SERVICE_LEVEL_Z):
+    """
+    Compute velocities, reorder points and order quantities for many products.
+
+    Args:
+        quantities (np.ndarray): Daily quantities sold, one row per product,
+            oldest day first
+        stock (np.ndarray): Units in stock per product
+        lead_time_days (float): Days between ordering and receiving stock
+        review_days (float): Days between two orders
+        service_level_z (float): Safety stock in standard deviations of daily sales
+
+    Returns:
+        dict: Arrays "sold_<window>d" and "velocity_<window>d" per window,
+            "velocity", "days_of_cover", "safety_stock", "reorder_point",
+            "order_up_to" and "suggested_order"
+    """
+    quantities = np.asarray(quantities, dtype=float)
+    stock = np.asarray(stock, dtype=float)
+    plan = {}
+    for window in VELOCITY_WINDOWS:
+        sold = quantities[:, -window:].sum(axis=1)
+        plan[f"sold_{window}d"] = sold
+        plan[f"velocity_{window}d"] = sold / window
+    short, long = (plan[f"velocity_{window}d"] for window in (min(VELOCITY_WINDOWS), max(VELOCITY_WINDOWS)))
+    velocity = SHORT_WINDOW_WEIGHT * short + (1 - SHORT_WINDOW_WEIGHT) * long
+    safety_stock = service_level_z * quantities.std(axis=1) * math.sqrt(lead_time_days)
+    reorder_point = velocity * lead_time_days + safety_stock
+    order_up_to = velocity * (lead_time_days + review_days) + safety_stock
+    needs_order = (velocity > 0) & (stock <= reorder_point)
+    with np.errstate(divide="ignore"):
+        days_of_cover = np.where(velocity > 0, stock / np.where(velocity > 0, velocity, 1), np.inf)
+    plan.update({
+        "velocity": velocity,
+        "days_of_cover": days_of_cover,
+        "safety_stock": safety_stock,
+        "reorder_point": reorder_point,
+        "order_up_to": order_up_to,
+        "suggested_order": np.where(needs_order, np.ceil(np.maximum(order_up_to - stock, 0)), 0).astype(int)
+    })
+    return plan
+
+
+def get_reorder_recommendations(sales_velocity, inventory, products=None, **params):
+    """
+    Reorder recommendations for every product of the catalog.
+
+    Args:
+        sales_velocity (SalesVelocity): Refreshed sales history
+        inventory (dict): Stock levels (see catalog.load_inventory_data)
+        products (dict, optional): Product catalog, for the categories
+        **params: lead_time_days, review_days and service_level_z (see compute_reorder_plan)
+
+    Returns:
+        pd.DataFrame: One row per product, largest suggested orders first, then by days of cover
+    """
+    categories = {}
+    if products:
+        categories = {variant["name"]: category for category, _, variant in catalog.iter_catalog_items(products)}
+    names = sorted(set(inventory) | set(categories))
+    stock = np.array([inventory.get(name, {}).get("quantity", 0) for name in names], dtype=float)
+    plan = compute_reorder_plan(sales_velocity.get_quantities(names), stock, **params)
+
+    status = np.where(plan["suggested_order"] > 0, "Reorder", np.where(plan["velocity"] > 0, "OK", "No sales"))
+    status = np.where((plan["velocity"] > 0) & (stock <= 0), "Out of stock", status)
+    frame = pd.DataFrame({
+        "Product": names,
+        "Category": [categories.get(name, "") for name in names],
+        "Stock": stock.astype(int),
+        **{f"Sold {window}d": plan[f"sold_{window}d"].astype(int) for window in VELOCITY_WINDOWS},
+        "Velocity/day": plan["velocity"].round(2),
+        "Days of Cover": plan["days_of_cover"].round(1),
+        "Reorder Point": np.ceil(plan["reorder_point"]).astype(int),
+        "Suggested Order": plan["suggested_order"],
+        "Status": status
+    })
+    return frame.sort_values(["Suggested Order", "Days of Cover"], ascending=[False, True],
+                             kind="stable").reset_index(drop=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Suggest stock reorders from recent sales")
+    parser.add_argument("--lead-time", type=float, default=DEFAULT_LEAD_TIME_DAYS, help="Supplier lead time in days")
+    parser.add_argument("--review-days", type=float, default=DEFAULT_REVIEW_DAYS, help="Days between orders")
+    parser.add_argument("--service-z", type=float, default=DEFAULT_SERVICE_LEVEL_Z, help="Safety stock z-score")
+    parser.add_argument("--bills-dir", default=None, help="Bills directory (default: saved_bills)")
+    parser.add_argument("--data-dir", default=None, help="Catalog directory (default: data)")
+    parser.add_argument("--all", action="store_true", help="Show every product, not only those to reorder")
+    parser.add_argument("--csv", default=None, help="Also write the recommendations to a CSV file")
+    args = parser.parse_args(argv)
+
+    sales_velocity = SalesVelocity(args.bills_dir)
+    sales_velocity.refresh()
+    recommendations = get_reorder_recommendations(
+        sales_velocity,
+        catalog.load_inventory_data(args.data_dir),
+        catalog.load_product_data(args.data_dir),
+        lead_time_days=args.lead_time,
+        review_days=args.review_days,
+        service_level_z=args.service_z
+    )
+    if args.csv:
+        recommendations.to_csv(args.csv, index=False)
+    shown = recommendations if args.all else recommendations[recommendations["Suggested Order"] > 0]
+    if shown.empty:
+        print("Nothing to reorder.")
+    else:
+        print(shown.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
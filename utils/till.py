@@ -0,0 +1,473 @@
+import os
+import re
+import json
+import argparse
+import threading
+from contextlib import contextmanager
+from datetime import datetime, date
+from utils import bill_store, catalog
+from utils.bill_model import CATEGORIES, Bill
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: only the threads of one process are coordinated
+    fcntl = None
+
+# Shift and day close. Every lane (a till: the Streamlit app, or a POS lane
+# posting to the API) keeps running counters for its open shift, updated as
+# bills are committed and voided: bill count, gross, tax, sales per category
+# and voids. An X-report reads the counters as they are; closing the shift
+# (Z-report) freezes them into a shift record and starts the next shift.
+# Closing a day sums the frozen shift records of that day into a daily
+# summary. Reports of past days read the summaries, never the bills.
+#
+# Files, under data/till/:
+#   <lane>.json                          counters of the lane's open shift
+#   <lane>.lock                          flock held while they are changed
+#   shifts/YYYY-MM-DD/<lane>-NNNNN.json  closed shifts, by the day they opened
+#                                        on (or were closed on, if that day
+#                                        was already closed)
+#   days/YYYY-MM-DD.json                 daily summaries
+#
+# Frozen records are written once (hard-linked into place, which fails if
+# the record exists) and made read-only. Processes may share a lane (the app
+# and the POS API both default to lane 1): its counters are read again and
+# written holding an flock on the lane's lock file. Counters that a crash (or
+# a failed write) left behind can be rebuilt from the bill manifests, which
+# record the lane of every bill.
+TILL_DIR = "till"
+SHIFTS_DIR = "shifts"
+DAYS_DIR = "days"
+LANE_ENV = "BILLING_LANE"
+DEFAULT_LANE = "1"
+RECORD_VERSION = 1
+DATE_FORMAT = bill_store.MANIFEST_DATE_FORMAT
+DAY_FORMAT = "%Y-%m-%d"
+_LANE_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,32}")
+
+_tills = {}
+_tills_lock = threading.Lock()
+
+
+class TillError(ValueError):
+    """Raised when a shift or day cannot be closed, or a lane name is invalid."""
+
+
+def get_lane(lane=None):
+    """Return the lane: lane, else BILLING_LANE, else DEFAULT_LANE."""
+    lane = str(lane or os.environ.get(LANE_ENV) or DEFAULT_LANE)
+    if not _LANE_PATTERN.fullmatch(lane):
+        raise TillError(f"Invalid lane {lane!r}: use up to 32 letters, digits, '-' or '_'")
+    return lane
+
+
+def get_till_dir(data_dir=None):
+    return catalog.get_data_file(TILL_DIR, data_dir)
+
+
+def new_counters(lane, shift, opened_at=None):
+    return {
+        "version": RECORD_VERSION,
+        "lane": lane,
+        "shift": shift,
+        "opened_at": opened_at or datetime.now().strftime(DATE_FORMAT),
+        "bills": 0,
+        "gross": 0.0,
+        "subtotal": 0.0,
+        "tax": 0.0,
+        "voids": 0,
+        "void_amount": 0.0,
+        # Category -> quantity and amount sold, net of voids
+        "categories": {category: {"quantity": 0, "amount": 0.0} for category in CATEGORIES},
+        "first_bill": None,
+        "first_bill_at": None,
+        "last_bill": None,
+        "last_bill_at": None
+    }
+
+
+def add_counters(total, counters):
+    """Add the counters of a shift (or day) to a running total, in place."""
+    for key in ("bills", "voids"):
+        total[key] += counters[key]
+    for key in ("gross", "subtotal", "tax", "void_amount"):
+        total[key] = round(total[key] + counters[key], 2)
+    for category, sales in counters["categories"].items():
+        category_total = total["categories"].setdefault(category, {"quantity": 0, "amount": 0.0})
+        category_total["quantity"] += sales["quantity"]
+        category_total["amount"] = round(category_total["amount"] + sales["amount"], 2)
+    return total
+
+
+def _write_json(path, record):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def _freeze(path, record):
+    """Write a record that must never change; raises TillError if it exists."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        os.link(temp_path, path)
+    except FileExistsError:
+        raise TillError(f"{os.path.basename(path)} is already closed")
+    finally:
+        os.remove(temp_path)
+    os.chmod(path, 0o444)
+
+
+def _load_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class Till:
+    """
+    Counters of one lane's open shift.
+
+    Args:
+        till_dir (str): Till directory (see get_till_dir)
+        lane (str): Lane name
+    """
+
+    def __init__(self, till_dir, lane):
+        self.till_dir = till_dir
+        self.lane = get_lane(lane)
+        self.path = os.path.join(till_dir, f"{self.lane}.json")
+        self.lock_path = os.path.join(till_dir, f"{self.lane}.lock")
+        self._lock = threading.RLock()
+        self._mtime = None
+        self.counters = None
+        self._reload()
+
+    def _get_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _reload(self, force=False):
+        """Read the counters again if another process changed them."""
+        mtime = self._get_mtime()
+        if self.counters is not None and mtime == self._mtime and not force:
+            return
+        counters = _load_json(self.path)
+        if counters is None:
+            counters = new_counters(self.lane, self._last_shift() + 1)
+        self.counters = counters
+        self._mtime = mtime
+
+    def _save(self):
+        _write_json(self.path, self.counters)
+        self._mtime = self._get_mtime()
+
+    @contextmanager
+    def _locked(self):
+        """Hold the lane's lock, against other threads and processes, with its counters read again."""
+        with self._lock:
+            os.makedirs(self.till_dir, exist_ok=True)
+            fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                # Another process may have written them within the same mtime tick
+                self._reload(force=True)
+                yield
+            finally:
+                # Closing releases the flock
+                os.close(fd)
+
+    def _last_shift(self):
+        """Number of the lane's last closed shift, for a lane whose counters are lost."""
+        last = 0
+        shifts_dir = os.path.join(self.till_dir, SHIFTS_DIR)
+        for day in os.listdir(shifts_dir) if os.path.isdir(shifts_dir) else ():
+            for name in os.listdir(os.path.join(shifts_dir, day)):
+                lane, _, number = name[:-len(".json")].rpartition("-")
+                if lane == self.lane and number.isdigit():
+                    last = max(last, int(number))
+        return last
+
+    def record_bill(self, bill):
+        """
+        Count a committed bill.
+
+        Args:
+            bill (bill_model.Bill): The bill
+        """
+        with self._locked():
+            self._count_bill(bill, bill.date.strftime(DATE_FORMAT))
+            self._save()
+
+    def record_void(self, bill):
+        """
+        Count a voided bill, taking its items out of the category sales.
+
+        Args:
+            bill (bill_model.Bill): The voided bill, from this or an earlier shift
+        """
+        with self._locked():
+            self._count_void(bill)
+            self._save()
+
+    def _count_bill(self, bill, when):
+        counters = self.counters
+        counters["bills"] += 1
+        counters["gross"] = round(counters["gross"] + bill.grand_total, 2)
+        counters["subtotal"] = round(counters["subtotal"] + bill.subtotal, 2)
+        counters["tax"] = round(counters["tax"] + bill.total_tax, 2)
+        self._count_items(bill, 1)
+        if counters["first_bill_at"] is None or when < counters["first_bill_at"]:
+            counters["first_bill"], counters["first_bill_at"] = bill.bill_number, when
+        if counters["last_bill_at"] is None or when >= counters["last_bill_at"]:
+            counters["last_bill"], counters["last_bill_at"] = bill.bill_number, when
+
+    def _count_void(self, bill):
+        self.counters["voids"] += 1
+        self.counters["void_amount"] = round(self.counters["void_amount"] + bill.grand_total, 2)
+        self._count_items(bill, -1)
+
+    def _count_items(self, bill, sign):
+        categories = self.counters["categories"]
+        for item in bill.items:
+            sales = categories.setdefault(item.category, {"quantity": 0, "amount": 0.0})
+            sales["quantity"] += sign * item.quantity
+            sales["amount"] = round(sales["amount"] + sign * item.total, 2)
+
+    def x_report(self):
+        """Return the counters of the open shift, leaving it open."""
+        with self._lock:
+            self._reload()
+            return report_record(self.counters)
+
+    def close_shift(self, closed_at=None):
+        """
+        Close the open shift: freeze its counters and open the next shift.
+
+        Args:
+            closed_at (datetime, optional): Default: now
+
+        Returns:
+            dict: The frozen shift record (Z-report)
+        """
+        closed_at = (closed_at or datetime.now()).strftime(DATE_FORMAT)
+        with self._locked():
+            record = report_record(self.counters, closed_at=closed_at)
+            # A shift belongs to the day it opened on, unless that day is
+            # already closed
+            day = record["opened_at"][:10]
+            if os.path.exists(os.path.join(self.till_dir, DAYS_DIR, f"{day}.json")):
+                day = closed_at[:10]
+            _freeze(os.path.join(self.till_dir, SHIFTS_DIR, day, f"{self.lane}-{record['shift']:05d}.json"), record)
+            self.counters = new_counters(self.lane, record["shift"] + 1, closed_at)
+            self._save()
+            return record
+
+    def rebuild(self, bills_directory=None):
+        """
+        Recount the open shift from the bill manifests, after a crash.
+
+        Only partitions from the day the shift opened on are read, so voids
+        of older bills are not recounted.
+
+        Returns:
+            dict: The rebuilt counters
+        """
+        with self._locked():
+            counters = new_counters(self.lane, self.counters["shift"], self.counters["opened_at"])
+            self.counters = counters
+            opened_at = counters["opened_at"]
+            start = datetime.strptime(opened_at, DATE_FORMAT).date()
+            for entry in bill_store.iter_bills(bills_directory, start_date=start):
+                if entry.get("lane", DEFAULT_LANE) != self.lane and entry.get("voided", {}).get("lane") != self.lane:
+                    continue
+                bill = Bill.from_manifest_entry(entry)
+                if entry.get("lane", DEFAULT_LANE) == self.lane and entry["date"] >= opened_at:
+                    self._count_bill(bill, entry["date"])
+                voided = entry.get("voided")
+                if voided and voided.get("lane") == self.lane and voided["voided_at"] >= opened_at:
+                    self._count_void(bill)
+            self._save()
+            return report_record(counters)
+
+
+def get_till(till_dir, lane=None):
+    """Return the Till of a lane, shared by every service of the process."""
+    lane = get_lane(lane)
+    key = (os.path.abspath(till_dir), lane)
+    with _tills_lock:
+        till = _tills.get(key)
+        if till is None:
+            till = _tills[key] = Till(till_dir, lane)
+        return till
+
+
+def report_record(counters, **fields):
+    """Copy counters into a report record, with the net sales added."""
+    record = json.loads(json.dumps(counters))
+    record["net"] = round(record["gross"] - record["void_amount"], 2)
+    record.update(fields)
+    return record
+
+
+def iter_lanes(till_dir):
+    """Yield the open shift counters of every lane."""
+    for name in sorted(os.listdir(till_dir)) if os.path.isdir(till_dir) else ():
+        if name.endswith(".json"):
+            counters = _load_json(os.path.join(till_dir, name))
+            if counters is not None:
+                yield counters
+
+
+def close_day(day=None, till_dir=None, close_open_shifts=False):
+    """
+    Freeze the summary of a day from its closed shifts.
+
+    Args:
+        day (date, optional): Default: today
+        till_dir (str, optional): Till directory (default: data/till)
+        close_open_shifts (bool): Close the shifts still open that opened on
+            or before the day, instead of refusing to close it
+
+    Returns:
+        dict: The daily summary
+
+    Raises:
+        TillError: If the day is already closed, or a shift with bills is still open
+    """
+    day = (day or date.today()).strftime(DAY_FORMAT)
+    till_dir = till_dir or get_till_dir()
+    if os.path.exists(os.path.join(till_dir, DAYS_DIR, f"{day}.json")):
+        raise TillError(f"{day} is already closed")
+    for counters in iter_lanes(till_dir):
+        if counters["opened_at"][:10] <= day and (counters["bills"] or counters["voids"]):
+            if not close_open_shifts:
+                raise TillError(f"Lane {counters['lane']} has an open shift with {counters['bills']} bills; close it first")
+            get_till(till_dir, counters["lane"]).close_shift()
+
+    summary = new_counters(None, None)
+    del summary["lane"], summary["shift"], summary["opened_at"]
+    summary.update(day=day, lanes={}, shifts=[])
+    shifts_dir = os.path.join(till_dir, SHIFTS_DIR, day)
+    for name in sorted(os.listdir(shifts_dir)) if os.path.isdir(shifts_dir) else ():
+        if not name.endswith(".json"):
+            continue
+        shift = _load_json(os.path.join(shifts_dir, name))
+        add_counters(summary, shift)
+        lane = summary["lanes"].setdefault(shift["lane"], {"bills": 0, "gross": 0.0, "voids": 0, "void_amount": 0.0, "shifts": []})
+        for key in ("bills", "voids"):
+            lane[key] += shift[key]
+        for key in ("gross", "void_amount"):
+            lane[key] = round(lane[key] + shift[key], 2)
+        lane["shifts"].append(shift["shift"])
+        summary["shifts"].append(name[:-len(".json")])
+        if shift["first_bill_at"] and (summary["first_bill_at"] is None or shift["first_bill_at"] < summary["first_bill_at"]):
+            summary["first_bill"], summary["first_bill_at"] = shift["first_bill"], shift["first_bill_at"]
+        if shift["last_bill_at"] and (summary["last_bill_at"] is None or shift["last_bill_at"] > summary["last_bill_at"]):
+            summary["last_bill"], summary["last_bill_at"] = shift["last_bill"], shift["last_bill_at"]
+    summary["net"] = round(summary["gross"] - summary["void_amount"], 2)
+    summary["closed_at"] = datetime.now().strftime(DATE_FORMAT)
+    _freeze(os.path.join(till_dir, DAYS_DIR, f"{day}.json"), summary)
+    return summary
+
+
+def load_day(day, till_dir=None):
+    """Return the summary of a closed day, or None."""
+    return _load_json(os.path.join(till_dir or get_till_dir(), DAYS_DIR, f"{day.strftime(DAY_FORMAT)}.json"))
+
+
+def iter_days(start_date=None, end_date=None, till_dir=None):
+    """Yield the summaries of the closed days in a date range, oldest first."""
+    days_dir = os.path.join(till_dir or get_till_dir(), DAYS_DIR)
+    start = start_date.strftime(DAY_FORMAT) if start_date else ""
+    end = end_date.strftime(DAY_FORMAT) if end_date else "9999"
+    for name in sorted(os.listdir(days_dir)) if os.path.isdir(days_dir) else ():
+        if name.endswith(".json") and start <= name[:-len(".json")] <= end:
+            yield _load_json(os.path.join(days_dir, name))
+
+
+def format_report(record, width=40):
+    """Format an X/Z-report or a daily summary as text."""
+    if "day" in record:
+        title = f"DAY CLOSE {record['day']}"
+        period = [f"Lanes: {', '.join(sorted(record['lanes'])) or '-'}", f"Shifts: {len(record['shifts'])}"]
+    else:
+        title = f"{'Z' if 'closed_at' in record else 'X'}-REPORT  Lane {record['lane']}  Shift {record['shift']}"
+        period = [f"Opened: {record['opened_at']}"]
+    if "closed_at" in record:
+        period.append(f"Closed: {record['closed_at']}")
+    amount = f"{{:<{width - 14}}}{{:>14,.2f}}"
+    lines = [title.center(width), "=" * width, *period, "-" * width,
+             f"{'Bills':<{width - 14}}{record['bills']:>14,d}",
+             amount.format("Gross", record["gross"]),
+             f"{'Voids':<{width - 14}}{record['voids']:>14,d}",
+             amount.format("Void amount", record["void_amount"]),
+             amount.format("Net sales", record["net"]),
+             amount.format("Subtotal", record["subtotal"]),
+             amount.format("Tax", record["tax"]),
+             "-" * width]
+    for category, sales in record["categories"].items():
+        lines.append(f"{category:<{width - 22}}{sales['quantity']:>8,d}{sales['amount']:>14,.2f}")
+    lines.append("-" * width)
+    if record["first_bill"]:
+        lines.append(f"Bills {record['first_bill']} .. {record['last_bill']}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shift and day close: X/Z-reports and daily summaries")
+    parser.add_argument("--data-dir", default=None, help="Catalog directory (default: data)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    for command, help_text in (("x", "Show the open shift's counters"), ("z", "Close the open shift"),
+                               ("rebuild", "Recount the open shift from the bill manifests")):
+        subparser = subparsers.add_parser(command, help=help_text)
+        subparser.add_argument("--lane", default=None, help=f"Lane (default: ${LANE_ENV} or {DEFAULT_LANE})")
+        if command == "rebuild":
+            subparser.add_argument("--bills-dir", default=None, help="Bills directory (default: saved_bills)")
+
+    close_parser = subparsers.add_parser("close-day", help="Freeze the summary of a day")
+    close_parser.add_argument("day", nargs="?", default=None, help="Day (YYYY-MM-DD, default: today)")
+    close_parser.add_argument("--close-open-shifts", action="store_true", help="Close the lanes' open shifts first")
+
+    days_parser = subparsers.add_parser("days", help="List the summaries of closed days")
+    days_parser.add_argument("--start", default=None, help="First day (YYYY-MM-DD)")
+    days_parser.add_argument("--end", default=None, help="Last day (YYYY-MM-DD)")
+
+    args = parser.parse_args(argv)
+    till_dir = get_till_dir(args.data_dir)
+    parse_day = lambda value: datetime.strptime(value, DAY_FORMAT).date() if value else None
+    try:
+        if args.command in ("x", "z", "rebuild"):
+            till = get_till(till_dir, args.lane)
+            if args.command == "x":
+                record = till.x_report()
+            elif args.command == "z":
+                record = till.close_shift()
+            else:
+                record = till.rebuild(args.bills_dir)
+            print(format_report(record))
+        elif args.command == "close-day":
+            print(format_report(close_day(parse_day(args.day), till_dir, args.close_open_shifts)))
+        else:
+            for summary in iter_days(parse_day(args.start), parse_day(args.end), till_dir):
+                print(f"{summary['day']}  {summary['bills']:>7,d} bills  gross ₹{summary['gross']:>12,.2f}  "
+                      f"voids {summary['voids']:>4,d}  net ₹{summary['net']:>12,.2f}")
+    except TillError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
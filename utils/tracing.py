@@ -0,0 +1,331 @@
+import os
+import json
+import math
+import time
+import bisect
+import argparse
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# Lightweight in-process tracing for the checkout path. Each stage (pricing,
+# bill text, PDF, Excel, master file, inventory write, email) is timed with a
+# span; durations go into a fixed-bucket histogram plus a window of recent
+# values for percentiles, and calls/errors into counters. Everything lives in
+# one registry guarded by a lock, so the cost per span is two perf_counter()
+# calls and a few dict updates. Metrics are exported in the Prometheus text
+# format or as JSON lines, and when BILLING_TRACE_LOG names a file every span
+# is also appended to it so other processes (the POS API, load tests) can be
+# watched from the admin page.
+METRIC_PREFIX = "billing"
+TRACE_LOG_ENV = "BILLING_TRACE_LOG"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RECENT_SIZE = 1000
+
+
+class Histogram:
+    """Cumulative latency histogram with a window of recent observations."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+        self.last = None
+        self.recent = deque(maxlen=RECENT_SIZE)
+
+    def observe(self, seconds, error=False):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.last = seconds
+        self.recent.append(seconds)
+        if error:
+            self.errors += 1
+
+    def percentile(self, fraction):
+        """Nearest-rank percentile of the recent observations, or None."""
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class Registry:
+    """Stage histograms and labelled counters shared by the whole process."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.histograms = {}
+        # (name, sorted label items) -> value
+        self.counters = {}
+        self.started = time.time()
+
+    def observe(self, stage, seconds, error=False):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds, error)
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.started = time.time()
+
+    def get_stage_stats(self):
+        """
+        Summarize every stage seen so far.
+
+        Returns:
+            list: Dicts with stage, count, errors and mean/p50/p99/last/total
+                seconds, slowest total first
+        """
+        with self._lock:
+            stats = [
+                {
+                    "stage": stage,
+                    "count": histogram.count,
+                    "errors": histogram.errors,
+                    "mean": histogram.sum / histogram.count if histogram.count else None,
+                    "p50": histogram.percentile(0.5),
+                    "p99": histogram.percentile(0.99),
+                    "last": histogram.last,
+                    "total": histogram.sum
+                }
+                for stage, histogram in self.histograms.items()
+            ]
+        return sorted(stats, key=lambda row: row["total"], reverse=True)
+
+    def export_prometheus(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        name = f"{METRIC_PREFIX}_stage_duration_seconds"
+        lines = [
+            f"# HELP {name} Time spent in each checkout stage.",
+            f"# TYPE {name} histogram"
+        ]
+        with self._lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum!r}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+
+            errors = f"{METRIC_PREFIX}_stage_errors_total"
+            lines.append(f"# HELP {errors} Checkout stage calls that failed.")
+            lines.append(f"# TYPE {errors} counter")
+            for stage, histogram in sorted(self.histograms.items()):
+                lines.append(f'{errors}{{stage="{stage}"}} {histogram.errors}')
+
+            counter_names = sorted({counter for counter, _ in self.counters})
+            for counter in counter_names:
+                lines.append(f"# TYPE {METRIC_PREFIX}_{counter} counter")
+                for (other, labels), value in sorted(self.counters.items()):
+                    if other == counter:
+                        label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                        label_text = f"{{{label_text}}}" if label_text else ""
+                        lines.append(f"{METRIC_PREFIX}_{counter}{label_text} {value}")
+        return "\n".join(lines) + "\n"
+
+    def export_json_lines(self):
+        """Return one JSON line per stage and per counter."""
+        now = datetime.now().isoformat(timespec="seconds")
+        lines = [json.dumps({"time": now, "type": "stage", **row}) for row in self.get_stage_stats()]
+        with self._lock:
+            for (counter, labels), value in sorted(self.counters.items()):
+                lines.append(json.dumps({"time": now, "type": "counter", "name": counter,
+                                         "labels": dict(labels), "value": value}))
+        return "\n".join(lines) + ("\n" if lines else "")
+
+
+registry = Registry()
+
+
+def get_trace_log():
+    """Return the file spans are appended to (BILLING_TRACE_LOG), or None."""
+    return os.environ.get(TRACE_LOG_ENV) or None
+
+
+_trace_log_lock = threading.Lock()
+
+
+def _append_trace_event(stage, seconds, error):
+    trace_log = get_trace_log()
+    if not trace_log:
+        return
+    event = json.dumps({
+        "time": time.time(),
+        "pid": os.getpid(),
+        "stage": stage,
+        "seconds": round(seconds, 6),
+        "error": error
+    })
+    try:
+        with _trace_log_lock, open(trace_log, "a", encoding="utf-8") as f:
+            f.write(event + "\n")
+    except OSError:
+        pass
+
+
+class Span:
+    """A running stage timer; call fail() to count it as an error without raising."""
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.error = False
+        self.seconds = None
+
+    def fail(self):
+        self.error = True
+
+
+@contextmanager
+def span(stage):
+    """
+    Time a block of code as one call of a stage.
+
+    Exceptions are counted as errors and re-raised.
+
+    Args:
+        stage (str): Stage name, e.g. "export_excel"
+
+    Yields:
+        Span: The running span
+    """
+    current = Span(stage)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        current.error = True
+        raise
+    finally:
+        current.seconds = time.perf_counter() - start
+        registry.observe(stage, current.seconds, current.error)
+        _append_trace_event(stage, current.seconds, current.error)
+
+
+def is_error_result(result):
+    """
+    Return True for the failure results of the billing helpers, which report
+    errors as "Error ..." messages or (False, message) tuples instead of raising.
+    """
+    if isinstance(result, str):
+        return result.startswith("Error")
+    if isinstance(result, tuple) and result and isinstance(result[0], bool):
+        return not result[0]
+    return False
+
+
+def traced(stage, is_error=is_error_result):
+    """
+    Decorator that runs every call of a function in a span.
+
+    Args:
+        stage (str): Stage name
+        is_error (callable, optional): Marks a returned value as a failure
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage) as current:
+                result = func(*args, **kwargs)
+                if is_error is not None and is_error(result):
+                    current.fail()
+                return result
+        return wrapper
+    return decorator
+
+
+def increment(name, amount=1, **labels):
+    """Add to a counter, e.g. increment("bills_committed")."""
+    registry.increment(name, amount, **labels)
+
+
+def get_stage_stats():
+    return registry.get_stage_stats()
+
+
+def export_prometheus():
+    return registry.export_prometheus()
+
+
+def export_json_lines():
+    return registry.export_json_lines()
+
+
+def reset():
+    registry.reset()
+
+
+def load_trace_log(trace_log=None, since=None):
+    """
+    Rebuild the metrics of one or more processes from a trace log.
+
+    Args:
+        trace_log (str, optional): Trace log file (default: BILLING_TRACE_LOG)
+        since (float, optional): Only use spans after this Unix time
+
+    Returns:
+        Registry: Registry holding the logged spans (empty if there is no log)
+    """
+    trace_log = trace_log or get_trace_log()
+    log_registry = Registry()
+    if not trace_log or not os.path.exists(trace_log):
+        return log_registry
+    with open(trace_log, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if since is not None and event.get("time", 0) < since:
+                continue
+            log_registry.observe(event["stage"], event["seconds"], event.get("error", False))
+    return log_registry
+
+
+def format_stage_stats(stats):
+    """Format stage statistics as a text table with millisecond timings."""
+    def ms(value):
+        return f"{value * 1000:10.1f}" if value is not None else f"{'-':>10}"
+
+    lines = [f"{'Stage':<18}{'Calls':>8}{'Errors':>8}{'p50 (ms)':>10}{'p99 (ms)':>10}{'Mean (ms)':>10}"]
+    for row in stats:
+        lines.append(f"{row['stage']:<18}{row['count']:>8}{row['errors']:>8}{ms(row['p50'])}{ms(row['p99'])}{ms(row['mean'])}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize checkout stage latencies from a trace log")
+    parser.add_argument("trace_log", nargs="?", default=None, help=f"Trace log file (default: ${TRACE_LOG_ENV})")
+    parser.add_argument("--minutes", type=float, default=None, help="Only use spans from the last N minutes")
+    parser.add_argument("--prometheus", action="store_true", help="Print the Prometheus text format instead")
+    args = parser.parse_args(argv)
+
+    trace_log = args.trace_log or get_trace_log()
+    if not trace_log:
+        parser.error(f"No trace log given and {TRACE_LOG_ENV} is not set")
+    since = time.time() - args.minutes * 60 if args.minutes else None
+    log_registry = load_trace_log(trace_log, since)
+    if args.prometheus:
+        print(log_registry.export_prometheus(), end="")
+    else:
+        print(format_stage_stats(log_registry.get_stage_stats()))
+
+
+if __name__ == "__main__":
+    main()
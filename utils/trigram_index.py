@@ -0,0 +1,309 @@
+import os
+import re
+import time
+import argparse
+import threading
+from array import array
+import numpy as np
+from utils import bill_store
+from utils.customer_autocomplete import normalize_name
+
+# Typo-tolerant search. Text is broken into trigrams, each word padded with
+# two spaces in front and one behind ("coca" -> "  c", " co", "coc", "oca",
+# "ca "), and two strings are as similar as the share of trigrams they have
+# in common (common / (query trigrams + term trigrams - common)), so "coka
+# cola" still finds "Coca Cola" and "ashaa" finds "Asha".
+#
+# Distinct strings (terms) are indexed once however many documents use them:
+# an inverted index maps each trigram to the terms containing it, and each
+# term keeps the documents (bills, products) it belongs to. Searching counts
+# the trigrams the query shares with every term in one np.bincount over the
+# postings of the query's trigrams, then spreads the term similarities onto
+# the documents with dense numpy arrays and takes the top k with
+# np.argpartition; the work grows with the postings the query touches, not
+# with the number of documents.
+#
+# A document's fields are indexed as phrases (customer and product names: the
+# whole string and each of its words) or as words only (bill numbers, whose
+# whole string is unique to one bill). A document scores the better of its
+# best phrase similarity and the mean over the query's words of their best
+# word similarity, so both "coka cola" and "soap" find "Dove Bath Soap".
+#
+# Postings are append-only arrays, so adding documents is incremental;
+# removed documents are masked out until the index is rebuilt.
+DEFAULT_THRESHOLD = 0.25
+# Query words match the words of a document from this similarity on
+WORD_THRESHOLD = 0.2
+DEFAULT_LIMIT = 20
+PHRASE = 0
+WORD = 1
+_WORDS = re.compile(r"\w+")
+
+
+def trigrams(text):
+    """Return the set of trigrams of a normalized string."""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def normalize(text):
+    """Case-fold and keep only the words of a string, separated by single spaces."""
+    return " ".join(_WORDS.findall(normalize_name(text))) if text else ""
+
+
+class TrigramIndex:
+    """
+    Trigram index of documents identified by keys.
+
+    Documents are added with add() and searched with search(); see the
+    module comment for the scoring.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # Terms: distinct (kind, normalized string) pairs, with their kind
+        # (PHRASE or WORD), trigram counts and the documents using them
+        self.terms = []
+        self.term_ids = {}
+        self.term_kinds = array('b')
+        self.term_sizes = array('i')
+        self.term_docs = []
+        # Trigram -> ids of the terms containing it
+        self.postings = {}
+        self.keys = []
+        self.doc_ids = {}
+        self.removed = set()
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __contains__(self, key):
+        return key in self.doc_ids
+
+    def _get_term(self, kind, text):
+        term_id = self.term_ids.get((kind, text))
+        if term_id is None:
+            term_id = self.term_ids[(kind, text)] = len(self.terms)
+            grams = trigrams(text)
+            self.terms.append(text)
+            self.term_kinds.append(kind)
+            self.term_sizes.append(len(grams))
+            self.term_docs.append(array('i'))
+            for gram in grams:
+                postings = self.postings.get(gram)
+                if postings is None:
+                    postings = self.postings[gram] = array('i')
+                postings.append(term_id)
+        return term_id
+
+    def add(self, key, phrases=(), words=()):
+        """
+        Index a document, replacing any document with the same key.
+
+        Args:
+            key: Document key returned by search
+            phrases (iterable): Strings matched as a whole and word by word
+            words (iterable): Strings matched word by word only
+        """
+        with self._lock:
+            if key in self.doc_ids:
+                self.remove(key)
+            doc_id = self.doc_ids[key] = len(self.keys)
+            self.keys.append(key)
+            terms = set()
+            for text in phrases:
+                text = normalize(text)
+                if text:
+                    terms.add((PHRASE, text))
+                    terms.update((WORD, word) for word in text.split())
+            for text in words:
+                terms.update((WORD, word) for word in normalize(text).split())
+            for kind, text in terms:
+                self.term_docs[self._get_term(kind, text)].append(doc_id)
+
+    def remove(self, key):
+        """Remove a document; returns whether it was indexed."""
+        with self._lock:
+            doc_id = self.doc_ids.pop(key, None)
+            if doc_id is None:
+                return False
+            self.removed.add(doc_id)
+            return True
+
+    def _similar_terms(self, text, kind, threshold):
+        """Return (term ids, similarities) of the terms of a kind at least threshold similar to text."""
+        grams = trigrams(text)
+        posting_arrays = [np.frombuffer(self.postings[gram], dtype=np.int32) for gram in grams if gram in self.postings]
+        if not posting_arrays:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        common = np.bincount(np.concatenate(posting_arrays), minlength=len(self.terms))
+        term_ids = np.flatnonzero(common)
+        common = common[term_ids]
+        sizes = np.frombuffer(self.term_sizes, dtype=np.int32)[term_ids]
+        similarities = common / (len(grams) + sizes - common)
+        keep = (similarities >= threshold) & (np.frombuffer(self.term_kinds, dtype=np.int8)[term_ids] == kind)
+        return term_ids[keep], similarities[keep]
+
+    def _spread(self, scores, term_ids, similarities):
+        """Raise the score of every document of the terms to the term's similarity."""
+        for term_id, similarity in zip(term_ids.tolist(), similarities.tolist()):
+            docs = np.frombuffer(self.term_docs[term_id], dtype=np.int32)
+            scores[docs] = np.maximum(scores[docs], similarity)
+
+    def score(self, query):
+        """
+        Score every document against a query.
+
+        Returns:
+            numpy.ndarray: Score per document id (0 for no match), or None for an empty query
+        """
+        text = normalize(query)
+        if not text:
+            return None
+        with self._lock:
+            scores = np.zeros(len(self.keys), dtype=np.float32)
+            self._spread(scores, *self._similar_terms(text, PHRASE, WORD_THRESHOLD))
+            query_words = text.split()
+            word_scores = np.zeros(len(self.keys), dtype=np.float32)
+            for word in query_words:
+                best = np.zeros(len(self.keys), dtype=np.float32)
+                self._spread(best, *self._similar_terms(word, WORD, WORD_THRESHOLD))
+                word_scores += best
+            np.maximum(scores, word_scores / len(query_words), out=scores)
+            if self.removed:
+                scores[list(self.removed)] = 0
+            return scores
+
+    def top(self, scores, limit=DEFAULT_LIMIT, threshold=DEFAULT_THRESHOLD):
+        """Return the (key, score) pairs of the best scores, best first."""
+        matches = np.flatnonzero(scores >= threshold)
+        if limit is not None and len(matches) > limit:
+            matches = matches[np.argpartition(-scores[matches], limit - 1)[:limit]]
+        matches = matches[np.argsort(-scores[matches], kind="stable")]
+        return [(self.keys[doc_id], float(scores[doc_id])) for doc_id in matches.tolist()]
+
+    def search(self, query, limit=DEFAULT_LIMIT, threshold=DEFAULT_THRESHOLD):
+        """
+        Find the documents most similar to a query.
+
+        Args:
+            query (str): Text to look for, typos and all
+            limit (int, optional): Number of results (None: every match)
+            threshold (float): Lowest score returned, between 0 and 1
+
+        Returns:
+            list: (key, score) pairs, best first
+        """
+        scores = self.score(query)
+        if scores is None:
+            return []
+        return self.top(scores, limit, threshold)
+
+
+class BillIndex:
+    """
+    Trigram indexes of the bill store: bill numbers and customer names.
+
+    Partitions are read once and again only when their manifest changes, as
+    in customer_store.CustomerStore.refresh; bills whose customer name changed
+    since they were indexed are indexed again.
+
+    Args:
+        bills_directory (str, optional): Root bills directory
+    """
+
+    def __init__(self, bills_directory=None):
+        self.bills_directory = bills_directory or bill_store.get_default_bills_directory()
+        self.numbers = TrigramIndex()
+        self.customers = TrigramIndex()
+        # bill number -> customer name indexed
+        self.customer_names = {}
+        # partition directory (relative) -> manifest mtime when indexed
+        self.partitions = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def add_bill(self, bill_number, customer_name=None):
+        with self._lock:
+            self.numbers.add(bill_number, words=[bill_number])
+            self.customers.add(bill_number, phrases=[customer_name or ""])
+            self.customer_names[bill_number] = customer_name
+
+    def refresh(self):
+        """
+        Index the bills of partitions that are new or changed since the last refresh.
+
+        Returns:
+            int: Number of bills added or indexed again
+        """
+        added = 0
+        with self._lock:
+            for partition_date, partition_dir in bill_store.list_partitions(self.bills_directory):
+                manifest_path = os.path.join(partition_dir, bill_store.MANIFEST_FILE)
+                try:
+                    mtime = os.stat(manifest_path).st_mtime_ns
+                except FileNotFoundError:
+                    continue
+                key = os.path.relpath(partition_dir, self.bills_directory)
+                if self.partitions.get(key) == mtime:
+                    continue
+                for entry in bill_store.load_manifest(partition_dir)["bills"].values():
+                    bill_number, customer_name = entry["bill_number"], entry.get("customer_name")
+                    if bill_number in self.numbers and self.customer_names.get(bill_number) == customer_name:
+                        continue
+                    self.add_bill(bill_number, customer_name)
+                    added += 1
+                self.partitions[key] = mtime
+        return added
+
+    def search(self, bill_number=None, customer_name=None, limit=DEFAULT_LIMIT, threshold=DEFAULT_THRESHOLD):
+        """
+        Find bills by bill number and/or customer name.
+
+        With both, a bill must match both and scores the mean of the two.
+
+        Returns:
+            list: (bill number, score) pairs, best first
+        """
+        with self._lock:
+            scores = [index.score(query) for index, query in ((self.numbers, bill_number), (self.customers, customer_name))]
+            scores = [score for score in scores if score is not None]
+            if not scores:
+                return []
+            combined = scores[0]
+            if len(scores) == 2:
+                combined = np.where((scores[0] >= threshold) & (scores[1] >= threshold), (scores[0] + scores[1]) / 2, 0)
+            return self.numbers.top(combined, limit, threshold)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search bills by bill number or customer name, typos and all")
+    parser.add_argument("query", help="Text to look for")
+    parser.add_argument("--customer", action="store_true", help="Search customer names instead of bill numbers")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help="Number of results")
+    parser.add_argument("--bills-dir", default=None, help="Bills directory (default: saved_bills)")
+    args = parser.parse_args(argv)
+
+    index = BillIndex(args.bills_dir)
+    start = time.perf_counter()
+    index.refresh()
+    indexed = time.perf_counter() - start
+    start = time.perf_counter()
+    if args.customer:
+        results = index.search(customer_name=args.query, limit=args.limit)
+    else:
+        results = index.search(bill_number=args.query, limit=args.limit)
+    elapsed = time.perf_counter() - start
+    for bill_number, score in results:
+        entry = bill_store.find_bill(bill_number, index.bills_directory) or {}
+        print(f"{score:5.2f}  {bill_number:<22}{entry.get('customer_name') or '':<30}{entry.get('date', '')}")
+    print(f"{len(results)} of {len(index):,d} bills in {elapsed * 1000:.2f} ms (indexed in {indexed:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
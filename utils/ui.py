@@ -1,6 +1,5 @@
 import os
 import streamlit as st
-from utils.pdf_operations import extract_pdf_text
 
 def set_page_style():
     """Set the page style and CSS for the application."""
@@ -37,15 +36,51 @@ def set_page_style():
     </style>
     """, unsafe_allow_html=True)
 
-def display_customer_info_section():
-    """Display the customer information section and return the input values."""
+def _fill_customer(suggestions):
+    """Copy the picked suggestion into the customer name and phone inputs."""
+    picked = st.session_state.get("customer_suggestion")
+    if picked is not None:
+        st.session_state.customer_name = suggestions[picked]["name"]
+        st.session_state.phone_number = suggestions[picked]["phone"]
+        st.session_state.customer_query = ""
+        st.session_state.customer_suggestion = None
+
+def display_customer_info_section(autocomplete=None):
+    """
+    Display the customer information section and return the input values.
+
+    With an autocomplete (utils.customer_autocomplete.CustomerAutocomplete), a
+    search box suggests returning customers by name or phone and picking one
+    fills in both fields.
+    """
     st.markdown('<div class="section-header">Customer Information</div>', unsafe_allow_html=True)
+    if autocomplete is not None:
+        query = st.text_input("Find Returning Customer", key="customer_query",
+                              placeholder="Start typing a name or phone number")
+        suggestions = autocomplete.suggest(query) if query else []
+        if suggestions:
+            st.selectbox(
+                "Suggestions",
+                range(len(suggestions)),
+                index=None,
+                format_func=lambda i: f"{suggestions[i]['name']} · {suggestions[i]['phone']} ({suggestions[i]['visits']} visits)",
+                placeholder="Pick a customer",
+                key="customer_suggestion",
+                on_change=_fill_customer,
+                args=(suggestions,)
+            )
+        elif query:
+            st.caption("No returning customer matches.")
     col1, col2 = st.columns(2)
     with col1:
-        customer_name = st.text_input("Customer Name")
+        customer_name = st.text_input("Customer Name", key="customer_name")
     with col2:
-        phone_number = st.text_input("Phone Number")
-    
+        phone_number = st.text_input("Phone Number", key="phone_number")
+    if autocomplete is not None and phone_number and not customer_name:
+        known = autocomplete.lookup_phone(phone_number)
+        if known:
+            st.caption(f"Returning customer: {known['name']} ({known['visits']} visits)")
+
     return customer_name, phone_number
 
 def display_product_selection(cosmetic_products, grocery_products, drink_products, prices, inventory=None):